@@ -1,10 +1,8 @@
-﻿import os
-import arcpy
-
-try:
-    import xml.etree.cElementTree as ET
-except ImportError:
-    import xml.etree.ElementTree as ET
+﻿from prt import batch
+from prt import dimap
+from prt import metrics
+from prt import rastertype
+from prt import sniff
 
 
 class enumDataSourceType():
@@ -14,12 +12,10 @@ class enumDataSourceType():
 
 class RasterTypeFactory():
 
+    @rastertype.memoize
     def getRasterTypesInfo(self):
-        instrument_auxField = arcpy.Field()
-        instrument_auxField.name = 'Instrument'
-        instrument_auxField.aliasName = 'Instrument'
-        instrument_auxField.length = 50
-        instrument_auxField.type = 'String'
+        #built on the first call only; arcpy is not needed until the info is asked for
+        instrument_auxField = rastertype.field('Instrument', 'Instrument', 'String', 50)
 
         return [
                 {
@@ -78,6 +74,37 @@ class RasterTypeFactory():
         ]
 
 
+#everything the builder reads from a DEIMOS-1 dim file, collected in one streaming pass
+dimapProfile = dimap.DimapProfile(
+                sensorName = 'DEIMOS-1',
+                rasterPath = 'Data_Access/Data_File/DATA_FILE_PATH@href',
+                spatialReference = ['Coordinate_Reference_System/Horizontal_CS/HORIZONTAL_CS_CODE'],
+                #the EPSG code is turned into an arcpy.SpatialReference by build(), one shared object per code
+                footprintSpatialReference = True,
+                noSpatialReference = None,
+                productType = 'last',
+                footprint = 'Dataset_Frame/*',
+                bands = 'Image_Interpretation/*',
+                bandNames = {'NIR': 'NearInfrared'},
+                keyProperties = [
+                                  {'key': 'sunElevation', 'path': dimap.SCENE_SOURCE + '/SUN_ELEVATION', 'type': float},
+                                  {'key': 'sunAzimuth', 'path': dimap.SCENE_SOURCE + '/SUN_AZIMUTH', 'type': float},
+                                  {'key': 'acquisitionDate', 'paths': [dimap.SCENE_SOURCE + '/IMAGING_DATE', dimap.SCENE_SOURCE + '/IMAGING_TIME'], 'join': 'T'},
+                                  {'key': 'viewingAngle', 'path': dimap.SCENE_SOURCE + '/VIEWING_ANGLE', 'type': float},
+                                  {'key': 'incidenceAngle', 'path': dimap.SCENE_SOURCE + '/INCIDENCE_ANGLE', 'type': float},
+                                  {'key': 'Instrument', 'path': dimap.SCENE_SOURCE + '/INSTRUMENT'}
+                                ],
+                # Sensor elevation, azimuth
+                parameters = {
+                               'records': 'Dataset_Sources/Source_Information/Quality_Assessment/*',
+                               'name': 'QUALITY_PARAMETER_CODE',
+                               'value': 'QUALITY_PARAMETER_VALUE',
+                               'keys': {'SENSOR_AZIMUTH': 'sensorAzimuth', 'SENSOR_ELEVATION': 'sensorElevation'}
+                             },
+                tagsFromBandCount = False
+              )
+
+
 #############################################################################################
 #############################################################################################
 ###
@@ -88,130 +115,24 @@ class RasterTypeFactory():
 class DeimosBuilder():
 
     def __init__(self, **kwargs):
-        self.SensorName = 'DEIMOS-1'
+        self.SensorName = dimapProfile.sensorName
 
     def canBuild(self, datasetPath):
 
-        canBuild = False
-
-        #open the datasetPath and check if it contains the string Deimos
-        f = open(datasetPath)
-        s = f.read()
-        if '<MISSION>DEIMOS' in s:
-            if '<MISSION_INDEX>1' in s:
-                canBuild = True
-
-        f.close()
+        #read the head of the datasetPath and check that the mission is DEIMOS with index 1
+        header = sniff.sniffHeader(datasetPath)
+        canBuild = header['sensor'] == 'DEIMOS-1'
         return canBuild
 
     def build(self, itemURI):
-        #open the file that is part of the itemURI dictionary
-        filePath = itemURI['path']
-
-        #the metadata file is a XML file
-        tree = ET.parse(filePath)
-
-        # Horizontal CS
-        epsgCode = 0
-        for c in tree.findall('Coordinate_Reference_System/Horizontal_CS/HORIZONTAL_CS_CODE'):
-            print c.text
-            epsgCode = long(c.text.split(':')[1])
-
-        SRS = None
-        if epsgCode > 0:
-            SRS = arcpy.SpatialReference(epsgCode)
-
-        # Dataset path
-        fileName = None
-        for c in tree.findall('Data_Access/Data_File/DATA_FILE_PATH'):
-            fileName = c.attrib['href']
-
-        if fileName is None:
-            print "FilePath not found"
-            return None
-
-        fullPath = os.path.join(os.path.dirname(filePath), fileName)
-
-        # dataset frame - footprint; this is a list of Vertex coordinates
-        coords_list = list()
-        vertex_array = arcpy.Array()
-        for all_vertex in tree.findall('Dataset_Frame'):
-            for vertex in all_vertex:
-                coord = list()
-                frame_x = float(vertex.find('FRAME_X').text)
-                frame_y = float(vertex.find('FRAME_Y').text)
-                coord.append(frame_x)
-                coord.append(frame_y)
-                coords_list.append(coord)
-                vertex_array.add(arcpy.Point(frame_x, frame_y))
-
-        footprint_geometry = arcpy.Polygon(vertex_array, SRS)
-
-        bandProperties = list()
-
-        # Band info - gain, bias etc
-        for img_interpretation in tree.findall('Image_Interpretation'):
-            for band_info in img_interpretation:
-                bandProperty = {}
-                if band_info.find('BAND_DESCRIPTION').text == 'NIR':
-                    bandProperty['bandName'] = 'NearInfrared'
-                else:
-                    bandProperty['bandName'] = band_info.find('BAND_DESCRIPTION').text
-
-                band_num = int(band_info.find('BAND_INDEX').text)
-                bandProperty['RadianceGain'] = float(band_info.find('PHYSICAL_GAIN').text)
-                bandProperty['RadianceBias'] = float(band_info.find('PHYSICAL_BIAS').text)
-                bandProperty['unit'] = band_info.find('PHYSICAL_UNIT').text
-                bandProperties.append(bandProperty)
-
-        metadata = {}
-
-        acquisitionDate = None
-        acquisitionTime = None
-
-        # Sun elevation, azimuth etc
-        for img_metadata in tree.findall('Dataset_Sources/Source_Information/Scene_Source'):
-            metadata['sunElevation'] = float(img_metadata.find('SUN_ELEVATION').text)
-            metadata['sunAzimuth'] = float(img_metadata.find('SUN_AZIMUTH').text)
-            acquisitionDate = img_metadata.find('IMAGING_DATE').text
-            acquisitionTime = img_metadata.find('IMAGING_TIME').text
-            metadata['viewingAngle'] = float(img_metadata.find('VIEWING_ANGLE').text)
-            metadata['incidenceAngle'] = float(img_metadata.find('INCIDENCE_ANGLE').text)
-            metadata['Instrument'] = img_metadata.find('INSTRUMENT').text
-
-        # Sensor elevation, azimuth
-        for quality_assessment in tree.findall('Dataset_Sources/Source_Information/Quality_Assessment'):
-            for quality_param in quality_assessment:
-                quality_code = quality_param.find('QUALITY_PARAMETER_CODE')
-                if quality_code is not None:
-                    code = quality_code.text
-                    quality_value = float(quality_param.find('QUALITY_PARAMETER_VALUE').text)
-                    if 'SENSOR_AZIMUTH' in code:
-                        metadata['sensorAzimuth'] = quality_value
-                    elif 'SENSOR_ELEVATION' in code:
-                        metadata['sensorElevation'] = quality_value
-
-        if acquisitionDate is not None:
-            if acquisitionTime is not None:
-                acquisitionDate = acquisitionDate + 'T' + acquisitionTime
-
-            metadata['acquisitionDate'] = acquisitionDate
-
-        metadata['SensorName'] = self.SensorName
-        metadata['bandProperties'] = bandProperties
-        for productName in tree.findall('Production/PRODUCT_TYPE'):
-            if productName is not None:
-                metadata['ProductType'] = productName.text
-
-        # Assemble everything into a dictionary
-        builtItem = {}
-        builtItem['spatialReference'] = SRS
-        builtItem['raster'] = { 'Raster1' : fullPath }
-        builtItem['footprint'] = footprint_geometry
-        builtItem['keyProperties'] = metadata
-        builtItem['itemURI'] = { 'tag' : 'MS' }
+        #the arcpy footprint polygon is created here, from the portable item
+        with metrics.stage('build', self.SensorName):
+            return batch.materialize(self.buildPortable(itemURI), spatialReferenceObjects=True, itemURI=itemURI)
 
-        builtItemsList = list()
-        builtItemsList.append(builtItem)
-        return builtItemsList
+    def buildMany(self, itemURIs, workers=None):
+        #build many items on a pool of warm worker processes; arcpy geometry is only created in this process
+        return batch.buildMany(__file__, 'DeimosBuilder', itemURIs, workers, spatialReferenceObjects=True)
 
+    def buildPortable(self, itemURI):
+        #the metadata file is a XML file; the values are read and assembled as described by dimapProfile
+        return dimapProfile.buildPortable(itemURI)
@@ -1,10 +1,21 @@
-﻿import arcpy
-import os
+﻿import os
+
+from prt import archive
+from prt import batch
+from prt import geometry
+from prt import item
+from prt import metrics
+from prt import mtl
+from prt import rastertype
+from prt import sniff
+from prt import spatial
+from prt import walk
 
 class rasterTypeFactory():
     def __init__(self): #not reqd by API - can be used by pyDeveloper to declare and initialise class members
         self.Description = "Factory for available raster types"
 
+    @rastertype.memoize
     def getRasterTypesInfo(self):
         return [
                 {
@@ -136,46 +147,43 @@ class LS8Builder():
         self.name = "RasterDatasetBuilder" 
 
     def canBuild(self, datasetPath):
-        #open the mtl.txt file, look for specific identifier...return true if search is successful, else return false
-        f = open(datasetPath, 'r')
-        metadata = f.read()
-        if "LANDSAT_8" in metadata :
-            return True
-
-        return False
+        #read the head of the mtl.txt file, look for specific identifier...return true if search is successful, else return false
+        header = sniff.sniffHeader(datasetPath)
+        return header['sensor'] == sniff.LANDSAT8_SENSOR
 
     def readMetFile(self, datasetPath): #helper function - not reqd by API
-        f = open(datasetPath, 'r')
-        metFileProperties = {} #Dict
-        for line in f: #Iterates through every line in the file
-            if "=" in line: 
-                l = line.split("=") #Seperate by "=" and put into a dict
-                metFileProperties[l[0].strip()] = l[1].strip().replace('"','')  #First word is key, second word is value
-
-        f.close()
-        return metFileProperties 
+        #parsed once per (path, size, mtime) and shared by the MS and Pan items; fields of every GROUP by name, as text
+        return mtl.readMtl(datasetPath)
 
         
     def build(self, fileItemURI):
+        #the arcpy footprint polygon is created here, from the portable item
+        with metrics.stage('build', 'Landsat 8'):
+            return batch.materialize(self.buildPortable(fileItemURI), spatialReferenceObjects=True, itemURI=fileItemURI)
+
+    def buildMany(self, fileItemURIs, workers=None):
+        #build many items on a pool of warm worker processes; arcpy geometry is only created in this process
+        return batch.buildMany(__file__, 'LS8Builder', fileItemURIs, workers, spatialReferenceObjects=True)
+
+    def buildPortable(self, fileItemURI):
         datasetPath = fileItemURI.get('filePath')
         tag = fileItemURI.get('tag')
         
         metFileProperties = self.readMetFile(datasetPath)
 
-        ulx = metFileProperties['CORNER_UL_PROJECTION_X_PRODUCT']
-        uly = metFileProperties['CORNER_UL_PROJECTION_Y_PRODUCT']
-        urx = metFileProperties['CORNER_UR_PROJECTION_X_PRODUCT']
-        ury = metFileProperties['CORNER_UR_PROJECTION_Y_PRODUCT']
-        lrx = metFileProperties['CORNER_LR_PROJECTION_X_PRODUCT']
-        lry = metFileProperties['CORNER_LR_PROJECTION_Y_PRODUCT']
-        llx = metFileProperties['CORNER_LL_PROJECTION_X_PRODUCT']
-        lly = metFileProperties['CORNER_LL_PROJECTION_Y_PRODUCT']
-        coordinates = [[float(ulx), float(uly)], [float(urx), float(ury)], [float(lrx), float(lry)], [float(llx), float(lly)]]
-
         dirPath = os.path.split(datasetPath)[0]
-        description = arcpy.Describe(os.path.join(dirPath, metFileProperties['FILE_NAME_BAND_1']))
-        srs = description.SpatialReference
-        g = arcpy.Geometry("Polygon", arcpy.Array([arcpy.Point(*cordn) for cordn in coordinates]), srs, False, False)
+        #band 1 is described once per scene, not once per tag
+        description = spatial.describe(os.path.join(dirPath, metFileProperties['FILE_NAME_BAND_1']))
+        #keep the spatial reference as WKT so the item can be pickled; build() turns it back into an object
+        srs = description.SpatialReference.exportToString()
+        g = geometry.Footprint(srs)
+        for corner in ('UL', 'UR', 'LR', 'LL'):
+            g.add(metFileProperties.number('CORNER_' + corner + '_PROJECTION_X_PRODUCT'),
+                  metFileProperties.number('CORNER_' + corner + '_PROJECTION_Y_PRODUCT'))
+        #the footprint is in UTM; the scene catalog also gets the corners in longitude, latitude
+        geographicExtent = geometry.geographicExtent(
+                               [metFileProperties.number('CORNER_' + corner + '_LON_PRODUCT') for corner in ('UL', 'UR', 'LR', 'LL')],
+                               [metFileProperties.number('CORNER_' + corner + '_LAT_PRODUCT') for corner in ('UL', 'UR', 'LR', 'LL')])
 
         msBuilderItem = {}
         panBuilderItem = {}
@@ -201,6 +209,7 @@ class LS8Builder():
                                      },
                            'spatialReference': srs,
                            'footprint': g,
+                           item.GEOGRAPHIC_EXTENT: geographicExtent,
                            'variables' : {
                                             'defaultMaximumInput': 65535,
                                             'defaultGamma': 1
@@ -269,6 +278,7 @@ class LS8Builder():
                            'raster': {'Raster1': os.path.join(dirPath, metFileProperties['FILE_NAME_BAND_8'])},
                            'spatialReference': srs, 
                            'footprint': g,
+                           item.GEOGRAPHIC_EXTENT: geographicExtent,
                            'variables' : {
                                           'defaultMaximumInput': 65535,
                                           'defaultGamma': 1,
@@ -291,11 +301,12 @@ class LS8Builder():
                                              },                     
                           }
 
+        #compact items; they become dictionaries again when handed to ArcGIS
         builderItemsList = list()
         if (bool(msBuilderItem)):
-            builderItemsList.append(msBuilderItem)
+            builderItemsList.append(item.BuiltItem(**msBuilderItem))
         if (bool(panBuilderItem)):
-            builderItemsList.append(panBuilderItem)
+            builderItemsList.append(item.BuiltItem(**panBuilderItem))
 
         return builderItemsList
 
@@ -305,27 +316,39 @@ class LS8Crawler():
         self.paths = crawlerProperties['paths']
         self.tags = ['MS', 'Pan']
         self.tagsIterator = iter(self.tags)
-        self.pathsIterator = iter(self.paths)
-        self.curPath = self.pathsIterator.next()
+        #MTL files inside .zip/.tar.gz deliveries are read in place, as /vsizip/ or /vsitar/ members
+        self.pathsIterator = self.expandPaths(self.paths)
+        self.curPath = next(self.pathsIterator)
 
     def __iter__(self):
         return self
 
+    def expandPaths(self, paths):
+        for path in paths:
+            if archive.isArchive(path):
+                for member in archive.members(path, walk.compileFilter('*_MTL.txt')):
+                    yield member
+            else:
+                yield path
+
     def next(self):
-        try:
-            curTag = self.tagsIterator.next()
-        except StopIteration:
+        with metrics.stage('crawl', 'Landsat 8'):
             try:
-                self.curPath = self.pathsIterator.next()
-                self.tagsIterator = iter(self.tags)
-                curTag = self.tagsIterator.next()
+                curTag = next(self.tagsIterator)
             except StopIteration:
-                return None
-            
-        return {
-                'filePath': self.curPath,
-                'displayName': os.path.basename(self.curPath),
-                'tag': curTag,
-                'groupName': os.path.splitext(os.path.basename(self.curPath))[0],
-                'productName':'L1G'
-                }
+                try:
+                    self.curPath = next(self.pathsIterator)
+                    self.tagsIterator = iter(self.tags)
+                    curTag = next(self.tagsIterator)
+                except StopIteration:
+                    metrics.flush()
+                    return None
+
+            metrics.increment('crawl.items')
+            return {
+                    'filePath': self.curPath,
+                    'displayName': os.path.basename(self.curPath),
+                    'tag': curTag,
+                    'groupName': os.path.splitext(os.path.basename(self.curPath))[0],
+                    'productName':'L1G'
+                    }
@@ -0,0 +1,106 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: crawling zip and tar.gz deliveries without extracting them
+###
+###     Generates a synthetic corpus for --sensor, packs it into a .zip and a .tar.gz,
+###     and crawls the extracted tree and both archives, checking that each yields the
+###     same items. "extract + crawl" adds the time an unpack step would take first.
+###
+###     python Benchmarks/bench_archive.py --sensor kazakhstan --scenes 300
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import shutil
+import tarfile
+import zipfile
+import argparse
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+from bench_ingest import SENSORS, getRasterTypeInfo
+
+from prt import batch
+from prt import cache
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def crawl(crawlerClass, root, filter):
+    cache.metadataCache.clear()
+    crawler = crawlerClass(paths=[root], recurse=True, filter=filter)
+    items = list()
+    while True:
+        item = crawler.next()
+        if item is None:
+            break
+        # Items from an archive name the same scenes as the extracted ones
+        items.append((os.path.basename(item['path']), item['tag']))
+    return items
+
+
+def pack(source, out):
+    zipPath = os.path.join(out, 'delivery.zip')
+    with zipfile.ZipFile(zipPath, 'w', zipfile.ZIP_DEFLATED) as zipped:
+        for directory, directories, files in os.walk(source):
+            for name in files:
+                path = os.path.join(directory, name)
+                zipped.write(path, os.path.relpath(path, out))
+    tarPath = os.path.join(out, 'delivery.tar.gz')
+    with tarfile.open(tarPath, 'w:gz') as tar:
+        tar.add(source, os.path.relpath(source, out))
+    return zipPath, tarPath
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    # Sensors whose crawler takes a directory (or archive) root
+    parser.add_argument('--sensor', default='kazakhstan', choices=['kazakhstan', 'nigeriasat2', 'deimos2'])
+    parser.add_argument('--scenes', type=int, default=300)
+    args = parser.parse_args()
+
+    module = batch.loadModule(os.path.join(ROOT, SENSORS[args.sensor]['module']))
+    crawlerClass = getattr(module, getRasterTypeInfo(module)['crawlerName'])
+    filter = SENSORS[args.sensor]['filter']
+
+    out = tempfile.mkdtemp(prefix='prt_archive_')
+    try:
+        corpus.generate(out, [args.sensor], args.scenes, 1, 4, 20)
+        source = os.path.join(out, args.sensor)
+        zipPath, tarPath = pack(source, out)
+
+        started = clock()
+        with tarfile.open(tarPath, 'r:gz') as tar:
+            tar.extractall(os.path.join(out, 'extracted'))
+        extractSeconds = clock() - started
+
+        print ("{0} scenes of {1}".format(args.scenes, args.sensor))
+        print ("{0:>24} {1:>8} {2:>10} {3:>10}".format('source', 'items', 'seconds', 'items/s'))
+        expected = None
+        for name, root, extra in [('extracted tree', source, 0.0),
+                                  ('extract + crawl', os.path.join(out, 'extracted', args.sensor), extractSeconds),
+                                  ('zip', zipPath, 0.0),
+                                  ('tar.gz', tarPath, 0.0)]:
+            started = clock()
+            items = crawl(crawlerClass, root, filter)
+            seconds = clock() - started + extra
+            if expected is None:
+                expected = sorted(items)
+            print ("{0:>24} {1:>8} {2:>10.3f} {3:>10.1f}{4}".format(
+                   name, len(items), seconds, len(items) / seconds,
+                   '' if sorted(items) == expected else '  MISMATCH'))
+    finally:
+        shutil.rmtree(out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: asyncio crawl mode on a slow share
+###
+###     Crawls a synthetic Kazakhstan corpus through the latency-injecting filesystem
+###     stand-in (latencyfs.py), once with the default crawler and once per
+###     --concurrency value with the 'concurrency' crawler property, and checks that
+###     every mode yields the same items.
+###
+###     python Benchmarks/bench_async_crawl.py --scenes 400 --latency-ms 2 --concurrency 1,8,32,64
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+from latencyfs import LatencyFileSystem
+
+from prt import aiocrawl
+from prt import batch
+from prt import cache
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def crawl(module, root, properties):
+    # A fresh cache per run, so every mode reads the metadata from the "share"
+    cache.metadataCache.clear()
+    crawler = module.KazakhstanCrawler(paths=[root], recurse=True, filter='*.dim', **properties)
+    items = list()
+    while True:
+        item = crawler.next()
+        if item is None:
+            break
+        items.append((item['path'], item['tag']))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenes', type=int, default=400)
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--concurrency', default='1,8,32,64')
+    args = parser.parse_args()
+
+    module = batch.loadModule(os.path.join(ROOT, 'Kazakhstan.py'))
+    out = tempfile.mkdtemp(prefix='prt_async_')
+    try:
+        corpus.generate(out, ['kazakhstan'], args.scenes, args.depth, args.fanout, 20)
+        root = os.path.join(out, 'kazakhstan')
+
+        runs = [('threads (default)', {})]
+        for concurrency in args.concurrency.split(','):
+            runs.append(('asyncio, concurrency %s' % concurrency, {'concurrency': int(concurrency)}))
+
+        expected = None
+        print ("{0} scenes, {1} ms per stat/listing/open".format(args.scenes, args.latency_ms))
+        print ("{0:>28} {1:>8} {2:>10} {3:>10} {4:>8}".format('mode', 'items', 'seconds', 'items/s', 'calls'))
+        for name, properties in runs:
+            with LatencyFileSystem(args.latency_ms) as fs:
+                started = clock()
+                items = crawl(module, root, properties)
+                seconds = clock() - started
+            if expected is None:
+                expected = sorted(items)
+            print ("{0:>28} {1:>8} {2:>10.3f} {3:>10.1f} {4:>8}{5}".format(
+                   name, len(items), seconds, len(items) / seconds, sum(fs.calls.values()),
+                   '' if sorted(items) == expected else '  MISMATCH'))
+    finally:
+        shutil.rmtree(out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: radiometric calibration throughput
+###
+###     Converts a synthetic uint16 (bands, rows, cols) block with DEIMOS-2 like band
+###     gains and biases to radiance and to TOA reflectance with prt.calibration, and
+###     reports megapixels (per band) per second for:
+###         - a per-pixel Python loop, as the old conversion script did (on a sample)
+###         - one untiled NumPy expression per band
+###         - calibrate() on 1..N threads
+###         - calibrate() from a memory-mapped raw file to a memory-mapped output
+###
+###     python Benchmarks/bench_calibration.py --bands 4 --rows 4096 --cols 4096 --workers 1,2,4,8
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+
+import numpy
+
+from prt import calibration
+
+clock = getattr(time, 'perf_counter', time.time)
+
+BAND_PROPERTIES = [
+                   {'bandName': 'NearInfrared', 'RadianceGain': 0.857607, 'RadianceBias': 0.655034},
+                   {'bandName': 'Red', 'RadianceGain': 0.593124, 'RadianceBias': -0.34494},
+                   {'bandName': 'Green', 'RadianceGain': 1.463372, 'RadianceBias': -0.109922},
+                   {'bandName': 'Blue', 'RadianceGain': 0.596995, 'RadianceBias': -0.069722},
+                   {'bandName': 'Panchromatic', 'RadianceGain': 1.064488, 'RadianceBias': -0.226575}
+                  ]
+
+KEY_PROPERTIES = {'SunElevation': 58.3, 'AcquisitionDate': '2016-06-01'}
+
+ESUN = [1040.0, 1550.0, 1830.0, 1990.0, 1600.0]
+
+# Pixels converted by the per-pixel loop; its rate is measured on this sample
+LOOP_SAMPLE = 200000
+
+
+def perPixel(block, bandProperties):
+    out = list()
+    for band, bandProperty in enumerate(bandProperties):
+        gain = bandProperty['RadianceGain']
+        bias = bandProperty['RadianceBias']
+        out.append([value / gain + bias for value in block[band].ravel()[:LOOP_SAMPLE // len(bandProperties)].tolist()])
+    return out
+
+
+def untiled(block, bandProperties):
+    return [block[band] / bandProperty['RadianceGain'] + bandProperty['RadianceBias']
+            for band, bandProperty in enumerate(bandProperties)]
+
+
+def timed(function, pixels, repeat=1):
+    started = clock()
+    for run in range(repeat):
+        function()
+    seconds = (clock() - started) / repeat
+    return pixels / seconds / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bands', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=4096)
+    parser.add_argument('--cols', type=int, default=4096)
+    parser.add_argument('--tile-rows', type=int, default=calibration.TILE_ROWS)
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    bandProperties = BAND_PROPERTIES[:args.bands]
+    pixels = args.bands * args.rows * args.cols
+    block = numpy.random.RandomState(1).randint(0, 4096, (args.bands, args.rows, args.cols)).astype(numpy.uint16)
+    out = numpy.empty(block.shape, dtype=numpy.float32)
+
+    print ("{0} bands x {1} x {2} uint16, {3:.1f} MP".format(args.bands, args.rows, args.cols, pixels / 1e6))
+    print ("{0:>36} {1:>10} {2:>10}".format('', 'radiance', 'TOA'))
+    print ("{0:>36} {1:>10.1f} {2:>10}".format('per-pixel Python loop', timed(lambda: perPixel(block, bandProperties), LOOP_SAMPLE), '-'))
+    print ("{0:>36} {1:>10.1f} {2:>10}".format('untiled NumPy (float64)', timed(lambda: untiled(block, bandProperties), pixels, args.repeat), '-'))
+
+    for workers in [int(workers) for workers in args.workers.split(',')]:
+        radiance = timed(lambda: calibration.calibrate(block, bandProperties, out=out, tileRows=args.tile_rows,
+                                                       workers=workers), pixels, args.repeat)
+        toa = timed(lambda: calibration.calibrate(block, bandProperties, out=out, toa=True, keyProperties=KEY_PROPERTIES,
+                                                  esun=ESUN[:args.bands], tileRows=args.tile_rows, workers=workers),
+                    pixels, args.repeat)
+        print ("{0:>36} {1:>10.1f} {2:>10.1f}".format('calibrate, %d thread%s' % (workers, '' if workers == 1 else 's'),
+                                                       radiance, toa))
+
+    directory = tempfile.mkdtemp(prefix='prt_calibration_')
+    try:
+        source = calibration.openRaw(os.path.join(directory, 'in.raw'), args.bands, args.rows, args.cols, 'uint16', mode='w+')
+        source[:] = block
+        source.flush()
+        del source
+        source = calibration.openRaw(os.path.join(directory, 'in.raw'), args.bands, args.rows, args.cols, 'uint16')
+        target = calibration.openRaw(os.path.join(directory, 'out.raw'), args.bands, args.rows, args.cols, 'float32', mode='w+')
+        workers = max(int(workers) for workers in args.workers.split(','))
+        radiance = timed(lambda: calibration.calibrate(source, bandProperties, out=target, tileRows=args.tile_rows,
+                                                       workers=workers), pixels, args.repeat)
+        print ("{0:>36} {1:>10.1f} {2:>10}".format('memmap -> memmap, %d threads' % workers, radiance, '-'))
+        del source, target
+    finally:
+        shutil.rmtree(directory)
+    print ("(megapixels per second)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: scene catalog queries
+###
+###     Fills a scene catalog (prt.catalog) with --scenes synthetic items scattered over
+###     the globe and a year of acquisitions, then times bbox, date and combined
+###     queries against the R-tree (with and without reading the details of each scene)
+###     and against a scan of every row, and checks that all return the same scenes.
+###
+###     python Benchmarks/bench_catalog.py --scenes 1000000
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+
+from prt import catalog
+from prt import geometry
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# AOIs in degrees: (minX, minY, maxX, maxY)
+QUERIES = [
+           ('1 degree AOI', {'bbox': (30.0, 40.0, 31.0, 41.0)}),
+           ('10 degree AOI', {'bbox': (0.0, 40.0, 10.0, 50.0)}),
+           ('one week', {'start': '2016-03-01', 'end': '2016-03-07'}),
+           ('10 degree AOI, one month', {'bbox': (0.0, 40.0, 10.0, 50.0), 'start': '2016-03-01', 'end': '2016-03-31'}),
+          ]
+
+
+def builtItems(random, index):
+    # One item shaped like the DIMAP builders' portable items
+    x = random.uniform(-180.0, 179.5)
+    y = random.uniform(-80.0, 79.5)
+    size = random.uniform(0.1, 0.5)
+    footprint = geometry.Footprint(coordinates=(x, y + size, x + size, y + size, x + size, y, x, y))
+    day = random.randint(0, 365)
+    date = time.strftime('%Y-%m-%d', time.gmtime(1451606400 + day * 86400))
+    return [{
+             'itemURI': {'tag': 'MS'},
+             'raster': {'Raster1': '/data/scene_%07d/scene_%07d.tif' % (index, index)},
+             'footprint': footprint,
+             'spatialReference': 4326,
+             'keyProperties': {'SensorName': 'Synthetic', 'ProductType': 'L1B', 'acquisitionDate': date,
+                               'sunElevation': random.uniform(10.0, 70.0)}
+            }]
+
+
+def scan(scenes, bbox=None, start=None, end=None):
+    # The catalog query done by hand over every row
+    found = list()
+    for scene in scenes:
+        if bbox is not None:
+            extent = scene['extent']
+            if extent[0] > bbox[2] or extent[2] < bbox[0] or extent[1] > bbox[3] or extent[3] < bbox[1]:
+                continue
+        if start is not None and scene['acquisitionDate'] < start:
+            continue
+        if end is not None and scene['acquisitionDate'] > end:
+            continue
+        found.append(scene['path'])
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenes', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    out = tempfile.mkdtemp(prefix='prt_catalog_')
+    try:
+        sceneCatalog = catalog.SceneCatalog(os.path.join(out, 'catalog.sqlite'))
+        generator = random.Random(args.seed)
+        started = clock()
+        for index in range(args.scenes):
+            sceneCatalog.record({'path': '/data/scene_%07d/scene_%07d.dim' % (index, index), 'tag': 'MS'},
+                                builtItems(generator, index))
+        sceneCatalog.flush()
+        seconds = clock() - started
+        print ("{0} scenes written in {1:.1f} s ({2:.0f} scenes/s), R-tree: {3}".format(
+               args.scenes, seconds, args.scenes / seconds, sceneCatalog.rtree))
+
+        scenes = sceneCatalog.query(details=False)
+        print ("{0:>28} {1:>8} {2:>12} {3:>12} {4:>12}".format('query', 'scenes', 'catalog ms', 'details ms', 'scan ms'))
+        for name, arguments in QUERIES:
+            timings = list()
+            for details in (False, True):
+                started = clock()
+                for repeat in range(args.repeat):
+                    found = sceneCatalog.query(details=details, **arguments)
+                timings.append((clock() - started) * 1000.0 / args.repeat)
+            started = clock()
+            expected = scan(scenes, **arguments)
+            scanMs = (clock() - started) * 1000.0
+            print ("{0:>28} {1:>8} {2:>12.2f} {3:>12.2f} {4:>12.2f}{5}".format(
+                   name, len(found), timings[0], timings[1], scanMs,
+                   '' if sorted(scene['path'] for scene in found) == sorted(expected) else '  MISMATCH'))
+        sceneCatalog.close()
+    finally:
+        shutil.rmtree(out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: cost of crawl checkpoints
+###
+###     Crawls a synthetic tree with a describe() that does not open the files but
+###     sleeps --describe-ms to stand in for the metadata read, and compares checkpoint
+###     intervals.
+###     Then interrupts a crawl and checks that the resumed crawl emits exactly the
+###     items that were not emitted before.
+###
+###     python Benchmarks/bench_crawl_checkpoint.py --dirs 100 --files 20
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prt import crawl
+
+
+DESCRIBE_SECONDS = 0.0
+
+
+def describe(path):
+    if DESCRIBE_SECONDS:
+        time.sleep(DESCRIBE_SECONDS)
+    return ['MS', 'Pan'], 'L1B'
+
+
+def makeTree(root, dirs, files):
+    for d in range(dirs):
+        folder = os.path.join(root, 'scene_%04d' % d, 'metadata')
+        os.makedirs(folder)
+        for f in range(files):
+            open(os.path.join(folder, 'product_%03d.dim' % f), 'w').close()
+
+
+def crawlItems(root, limit=None, **options):
+    crawler = crawl.SceneCrawler([root], True, '*.dim', describe, 'Benchmark', options)
+    items = list()
+    while limit is None or len(items) < limit:
+        uri = crawler.next()
+        if uri is None:
+            break
+        items.append((uri['path'], uri['tag']))
+    return items, crawler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dirs', type=int, default=100)
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--describe-ms', type=float, default=1.0)
+    args = parser.parse_args()
+    global DESCRIBE_SECONDS
+    DESCRIBE_SECONDS = args.describe_ms / 1000.0
+
+    workDir = tempfile.mkdtemp(prefix='prt_checkpoint_')
+    try:
+        root = os.path.join(workDir, 'tree')
+        makeTree(root, args.dirs, args.files)
+        checkpointPath = os.path.join(workDir, 'crawl.checkpoint')
+
+        print ("{0:>12} {1:>10} {2:>12} {3:>12} {4:>12} {5:>10}".format(
+               'interval', 'items/s', 'checkpoints', 'write ms', 'avg bytes', 'overhead'))
+        for interval in (None, 1.0, 0.25, 0.05, 0.0):
+            options = {}
+            if interval is not None:
+                options = {'checkpoint': checkpointPath, 'checkpointInterval': interval}
+            start = time.time()
+            items, crawler = crawlItems(root, **options)
+            elapsed = time.time() - start
+            stats = crawler.checkpointStats() or {'checkpoints': 0, 'seconds': 0.0, 'bytes': 0}
+            print ("{0:>12} {1:>10.0f} {2:>12} {3:>12.1f} {4:>12.0f} {5:>9.2%}".format(
+                   'off' if interval is None else interval, len(items) / elapsed, stats['checkpoints'],
+                   stats['seconds'] * 1000.0, stats['bytes'] / max(stats['checkpoints'], 1), stats['seconds'] / elapsed))
+
+        # Interrupted and resumed crawls, with a checkpoint for every item
+        DESCRIBE_SECONDS = 0.0
+        full, crawler = crawlItems(root)
+        for cut in (1, len(full) // 3, len(full) - 1):
+            first, crawler = crawlItems(root, cut, checkpoint=checkpointPath, checkpointInterval=0)
+            del crawler
+            rest, crawler = crawlItems(root, checkpoint=checkpointPath, checkpointInterval=0)
+            exact = sorted(first + rest) == sorted(full)
+            print ("interrupted after {0} items: resumed with {1}, exactly once: {2}".format(cut, len(rest), exact))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: streaming DIMAP extractor vs ET.parse + findall
+###
+###     python Benchmarks/bench_dimap_extract.py --ancillary 200000 --repeat 5
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prt import dimap
+
+EXTRACTOR = dimap.DimapExtractor(
+              texts = [
+                        'Raster_Dimensions/NBANDS',
+                        'Coordinate_Reference_System/PROJECTION',
+                        'Data_Access/Data_File/DATA_FILE_PATH@href',
+                        'Production/PRODUCT_TYPE'
+                      ],
+              records = [
+                          'Dataset_Frame/*',
+                          'Image_Interpretation/*',
+                          'Dataset_Sources/Source_Information/Scene_Source',
+                          'Dataset_Sources/Source_Information/Quality_Assessment/*'
+                        ]
+            )
+
+
+def writeDimap(path, ancillaryPoints, ancillaryFirst):
+    # A DEIMOS-2 L1B style document; the ancillary block stands in for ephemeris/attitude data
+    ancillary = ['<Data_Strip><Ephemeris><Points>']
+    for i in range(ancillaryPoints):
+        ancillary.append('<Point><TIME>2016-05-01T10:11:%06.3f</TIME><X>%f</X><Y>%f</Y><Z>%f</Z></Point>' % (i % 60, i * 1.5, i * 2.5, i * 3.5))
+    ancillary.append('</Points></Ephemeris></Data_Strip>')
+    ancillary = ''.join(ancillary)
+
+    vertices = ''.join('<Vertex><FRAME_X>%f</FRAME_X><FRAME_Y>%f</FRAME_Y></Vertex>' % (10 + i, 20 + i) for i in range(4))
+    bands = ''.join('<Spectral_Band_Info><BAND_INDEX>%d</BAND_INDEX><BAND_DESCRIPTION>B%d</BAND_DESCRIPTION>'
+                    '<PHYSICAL_GAIN>1.5</PHYSICAL_GAIN><PHYSICAL_BIAS>0.0</PHYSICAL_BIAS><PHYSICAL_UNIT>W/m2/sr/um</PHYSICAL_UNIT>'
+                    '</Spectral_Band_Info>' % (i + 1, i + 1) for i in range(4))
+    body = ('<Dataset_Frame>' + vertices + '</Dataset_Frame>'
+            '<Coordinate_Reference_System><PROJECTION>GEOGCS["WGS 84"]</PROJECTION></Coordinate_Reference_System>'
+            '<Raster_Dimensions><NCOLS>10000</NCOLS><NROWS>10000</NROWS><NBANDS>4</NBANDS></Raster_Dimensions>'
+            '<Data_Access><Data_File><DATA_FILE_PATH href="image.tif"/></Data_File></Data_Access>'
+            '<Image_Interpretation>' + bands + '</Image_Interpretation>'
+            '<Dataset_Sources><Source_Information><Scene_Source><MISSION>Deimos 2</MISSION><SUN_ELEVATION>50.0</SUN_ELEVATION>'
+            '<SUN_AZIMUTH>150.0</SUN_AZIMUTH><IMAGING_DATE>2016-05-01</IMAGING_DATE></Scene_Source>'
+            '<Quality_Assessment><Quality_Parameter><QUALITY_PARAMETER_CODE>SENSOR_AZIMUTH</QUALITY_PARAMETER_CODE>'
+            '<QUALITY_PARAMETER_VALUE>90.0</QUALITY_PARAMETER_VALUE></Quality_Parameter></Quality_Assessment>'
+            '</Source_Information></Dataset_Sources>'
+            '<Production><PRODUCT_TYPE>L1B</PRODUCT_TYPE></Production>')
+
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0"?><Dimap_Document>')
+        if ancillaryFirst:
+            f.write(ancillary + body)
+        else:
+            f.write(body + ancillary)
+        f.write('</Dimap_Document>')
+
+
+def readWithElementTree(path):
+    # What the builders did before: a full tree, then findall/find
+    tree = ET.parse(path)
+    values = {}
+    values['nbands'] = [n.text for n in tree.findall('Raster_Dimensions/NBANDS')]
+    values['projection'] = [n.text for n in tree.findall('Coordinate_Reference_System/PROJECTION')]
+    values['file'] = [n.attrib['href'] for n in tree.findall('Data_Access/Data_File/DATA_FILE_PATH')]
+    values['product'] = [n.text for n in tree.findall('Production/PRODUCT_TYPE')]
+    values['vertices'] = [dict((c.tag, c.text) for c in v) for frame in tree.findall('Dataset_Frame') for v in frame]
+    values['bands'] = [dict((c.tag, c.text) for c in b) for ii in tree.findall('Image_Interpretation') for b in ii]
+    values['scene'] = [dict((c.tag, c.text) for c in s) for s in tree.findall('Dataset_Sources/Source_Information/Scene_Source')]
+    values['quality'] = [dict((c.tag, c.text) for c in q) for qa in tree.findall('Dataset_Sources/Source_Information/Quality_Assessment') for q in qa]
+    return values
+
+
+def readWithExtractor(path):
+    return EXTRACTOR.extract(path)
+
+
+def measure(function, path, repeat):
+    times = list()
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(path)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times.sort()
+    return {'best_ms': times[0] * 1000.0, 'median_ms': times[len(times) // 2] * 1000.0, 'peak_kb': peak / 1024.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ancillary', type=int, default=100000, help='number of ancillary points in the document')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='prt_bench_')
+    for position, ancillaryFirst in (('end', False), ('start', True)):
+        path = os.path.join(folder, 'DE2_L1B_%s.dim' % position)
+        writeDimap(path, args.ancillary, ancillaryFirst)
+        sizeMB = os.path.getsize(path) / (1024.0 * 1024.0)
+
+        print('ancillary block at %s of a %.1f MB document' % (position, sizeMB))
+        for name, function in (('ET.parse + findall', readWithElementTree), ('DimapExtractor', readWithExtractor)):
+            result = measure(function, path, args.repeat)
+            print('  %-20s best %9.2f ms  median %9.2f ms  peak %10.1f KB' % (name, result['best_ms'], result['median_ms'], result['peak_kb']))
+        os.remove(path)
+
+    os.rmdir(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: footprint memory and polygon conversion
+###
+###     Builds --footprints four-corner footprints the way the builders used to (a list
+###     of per-vertex coordinates, then one arcpy.Point and Array.add per vertex) and
+###     the way prt.geometry does now (one array('d') per footprint, each value appended
+###     as it is converted, then geometry.toPolygons over the whole batch). Reports the
+###     bytes held per footprint while items are in flight and the time to create them
+###     and their polygons. Uses arcpy when it is installed and the stand-in otherwise.
+###
+###     python Benchmarks/bench_footprint.py --footprints 100000
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+
+try:
+    import arcpy
+except ImportError:
+    sys.path.insert(0, os.path.join(HERE, 'standin'))
+    import arcpy
+
+from prt import geometry
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def frames(count, seed):
+    # DIMAP-like values: FRAME_X / FRAME_Y text for four vertices per scene
+    generator = random.Random(seed)
+    scenes = list()
+    for index in range(count):
+        x = generator.uniform(-180.0, 179.0)
+        y = generator.uniform(-80.0, 79.0)
+        scenes.append([{'FRAME_X': '%.6f' % vertexX, 'FRAME_Y': '%.6f' % vertexY}
+                       for vertexX, vertexY in [(x, y + 0.3), (x + 0.3, y + 0.3), (x + 0.3, y), (x, y)]])
+    return scenes
+
+
+def listFootprints(scenes):
+    footprints = list()
+    for vertices in scenes:
+        coords_list = list()
+        for vertex in vertices:
+            coords_list.append([float(vertex['FRAME_X']), float(vertex['FRAME_Y'])])
+        footprints.append(coords_list)
+    return footprints
+
+
+def listPolygons(footprints):
+    polygons = list()
+    for coords_list in footprints:
+        vertex_array = arcpy.Array()
+        for x, y in coords_list:
+            vertex_array.add(arcpy.Point(x, y))
+        polygons.append(arcpy.Polygon(vertex_array))
+    return polygons
+
+
+def arrayFootprints(scenes):
+    # As prt.dimap.DimapProfile fills them
+    footprints = list()
+    for vertices in scenes:
+        footprint = geometry.Footprint(None)
+        coordinates = footprint.coordinates
+        for vertex in vertices:
+            coordinates.append(float(vertex['FRAME_X']))
+            coordinates.append(float(vertex['FRAME_Y']))
+        footprints.append(footprint)
+    return footprints
+
+
+def measure(function, argument):
+    # (result, seconds, bytes still allocated by the result)
+    tracemalloc.start()
+    started = clock()
+    result = function(argument)
+    seconds = clock() - started
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, seconds, allocated
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--footprints', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    scenes = frames(args.footprints, args.seed)
+    print ("{0} footprints, {1}".format(args.footprints, 'arcpy stand-in' if getattr(arcpy, 'STANDIN', False) else 'arcpy'))
+    print ("{0:>22} {1:>14} {2:>12} {3:>12}".format('', 'bytes/footprint', 'build s', 'polygons s'))
+
+    # Build and polygon times are measured without tracemalloc, which slows allocation down
+    for name, build, convert in [('list of vertices', listFootprints, listPolygons),
+                                 ('array(\'d\')', arrayFootprints, geometry.toPolygons)]:
+        footprints, seconds, allocated = measure(build, scenes)
+        del footprints
+        started = clock()
+        footprints = build(scenes)
+        buildSeconds = clock() - started
+        started = clock()
+        polygons = convert(footprints)
+        polygonSeconds = clock() - started
+        print ("{0:>22} {1:>14.0f} {2:>12.3f} {3:>12.3f}".format(
+               name, float(allocated) / args.footprints, buildSeconds, polygonSeconds))
+        del footprints, polygons
+
+
+if __name__ == '__main__':
+    main()
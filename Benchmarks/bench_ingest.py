@@ -0,0 +1,336 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: crawl and build throughput of the raster types
+###
+###     Runs each sensor's crawler and builder over a synthetic corpus (corpus.py) and
+###     measures crawl files/s, build items/s, metadata parses and opens per item, the
+###     p50/p99 build latency, the peak RSS and the memory a built item holds while in
+###     flight (as the builder's compact item and as the dict ArcGIS gets). Every sensor
+###     runs in its own process so caches and peak RSS are not shared. Without arcpy the
+###     stand-in in standin/ is used.
+###     Results are written as JSON; compare two runs with compare.py.
+###
+###     python Benchmarks/bench_ingest.py --corpus /tmp/prt_corpus --scenes 500 --output base.json
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+STANDIN = os.path.join(HERE, 'standin')
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+import memory
+
+try:
+    import builtins
+except ImportError:
+    # Python 2
+    import __builtin__ as builtins
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+SUITE = 'prt-ingest'
+RESULTS_VERSION = 1
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# sensor -> raster type module, crawler filter and how the crawler is fed
+SENSORS = {
+           'kazakhstan': {'module': 'Kazakhstan.py', 'filter': '*.dim'},
+           'nigeriasat2': {'module': 'NigeriaSat-2.py', 'filter': '*.dim'},
+           'deimos1': {'module': os.path.join('Backup', 'Deimos_1.py'), 'filter': '*.dim'},
+           'deimos2': {'module': os.path.join('PRT Updates', 'upd9', 'Deimos_2.py'), 'filter': '*.dim'},
+           'planetlabs': {'module': 'PlanetLabs.py', 'filter': '*_metadata.json'},
+           # LS8Crawler does not walk folders: it is given the MTL files
+           'landsat8': {'module': os.path.join('Backup', 'Test_LS.py'), 'filter': '*_MTL.txt', 'listFiles': True}
+          }
+
+
+class OpenCounter():
+
+    # Counts files opened for reading while installed
+
+    def __init__(self):
+        self.opens = 0
+        self.original = None
+
+    def install(self):
+        self.original = builtins.open
+        original = self.original
+
+        def countingOpen(path, mode='r', *args, **kwargs):
+            if 'r' in mode:
+                self.opens += 1
+            return original(path, mode, *args, **kwargs)
+
+        builtins.open = countingOpen
+
+    def uninstall(self):
+        builtins.open = self.original
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of an unsorted list
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(-(-fraction * len(ordered) // 1)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def peakRssKb():
+    if resource is None:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset // 1024
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+def totalParses(stats):
+    return sum(stats['parses'].values())
+
+
+def itemPath(itemURI):
+    return itemURI.get('path') or itemURI.get('filePath')
+
+
+def getRasterTypeInfo(module):
+    factory = getattr(module, 'rasterTypeFactory', None) or getattr(module, 'RasterTypeFactory')
+    return factory().getRasterTypesInfo()[0]
+
+
+def crawlSensor(module, info, sensor, root):
+    from prt import walk
+
+    settings = SENSORS[sensor]
+    crawlerName = info.get('crawlerName')
+    if crawlerName is None:
+        # No crawler (DEIMOS-1): one MS item per metadata file
+        return [{'path': path, 'tag': 'MS'} for path in walk.findFiles([root], True, settings['filter'])]
+
+    paths = [root]
+    if settings.get('listFiles'):
+        paths = list(walk.findFiles([root], True, settings['filter']))
+    crawler = getattr(module, crawlerName)(paths=paths, recurse=True, filter=settings['filter'])
+    itemURIs = list()
+    while True:
+        itemURI = crawler.next()
+        if itemURI is None:
+            break
+        itemURIs.append(itemURI)
+    return itemURIs
+
+
+def itemBytes(builder, itemURIs):
+    # Bytes per built item retained for all itemURIs: as returned by buildPortable, and
+    # as the plain dicts handed to ArcGIS. Each item goes through pickle, as items from
+    # build workers do, so values read from the same file are not shared between items
+    import pickle
+    from prt import item
+
+    portable = list()
+    for itemURI in itemURIs:
+        for builtItem in builder.buildPortable(itemURI) or []:
+            portable.append(pickle.loads(pickle.dumps(builtItem, 2)))
+    if not portable:
+        return None, None
+    dicts = [pickle.loads(pickle.dumps(item.export(builtItem), 2)) for builtItem in portable]
+    # The footprint, the same object in both, is left out
+    footprints = memory.deepSize([builtItem['footprint'] for builtItem in portable])
+    return ((memory.deepSize(portable) - footprints) / float(len(portable)),
+            (memory.deepSize(dicts) - memory.deepSize([builtItem['footprint'] for builtItem in dicts])) / float(len(dicts)))
+
+
+def runSensor(sensor, corpusDir, workers):
+    # Runs in the child process: crawl everything, then build every item
+    from prt import batch
+    from prt import cache
+
+    root = os.path.join(corpusDir, sensor)
+    module = batch.loadModule(os.path.join(ROOT, SENSORS[sensor]['module']))
+    info = getRasterTypeInfo(module)
+
+    opens = OpenCounter()
+    opens.install()
+    try:
+        parsesBefore = totalParses(cache.metadataCache.stats())
+        started = clock()
+        itemURIs = crawlSensor(module, info, sensor, root)
+        crawlSeconds = clock() - started
+        crawlOpens = opens.opens
+        crawlParses = totalParses(cache.metadataCache.stats()) - parsesBefore
+
+        builder = getattr(module, info['builderName'])()
+        latencies = list()
+        builtItems = 0
+        started = clock()
+        for itemURI in itemURIs:
+            itemStarted = clock()
+            built = builder.build(itemURI)
+            latencies.append(clock() - itemStarted)
+            builtItems += len(built or [])
+        buildSeconds = clock() - started
+    finally:
+        opens.uninstall()
+
+    parses = totalParses(cache.metadataCache.stats()) - parsesBefore
+    files = len(set(itemPath(itemURI) for itemURI in itemURIs))
+    items = len(itemURIs)
+    latenciesMs = [latency * 1000.0 for latency in latencies]
+
+    result = {
+              'files': files,
+              'items': items,
+              'builtItems': builtItems,
+              'crawlSeconds': crawlSeconds,
+              'crawlFilesPerSecond': files / crawlSeconds if crawlSeconds else None,
+              'buildSeconds': buildSeconds,
+              'buildItemsPerSecond': items / buildSeconds if buildSeconds else None,
+              'crawlParses': crawlParses,
+              'buildParses': parses - crawlParses,
+              'parsesPerItem': float(parses) / items if items else None,
+              'opensPerItem': float(opens.opens) / items if items else None,
+              'crawlOpens': crawlOpens,
+              'latencyMs': {
+                            'p50': percentile(latenciesMs, 0.50),
+                            'p99': percentile(latenciesMs, 0.99),
+                            'mean': sum(latenciesMs) / len(latenciesMs) if latenciesMs else None,
+                            'max': max(latenciesMs) if latenciesMs else None
+                           },
+              'peakRssKb': peakRssKb()
+             }
+    result['itemBytes'], result['itemDictBytes'] = itemBytes(builder, itemURIs)
+
+    if workers:
+        # The same items again on a pool of worker processes
+        buildMany = getattr(builder, 'buildMany', None)
+        if buildMany is not None:
+            started = clock()
+            buildMany(itemURIs, workers)
+            seconds = clock() - started
+            result['buildManyWorkers'] = workers
+            result['buildManyItemsPerSecond'] = items / seconds if seconds else None
+            batch.shutdown()
+
+    return result
+
+
+def arcpyAvailable():
+    try:
+        import arcpy
+    except ImportError:
+        return False
+    return not getattr(arcpy, 'STANDIN', False)
+
+
+def gitCommit():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def runChild(sensor, corpusDir, workers, standin):
+    environment = dict(os.environ)
+    if standin:
+        environment['PYTHONPATH'] = os.pathsep.join([STANDIN] + [p for p in [environment.get('PYTHONPATH')] if p])
+
+    handle, output = tempfile.mkstemp(suffix='.json', prefix='prt_bench_')
+    os.close(handle)
+    try:
+        command = [sys.executable, os.path.abspath(__file__), '--child', sensor, '--corpus', corpusDir,
+                   '--workers', str(workers), '--output', output]
+        subprocess.check_call(command, env=environment)
+        with open(output) as resultFile:
+            return json.load(resultFile)
+    finally:
+        os.remove(output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'prt_corpus'))
+    parser.add_argument('--sensors', default=','.join(corpus.SENSORS))
+    parser.add_argument('--scenes', type=int, default=500, help='scenes per sensor when the corpus is generated')
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--ancillary-points', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--regenerate', action='store_true')
+    parser.add_argument('--workers', type=int, default=0, help='also time buildMany on this many workers')
+    parser.add_argument('--output', default='ingest_results.json')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = runSensor(args.child, args.corpus, args.workers)
+        with open(args.output, 'w') as resultFile:
+            json.dump(result, resultFile)
+        return
+
+    sensors = [sensor for sensor in args.sensors.split(',') if sensor]
+    manifestPath = os.path.join(args.corpus, corpus.CORPUS_MANIFEST)
+    if args.regenerate or not os.path.exists(manifestPath):
+        corpus.generate(args.corpus, sensors, args.scenes, args.depth, args.fanout, args.ancillary_points, args.seed)
+    with open(manifestPath) as manifestFile:
+        corpusManifest = json.load(manifestFile)
+
+    standin = not arcpyAvailable()
+    results = {
+               'suite': SUITE,
+               'version': RESULTS_VERSION,
+               'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'commit': gitCommit(),
+               'arcpy': 'standin' if standin else 'arcpy',
+               'corpus': dict((key, value) for key, value in corpusManifest.items() if key != 'sensors'),
+               'sensors': {}
+              }
+
+    print ("{0:>12} {1:>7} {2:>11} {3:>11} {4:>8} {5:>8} {6:>9} {7:>9} {8:>10} {9:>13}".format(
+           'sensor', 'items', 'crawl f/s', 'build i/s', 'parse/i', 'open/i', 'p50 ms', 'p99 ms', 'peak MB', 'B/item (dict)'))
+    for sensor in sensors:
+        if sensor not in corpusManifest['sensors']:
+            print ("{0:>12} not in the corpus, skipped".format(sensor))
+            continue
+        result = runChild(sensor, args.corpus, args.workers, standin)
+        results['sensors'][sensor] = result
+        print ("{0:>12} {1:>7} {2:>11.1f} {3:>11.1f} {4:>8.2f} {5:>8.2f} {6:>9.3f} {7:>9.3f} {8:>10} {9:>13}".format(
+               sensor, result['items'], result['crawlFilesPerSecond'] or 0, result['buildItemsPerSecond'] or 0,
+               result['parsesPerItem'] or 0, result['opensPerItem'] or 0,
+               result['latencyMs']['p50'] or 0, result['latencyMs']['p99'] or 0,
+               '-' if result['peakRssKb'] is None else '%.1f' % (result['peakRssKb'] / 1024.0),
+               '-' if result.get('itemBytes') is None else '%.0f (%.0f)' % (result['itemBytes'], result['itemDictBytes'])))
+
+    with open(args.output, 'w') as resultFile:
+        json.dump(results, resultFile, indent=2, sort_keys=True)
+    print ("results written to {0}".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
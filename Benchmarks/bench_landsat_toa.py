@@ -0,0 +1,128 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: Landsat 8 TOA reflectance
+###
+###     Writes synthetic uncompressed uint16 GeoTIFF-like bands for one Landsat 8 scene
+###     (bands 1-7 and 9 at --size, Pan band 8 at twice that) and converts them with
+###     prt.landsat8.reflectance(), band after band with tiles spread over the workers and
+###     with bandParallel. Reports megapixels per second and the peak of Python / NumPy
+###     allocations (tracemalloc), which follows --tile-rows times the band width, not the
+###     size of the scene.
+###
+###     python Benchmarks/bench_landsat_toa.py --size 2000,4000,8000 --tile-rows 512 --workers 4
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import struct
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+
+import numpy
+
+from prt import landsat8
+
+clock = getattr(time, 'perf_counter', time.time)
+
+SUN_ELEVATION = 47.06404414
+
+
+def writeTiff(path, rows, cols, seed):
+    # A little endian, one strip, uint16 TIFF; the pixels are written a few rows at a time
+    entries = [(256, 4, 1, cols), (257, 4, 1, rows), (258, 3, 1, 16), (259, 3, 1, 1),
+               (262, 3, 1, 1), (273, 4, 1, 0), (277, 3, 1, 1), (278, 4, 1, rows),
+               (279, 4, 1, rows * cols * 2), (339, 3, 1, 1)]
+    dataOffset = 8 + 2 + 12 * len(entries) + 4
+    with open(path, 'wb') as f:
+        f.write(b'II*\x00' + struct.pack('<I', 8) + struct.pack('<H', len(entries)))
+        for tag, fieldType, count, value in entries:
+            if tag == 273:
+                value = dataOffset
+            # SHORT values are left-justified in the 4 byte field
+            field = struct.pack('<HH', value, 0) if fieldType == 3 else struct.pack('<I', value)
+            f.write(struct.pack('<HHI', tag, fieldType, count) + field)
+        f.write(struct.pack('<I', 0))
+        random = numpy.random.RandomState(seed)
+        for start in range(0, rows, 256):
+            block = random.randint(5000, 30000, size=(min(256, rows - start), cols)).astype('<u2')
+            block[:, :8] = 0
+            f.write(block.tobytes())
+
+
+def scene(directory, size):
+    raster = dict()
+    metadata = {'SUN_ELEVATION': str(SUN_ELEVATION)}
+    for index, band in enumerate(landsat8.MS_BANDS):
+        path = os.path.join(directory, 'LC8_B{0}.TIF'.format(band))
+        writeTiff(path, size, size, band)
+        raster['Raster{0}'.format(index + 1)] = path
+    pan = os.path.join(directory, 'LC8_B8.TIF')
+    writeTiff(pan, 2 * size, 2 * size, 8)
+    for band in range(1, 12):
+        metadata['REFLECTANCE_MULT_BAND_{0}'.format(band)] = '2.0000E-05'
+        metadata['REFLECTANCE_ADD_BAND_{0}'.format(band)] = '-0.100000'
+    keyProperties = {'sunElevation': str(SUN_ELEVATION), 'bandProperties': [{}] * len(landsat8.MS_BANDS)}
+    items = [{'itemURI': {'tag': 'MS'}, 'raster': raster, 'keyProperties': keyProperties},
+             {'itemURI': {'tag': 'Pan'}, 'raster': {'Raster1': pan},
+              'keyProperties': {'sunElevation': str(SUN_ELEVATION), 'bandProperties': [{}]}}]
+    return items, metadata
+
+
+def run(items, metadata, output, tileRows, workers, bandParallel):
+    tracemalloc.start()
+    started = clock()
+    outputs = landsat8.reflectance(items, output, metadata=metadata, tileRows=tileRows,
+                                   workers=workers, bandParallel=bandParallel)
+    seconds = clock() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return outputs, seconds, peak
+
+
+def check(outputs, items, metadata):
+    # One band against the formula, computed in full
+    source = items[0]['raster']['Raster4']
+    dn = numpy.memmap(source, dtype='<u2', mode='r', offset=8 + 2 + 12 * 10 + 4)
+    expected = (dn * 2.0e-5 - 0.1) / numpy.sin(numpy.radians(SUN_ELEVATION))
+    expected[dn == landsat8.FILL_DN] = numpy.nan
+    result = numpy.fromfile(outputs[4], dtype='float32')
+    return numpy.allclose(result, expected, rtol=1e-6, atol=1e-6, equal_nan=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', default='2000,4000,8000')
+    parser.add_argument('--tile-rows', type=int, default=512)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print ("{0:>6} {1:>13} {2:>9} {3:>9} {4:>8} {5:>11} {6:>6}".format(
+           'size', 'mode', 'MP', 'seconds', 'MP/s', 'peak MB', 'ok'))
+    for size in [int(size) for size in args.size.split(',')]:
+        out = tempfile.mkdtemp(prefix='prt_toa_')
+        try:
+            items, metadata = scene(out, size)
+            megapixels = (len(landsat8.MS_BANDS) * size * size + 4 * size * size) / 1e6
+            for bandParallel in (False, True):
+                output = os.path.join(out, 'toa')
+                outputs, seconds, peak = run(items, metadata, output, args.tile_rows, args.workers, bandParallel)
+                print ("{0:>6} {1:>13} {2:>9.1f} {3:>9.3f} {4:>8.1f} {5:>11.1f} {6:>6}".format(
+                       size, 'band-parallel' if bandParallel else 'tiles', megapixels, seconds,
+                       megapixels / seconds, peak / 1e6, str(check(outputs, items, metadata))))
+                shutil.rmtree(output)
+        finally:
+            shutil.rmtree(out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: Landsat 8 MTL parsing
+###
+###     Writes --files synthetic _MTL.txt files (Benchmarks/corpus.py) and reads each one
+###     the way LS8Builder does for its MS and Pan items, taking the eight corner
+###     coordinates as numbers:
+###         - line by line, split on "=", once per item (readMetFile before prt.mtl)
+###         - prt.mtl.parseMtl(), once per item, no cache
+###         - the same plus one group() lookup, which builds the GROUP tree
+###         - prt.mtl.readMtl() per item, with an empty cache and again with a warm one
+###     and reports files per second and the parses made.
+###
+###     python Benchmarks/bench_mtl.py --files 5000 --repeat 3
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+
+from prt import cache
+from prt import mtl
+
+clock = getattr(time, 'perf_counter', time.time)
+
+TAGS = ('MS', 'Pan')
+
+CORNERS = ['CORNER_' + corner + '_PROJECTION_' + axis + '_PRODUCT'
+           for corner in ('UL', 'UR', 'LR', 'LL') for axis in ('X', 'Y')]
+
+
+def writeFiles(directory, count):
+    rng = random.Random(1)
+    paths = list()
+    for index in range(count):
+        sceneId = 'LC8{0:03d}{1:03d}2016{2:03d}LGN00'.format(index % 233, index // 233 % 248, index % 366)
+        path = os.path.join(directory, '{0}_{1}_MTL.txt'.format(sceneId, index))
+        with open(path, 'w') as f:
+            f.write(corpus.mtlText(sceneId, rng))
+        paths.append(path)
+    return paths
+
+
+def lineSplit(path):
+    # LS8Builder.readMetFile before prt.mtl
+    f = open(path, 'r')
+    metFileProperties = {}
+    for line in f:
+        if "=" in line:
+            l = line.split("=")
+            metFileProperties[l[0].strip()] = l[1].strip().replace('"', '')
+    f.close()
+    return metFileProperties
+
+
+def withLineSplit(path):
+    for tag in TAGS:
+        metFileProperties = lineSplit(path)
+        coordinates = [float(metFileProperties[name]) for name in CORNERS]
+    return coordinates
+
+
+def withParse(path):
+    for tag in TAGS:
+        document = mtl.parseMtl(path)
+        coordinates = [document.number(name) for name in CORNERS]
+    return coordinates
+
+
+def withGroups(path):
+    for tag in TAGS:
+        document = mtl.parseMtl(path)
+        coordinates = [document.number(name) for name in CORNERS]
+        document.group('PRODUCT_METADATA')
+    return coordinates
+
+
+def withCache(path):
+    for tag in TAGS:
+        document = mtl.readMtl(path)
+        coordinates = [document.number(name) for name in CORNERS]
+    return coordinates
+
+
+def parseCount():
+    return cache.metadataCache.stats()['parses'].get('mtl', 0)
+
+
+def timed(paths, function, repeat, before=None):
+    best = None
+    for index in range(repeat):
+        if before is not None:
+            before()
+        started = clock()
+        for path in paths:
+            function(path)
+        seconds = clock() - started
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='prt_mtl_')
+    try:
+        paths = writeFiles(directory, args.files)
+        size = sum(os.path.getsize(path) for path in paths)
+        print ("{0} files, {1:.1f} MB".format(len(paths), size / 1e6))
+
+        # Both parsers must see the same fields
+        for path in paths[:100]:
+            expected = lineSplit(path)
+            expected.pop('GROUP', None)
+            expected.pop('END_GROUP', None)
+            assert mtl.parseMtl(path).toDict() == expected, path
+
+        print ("{0:>28} {1:>9} {2:>10} {3:>8}".format('', 'seconds', 'files/s', 'parses'))
+        baseline = timed(paths, withLineSplit, args.repeat)
+        print ("{0:>28} {1:>9.3f} {2:>10.0f} {3:>8}".format('split on "=", per item', baseline,
+                                                             len(paths) / baseline, len(paths) * len(TAGS)))
+        seconds = timed(paths, withParse, args.repeat)
+        print ("{0:>28} {1:>9.3f} {2:>10.0f} {3:>8}".format('mtl.parseMtl(), per item', seconds,
+                                                             len(paths) / seconds, len(paths) * len(TAGS)))
+        seconds = timed(paths, withGroups, args.repeat)
+        print ("{0:>28} {1:>9.3f} {2:>10.0f} {3:>8}".format('parseMtl() + group()', seconds,
+                                                             len(paths) / seconds, len(paths) * len(TAGS)))
+
+        cache.configure(maxBytes=max(size * mtl.MTL_EXPANSION * 2, 1 << 20))
+        before = parseCount()
+        seconds = timed(paths, withCache, args.repeat, before=cache.metadataCache.clear)
+        print ("{0:>28} {1:>9.3f} {2:>10.0f} {3:>8}".format('mtl.readMtl(), cold', seconds, len(paths) / seconds,
+                                                             (parseCount() - before) // args.repeat))
+        before = parseCount()
+        warm = timed(paths, withCache, args.repeat)
+        print ("{0:>28} {1:>9.3f} {2:>10.0f} {3:>8}".format('mtl.readMtl(), warm', warm, len(paths) / warm,
+                                                             parseCount() - before))
+        print ("readMtl() speedup over split on \"=\": {0:.1f}x cold, {1:.1f}x warm".format(baseline / seconds, baseline / warm))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
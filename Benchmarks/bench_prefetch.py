@@ -0,0 +1,91 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: read-ahead between crawler and builder
+###
+###     Runs an ingest loop as ArcGIS does (crawler.next(), then builder.build() on the
+###     item) over a synthetic Kazakhstan corpus on the latency-injecting filesystem
+###     stand-in, once per --depth. Depth 0 is the crawler without read-ahead. The
+###     prefetch hit rate and stall time show whether the builder still waits on reads.
+###
+###     python Benchmarks/bench_prefetch.py --scenes 300 --latency-ms 2 --depth 0,1,4,16,64
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+try:
+    import arcpy
+except ImportError:
+    sys.path.insert(0, os.path.join(HERE, 'standin'))
+    import arcpy
+
+import corpus
+from latencyfs import LatencyFileSystem
+
+from prt import batch
+from prt import cache
+from prt import spatial
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+def ingest(module, root, depth):
+    # Cold caches per run, so every depth reads from the "share"
+    cache.metadataCache.clear()
+    spatial.described.clear()
+    crawler = module.KazakhstanCrawler(paths=[root], recurse=True, filter='*.dim', prefetch=depth)
+    builder = module.KazakhstanBuilder()
+    items = 0
+    while True:
+        itemURI = crawler.next()
+        if itemURI is None:
+            break
+        builder.build(itemURI)
+        items += 1
+    return items, crawler.crawler.prefetchStats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenes', type=int, default=300)
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--depth', default='0,1,4,16,64')
+    args = parser.parse_args()
+
+    module = batch.loadModule(os.path.join(ROOT, 'Kazakhstan.py'))
+    out = tempfile.mkdtemp(prefix='prt_prefetch_')
+    try:
+        corpus.generate(out, ['kazakhstan'], args.scenes, 1, 4, 20)
+        root = os.path.join(out, 'kazakhstan')
+
+        print ("{0} scenes, {1} ms per stat/listing/open".format(args.scenes, args.latency_ms))
+        print ("{0:>6} {1:>7} {2:>9} {3:>9} {4:>7} {5:>7} {6:>9} {7:>10}".format(
+               'depth', 'items', 'seconds', 'items/s', 'hits', 'misses', 'hit rate', 'stall s'))
+        for depth in [int(depth) for depth in args.depth.split(',')]:
+            with LatencyFileSystem(args.latency_ms):
+                started = clock()
+                items, stats = ingest(module, root, depth)
+                seconds = clock() - started
+            stats = stats or {'hits': 0, 'misses': items, 'hitRate': None, 'stallSeconds': None}
+            print ("{0:>6} {1:>7} {2:>9.3f} {3:>9.1f} {4:>7} {5:>7} {6:>9} {7:>10}".format(
+                   depth, items, seconds, items / seconds, stats['hits'], stats['misses'],
+                   '-' if stats['hitRate'] is None else '%.2f' % stats['hitRate'],
+                   '-' if stats['stallSeconds'] is None else '%.3f' % stats['stallSeconds']))
+    finally:
+        shutil.rmtree(out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: RPC ground-to-image model
+###
+###     Evaluates a synthetic PlanetLabs style RPC (Benchmarks/corpus.py) with
+###     prt.rpcmodel.RpcModel for --points random image points per call:
+###         - the forward model one point at a time in Python (on a sample)
+###         - forward() and inverse() on all the points, at one height and at a height per point
+###         - footprint() with 64 points per side, and validate()
+###     and reports microseconds per call and the inverse / forward round trip error.
+###
+###     python Benchmarks/bench_rpc_model.py --points 100,1000,10000 --repeat 50
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import numpy
+
+import corpus
+
+from prt import rpc
+from prt import rpcmodel
+
+clock = getattr(time, 'perf_counter', time.time)
+
+# Points evaluated by the per-point loop
+LOOP_SAMPLE = 1000
+
+
+def loadModel():
+    handle, path = tempfile.mkstemp(suffix='_rpc.txt')
+    try:
+        with os.fdopen(handle, 'w') as f:
+            f.write(corpus.rpcText(67.5, -45.45, random.Random(1)))
+        coefficients = rpc.parseRpc(path)
+    finally:
+        os.remove(path)
+    return coefficients, rpcmodel.RpcModel(coefficients)
+
+
+def perPoint(coefficients, series, longitude, latitude, height):
+    # The forward model for one point, the way it is written without NumPy; series holds
+    # the four coefficient lists
+    L = (longitude - coefficients.get('LONG_OFF')) / coefficients.get('LONG_SCALE')
+    P = (latitude - coefficients.get('LAT_OFF')) / coefficients.get('LAT_SCALE')
+    H = (height - coefficients.get('HEIGHT_OFF')) / coefficients.get('HEIGHT_SCALE')
+    terms = [1.0, L, P, H, L * P, L * H, P * H, L * L, P * P, H * H, P * L * H, L ** 3, L * P * P,
+             L * H * H, L * L * P, P ** 3, P * H * H, L * L * H, P * P * H, H ** 3]
+    values = [sum(c * t for c, t in zip(polynomial, terms)) for polynomial in series]
+    line = values[0] / values[1] * coefficients.get('LINE_SCALE') + coefficients.get('LINE_OFF')
+    samp = values[2] / values[3] * coefficients.get('SAMP_SCALE') + coefficients.get('SAMP_OFF')
+    return line, samp
+
+
+def timed(function, repeat):
+    started = clock()
+    for index in range(repeat):
+        result = function()
+    return (clock() - started) / repeat * 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', default='100,1000,10000')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    coefficients, model = loadModel()
+    rows, cols = model.imageSize()
+    state = numpy.random.RandomState(1)
+
+    print ("{0:>7} {1:>24} {2:>12} {3:>12}".format('points', '', 'us/call', 'max error'))
+    for count in [int(count) for count in args.points.split(',')]:
+        lines = state.uniform(0, rows, count)
+        samples = state.uniform(0, cols, count)
+        heights = state.uniform(0.0, 800.0, count)
+        longitudes, latitudes = model.inverse(lines, samples)
+
+        sample = min(count, LOOP_SAMPLE)
+        series = [list(coefficients.series(name)) for name in rpcmodel.POLYNOMIALS]
+        seconds, result = timed(lambda: [perPoint(coefficients, series, longitudes[index], latitudes[index], model.heightOffset)
+                                         for index in range(sample)], 1)
+        print ("{0:>7} {1:>24} {2:>12.1f} {3:>12}".format(count, 'forward, point by point', seconds * count / sample, '-'))
+
+        seconds, (forwardLines, forwardSamples) = timed(lambda: model.forward(longitudes, latitudes), args.repeat)
+        error = max(numpy.abs(forwardLines - lines).max(), numpy.abs(forwardSamples - samples).max())
+        print ("{0:>7} {1:>24} {2:>12.1f} {3:>12.2e}".format(count, 'forward()', seconds, error))
+
+        seconds, result = timed(lambda: model.inverse(lines, samples), args.repeat)
+        print ("{0:>7} {1:>24} {2:>12.1f} {3:>12}".format(count, 'inverse()', seconds, '-'))
+
+        seconds, (inverseLongitudes, inverseLatitudes) = timed(lambda: model.inverse(lines, samples, heights), args.repeat)
+        forwardLines, forwardSamples = model.forward(inverseLongitudes, inverseLatitudes, heights)
+        error = max(numpy.abs(forwardLines - lines).max(), numpy.abs(forwardSamples - samples).max())
+        print ("{0:>7} {1:>24} {2:>12.1f} {3:>12.2e}".format(count, 'inverse(), heights', seconds, error))
+
+        seconds, result = timed(lambda: model.forward(inverseLongitudes, inverseLatitudes, heights), args.repeat)
+        print ("{0:>7} {1:>24} {2:>12.1f} {3:>12}".format(count, 'forward(), heights', seconds, '-'))
+
+    seconds, footprint = timed(lambda: model.footprint(rows, cols, pointsPerSide=64), args.repeat)
+    print ("{0:>7} {1:>24} {2:>12.1f} {3:>12}".format(len(footprint), 'footprint()', seconds, '-'))
+    seconds, problems = timed(lambda: model.validate(rows, cols, footprint), args.repeat)
+    print ("{0:>7} {1:>24} {2:>12.1f} {3:>12}".format(rpcmodel.VALIDATION_GRID ** 2, 'validate()', seconds,
+                                                      'ok' if not problems else '; '.join(problems)))
+
+
+if __name__ == '__main__':
+    main()
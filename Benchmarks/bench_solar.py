@@ -0,0 +1,141 @@
+#############################################################################################
+#############################################################################################
+###
+###     Benchmark: solar position for batches of scenes
+###
+###     Computes the sun elevation and azimuth of --scenes random acquisitions (time and
+###     scene centre) one scene at a time with the math module, as a per-scene tool
+###     does, and in one call to prt.solar.position(); then fills the angles of as many
+###     built items one item at a time and with prt.solar.fill(), and runs fill() again
+###     on the filled items, which have nothing left to compute. Reports scenes per
+###     second and the largest difference between the computations.
+###
+###     python Benchmarks/bench_solar.py --scenes 100000
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import math
+import time
+import argparse
+import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+
+import numpy
+
+from prt import geometry
+from prt import item
+from prt import solar
+
+clock = getattr(time, 'perf_counter', time.time)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def scalarPosition(when, latitude, longitude):
+    # The equations of solar.position() for one scene
+    seconds = (when - EPOCH).total_seconds()
+    century = (seconds / 86400.0 + 2440587.5 - 2451545.0) / 36525.0
+    meanLongitude = math.radians((280.46646 + century * (36000.76983 + century * 0.0003032)) % 360.0)
+    meanAnomaly = math.radians(357.52911 + century * (35999.05029 - 0.0001537 * century))
+    eccentricity = 0.016708634 - century * (0.000042037 + 0.0000001267 * century)
+    centre = (math.sin(meanAnomaly) * (1.914602 - century * (0.004817 + 0.000014 * century)) +
+              math.sin(2.0 * meanAnomaly) * (0.019993 - 0.000101 * century) + math.sin(3.0 * meanAnomaly) * 0.000289)
+    omega = math.radians(125.04 - 1934.136 * century)
+    apparentLongitude = meanLongitude + math.radians(centre - 0.00569 - 0.00478 * math.sin(omega))
+    obliquity = math.radians(23.0 + (26.0 + (21.448 - century * (46.815 + century * (0.00059 - century * 0.001813))) / 60.0) / 60.0 +
+                             0.00256 * math.cos(omega))
+    declination = math.asin(math.sin(obliquity) * math.sin(apparentLongitude))
+    y = math.tan(obliquity / 2.0) ** 2
+    equationOfTime = 4.0 * math.degrees(y * math.sin(2.0 * meanLongitude) - 2.0 * eccentricity * math.sin(meanAnomaly) +
+                                        4.0 * eccentricity * y * math.sin(meanAnomaly) * math.cos(2.0 * meanLongitude) -
+                                        0.5 * y * y * math.sin(4.0 * meanLongitude) -
+                                        1.25 * eccentricity * eccentricity * math.sin(2.0 * meanAnomaly))
+    trueSolarTime = ((seconds % 86400.0) / 60.0 + equationOfTime + 4.0 * longitude) % 1440.0
+    hourAngle = math.radians(trueSolarTime / 4.0 - 180.0)
+    latitude = math.radians(latitude)
+    cosZenith = (math.sin(latitude) * math.sin(declination) +
+                 math.cos(latitude) * math.cos(declination) * math.cos(hourAngle))
+    elevation = 90.0 - math.degrees(math.acos(max(-1.0, min(1.0, cosZenith))))
+    azimuth = (math.degrees(math.atan2(math.sin(hourAngle), math.cos(hourAngle) * math.sin(latitude) -
+                                       math.tan(declination) * math.cos(latitude))) + 180.0) % 360.0
+    return elevation, azimuth
+
+
+def scenes(count):
+    random = numpy.random.RandomState(1)
+    times = (numpy.datetime64('2015-01-01T00:00:00', 'us') +
+             (random.uniform(0, 3 * 365 * 86400, count) * 1e6).astype('timedelta64[us]'))
+    return times, random.uniform(-70.0, 70.0, count), random.uniform(-180.0, 180.0, count)
+
+
+def builtItems(times, latitudes, longitudes):
+    items = list()
+    for when, latitude, longitude in zip(times.astype(datetime.datetime), latitudes, longitudes):
+        footprint = geometry.Footprint(4326, [longitude - 0.1, latitude + 0.1, longitude + 0.1, latitude + 0.1,
+                                              longitude + 0.1, latitude - 0.1, longitude - 0.1, latitude - 0.1])
+        items.append(item.BuiltItem(footprint=footprint, spatialReference=4326,
+                                    keyProperties={'acquisitionDate': when.strftime('%Y-%m-%d'),
+                                                   'acquisitionTime': when.strftime('%H:%M:%S.%f')}))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenes', type=int, default=100000)
+    args = parser.parse_args()
+
+    times, latitudes, longitudes = scenes(args.scenes)
+    print ("{0:>22} {1:>9} {2:>12} {3:>12}".format('', 'seconds', 'scenes/s', 'max diff'))
+
+    started = clock()
+    scalar = [scalarPosition(when, latitude, longitude)
+              for when, latitude, longitude in zip(times.astype(datetime.datetime), latitudes, longitudes)]
+    seconds = clock() - started
+    print ("{0:>22} {1:>9.3f} {2:>12.0f} {3:>12}".format('one scene at a time', seconds, args.scenes / seconds, '-'))
+
+    started = clock()
+    elevation, azimuth = solar.position(times, latitudes, longitudes)
+    seconds = clock() - started
+    scalar = numpy.array(scalar)
+    difference = max(numpy.abs(elevation - scalar[:, 0]).max(),
+                     numpy.abs((azimuth - scalar[:, 1] + 180.0) % 360.0 - 180.0).max())
+    print ("{0:>22} {1:>9.3f} {2:>12.0f} {3:>12.2e}".format('solar.position()', seconds, args.scenes / seconds, difference))
+
+    items = builtItems(times, latitudes, longitudes)
+    started = clock()
+    for builtItem in items:
+        # What a builder does per item: read the time and centre, compute, write back
+        keyProperties = builtItem['keyProperties']
+        when = datetime.datetime.strptime(keyProperties['acquisitionDate'] + ' ' + keyProperties['acquisitionTime'],
+                                          '%Y-%m-%d %H:%M:%S.%f')
+        coordinates = builtItem['footprint'].coordinates
+        elevation, azimuth = scalarPosition(when, sum(coordinates[1::2]) / 4.0, sum(coordinates[0::2]) / 4.0)
+        keyProperties['sunElevation'] = round(elevation, 4)
+        keyProperties['sunAzimuth'] = round(azimuth, 4)
+    seconds = clock() - started
+    filled = numpy.array([items[index]['keyProperties']['sunElevation'] for index in range(len(items))])
+    print ("{0:>22} {1:>9.3f} {2:>12.0f} {3:>12.2e}".format('items, one at a time', seconds, args.scenes / seconds,
+                                                              numpy.abs(filled - scalar[:, 0]).max()))
+
+    items = builtItems(times, latitudes, longitudes)
+    started = clock()
+    solar.fill(items)
+    seconds = clock() - started
+    filled = numpy.array([items[index]['keyProperties']['sunElevation'] for index in range(len(items))])
+    print ("{0:>22} {1:>9.3f} {2:>12.0f} {3:>12.2e}".format('solar.fill() on items', seconds, args.scenes / seconds,
+                                                              numpy.abs(filled - scalar[:, 0]).max()))
+
+    started = clock()
+    solar.fill(items)
+    seconds = clock() - started
+    print ("{0:>22} {1:>9.3f} {2:>12.0f} {3:>12}".format('fill(), angles present', seconds, args.scenes / seconds, '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#############################################################################################
+#############################################################################################
+###
+###     Compare two bench_ingest.py result files
+###
+###     Prints every sensor's metrics side by side with the change, and marks the ones
+###     that got worse by more than --threshold. Exits with 1 when any did, so it can
+###     gate a build.
+###
+###     python Benchmarks/compare.py base.json new.json --threshold 0.10
+###
+#############################################################################################
+#############################################################################################
+import sys
+import json
+import argparse
+
+# metric -> True when higher is better
+METRICS = [
+           ('crawlFilesPerSecond', True),
+           ('buildItemsPerSecond', True),
+           ('buildManyItemsPerSecond', True),
+           ('parsesPerItem', False),
+           ('opensPerItem', False),
+           ('latencyMs.p50', False),
+           ('latencyMs.p99', False),
+           ('peakRssKb', False),
+           ('itemBytes', False)
+          ]
+
+
+def metric(result, name):
+    value = result
+    for part in name.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def change(old, new):
+    if old is None or new is None:
+        return None
+    if old == 0:
+        return 0.0 if new == 0 else None
+    return (new - old) / float(old)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change that counts as a regression')
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print ("old: {0} {1} python {2}".format(old.get('created'), (old.get('commit') or '')[:10], old.get('python')))
+    print ("new: {0} {1} python {2}".format(new.get('created'), (new.get('commit') or '')[:10], new.get('python')))
+    if old.get('corpus') != new.get('corpus'):
+        print ("warning: the runs used different corpora")
+
+    regressions = 0
+    print ("{0:>12} {1:>24} {2:>12} {3:>12} {4:>9}".format('sensor', 'metric', 'old', 'new', 'change'))
+    for sensor in sorted(set(old['sensors']) | set(new['sensors'])):
+        oldResult = old['sensors'].get(sensor)
+        newResult = new['sensors'].get(sensor)
+        if oldResult is None or newResult is None:
+            print ("{0:>12} only in {1}".format(sensor, 'new' if oldResult is None else 'old'))
+            continue
+        for name, higherIsBetter in METRICS:
+            oldValue = metric(oldResult, name)
+            newValue = metric(newResult, name)
+            if oldValue is None and newValue is None:
+                continue
+            relative = change(oldValue, newValue)
+            flag = ''
+            if relative is not None:
+                worse = -relative if higherIsBetter else relative
+                if worse > args.threshold:
+                    flag = ' REGRESSION'
+                    regressions += 1
+            print ("{0:>12} {1:>24} {2:>12} {3:>12} {4:>9}{5}".format(
+                   sensor, name,
+                   '-' if oldValue is None else '%.3f' % oldValue,
+                   '-' if newValue is None else '%.3f' % newValue,
+                   '-' if relative is None else '%+.1f%%' % (relative * 100), flag))
+
+    print ("{0} regression(s) over {1:.0%}".format(regressions, args.threshold))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
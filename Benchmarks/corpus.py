@@ -0,0 +1,322 @@
+#############################################################################################
+#############################################################################################
+###
+###     Synthetic scene corpus for the ingest benchmarks
+###
+###     Writes metadata files in the layout each raster type expects: DIMAP .dim for
+###     Kazakhstan, NigeriaSat-2, DEIMOS-1 and DEIMOS-2, PlanetLabs .json with its
+###     _rpc.txt and product GeoTIFF, and Landsat 8 _MTL.txt. Rasters are empty files;
+###     only their names matter to the builders.
+###
+###     Scenes are spread over fanout ** depth leaf folders. DIMAP and Landsat scenes
+###     get a folder each, PlanetLabs scenes share their leaf folder, as deliveries do.
+###
+###     writeTiff() writes pixels as a classic uncompressed single band TIFF, the Landsat 8
+###     band layout, for the tests that need real rasters.
+###
+###     python Benchmarks/corpus.py --out /tmp/corpus --scenes 1000 --depth 2 --fanout 8
+###
+#############################################################################################
+#############################################################################################
+import os
+import json
+import struct
+import random
+import argparse
+
+SENSORS = ['kazakhstan', 'nigeriasat2', 'deimos1', 'deimos2', 'planetlabs', 'landsat8']
+
+CORPUS_MANIFEST = 'corpus.json'
+
+WGS84_WKT = ('GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],'
+             'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433]]')
+
+# (MISSION, MISSION_INDEX) as the sniffer expects them
+DIMAP_MISSIONS = {
+                   'kazakhstan': ('DZZ-HR', '1'),
+                   'nigeriasat2': ('NIGERIASAT-2', '1'),
+                   'deimos1': ('DEIMOS', '1'),
+                   'deimos2': ('Deimos 2', '1'),
+                 }
+
+PLANET_PRODUCTS = ['analytic', 'visual', 'unrectified']
+
+# RPC00B term order: 1, L, P, H, LP, LH, PH, L2, P2, H2, PLH, L3, LP2, LH2, L2P, P3, PH2, L2H, P2H, H3
+RPC_TERMS = 20
+
+
+def leafFolders(root, depth, fanout):
+    folders = ['']
+    for level in range(depth):
+        folders = [os.path.join(folder, 'd%d_%02d' % (level, i)) for folder in folders for i in range(fanout)]
+    return [os.path.join(root, folder) for folder in folders]
+
+
+def footprint(rng):
+    lon = rng.uniform(-170.0, 170.0)
+    lat = rng.uniform(-60.0, 60.0)
+    size = rng.uniform(0.05, 0.3)
+    return lon, lat, [(lon, lat + size), (lon + size, lat + size), (lon + size, lat), (lon, lat)]
+
+
+def dimapDocument(sensor, sceneId, rng, ancillaryPoints):
+    mission, missionIndex = DIMAP_MISSIONS[sensor]
+    lon, lat, corners = footprint(rng)
+    nbands = 1 if rng.random() < 0.25 else 4
+
+    if sensor == 'kazakhstan':
+        vertices = ''.join('<Vertex><FRAME_LON>%.6f</FRAME_LON><FRAME_LAT>%.6f</FRAME_LAT><FRAME_X>%.6f</FRAME_X>'
+                           '<FRAME_Y>%.6f</FRAME_Y></Vertex>' % (x, y, x, y) for x, y in corners)
+        frame = '<Dataset_Frame><VERTEX>%s</VERTEX></Dataset_Frame>' % vertices
+    else:
+        frame = '<Dataset_Frame>%s</Dataset_Frame>' % ''.join(
+                    '<Vertex><FRAME_LON>%.6f</FRAME_LON><FRAME_LAT>%.6f</FRAME_LAT><FRAME_X>%.6f</FRAME_X>'
+                    '<FRAME_Y>%.6f</FRAME_Y></Vertex>' % (x, y, x, y) for x, y in corners)
+
+    if sensor in ('kazakhstan', 'deimos1'):
+        crs = ('<Coordinate_Reference_System><Horizontal_CS><HORIZONTAL_CS_CODE>EPSG:4326</HORIZONTAL_CS_CODE>'
+               '</Horizontal_CS></Coordinate_Reference_System>')
+    else:
+        crs = '<Coordinate_Reference_System><PROJECTION>%s</PROJECTION></Coordinate_Reference_System>' % WGS84_WKT
+
+    if sensor == 'kazakhstan':
+        dataAccess = '<Data_Access><Data_File_List><DATA_FILE_PATH>%s.tif</DATA_FILE_PATH></Data_File_List></Data_Access>' % sceneId
+    else:
+        dataAccess = '<Data_Access><Data_File><DATA_FILE_PATH href="%s.tif"/></Data_File></Data_Access>' % sceneId
+
+    descriptions = ['PAN'] if nbands == 1 else ['NIR', 'RED', 'GREEN', 'BLUE']
+    bands = ''.join('<Spectral_Band_Info><BAND_INDEX>%d</BAND_INDEX><BAND_DESCRIPTION>%s</BAND_DESCRIPTION>'
+                    '<PHYSICAL_UNIT>W/m2/sr/um</PHYSICAL_UNIT><PHYSICAL_GAIN>%.6f</PHYSICAL_GAIN>'
+                    '<PHYSICAL_BIAS>%.6f</PHYSICAL_BIAS></Spectral_Band_Info>'
+                    % (i + 1, description, rng.uniform(0.5, 2.5), rng.uniform(-1.0, 1.0))
+                    for i, description in enumerate(descriptions))
+
+    sceneSource = ('<Scene_Source><MISSION>%s</MISSION><MISSION_INDEX>%s</MISSION_INDEX><INSTRUMENT>SLIM6</INSTRUMENT>'
+                   '<IMAGING_DATE>2016-%02d-%02d</IMAGING_DATE><IMAGING_TIME>%02d:%02d:%02d</IMAGING_TIME>'
+                   '<SUN_ELEVATION>%.4f</SUN_ELEVATION><SUN_AZIMUTH>%.4f</SUN_AZIMUTH>'
+                   '<VIEWING_ANGLE>%.4f</VIEWING_ANGLE><INCIDENCE_ANGLE>%.4f</INCIDENCE_ANGLE>'
+                   '<VIEWING_ANGLE_ALONG_TRACK>%.4f</VIEWING_ANGLE_ALONG_TRACK>'
+                   '<VIEWING_ANGLE_ACROSS_TRACK>%.4f</VIEWING_ANGLE_ACROSS_TRACK>'
+                   '<THEORETICAL_RESOLUTION>%.1f</THEORETICAL_RESOLUTION><EARTH_SUN_DISTANCE>%.6f</EARTH_SUN_DISTANCE>'
+                   '</Scene_Source>'
+                   % (mission, missionIndex, rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23), rng.randint(0, 59),
+                      rng.randint(0, 59), rng.uniform(10, 80), rng.uniform(0, 360), rng.uniform(0, 30), rng.uniform(0, 35),
+                      rng.uniform(-20, 20), rng.uniform(-20, 20), 22.0 if nbands == 4 else 5.0, rng.uniform(0.983, 1.017)))
+    quality = ('<Quality_Assessment><Quality_Parameter><QUALITY_PARAMETER_CODE>SENSOR_AZIMUTH</QUALITY_PARAMETER_CODE>'
+               '<QUALITY_PARAMETER_VALUE>%.4f</QUALITY_PARAMETER_VALUE></Quality_Parameter><Quality_Parameter>'
+               '<QUALITY_PARAMETER_CODE>SENSOR_ELEVATION</QUALITY_PARAMETER_CODE><QUALITY_PARAMETER_VALUE>%.4f'
+               '</QUALITY_PARAMETER_VALUE></Quality_Parameter></Quality_Assessment>' % (rng.uniform(0, 360), rng.uniform(60, 90)))
+
+    # Ephemeris and attitude samples make up most of a real .dim file
+    ancillary = ''.join('<Point><TIME>2016-01-01T00:00:%06.3f</TIME><X>%.3f</X><Y>%.3f</Y><Z>%.3f</Z></Point>'
+                        % (i % 60, i * 1.5, i * 2.5, i * 3.5) for i in range(ancillaryPoints))
+
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<Dimap_Document name="%s.dim">' % sceneId +
+            '<Metadata_Id><METADATA_FORMAT version="1.1">DIMAP</METADATA_FORMAT></Metadata_Id>' +
+            frame + crs +
+            '<Raster_Dimensions><NCOLS>%d</NCOLS><NROWS>%d</NROWS><NBANDS>%d</NBANDS></Raster_Dimensions>' % (10000, 10000, nbands) +
+            dataAccess +
+            '<Image_Interpretation>%s</Image_Interpretation>' % bands +
+            '<Dataset_Sources><Source_Information>%s%s</Source_Information></Dataset_Sources>' % (sceneSource, quality) +
+            '<Production><PRODUCT_TYPE>L1B</PRODUCT_TYPE></Production>' +
+            '<Data_Strip><Ephemeris><Points>%s</Points></Ephemeris></Data_Strip>' % ancillary +
+            '</Dimap_Document>\n')
+
+
+def rpcText(lon, lat, rng):
+    # A near affine RPC: line follows latitude, sample follows longitude
+    values = [('ERR_BIAS', -1.0), ('ERR_RAND', -1.0),
+              ('LINE_OFF', 3000.0), ('SAMP_OFF', 4000.0), ('LAT_OFF', lat), ('LONG_OFF', lon), ('HEIGHT_OFF', 250.0),
+              ('LINE_SCALE', 3000.0), ('SAMP_SCALE', 4000.0), ('LAT_SCALE', 0.1), ('LONG_SCALE', 0.15), ('HEIGHT_SCALE', 500.0)]
+    for prefix, linear in (('LINE_NUM_COEFF', 2), ('LINE_DEN_COEFF', 0), ('SAMP_NUM_COEFF', 1), ('SAMP_DEN_COEFF', 0)):
+        for term in range(RPC_TERMS):
+            if term == linear:
+                value = -1.0 if prefix == 'LINE_NUM_COEFF' else 1.0
+            else:
+                value = rng.uniform(-1e-4, 1e-4)
+            values.append(('%s_%d' % (prefix, term + 1), value))
+    return ''.join('%s: %+.15e\n' % (name, value) for name, value in values)
+
+
+def writePlanetLabs(folder, sceneId, rng):
+    lon, lat, corners = footprint(rng)
+    scene = {
+              'id': sceneId,
+              'type': 'Feature',
+              'geometry': {'type': 'Polygon', 'coordinates': [[list(corner) for corner in corners + [corners[0]]]]},
+              'properties': {
+                              'acquired': '2016-%02d-%02dT%02d:%02d:%02d.000000+00:00' % (rng.randint(1, 12), rng.randint(1, 28),
+                                                                                         rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59)),
+                              'camera': {'bit_depth': 12, 'color_mode': 'RGB', 'exposure_time': rng.randint(500, 2000),
+                                         'gain': rng.randint(100, 300), 'tdi_pulses': 0},
+                              'sun': {'altitude': rng.uniform(10, 80), 'azimuth': rng.uniform(0, 360)},
+                              'cloud_cover': {'estimated': rng.random()}
+                            }
+            }
+    with open(os.path.join(folder, sceneId + '_metadata.json'), 'w') as f:
+        json.dump(scene, f)
+    with open(os.path.join(folder, sceneId + '_rpc.txt'), 'w') as f:
+        f.write(rpcText(lon, lat, rng))
+    open(os.path.join(folder, '%s_%s.tif' % (sceneId, rng.choice(PLANET_PRODUCTS))), 'w').close()
+    return 1
+
+
+def mtlText(sceneId, rng):
+    lon, lat, corners = footprint(rng)
+    x0 = rng.uniform(200000, 600000)
+    y0 = rng.uniform(3000000, 6000000)
+    lines = ['GROUP = L1_METADATA_FILE',
+             '  GROUP = METADATA_FILE_INFO',
+             '    ORIGIN = "Image courtesy of the U.S. Geological Survey"',
+             '    LANDSAT_SCENE_ID = "%s"' % sceneId,
+             '    FILE_DATE = 2016-05-01T10:11:12Z',
+             '  END_GROUP = METADATA_FILE_INFO',
+             '  GROUP = PRODUCT_METADATA',
+             '    DATA_TYPE = "L1T"',
+             '    SPACECRAFT_ID = "LANDSAT_8"',
+             '    SENSOR_ID = "OLI_TIRS"',
+             '    DATE_ACQUIRED = 2016-05-01',
+             '    SCENE_CENTER_TIME = "10:11:12.1234560Z"']
+    for corner, (dx, dy) in (('UL', (0, 1)), ('UR', (1, 1)), ('LL', (0, 0)), ('LR', (1, 0))):
+        lines.append('    CORNER_%s_LAT_PRODUCT = %.5f' % (corner, lat + dy * 2))
+        lines.append('    CORNER_%s_LON_PRODUCT = %.5f' % (corner, lon + dx * 2))
+    for corner, (dx, dy) in (('UL', (0, 1)), ('UR', (1, 1)), ('LL', (0, 0)), ('LR', (1, 0))):
+        lines.append('    CORNER_%s_PROJECTION_X_PRODUCT = %.1f' % (corner, x0 + dx * 230000))
+        lines.append('    CORNER_%s_PROJECTION_Y_PRODUCT = %.1f' % (corner, y0 + dy * 230000))
+    for band in range(1, 12):
+        lines.append('    FILE_NAME_BAND_%d = "%s_B%d.TIF"' % (band, sceneId, band))
+    lines.extend(['    FILE_NAME_BAND_QUALITY = "%s_BQA.TIF"' % sceneId,
+                  '  END_GROUP = PRODUCT_METADATA',
+                  '  GROUP = IMAGE_ATTRIBUTES',
+                  '    CLOUD_COVER = %.2f' % rng.uniform(0, 100),
+                  '    SUN_AZIMUTH = %.8f' % rng.uniform(0, 360),
+                  '    SUN_ELEVATION = %.8f' % rng.uniform(10, 80),
+                  '    EARTH_SUN_DISTANCE = %.7f' % rng.uniform(0.983, 1.017),
+                  '  END_GROUP = IMAGE_ATTRIBUTES',
+                  '  GROUP = RADIOMETRIC_RESCALING'])
+    for band in range(1, 12):
+        lines.append('    RADIANCE_MULT_BAND_%d = %.5E' % (band, rng.uniform(0.005, 0.015)))
+    for band in range(1, 12):
+        lines.append('    RADIANCE_ADD_BAND_%d = %.5f' % (band, rng.uniform(-70, -50)))
+    for band in range(1, 10):
+        lines.append('    REFLECTANCE_MULT_BAND_%d = 2.0000E-05' % band)
+    for band in range(1, 10):
+        lines.append('    REFLECTANCE_ADD_BAND_%d = -0.100000' % band)
+    lines.extend(['  END_GROUP = RADIOMETRIC_RESCALING',
+                  '  GROUP = PROJECTION_PARAMETERS',
+                  '    MAP_PROJECTION = "UTM"',
+                  '    DATUM = "WGS84"',
+                  '    UTM_ZONE = %d' % rng.randint(1, 60),
+                  '  END_GROUP = PROJECTION_PARAMETERS',
+                  'END_GROUP = L1_METADATA_FILE',
+                  'END'])
+    return '\n'.join(lines) + '\n'
+
+
+def writeTiff(path, pixels, rowsPerStrip=None, compression=1):
+    # pixels: a (rows, cols) NumPy array, written in its own dtype and byte order, in
+    # strips of rowsPerStrip rows that follow one another in the file
+    rows, cols = pixels.shape
+    order = '>' if pixels.dtype.byteorder == '>' else '<'
+    pixels = pixels.astype(pixels.dtype.newbyteorder(order))
+    rowsPerStrip = rowsPerStrip or rows
+    starts = list(range(0, rows, rowsPerStrip))
+    counts = [(min(start + rowsPerStrip, rows) - start) * cols * pixels.dtype.itemsize for start in starts]
+    sampleFormat = {'u': 1, 'i': 2, 'f': 3}[pixels.dtype.kind]
+
+    entries = 10
+    arraysOffset = 8 + 2 + 12 * entries + 4
+    # Strip offsets and byte counts are stored after the directory when there is more than one
+    dataOffset = arraysOffset + (8 * len(starts) if len(starts) > 1 else 0)
+    offsets = [dataOffset + sum(counts[:index]) for index in range(len(starts))]
+
+    def entry(tag, fieldType, values, arrayOffset=None):
+        if arrayOffset is not None:
+            return struct.pack(order + 'HHII', tag, fieldType, len(values), arrayOffset)
+        if fieldType == 3:
+            # SHORT values are left-justified in the 4 byte field
+            return struct.pack(order + 'HHIHH', tag, fieldType, 1, values[0], 0)
+        return struct.pack(order + 'HHII', tag, fieldType, 1, values[0])
+
+    several = len(starts) > 1
+    directory = [entry(256, 4, [cols]), entry(257, 4, [rows]), entry(258, 3, [8 * pixels.dtype.itemsize]),
+                 entry(259, 3, [compression]), entry(262, 3, [1]),
+                 entry(273, 4, offsets, arraysOffset if several else None), entry(277, 3, [1]),
+                 entry(278, 4, [rowsPerStrip]), entry(279, 4, counts, arraysOffset + 4 * len(starts) if several else None),
+                 entry(339, 3, [sampleFormat])]
+    with open(path, 'wb') as f:
+        f.write((b'II*\x00' if order == '<' else b'MM\x00*') + struct.pack(order + 'I', 8))
+        f.write(struct.pack(order + 'H', entries) + b''.join(directory) + struct.pack(order + 'I', 0))
+        if several:
+            f.write(struct.pack(order + 'I' * len(starts), *offsets))
+            f.write(struct.pack(order + 'I' * len(starts), *counts))
+        f.write(pixels.tobytes())
+
+
+def writeScene(sensor, folder, index, rng, ancillaryPoints):
+    # Returns the number of metadata files written
+    if sensor == 'planetlabs':
+        return writePlanetLabs(folder, '2016%04d_%06d_0c%02d' % (index % 10000, index, index % 100), rng)
+
+    if sensor == 'landsat8':
+        sceneId = 'LC8%06d2016%03dLGN00' % (index, index % 366)
+        sceneFolder = os.path.join(folder, sceneId)
+        os.makedirs(sceneFolder)
+        with open(os.path.join(sceneFolder, sceneId + '_MTL.txt'), 'w') as f:
+            f.write(mtlText(sceneId, rng))
+        open(os.path.join(sceneFolder, sceneId + '_B1.TIF'), 'w').close()
+        return 1
+
+    sceneId = '%s_%06d' % (sensor.upper(), index)
+    sceneFolder = os.path.join(folder, sceneId)
+    os.makedirs(sceneFolder)
+    with open(os.path.join(sceneFolder, sceneId + '.dim'), 'w') as f:
+        f.write(dimapDocument(sensor, sceneId, rng, ancillaryPoints))
+    open(os.path.join(sceneFolder, sceneId + '.tif'), 'w').close()
+    return 1
+
+
+def generate(out, sensors=SENSORS, scenes=100, depth=1, fanout=4, ancillaryPoints=200, seed=1):
+    # Writes out/<sensor>/... and out/corpus.json, which describes the corpus
+    rng = random.Random(seed)
+    manifest = {'scenes': scenes, 'depth': depth, 'fanout': fanout, 'ancillaryPoints': ancillaryPoints,
+                'seed': seed, 'sensors': {}}
+    for sensor in sensors:
+        root = os.path.join(out, sensor)
+        folders = leafFolders(root, depth, fanout)
+        for folder in folders:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+        files = 0
+        for index in range(scenes):
+            files += writeScene(sensor, folders[index % len(folders)], index, rng, ancillaryPoints)
+        manifest['sensors'][sensor] = {'root': root, 'files': files}
+
+    with open(os.path.join(out, CORPUS_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic scene corpus')
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--sensors', default=','.join(SENSORS), help='comma separated, from ' + ', '.join(SENSORS))
+    parser.add_argument('--scenes', type=int, default=100, help='scenes per sensor')
+    parser.add_argument('--depth', type=int, default=1, help='folder levels above the scenes')
+    parser.add_argument('--fanout', type=int, default=4, help='subfolders per level')
+    parser.add_argument('--ancillary-points', type=int, default=200, help='ephemeris points per .dim file')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sensors = [sensor.strip() for sensor in args.sensors.split(',') if sensor.strip()]
+    unknown = [sensor for sensor in sensors if sensor not in SENSORS]
+    if unknown:
+        parser.error('unknown sensors: ' + ', '.join(unknown))
+
+    manifest = generate(args.out, sensors, args.scenes, args.depth, args.fanout, args.ancillary_points, args.seed)
+    for sensor, info in sorted(manifest['sensors'].items()):
+        print ("{0:>12}: {1} metadata files under {2}".format(sensor, info['files'], info['root']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#############################################################################################
+#############################################################################################
+###
+###     Latency-injecting filesystem stand-in
+###
+###     Makes a local disk behave like an NFS/SMB share: every stat, directory listing
+###     and open sleeps `latencyMs` first. Sleeping releases the GIL, so calls made
+###     from several threads wait side by side, as requests to a file server do.
+###
+###     with LatencyFileSystem(2.0) as fs:
+###         ... crawl ...
+###     print (fs.calls)
+###
+###     Import the modules under test first: a module that imports scandir by name
+###     while the stand-in is active keeps the slow one.
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import threading
+
+try:
+    import builtins
+except ImportError:
+    # Python 2
+    import __builtin__ as builtins
+
+
+class LatencyFileSystem():
+
+    def __init__(self, latencyMs):
+        self.latency = latencyMs / 1000.0
+        self.calls = {'stat': 0, 'scandir': 0, 'open': 0}
+        self.lock = threading.Lock()
+        self.patched = list()
+
+    def __delayed(self, kind, function):
+        def delayed(*args, **kwargs):
+            with self.lock:
+                self.calls[kind] += 1
+            time.sleep(self.latency)
+            return function(*args, **kwargs)
+        return delayed
+
+    def __patch(self, owner, name, kind):
+        original = getattr(owner, name)
+        self.patched.append((owner, name, original))
+        setattr(owner, name, self.__delayed(kind, original))
+
+    def __enter__(self):
+        self.__patch(os, 'stat', 'stat')
+        self.__patch(builtins, 'open', 'open')
+        # Modules that imported scandir by name
+        scandir = os.scandir
+        self.__patch(os, 'scandir', 'scandir')
+        for module in list(sys.modules.values()):
+            if module is not None and module is not os and getattr(module, 'scandir', None) is scandir:
+                self.__patch(module, 'scandir', 'scandir')
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        for owner, name, original in reversed(self.patched):
+            setattr(owner, name, original)
+        self.patched = list()
+        return False
@@ -0,0 +1,31 @@
+#############################################################################################
+#############################################################################################
+###
+###     Retained memory of Python objects
+###
+###     deepSize(objects) adds up sys.getsizeof over everything reachable from objects,
+###     counting each object once, so strings and tuples shared between items (interned
+###     names, shared property layouts) are only paid for once, as in the process.
+###     Classes, modules and functions are not counted.
+###
+#############################################################################################
+#############################################################################################
+import gc
+import sys
+import types
+
+SKIPPED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType)
+
+
+def deepSize(objects):
+    seen = set()
+    total = 0
+    pending = list(objects)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, SKIPPED):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        pending.extend(gc.get_referents(obj))
+    return total
@@ -0,0 +1,104 @@
+#############################################################################################
+#############################################################################################
+###
+###     arcpy stand-in for the benchmarks
+###
+###     Just enough of arcpy for the raster type modules to import and build items
+###     without ArcGIS: Field, Point, Array, Polygon, SpatialReference and Describe.
+###     Everything is plain Python and cheap, so timings measure the raster types and
+###     prt, not arcpy. Only put this folder on sys.path when arcpy is not installed.
+###
+#############################################################################################
+#############################################################################################
+import os
+
+STANDIN = True
+
+
+class Field(object):
+
+    def __init__(self):
+        self.name = None
+        self.aliasName = None
+        self.type = None
+        self.length = None
+
+
+class Point(object):
+
+    def __init__(self, X=0.0, Y=0.0, Z=None, M=None, ID=None):
+        self.X = X
+        self.Y = Y
+        self.Z = Z
+        self.M = M
+
+
+class Array(list):
+
+    def add(self, value):
+        self.append(value)
+
+    def removeAll(self):
+        del self[:]
+
+
+class SpatialReference(object):
+
+    def __init__(self, item=None, vcs=None, text=None):
+        self.factoryCode = 0
+        self.name = 'Unknown'
+        self.text = None
+        if text is not None:
+            self.text = text
+            self.name = text.split('"')[1] if '"' in text else 'Custom'
+        elif item is not None:
+            self.factoryCode = int(item)
+            self.name = 'WGS_1984' if self.factoryCode == 4326 else 'EPSG_%d' % self.factoryCode
+
+    def loadFromString(self, text):
+        self.text = text
+        self.name = text.split('"')[1] if '"' in text else 'Custom'
+
+    def exportToString(self):
+        if self.text is not None:
+            return self.text
+        return 'GEOGCS["%s"];AUTHORITY["EPSG",%d]' % (self.name, self.factoryCode)
+
+
+class Polygon(object):
+
+    def __init__(self, inputs, spatial_reference=None, has_z=False, has_m=False):
+        self.points = [(point.X, point.Y) for point in inputs]
+        self.spatialReference = spatial_reference
+
+    @property
+    def pointCount(self):
+        return len(self.points)
+
+
+class Geometry(Polygon):
+
+    def __init__(self, geometry, inputs, spatial_reference=None, has_z=False, has_m=False):
+        Polygon.__init__(self, inputs, spatial_reference, has_z, has_m)
+        self.type = geometry
+
+
+class _Describe(object):
+
+    def __init__(self, path):
+        # GDAL-style /vsizip/ and /vsitar/ archive members are described too
+        if path.startswith('/vsi'):
+            from prt import archive
+            exists = archive.exists(path)
+        else:
+            exists = os.path.exists(path)
+        if not exists:
+            raise IOError('{0} does not exist'.format(path))
+        self.catalogPath = path
+        self.dataType = 'RasterDataset'
+        self.spatialReference = SpatialReference(4326)
+        self.SpatialReference = self.spatialReference
+
+
+def Describe(path):
+    return _Describe(path)
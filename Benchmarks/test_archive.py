@@ -0,0 +1,155 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.archive
+###
+###     Corpus scenes (Benchmarks/corpus.py) packed into .zip and .tar.gz deliveries and
+###     read back through /vsizip/ and /vsitar/ paths, including tar members larger than
+###     the kept bytes and zip files evicted while a member is still being read.
+###
+###     python -m pytest Benchmarks/test_archive.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+
+from prt import archive
+
+
+def isDimap(name):
+    return name.endswith('.dim')
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.limits = (archive.MAX_MEMBER_BYTES, archive.MAX_OPEN_ZIPS)
+        self.directory = tempfile.mkdtemp(prefix='prt_test_archive_')
+        source = os.path.join(self.directory, 'corpus')
+        corpus.generate(source, sensors=['kazakhstan', 'deimos2'], scenes=3, depth=0, ancillaryPoints=100)
+        self.files = dict()
+        for folder, names, files in os.walk(source):
+            for name in files:
+                if name != corpus.CORPUS_MANIFEST:
+                    path = os.path.join(folder, name)
+                    with open(path, 'rb') as f:
+                        self.files[os.path.relpath(path, source).replace(os.sep, '/')] = f.read()
+        self.dimap = sorted(name for name in self.files if isDimap(name))
+        self.zipPath = self.pack('delivery.zip')
+        self.tarPath = self.pack('delivery.tar.gz')
+
+    def tearDown(self):
+        archive.MAX_MEMBER_BYTES, archive.MAX_OPEN_ZIPS = self.limits
+        with archive._lock:
+            for handle in archive._zips.values():
+                handle.zip.close()
+            archive._zips.clear()
+            archive._tars.clear()
+            archive._tarBytes[0] = 0
+        shutil.rmtree(self.directory)
+
+    def pack(self, name):
+        path = os.path.join(self.directory, name)
+        if name.endswith('.zip'):
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as delivery:
+                for member in sorted(self.files):
+                    delivery.writestr(member, self.files[member])
+            return path
+        delivery = tarfile.open(path, 'w:gz')
+        try:
+            for member in sorted(self.files):
+                delivery.add(os.path.join(self.directory, 'corpus', member), member)
+        finally:
+            delivery.close()
+        return path
+
+    def read(self, path):
+        with archive.open(path, 'rb') as f:
+            return f.read()
+
+    def testPaths(self):
+        self.assertEqual(archive.split('/vsizip/D:/a/b.zip/S/x.dim'), ('D:/a/b.zip', 'S/x.dim'))
+        self.assertEqual(archive.split('/vsitar/c.tar.gz\\S\\x.dim'), ('c.tar.gz', 'S/x.dim'))
+        self.assertEqual(archive.split('/data/x.dim'), None)
+        self.assertEqual(archive.memberPath('b.zip', 'x.dim'), '/vsizip/b.zip/x.dim')
+        self.assertEqual(archive.memberPath('b.tgz', 'x.dim'), '/vsitar/b.tgz/x.dim')
+        self.assertTrue(archive.isArchive('B.TAR.GZ'))
+        self.assertFalse(archive.isArchive('b.dim'))
+
+    def testMembers(self):
+        for archivePath in (self.zipPath, self.tarPath):
+            paths = list(archive.members(archivePath, isDimap))
+            self.assertEqual(paths, [archive.memberPath(archivePath, name) for name in self.dimap])
+            for path in paths:
+                name = archive.split(path)[1]
+                self.assertEqual(self.read(path), self.files[name])
+                self.assertTrue(archive.exists(path))
+                self.assertEqual(archive.stat(path).st_size, len(self.files[name]))
+            self.assertFalse(archive.exists(archive.memberPath(archivePath, 'missing.dim')))
+            self.assertRaises(IOError, archive.open, archive.memberPath(archivePath, 'missing.dim'))
+            self.assertRaises(IOError, archive.open, paths[0], 'wb')
+
+    def testTarMembersNotKept(self):
+        # Members not kept from the scan are read by scanning the archive again
+        list(archive.members(self.tarPath, isDimap))
+        for name in sorted(self.files):
+            self.assertEqual(self.read(archive.memberPath(self.tarPath, name)), self.files[name])
+
+    def testOversizedTarMember(self):
+        # A member larger than all the kept bytes is not kept, and nothing is evicted for it
+        archive.MAX_MEMBER_BYTES = min(len(self.files[name]) for name in self.dimap) - 1
+        paths = list(archive.members(self.tarPath, isDimap))
+        self.assertEqual(len(paths), len(self.dimap))
+        self.assertEqual(archive._tarBytes[0], 0)
+        for path in paths:
+            self.assertEqual(self.read(path), self.files[archive.split(path)[1]])
+
+    def testTarEviction(self):
+        archive.MAX_MEMBER_BYTES = max(len(self.files[name]) for name in self.dimap) + 1
+        paths = list(archive.members(self.tarPath, isDimap))
+        self.assertTrue(archive._tarBytes[0] <= archive.MAX_MEMBER_BYTES)
+        self.assertEqual(len(archive._tars[self.tarPath].data), 1)
+        for path in paths:
+            self.assertEqual(self.read(path), self.files[archive.split(path)[1]])
+
+    def testZipEvictedWhileReading(self):
+        archive.MAX_OPEN_ZIPS = 1
+        other = os.path.join(self.directory, 'other.zip')
+        shutil.copy(self.zipPath, other)
+        name = self.dimap[0]
+        stream = archive.open(archive.memberPath(self.zipPath, name), 'rb')
+        handle = archive._zips[self.zipPath]
+        first = stream.read(10)
+        # Reading the other archive drops this one from the open zips, but not under the stream
+        self.assertEqual(self.read(archive.memberPath(other, name)), self.files[name])
+        self.assertFalse(self.zipPath in archive._zips)
+        self.assertTrue(handle.dropped)
+        self.assertEqual(first + stream.read(), self.files[name])
+        stream.close()
+        self.assertEqual(handle.users, 0)
+        self.assertEqual(handle.zip.fp, None)
+        stream.close()
+        self.assertEqual(handle.users, 0)
+
+    def testTextMode(self):
+        path = archive.memberPath(self.zipPath, self.dimap[0])
+        with archive.open(path, 'r') as f:
+            self.assertEqual(f.read(), self.files[self.dimap[0]].decode('utf-8'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.batch
+###
+###     buildMany must return what build() returns for every itemURI of a corpus
+###     (Benchmarks/corpus.py), on a process pool and in this process when no worker
+###     interpreter can be found. Without arcpy the stand-in in standin/ is used.
+###
+###     python -m pytest Benchmarks/test_batch.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+try:
+    import arcpy
+except ImportError:
+    sys.path.insert(0, os.path.join(HERE, 'standin'))
+    import arcpy
+
+import corpus
+
+from prt import batch
+from prt import cache
+from prt import geometry
+from prt import item
+
+KAZAKHSTAN = os.path.join(ROOT, 'Kazakhstan.py')
+
+
+def comparable(builtItems):
+    # Exported items with their polygons as vertex lists
+    if builtItems is None:
+        return None
+    found = list()
+    for builtItem in builtItems:
+        builtItem = dict(builtItem)
+        footprint = builtItem.get('footprint')
+        builtItem['footprint'] = [(point.X, point.Y) for part in footprint.getPart() for point in part] \
+                                 if hasattr(footprint, 'getPart') else getattr(footprint, 'points', footprint)
+        found.append(builtItem)
+    return found
+
+
+class BatchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix='prt_test_batch_')
+        corpus.generate(cls.directory, sensors=['kazakhstan'], scenes=12, depth=1, fanout=2, ancillaryPoints=10)
+        cls.module = batch.loadModule(KAZAKHSTAN)
+        crawler = cls.module.KazakhstanCrawler(paths=[cls.directory], recurse=True, filter='*.dim')
+        cls.itemURIs = list()
+        while True:
+            itemURI = crawler.next()
+            if itemURI is None:
+                break
+            cls.itemURIs.append(itemURI)
+        cls.expected = [comparable(cls.module.KazakhstanBuilder().build(itemURI)) for itemURI in cls.itemURIs]
+
+    @classmethod
+    def tearDownClass(cls):
+        batch.shutdown()
+        cache.metadataCache.clear()
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        self.pythonExecutable = batch.PYTHON_EXECUTABLE
+
+    def tearDown(self):
+        batch.PYTHON_EXECUTABLE = self.pythonExecutable
+
+    def testCorpus(self):
+        self.assertTrue(len(self.itemURIs) >= 12)
+        self.assertTrue(all(builtItems for builtItems in self.expected))
+
+    def testPool(self):
+        built = batch.buildMany(KAZAKHSTAN, 'KazakhstanBuilder', self.itemURIs, workers=2, chunkSize=3)
+        self.assertEqual([comparable(builtItems) for builtItems in built], self.expected)
+
+    def testInProcess(self):
+        # No interpreter to start workers with: the builds run here
+        batch.PYTHON_EXECUTABLE = os.path.join(self.directory, 'missing', 'python.exe')
+        self.assertEqual(batch.pythonExecutable(), None)
+        self.assertEqual(batch.getPool(KAZAKHSTAN, 'KazakhstanBuilder', 3), None)
+        built = batch.buildMany(KAZAKHSTAN, 'KazakhstanBuilder', self.itemURIs, workers=3)
+        self.assertEqual([comparable(builtItems) for builtItems in built], self.expected)
+
+    def testPythonExecutable(self):
+        batch.PYTHON_EXECUTABLE = None
+        self.assertEqual(batch.pythonExecutable(), sys.executable)
+        batch.PYTHON_EXECUTABLE = sys.executable
+        self.assertEqual(batch.pythonExecutable(), sys.executable)
+
+    def testMaterialize(self):
+        footprint = geometry.Footprint(None, [10.0, 50.0, 10.1, 50.0, 10.1, 50.1, 10.0, 50.1])
+        builtItem = item.BuiltItem(footprint=footprint, spatialReference=4326, keyProperties={'SensorName': 'Test'})
+        exported = batch.materialize([builtItem, item.BuiltItem(raster={'Raster1': 'a.tif'})])
+        self.assertEqual(exported[0]['keyProperties'], {'SensorName': 'Test'})
+        self.assertEqual(comparable(exported[:1])[0]['footprint'],
+                         [(10.0, 50.0), (10.1, 50.0), (10.1, 50.1), (10.0, 50.1)])
+        self.assertEqual(exported[1], {'raster': {'Raster1': 'a.tif'}})
+        self.assertEqual(batch.materialize(None), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.cache
+###
+###     One parse per file, a new parse when the file changes on disk, and eviction of
+###     the least recently used entries past maxBytes / maxEntries.
+###
+###     python -m pytest Benchmarks/test_cache.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from prt import cache
+
+
+class Loader():
+
+    def __init__(self):
+        self.paths = list()
+
+    def __call__(self, path):
+        self.paths.append(path)
+        with open(path) as f:
+            return f.read()
+
+
+class MetadataCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_cache_')
+        self.paths = [self.write('file%d.txt' % index, 'x' * 100) for index in range(4)]
+        self.loader = Loader()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def testOneParsePerFile(self):
+        metadataCache = cache.MetadataCache()
+        for repeat in range(3):
+            for path in self.paths:
+                self.assertEqual(metadataCache.get(path, self.loader, 'text'), 'x' * 100)
+        self.assertEqual(self.loader.paths, self.paths)
+        stats = metadataCache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (8, 4, 4))
+        self.assertEqual(stats['parses'], {'text': 4})
+
+    def testKinds(self):
+        # The same file read two ways is two entries, counted under the kind before ':'
+        metadataCache = cache.MetadataCache()
+        metadataCache.get(self.paths[0], self.loader, 'dimap:a')
+        metadataCache.get(self.paths[0], self.loader, 'dimap:b')
+        metadataCache.get(self.paths[0], self.loader, 'dimap:a')
+        self.assertEqual(len(self.loader.paths), 2)
+        self.assertEqual(metadataCache.stats()['parses'], {'dimap': 2})
+
+    def testChangedFile(self):
+        metadataCache = cache.MetadataCache()
+        path = self.paths[0]
+        metadataCache.get(path, self.loader, 'text')
+        self.write('file0.txt', 'y' * 50)
+        st = os.stat(path)
+        os.utime(path, (st.st_atime, st.st_mtime + 10))
+        self.assertEqual(metadataCache.get(path, self.loader, 'text'), 'y' * 50)
+        # The stale entry is dropped, not kept next to the new one
+        self.assertEqual(metadataCache.stats()['entries'], 1)
+        self.assertEqual(metadataCache.stats()['bytes'], 50)
+
+    def testMaxBytes(self):
+        metadataCache = cache.MetadataCache(maxBytes=300)
+        for path in self.paths[:3]:
+            metadataCache.get(path, self.loader, 'text')
+        # Using the first entry makes the second the least recently used
+        metadataCache.get(self.paths[0], self.loader, 'text')
+        metadataCache.get(self.paths[3], self.loader, 'text')
+        self.assertEqual(metadataCache.stats()['bytes'], 300)
+        metadataCache.get(self.paths[0], self.loader, 'text')
+        metadataCache.get(self.paths[1], self.loader, 'text')
+        self.assertEqual(self.loader.paths, self.paths + [self.paths[1]])
+
+    def testTooLarge(self):
+        # An entry larger than the whole cache is returned but not kept
+        metadataCache = cache.MetadataCache(maxBytes=150)
+        metadataCache.get(self.paths[0], self.loader, 'text', expansion=2)
+        metadataCache.get(self.paths[0], self.loader, 'text', expansion=2)
+        self.assertEqual(len(self.loader.paths), 2)
+        self.assertEqual(metadataCache.stats()['entries'], 0)
+
+    def testMaxEntries(self):
+        metadataCache = cache.MetadataCache(maxEntries=2)
+        for path in self.paths:
+            metadataCache.get(path, self.loader, 'text')
+        self.assertEqual(metadataCache.stats()['entries'], 2)
+        metadataCache.get(self.paths[3], self.loader, 'text')
+        metadataCache.get(self.paths[0], self.loader, 'text')
+        self.assertEqual(len(self.loader.paths), 5)
+
+    def testClear(self):
+        metadataCache = cache.MetadataCache()
+        metadataCache.get(self.paths[0], self.loader, 'text')
+        metadataCache.clear()
+        self.assertEqual(metadataCache.stats()['bytes'], 0)
+        metadataCache.get(self.paths[0], self.loader, 'text')
+        self.assertEqual(len(self.loader.paths), 2)
+
+    def testXmlAndJson(self):
+        cache.metadataCache.clear()
+        xmlPath = self.write('scene.xml', '<Dimap_Document><NBANDS>4</NBANDS></Dimap_Document>')
+        jsonPath = self.write('scene.json', json.dumps({'id': 'scene', 'properties': {'sun': {'altitude': 40.5}}}))
+        try:
+            tree = cache.parseXml(xmlPath)
+            self.assertTrue(cache.parseXml(xmlPath) is tree)
+            self.assertEqual(tree.getroot().find('NBANDS').text, '4')
+            scene = cache.loadJson(jsonPath)
+            self.assertTrue(cache.loadJson(jsonPath) is scene)
+            self.assertEqual(scene['properties']['sun']['altitude'], 40.5)
+        finally:
+            cache.metadataCache.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.calibration
+###
+###     coefficients() for both gain conventions, applyLinear() against the formula for
+###     any tile size and number of workers, calibrate() back to the DN it started from,
+###     TOA factors, and the memory-mapped raw and TIFF rasters.
+###
+###     python -m pytest Benchmarks/test_calibration.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import math
+import shutil
+import datetime
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import numpy
+
+import corpus
+
+from prt import calibration
+
+BAND_PROPERTIES = [{'bandName': 'Red', 'RadianceGain': 1.6, 'RadianceBias': 0.5},
+                   {'bandName': 'Green', 'RadianceGain': 2.0, 'RadianceBias': -1.25},
+                   {'bandName': 'Blue', 'RadianceGain': 0.8}]
+
+
+def dn(bands=3, rows=37, cols=23, seed=1):
+    return numpy.random.RandomState(seed).randint(1, 4096, size=(bands, rows, cols)).astype('uint16')
+
+
+def inverse(pairs):
+    # The (scale, offset) pairs that undo pairs
+    return [(1.0 / scale, -offset / scale) for scale, offset in pairs]
+
+
+class CoefficientsTest(unittest.TestCase):
+
+    def testDimap(self):
+        # radiance = DN / PHYSICAL_GAIN + PHYSICAL_BIAS
+        pairs = calibration.coefficients(BAND_PROPERTIES)
+        self.assertEqual(pairs, [(1.0 / 1.6, 0.5), (0.5, -1.25), (1.0 / 0.8, 0.0)])
+        for (scale, offset), bandProperty in zip(pairs, BAND_PROPERTIES):
+            radiance = 1000.0 * scale + offset
+            self.assertAlmostEqual((radiance - bandProperty.get('RadianceBias', 0.0)) * bandProperty['RadianceGain'], 1000.0)
+
+    def testLinear(self):
+        self.assertEqual(calibration.coefficients(BAND_PROPERTIES, calibration.LINEAR), [(1.6, 0.5), (2.0, -1.25), (0.8, 0.0)])
+        # Reflectance gains are always linear
+        bandProperties = [{'bandName': 'Red', 'reflectanceGain': 2e-05, 'reflectanceBias': -0.1}]
+        self.assertEqual(calibration.coefficients(bandProperties), [(2e-05, -0.1)])
+
+    def testErrors(self):
+        self.assertRaises(ValueError, calibration.coefficients, [{'bandName': 'Red'}])
+        self.assertRaises(ValueError, calibration.coefficients, [{'bandName': 'Red', 'RadianceGain': 0.0}])
+
+
+class ApplyLinearTest(unittest.TestCase):
+
+    def testTilesAndWorkers(self):
+        block = dn()
+        pairs = calibration.coefficients(BAND_PROPERTIES)
+        expected = numpy.array([block[band] * scale + offset for band, (scale, offset) in enumerate(pairs)])
+        for tileRows in (1, 5, 37, 512):
+            for workers in (1, 4):
+                out = numpy.empty(block.shape, dtype='float64')
+                calibration.applyLinear(block, pairs, out, tileRows=tileRows, workers=workers)
+                self.assertTrue(numpy.allclose(out, expected, rtol=1e-12, atol=0.0))
+
+    def testRoundTrip(self):
+        block = dn()
+        pairs = calibration.coefficients(BAND_PROPERTIES)
+        radiance = calibration.applyLinear(block, pairs, numpy.empty(block.shape, dtype='float64'), tileRows=8, workers=3)
+        back = calibration.applyLinear(radiance, inverse(pairs), numpy.empty(block.shape, dtype='float64'), tileRows=8)
+        self.assertTrue(numpy.allclose(back, block, rtol=0.0, atol=1e-9))
+
+    def testNodata(self):
+        block = dn()
+        block[1, 3:5, 7] = 0
+        out = calibration.applyLinear(block, [(2.0, 1.0)] * 3, numpy.empty(block.shape, dtype='float32'), nodata=0, tileRows=4)
+        self.assertTrue(numpy.isnan(out[1, 3:5, 7]).all())
+        self.assertEqual(int(numpy.isnan(out).sum()), 2)
+        self.assertRaises(ValueError, calibration.applyLinear, block, [(2.0, 1.0)] * 3, numpy.empty(block.shape, dtype='int32'), 0)
+
+
+class CalibrateTest(unittest.TestCase):
+
+    def testRadianceRoundTrip(self):
+        block = dn()
+        radiance = calibration.calibrate(block, BAND_PROPERTIES, dtype='float64', tileRows=6, workers=2)
+        for band, bandProperty in enumerate(BAND_PROPERTIES):
+            back = (radiance[band] - bandProperty.get('RadianceBias', 0.0)) * bandProperty['RadianceGain']
+            self.assertTrue(numpy.allclose(back, block[band], rtol=0.0, atol=1e-9))
+
+    def testSingleBand(self):
+        block = dn(bands=1)[0]
+        radiance = calibration.calibrate(block, BAND_PROPERTIES[1:2])
+        self.assertEqual(radiance.shape, block.shape)
+        self.assertEqual(radiance.dtype, numpy.float32)
+        self.assertTrue(numpy.allclose(radiance, block * 0.5 - 1.25))
+
+    def testToa(self):
+        block = dn()
+        keyProperties = {'sunElevation': 30.0, 'acquisitionDate': '2016-07-04T10:00:00'}
+        esun = [1500.0, 1800.0, 2000.0]
+        radiance = calibration.calibrate(block, BAND_PROPERTIES, dtype='float64')
+        reflectance = calibration.calibrate(block, BAND_PROPERTIES, toa=True, keyProperties=keyProperties, esun=esun,
+                                            dtype='float64')
+        distance = calibration.sunDistance('2016-07-04')
+        for band in range(3):
+            factor = math.pi * distance ** 2 / (esun[band] * math.sin(math.radians(30.0)))
+            self.assertTrue(numpy.allclose(reflectance[band], radiance[band] * factor, rtol=1e-12))
+
+        builtItem = {'keyProperties': dict(keyProperties, bandProperties=BAND_PROPERTIES)}
+        byName = {'Red': 1500.0, 'Green': 1800.0, 'Blue': 2000.0}
+        self.assertTrue(numpy.allclose(calibration.calibrateItem(builtItem, block, toa=True, esun=byName, dtype='float64'),
+                                       reflectance))
+
+    def testErrors(self):
+        block = dn()
+        self.assertRaises(ValueError, calibration.calibrate, block, BAND_PROPERTIES[:2])
+        self.assertRaises(ValueError, calibration.calibrate, block, BAND_PROPERTIES, out=numpy.empty((3, 2, 2), 'float32'))
+        self.assertRaises(ValueError, calibration.calibrate, block, BAND_PROPERTIES, toa=True, keyProperties={}, esun=[1.0] * 3)
+        self.assertRaises(ValueError, calibration.calibrate, block, BAND_PROPERTIES, toa=True,
+                          keyProperties={'sunElevation': 30.0}, esun=[1.0] * 3)
+        self.assertRaises(ValueError, calibration.calibrate, block, BAND_PROPERTIES, toa=True,
+                          keyProperties={'sunElevation': 30.0, 'SunDistance': 1.0}, esun=[1.0, 1.0])
+
+    def testSunDistance(self):
+        # Perihelion early in January, aphelion early in July
+        self.assertAlmostEqual(calibration.sunDistance('2016-01-04'), 0.98328, places=4)
+        self.assertAlmostEqual(calibration.sunDistance(datetime.date(2016, 7, 4)), 1.0167, places=3)
+        self.assertEqual(calibration.sunDistance(datetime.datetime(2016, 7, 4, 12)), calibration.sunDistance('2016-07-04'))
+
+
+class RasterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_calibration_')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testRawInterleaves(self):
+        block = dn(bands=3, rows=5, cols=4)
+        layouts = {'bsq': block, 'bil': block.transpose(1, 0, 2), 'bip': block.transpose(1, 2, 0)}
+        for interleave, layout in layouts.items():
+            path = os.path.join(self.directory, interleave + '.raw')
+            numpy.ascontiguousarray(layout).tofile(path)
+            mapped = calibration.openRaw(path, 3, 5, 4, 'uint16', interleave=interleave.upper())
+            self.assertTrue((mapped == block).all())
+            del mapped
+        self.assertRaises(ValueError, calibration.openRaw, path, 3, 5, 4, 'uint16', interleave='band')
+
+    def testCalibrateToRaw(self):
+        block = dn()
+        path = os.path.join(self.directory, 'scene.dat')
+        out = calibration.openRaw(path, 3, 37, 23, 'float32', mode='w+')
+        calibration.calibrate(block, BAND_PROPERTIES, out=out, tileRows=10, workers=2)
+        del out
+        headerPath = calibration.writeEnviHeader(path, 3, 37, 23, 'float32', bandNames=['Red', 'Green', 'Blue'])
+        with open(headerPath) as f:
+            header = f.read()
+        self.assertTrue('data type = 4\n' in header and 'band names = {Red, Green, Blue}' in header)
+        written = numpy.fromfile(path, dtype='float32').reshape(3, 37, 23)
+        self.assertTrue(numpy.allclose(written, calibration.calibrate(block, BAND_PROPERTIES)))
+        self.assertRaises(ValueError, calibration.writeEnviHeader, path, 1, 1, 1, 'complex64')
+
+    def testTiff(self):
+        pixels = dn(bands=1, rows=30, cols=17)[0]
+        for name, data, rowsPerStrip in (('one.tif', pixels, None), ('strips.tif', pixels, 7),
+                                         ('big.tif', pixels.astype('>u2'), 4), ('float.tif', pixels.astype('<f4'), None)):
+            path = os.path.join(self.directory, name)
+            corpus.writeTiff(path, data, rowsPerStrip)
+            mapped = calibration.openTiff(path)
+            self.assertEqual(mapped.dtype, data.dtype.newbyteorder('>' if data.dtype.byteorder == '>' else '<'))
+            self.assertTrue((mapped == pixels).all())
+            del mapped
+
+        compressed = os.path.join(self.directory, 'compressed.tif')
+        corpus.writeTiff(compressed, pixels, compression=5)
+        self.assertRaises(ValueError, calibration.openTiff, compressed)
+        notTiff = os.path.join(self.directory, 'scene.raw')
+        pixels.tofile(notTiff)
+        self.assertRaises(ValueError, calibration.openTiff, notTiff)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.catalog
+###
+###     bbox queries in longitude, latitude find scenes whatever the coordinates of
+###     their footprints, date / sensor queries, rows replaced by a new build and
+###     removed with their metadata file, catalogs written before the geographic boxes,
+###     and the boxes of items built from a corpus (Benchmarks/corpus.py). Without
+###     arcpy the stand-in in standin/ is used.
+###
+###     python -m pytest Benchmarks/test_catalog.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+try:
+    import arcpy
+except ImportError:
+    sys.path.insert(0, os.path.join(HERE, 'standin'))
+    import arcpy
+
+import corpus
+
+from prt import batch
+from prt import cache
+from prt import catalog
+from prt import geometry
+from prt import item
+from prt import mtl
+from prt import walk
+
+UTM_33N = 32633
+
+
+def builtItem(sensor, date, coordinates, srs=4326, geographicExtent=None, tag='MS'):
+    builtItem = item.BuiltItem(spatialReference=srs, footprint=geometry.Footprint(srs, coordinates),
+                               raster={'Raster1': 'scene.tif'}, itemURI={'tag': tag},
+                               keyProperties={'SensorName': sensor, 'acquisitionDate': date, 'ProductType': 'L1B'})
+    if geographicExtent is not None:
+        builtItem[item.GEOGRAPHIC_EXTENT] = geographicExtent
+    return builtItem
+
+
+def square(x, y, size):
+    return [x, y, x + size, y, x + size, y + size, x, y + size]
+
+
+class SceneCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_catalog_')
+        self.dbPath = os.path.join(self.directory, 'catalog.sqlite')
+        self.catalog = catalog.SceneCatalog(self.dbPath)
+        # Two geographic scenes, one UTM scene with its corners in longitude, latitude and
+        # one UTM scene without them
+        self.catalog.record({'path': 'a.dim', 'productName': 'A'}, [builtItem('Kazakhstan', '2016-01-10T10:00:00', square(30.0, 40.0, 1.0))])
+        self.catalog.record({'path': 'b.dim', 'productName': 'B'}, [builtItem('Kazakhstan', '2016-03-05', square(35.0, 40.0, 1.0))])
+        self.catalog.record({'filePath': 'c_MTL.txt', 'productName': 'C'},
+                            [builtItem('Landsat 8', '2016-02-01', square(500000.0, 4400000.0, 185000.0), UTM_33N,
+                                       (14.0, 39.7, 16.2, 41.4))])
+        self.catalog.record({'path': 'd_MTL.txt', 'productName': 'D'},
+                            [builtItem('Landsat 8', '2016-02-15', square(500000.0, 4400000.0, 185000.0), UTM_33N)])
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.directory)
+
+    def paths(self, **query):
+        return [scene['path'] for scene in self.catalog.query(**query)]
+
+    def testBbox(self):
+        self.assertEqual(self.paths(bbox=(30.5, 40.5, 30.6, 40.6)), ['a.dim'])
+        self.assertEqual(self.paths(bbox=(15.0, 40.0, 15.1, 40.1)), ['c_MTL.txt'])
+        self.assertEqual(self.paths(bbox=(10.0, 35.0, 40.0, 45.0)), ['a.dim', 'c_MTL.txt', 'b.dim'])
+        # Touching edges intersect
+        self.assertEqual(self.paths(bbox=(31.0, 41.0, 32.0, 42.0)), ['a.dim'])
+        self.assertEqual(self.paths(bbox=(32.0, 40.0, 34.0, 41.0)), [])
+        # UTM coordinates are not longitudes
+        self.assertEqual(self.paths(bbox=(500000.0, 4400000.0, 600000.0, 4500000.0)), [])
+
+    def testDates(self):
+        self.assertEqual(self.paths(), ['a.dim', 'c_MTL.txt', 'd_MTL.txt', 'b.dim'])
+        self.assertEqual(self.paths(start='2016-02-01', end='2016-02-28'), ['c_MTL.txt', 'd_MTL.txt'])
+        self.assertEqual(self.paths(start='2016-02-02'), ['d_MTL.txt', 'b.dim'])
+        self.assertEqual(self.paths(bbox=(10.0, 35.0, 40.0, 45.0), end='2016-02-01'), ['a.dim', 'c_MTL.txt'])
+        self.assertEqual(self.paths(sensor='Landsat 8', limit=1), ['c_MTL.txt'])
+        self.assertEqual(self.paths(spatialReference=UTM_33N), ['c_MTL.txt', 'd_MTL.txt'])
+
+    def testScenes(self):
+        scene = self.catalog.query(bbox=(15.0, 40.0, 15.1, 40.1))[0]
+        self.assertEqual(scene['extent'], (500000.0, 4400000.0, 685000.0, 4585000.0))
+        self.assertEqual(scene['geographicExtent'], (14.0, 39.7, 16.2, 41.4))
+        self.assertEqual((scene['tag'], scene['productName'], scene['sensor'], scene['productType']), ('MS', 'C', 'Landsat 8', 'L1B'))
+        self.assertEqual(scene['acquisitionDate'], '2016-02-01')
+        self.assertEqual(scene['spatialReference'], str(UTM_33N))
+        self.assertEqual(scene['vertices'][1], (685000.0, 4400000.0))
+        self.assertEqual(scene['rasters'], {'Raster1': 'scene.tif'})
+        scene = self.catalog.query(bbox=(30.5, 40.5, 30.6, 40.6), details=False)[0]
+        self.assertEqual(scene['geographicExtent'], (30.0, 40.0, 31.0, 41.0))
+        self.assertFalse('vertices' in scene)
+        self.assertEqual(self.catalog.query(sensor='Landsat 8', start='2016-02-15')[0]['geographicExtent'], None)
+
+    def testReplaceAndRemove(self):
+        # Built again, a scene moves: the R-tree follows its row
+        self.catalog.record({'path': 'a.dim', 'productName': 'A'}, [builtItem('Kazakhstan', '2016-01-10', square(50.0, 10.0, 1.0))])
+        self.assertEqual(self.catalog.count(), 4)
+        self.assertEqual(self.paths(bbox=(30.5, 40.5, 30.6, 40.6)), [])
+        self.assertEqual(self.paths(bbox=(50.5, 10.5, 50.6, 10.6)), ['a.dim'])
+        self.catalog.remove(['a.dim', 'c_MTL.txt'])
+        self.assertEqual(self.paths(bbox=(-180.0, -90.0, 180.0, 90.0)), ['b.dim'])
+        self.assertEqual(self.catalog.count(), 2)
+
+    def testUpgrade(self):
+        # A catalog written with an R-tree of footprint boxes
+        dbPath = os.path.join(self.directory, 'old.sqlite')
+        connection = sqlite3.connect(dbPath)
+        connection.executescript("""
+CREATE TABLE scenes (id INTEGER PRIMARY KEY, path TEXT NOT NULL, tag TEXT NOT NULL, productName TEXT NOT NULL,
+                     sensor TEXT, productType TEXT, acquisitionDate TEXT, minX REAL, minY REAL, maxX REAL, maxY REAL,
+                     spatialReference TEXT, vertices TEXT, rasters TEXT, keyProperties TEXT, updated REAL NOT NULL,
+                     UNIQUE (path, tag, productName));
+CREATE VIRTUAL TABLE sceneExtents USING rtree (id, minX, maxX, minY, maxY);
+CREATE TRIGGER scenesInsert AFTER INSERT ON scenes WHEN new.minX IS NOT NULL BEGIN
+    INSERT INTO sceneExtents (id, minX, maxX, minY, maxY) VALUES (new.id, new.minX, new.maxX, new.minY, new.maxY);
+END;
+INSERT INTO scenes VALUES (1, 'a.dim', 'MS', 'A', 'Kazakhstan', 'L1B', '2016-01-10', 30, 40, 31, 41, '4326', NULL, '{}', '{}', 0);
+INSERT INTO scenes VALUES (2, 'c_MTL.txt', 'MS', 'C', 'Landsat 8', 'L1T', '2016-02-01', 500000, 4400000, 685000, 4585000,
+                           '32633', NULL, '{}', '{}', 0);
+""")
+        connection.commit()
+        connection.close()
+
+        upgraded = catalog.SceneCatalog(dbPath)
+        try:
+            self.assertEqual([scene['path'] for scene in upgraded.query(bbox=(30.5, 40.5, 30.6, 40.6))], ['a.dim'])
+            self.assertEqual([scene['path'] for scene in upgraded.query(bbox=(500000.0, 4400000.0, 600000.0, 4500000.0))], [])
+            self.assertEqual(upgraded.query(sensor='Landsat 8')[0]['extent'], (500000.0, 4400000.0, 685000.0, 4585000.0))
+            upgraded.record({'path': 'e.dim', 'productName': 'E'}, [builtItem('Kazakhstan', '2016-04-01', square(30.2, 40.2, 0.1))])
+            self.assertEqual([scene['path'] for scene in upgraded.query(bbox=(30.5, 40.5, 30.6, 40.6))], ['a.dim'])
+            self.assertEqual(upgraded.count(), 3)
+        finally:
+            upgraded.close()
+
+
+class CorpusCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_catalog_')
+        corpus.generate(self.directory, sensors=['kazakhstan', 'landsat8'], scenes=6, depth=1, fanout=2, ancillaryPoints=0)
+        catalog.enable(os.path.join(self.directory, 'catalog.sqlite'))
+
+    def tearDown(self):
+        catalog.disable()
+        cache.metadataCache.clear()
+        shutil.rmtree(self.directory)
+
+    def build(self, modulePath, crawlerName, builderName, **crawlerProperties):
+        module = batch.loadModule(os.path.join(ROOT, modulePath))
+        crawler = getattr(module, crawlerName)(**crawlerProperties)
+        builder = getattr(module, builderName)()
+        while True:
+            itemURI = crawler.next()
+            if itemURI is None:
+                break
+            for builtItem in builder.build(itemURI):
+                # Only the catalog sees the geographic box
+                self.assertFalse(item.GEOGRAPHIC_EXTENT in builtItem)
+
+    def testGeographicExtents(self):
+        self.build('Kazakhstan.py', 'KazakhstanCrawler', 'KazakhstanBuilder',
+                   paths=[os.path.join(self.directory, 'kazakhstan')], recurse=True, filter='*.dim')
+        mtlPaths = sorted(walk.findFiles([os.path.join(self.directory, 'landsat8')], True, '*_MTL.txt'))
+        self.build(os.path.join('Backup', 'Test_LS.py'), 'LS8Crawler', 'LS8Builder', paths=mtlPaths)
+
+        scenes = catalog._open().query()
+        self.assertEqual(len([scene for scene in scenes if scene['sensor'] == 'Kazakhstan']), 6)
+        for mtlPath in mtlPaths:
+            fields = mtl.readMtl(mtlPath)
+            longitudes = [fields.number('CORNER_%s_LON_PRODUCT' % corner) for corner in ('UL', 'UR', 'LR', 'LL')]
+            latitudes = [fields.number('CORNER_%s_LAT_PRODUCT' % corner) for corner in ('UL', 'UR', 'LR', 'LL')]
+            expected = (min(longitudes), min(latitudes), max(longitudes), max(latitudes))
+            found = [scene for scene in scenes if scene['path'] == mtlPath]
+            self.assertEqual([scene['tag'] for scene in found], ['MS', 'Pan'])
+            self.assertEqual(found[0]['geographicExtent'], expected)
+
+        # Every scene is found by a small box around its centre, in longitude, latitude
+        for scene in scenes:
+            minLon, minLat, maxLon, maxLat = scene['geographicExtent']
+            lon, lat = (minLon + maxLon) / 2.0, (minLat + maxLat) / 2.0
+            found = catalog._open().query(bbox=(lon - 0.01, lat - 0.01, lon + 0.01, lat + 0.01), details=False)
+            self.assertTrue((scene['path'], scene['tag']) in [(other['path'], other['tag']) for other in found])
+
+
+if __name__ == '__main__':
+    unittest.main()
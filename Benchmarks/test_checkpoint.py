@@ -0,0 +1,100 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.checkpoint
+###
+###     Checkpoints written and loaded back, files that cannot be resumed from, and the
+###     interval / overhead limits on how often they are written.
+###
+###     python -m pytest Benchmarks/test_checkpoint.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from prt import checkpoint
+from prt import files
+
+# As prt.crawl writes it
+STATE = {'sensor': 'kazakhstan', 'paths': ['/data'], 'filter': '*.dim', 'recurse': True, 'rootIndex': 0, 'listOffset': 3,
+         'path': '/data/d0_00/S1/S1.dim', 'tagIndex': 1, 'emitted': 4, 'crawlId': None,
+         'pendingDirs': ['/data/d0_01', '/data/d0_02'], 'listedDirs': ['/data/d0_00']}
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_checkpoint_')
+        self.path = os.path.join(self.directory, 'crawl.checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testWriteAndLoad(self):
+        checkpointer = checkpoint.Checkpointer(self.path, interval=0)
+        self.assertEqual(checkpointer.load(), None)
+        checkpointer.write(STATE)
+        checkpointer.write(dict(STATE, tagIndex=2))
+        state = checkpoint.Checkpointer(self.path).load()
+        self.assertEqual(state['version'], checkpoint.CHECKPOINT_VERSION)
+        self.assertEqual(state['pendingDirs'], STATE['pendingDirs'])
+        self.assertEqual(state['tagIndex'], 2)
+        self.assertEqual(os.listdir(self.directory), ['crawl.checkpoint'])
+
+        stats = checkpointer.stats()
+        self.assertEqual(stats['checkpoints'], 2)
+        self.assertTrue(stats['bytes'] > 0)
+
+        checkpointer.remove()
+        self.assertFalse(os.path.exists(self.path))
+        checkpointer.remove()
+
+    def testUnusableFiles(self):
+        for text in ('', '{"paths": [', json.dumps(dict(STATE, version=checkpoint.CHECKPOINT_VERSION + 1)),
+                     json.dumps(STATE)):
+            with open(self.path, 'w') as f:
+                f.write(text)
+            self.assertEqual(checkpoint.Checkpointer(self.path).load(), None)
+
+    def testDue(self):
+        self.assertTrue(checkpoint.Checkpointer(self.path, interval=0).due())
+        checkpointer = checkpoint.Checkpointer(self.path, interval=3600)
+        self.assertFalse(checkpointer.due())
+        checkpointer.write(STATE)
+        self.assertFalse(checkpointer.due())
+
+    def testMaxOverhead(self):
+        # A write pushes the next one out to elapsed / maxOverhead, past the interval
+        checkpointer = checkpoint.Checkpointer(self.path, interval=1e-9, maxOverhead=1e-12)
+        checkpointer.write(STATE)
+        self.assertFalse(checkpointer.due())
+        # interval 0 writes every time, whatever it costs
+        checkpointer = checkpoint.Checkpointer(self.path, interval=0, maxOverhead=1e-12)
+        checkpointer.write(STATE)
+        self.assertTrue(checkpointer.due())
+
+    def testReplaceFile(self):
+        source = os.path.join(self.directory, 'new')
+        with open(source, 'w') as f:
+            f.write('new')
+        with open(self.path, 'w') as f:
+            f.write('old')
+        files.replaceFile(source, self.path)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'new')
+        self.assertFalse(os.path.exists(source))
+
+
+if __name__ == '__main__':
+    unittest.main()
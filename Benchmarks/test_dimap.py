@@ -0,0 +1,173 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.dimap
+###
+###     The extractor must return what ElementTree.findall returns on the whole file,
+###     on corpus .dim documents (Benchmarks/corpus.py) and on the cases its early stop
+###     and skipped subtrees have to get right: repeated Source_Information blocks,
+###     markup inside skipped blocks, and elements split across read chunks.
+###     Profiles must pick the values the sensor modules always picked.
+###
+###     python -m pytest Benchmarks/test_dimap.py
+###
+#############################################################################################
+#############################################################################################
+import io
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+
+from prt import dimap
+
+TEXTS = ['Raster_Dimensions/NBANDS',
+         'Production/PRODUCT_TYPE',
+         'Dataset_Sources/Source_Information/Scene_Source/SUN_ELEVATION',
+         'Coordinate_Reference_System/Horizontal_CS/HORIZONTAL_CS_CODE',
+         'Data_Access/Data_File/DATA_FILE_PATH@href',
+         'Metadata_Id/METADATA_FORMAT@version']
+
+RECORDS = ['Dataset_Frame/Vertex',
+           'Image_Interpretation/*',
+           'Dataset_Sources/Source_Information/Scene_Source']
+
+SECOND_SOURCE = ('<Source_Information><Scene_Source><MISSION>DEIMOS</MISSION>'
+                 '<SUN_ELEVATION>12.5</SUN_ELEVATION></Scene_Source></Source_Information></Dataset_Sources>')
+
+
+def findAll(text):
+    # What the extractor has to return, from the whole document
+    root = ET.fromstring(text.encode('utf-8'))
+    values = dict()
+    for key in TEXTS:
+        path, separator, attribute = key.partition('@')
+        values[key] = [element.get(attribute) if attribute else element.text for element in root.findall(path)]
+    for key in RECORDS:
+        values[key] = [dict((child.tag, child.text) for child in element) for element in root.findall(key)]
+    return values
+
+
+def extract(text, stopEarly=True):
+    return dimap.DimapExtractor(TEXTS, RECORDS, stopEarly=stopEarly).extract(io.BytesIO(text.encode('utf-8')))
+
+
+class DimapExtractorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chunkSize = dimap.CHUNK_SIZE
+        self.directory = tempfile.mkdtemp(prefix='prt_test_dimap_')
+
+    def tearDown(self):
+        dimap.CHUNK_SIZE = self.chunkSize
+        shutil.rmtree(self.directory)
+
+    def documents(self):
+        rng = random.Random(1)
+        for sensor in sorted(corpus.DIMAP_MISSIONS):
+            yield corpus.dimapDocument(sensor, sensor.upper() + '_000001', rng, 50)
+
+    def testCorpusDocuments(self):
+        for text in self.documents():
+            self.assertEqual(extract(text), findAll(text))
+            self.assertEqual(extract(text, stopEarly=False), findAll(text))
+
+    def testRepeatedSourceInformation(self):
+        for text in self.documents():
+            text = text.replace('</Dataset_Sources>', SECOND_SOURCE)
+            values = extract(text)
+            self.assertEqual(values, findAll(text))
+            self.assertEqual(len(values['Dataset_Sources/Source_Information/Scene_Source']), 2)
+            self.assertEqual(values['Dataset_Sources/Source_Information/Scene_Source/SUN_ELEVATION'][-1], '12.5')
+
+    def testSmallChunks(self):
+        # Skipped subtrees and wanted elements split across many reads
+        for chunkSize in (7, 64, 1000):
+            dimap.CHUNK_SIZE = chunkSize
+            for text in self.documents():
+                text = text.replace('<Data_Strip>', '<Data_Strip a="x>y"><Data_Strip>nested</Data_Strip>')
+                self.assertEqual(extract(text), findAll(text))
+
+    def testMarkup(self):
+        # Markup that could hide or fake the end of a skipped block
+        blocks = ['<Data_Strip><!-- </Data_Strip><Production><PRODUCT_TYPE>X</PRODUCT_TYPE></Production> --></Data_Strip>',
+                  '<Data_Strip><![CDATA[</Data_Strip><Production>]]></Data_Strip>',
+                  '<Data_Strip><?pi </Data_Strip> ?></Data_Strip>',
+                  '<Data_Strip note="a > b"><Data_StripX/><Data_Strip/></Data_Strip>',
+                  '<Data_Strip>&amp;&lt;/Data_Strip&gt;</Data_Strip>']
+        for block in blocks:
+            for text in self.documents():
+                text = text.replace('<Data_Strip>', block + '<Data_Strip>')
+                self.assertEqual(extract(text), findAll(text))
+                self.assertEqual(extract(text, stopEarly=False), findAll(text))
+
+    def testDoctype(self):
+        text = next(self.documents()).replace('<Dimap_Document',
+                                              '<!DOCTYPE Dimap_Document [<!ENTITY product "L1B">]>\n<Dimap_Document', 1)
+        text = text.replace('<PRODUCT_TYPE>L1B<', '<PRODUCT_TYPE>&product;<')
+        self.assertEqual(extract(text), findAll(text))
+        self.assertEqual(extract(text)['Production/PRODUCT_TYPE'], ['L1B'])
+
+    def testEarlyStop(self):
+        # Everything wanted has been read before the broken tail
+        text = next(self.documents()).replace('</Dimap_Document>', '<<<')
+        values = dimap.DimapExtractor(['Raster_Dimensions/NBANDS', 'Production/PRODUCT_TYPE']).extract(
+                     io.BytesIO(text.encode('utf-8')))
+        self.assertEqual(values['Production/PRODUCT_TYPE'], ['L1B'])
+        self.assertRaises(ET.ParseError, extract, text, False)
+
+    def testPath(self):
+        text = next(self.documents())
+        path = os.path.join(self.directory, 'scene.dim')
+        with open(path, 'w') as f:
+            f.write(text)
+        self.assertEqual(dimap.DimapExtractor(TEXTS, RECORDS).extract(path), findAll(text))
+
+    def testMissingPaths(self):
+        values = extract('<Dimap_Document><Production><PRODUCT_TYPE>L1B</PRODUCT_TYPE></Production></Dimap_Document>')
+        self.assertEqual(values['Production/PRODUCT_TYPE'], ['L1B'])
+        self.assertEqual(values['Raster_Dimensions/NBANDS'], [])
+        self.assertEqual(dimap.firstValue(values, 'Raster_Dimensions/NBANDS', '1'), '1')
+
+
+class DimapProfileTest(unittest.TestCase):
+
+    def profile(self, **options):
+        return dimap.DimapProfile('Test', 'Data_Access/Data_File/DATA_FILE_PATH@href',
+                                  ['Coordinate_Reference_System/Horizontal_CS/HORIZONTAL_CS_CODE'], 'Dataset_Frame/Vertex',
+                                  **options)
+
+    def values(self, text):
+        return self.profile().extractor.extract(io.BytesIO(text.encode('utf-8')))
+
+    def testProductType(self):
+        values = self.values('<Dimap_Document><Production><PRODUCT_TYPE>L1B</PRODUCT_TYPE>'
+                             '<PRODUCT_TYPE>L1C</PRODUCT_TYPE></Production></Dimap_Document>')
+        # The first PRODUCT_TYPE whatever multipleValues says, unless asked otherwise
+        self.assertEqual(self.profile().getProductName(values), 'L1B')
+        self.assertEqual(self.profile(multipleValues='first').getProductName(values), 'L1B')
+        self.assertEqual(self.profile(productType='last').getProductName(values), 'L1C')
+
+    def testSpatialReference(self):
+        values = self.values('<Dimap_Document><Coordinate_Reference_System><Horizontal_CS>'
+                             '<HORIZONTAL_CS_CODE>EPSG:32633</HORIZONTAL_CS_CODE></Horizontal_CS>'
+                             '</Coordinate_Reference_System></Dimap_Document>')
+        self.assertEqual(self.profile().getSpatialReference(values), 32633)
+        values = self.values('<Dimap_Document></Dimap_Document>')
+        self.assertEqual(self.profile().getSpatialReference(values), 0)
+        self.assertEqual(self.profile(noSpatialReference=None).getSpatialReference(values), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.item
+###
+###     BuiltItem and KeyProperties read like the dicts they replace, share their
+###     layouts and strings, survive pickling to and from build workers, and export()
+###     gives back exactly the nested dicts the builders used to return.
+###
+###     python -m pytest Benchmarks/test_item.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import pickle
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from prt import geometry
+from prt import item
+
+
+def builtItemDict(sensor='Kazakhstan'):
+    return {
+            'itemURI': {'tag': 'MS'},
+            'raster': {'Raster1': 'C:/scenes/scene.tif'},
+            'footprint': [(10.0, 50.0), (10.1, 50.0), (10.1, 50.1)],
+            'spatialReference': 4326,
+            'keyProperties': {
+                              'SensorName': sensor,
+                              'ProductType': 'L1B',
+                              'sunElevation': 45.5,
+                              'bandProperties': [{'bandName': 'Red', 'RadianceGain': 1.5, 'unit': 'W/m2/sr/um'},
+                                                 {'bandName': 'NearInfrared', 'RadianceGain': 1.25, 'unit': 'W/m2/sr/um'}]
+                             },
+            'variables': {'defaultGamma': 1}
+           }
+
+
+def copied(text):
+    # An equal string that is not the same object
+    return ''.join(list(text))
+
+
+class KeyPropertiesTest(unittest.TestCase):
+
+    def testReadsLikeADict(self):
+        properties = item.KeyProperties({'SensorName': 'Kazakhstan', 'sunElevation': 45.5})
+        self.assertEqual(properties['SensorName'], 'Kazakhstan')
+        self.assertEqual(properties.get('sunAzimuth', 0.0), 0.0)
+        self.assertRaises(KeyError, lambda: properties['sunAzimuth'])
+        self.assertTrue('sunElevation' in properties)
+        self.assertEqual(sorted(properties), ['SensorName', 'sunElevation'])
+        self.assertEqual(sorted(properties.items()), [('SensorName', 'Kazakhstan'), ('sunElevation', 45.5)])
+        self.assertEqual(len(properties), 2)
+
+    def testSetItem(self):
+        properties = item.KeyProperties({'SensorName': 'Kazakhstan'})
+        properties['sunElevation'] = 45.5
+        properties['SensorName'] = 'NigeriaSat2'
+        self.assertEqual(properties.toDict(), {'SensorName': 'NigeriaSat2', 'sunElevation': 45.5})
+        self.assertEqual(properties.keys(), ['SensorName', 'sunElevation'])
+
+    def testFirst(self):
+        properties = item.KeyProperties({'acquisitionDate': None, 'DATE_ACQUIRED': '2016-05-01'})
+        self.assertEqual(properties.first(['AcquisitionDate', 'acquisitionDate', 'DATE_ACQUIRED']), 'DATE_ACQUIRED')
+        self.assertEqual(properties.first(['acquired']), None)
+
+    def testSharedLayoutAndInterning(self):
+        first = item.KeyProperties({'SensorName': copied('Kazakhstan'), 'sunElevation': 1.0})
+        second = item.KeyProperties({'SensorName': copied('Kazakhstan'), 'sunElevation': 2.0})
+        self.assertTrue(first.layout is second.layout)
+        self.assertTrue(first['SensorName'] is second['SensorName'])
+        # Only the listed properties are interned
+        first = item.KeyProperties({'note': copied('some text')})
+        second = item.KeyProperties({'note': copied('some text')})
+        self.assertFalse(first['note'] is second['note'])
+
+    def testNestedBandProperties(self):
+        properties = item.KeyProperties(builtItemDict()['keyProperties'])
+        bands = properties['bandProperties']
+        self.assertTrue(all(type(band) is item.KeyProperties for band in bands))
+        self.assertEqual(bands[1]['bandName'], 'NearInfrared')
+        self.assertTrue(bands[0].layout is bands[1].layout)
+        self.assertEqual(properties.toDict(), builtItemDict()['keyProperties'])
+
+
+class BuiltItemTest(unittest.TestCase):
+
+    def testFields(self):
+        builtItem = item.BuiltItem(**builtItemDict())
+        self.assertEqual(builtItem['keyProperties']['bandProperties'][0]['RadianceGain'], 1.5)
+        self.assertEqual(builtItem.get('geodataXform'), None)
+        self.assertRaises(KeyError, lambda: builtItem['geodataXform'])
+        self.assertTrue('raster' in builtItem)
+        self.assertFalse('geodataXform' in builtItem)
+        self.assertEqual(builtItem.extra, None)
+
+    def testExtra(self):
+        builtItem = item.BuiltItem(spatialReference=4326)
+        builtItem[item.SOLAR_REQUEST] = (50.0, 10.0, False)
+        self.assertTrue(item.SOLAR_REQUEST in builtItem)
+        self.assertEqual(builtItem.keys(), ['spatialReference', item.SOLAR_REQUEST])
+        self.assertEqual(builtItem.pop(item.SOLAR_REQUEST), (50.0, 10.0, False))
+        self.assertEqual(builtItem.pop(item.SOLAR_REQUEST, 'gone'), 'gone')
+        self.assertEqual(builtItem.pop('spatialReference'), 4326)
+        self.assertEqual(builtItem.keys(), [])
+
+    def testExport(self):
+        expected = builtItemDict()
+        self.assertEqual(item.export(item.BuiltItem(**builtItemDict())), expected)
+        self.assertEqual(item.BuiltItem(**builtItemDict()).toDict(), expected)
+        # Items built without this module are passed through
+        self.assertTrue(item.export(expected) is expected)
+        self.assertEqual(item.export(None), None)
+
+    def testInternedSpatialReference(self):
+        wkt = 'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]]]'
+        first = item.BuiltItem(spatialReference=copied(wkt))
+        second = item.BuiltItem(spatialReference=copied(wkt))
+        self.assertTrue(first['spatialReference'] is second['spatialReference'])
+
+    def testPickle(self):
+        builtItem = item.BuiltItem(**builtItemDict())
+        builtItem['footprint'] = geometry.Footprint(4326, [10.0, 50.0, 10.1, 50.0, 10.1, 50.1])
+        builtItem[item.GEOGRAPHIC_EXTENT] = (10.0, 50.0, 10.1, 50.1)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            unpickled = pickle.loads(pickle.dumps([builtItem], protocol))[0]
+            self.assertEqual(unpickled.keys(), builtItem.keys())
+            self.assertEqual(unpickled['footprint'].vertices(), builtItem['footprint'].vertices())
+            exported = unpickled.toDict()
+            del exported['footprint']
+            expected = builtItem.toDict()
+            del expected['footprint']
+            self.assertEqual(exported, expected)
+            # Unpickled records use this process's layouts and strings
+            self.assertTrue(unpickled['keyProperties'].layout is builtItem['keyProperties'].layout)
+            self.assertTrue(unpickled['keyProperties']['SensorName'] is builtItem['keyProperties']['SensorName'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.landsat8
+###
+###     The bands and coefficients of MS and Pan items, and reflectance() against
+###     (REFLECTANCE_MULT * DN + REFLECTANCE_ADD) / sin(SUN_ELEVATION) on band GeoTIFFs
+###     written by Benchmarks/corpus.py, band by band or one band per worker.
+###
+###     python -m pytest Benchmarks/test_landsat8.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import math
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import numpy
+
+import corpus
+
+from prt import landsat8
+
+SUN_ELEVATION = 52.5
+
+
+def gain(band):
+    return 2e-05 * (1.0 + band / 10.0)
+
+
+def bias(band):
+    return -0.1 + band / 1000.0
+
+
+def metadataFor(bands):
+    metadata = {'SUN_ELEVATION': SUN_ELEVATION}
+    for band in bands:
+        metadata['REFLECTANCE_MULT_BAND_{0}'.format(band)] = gain(band)
+        metadata['REFLECTANCE_ADD_BAND_{0}'.format(band)] = bias(band)
+    return metadata
+
+
+def builtItem(tag, rasterPaths, bands, sunElevation=SUN_ELEVATION):
+    bandProperties = [{'bandName': 'B{0}'.format(band), 'reflectanceGain': gain(band), 'reflectanceBias': bias(band)}
+                      for band in bands]
+    return {'itemURI': {'tag': tag},
+            'raster': dict(('Raster{0}'.format(index + 1), path) for index, path in enumerate(rasterPaths)),
+            'keyProperties': {'sunElevation': sunElevation, 'bandProperties': bandProperties}}
+
+
+def expected(pixels, band):
+    reflectance = (pixels * gain(band) + bias(band)) / math.sin(math.radians(SUN_ELEVATION))
+    return numpy.where(pixels == landsat8.FILL_DN, numpy.nan, reflectance)
+
+
+class ItemTest(unittest.TestCase):
+
+    def testBands(self):
+        ms = builtItem('MS', ['B{0}.TIF'.format(band) for band in landsat8.MS_BANDS], landsat8.MS_BANDS)
+        pan = builtItem('Pan', ['B8.TIF'], [landsat8.PAN_BAND])
+        self.assertEqual(landsat8.bandNumbers(ms), (1, 2, 3, 4, 5, 6, 7, 9))
+        self.assertEqual(landsat8.bandNumbers(pan), (8,))
+        self.assertEqual(landsat8.rasterPaths(ms)[-1], 'B9.TIF')
+        self.assertEqual(landsat8.rasterPaths(pan), ['B8.TIF'])
+        self.assertEqual(landsat8.outputPath('D:/toa', 'C:/scene/LC8_B4.TIF'), os.path.join('D:/toa', 'LC8_B4' + landsat8.OUTPUT_SUFFIX))
+
+    def testCoefficients(self):
+        sine = math.sin(math.radians(SUN_ELEVATION))
+        ms = builtItem('MS', ['B{0}.TIF'.format(band) for band in landsat8.MS_BANDS], landsat8.MS_BANDS)
+        pairs = landsat8.coefficients(ms)
+        self.assertEqual(len(pairs), 8)
+        for (scale, offset), band in zip(pairs, landsat8.MS_BANDS):
+            self.assertAlmostEqual(scale, gain(band) / sine, places=15)
+            self.assertAlmostEqual(offset, bias(band) / sine, places=15)
+
+        # The MTL rescaling and sun elevation win over the item's
+        metadata = metadataFor(landsat8.MS_BANDS)
+        metadata['SUN_ELEVATION'] = 30.0
+        metadata['REFLECTANCE_MULT_BAND_9'] = 1e-05
+        scale, offset = landsat8.coefficients(ms, metadata)[-1]
+        self.assertAlmostEqual(scale, 2e-05, places=15)
+        self.assertAlmostEqual(offset, bias(9) * 2.0, places=15)
+
+    def testErrors(self):
+        pan = builtItem('Pan', ['B8.TIF'], [landsat8.PAN_BAND], sunElevation=None)
+        self.assertRaises(ValueError, landsat8.coefficients, pan)
+        self.assertRaises(ValueError, landsat8.coefficients, builtItem('Pan', ['B8.TIF'], [8], sunElevation=-3.0))
+        pan = builtItem('Pan', ['B8.TIF'], [landsat8.PAN_BAND])
+        pan['keyProperties']['bandProperties'] = [{'bandName': 'B8'}]
+        self.assertRaises(ValueError, landsat8.coefficients, pan)
+
+
+class ReflectanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_landsat8_')
+        random = numpy.random.RandomState(8)
+        self.pixels = dict()
+        for band in landsat8.MS_BANDS:
+            self.pixels[band] = random.randint(5000, 30000, size=(41, 29)).astype('uint16')
+            self.pixels[band][:3, :4] = landsat8.FILL_DN
+        self.pixels[landsat8.PAN_BAND] = random.randint(5000, 30000, size=(82, 58)).astype('uint16')
+        self.paths = dict()
+        for band, pixels in self.pixels.items():
+            self.paths[band] = os.path.join(self.directory, 'LC8_B{0}.TIF'.format(band))
+            corpus.writeTiff(self.paths[band], pixels, rowsPerStrip=5)
+        self.items = [builtItem('MS', [self.paths[band] for band in landsat8.MS_BANDS], landsat8.MS_BANDS),
+                      builtItem('Pan', [self.paths[landsat8.PAN_BAND]], [landsat8.PAN_BAND])]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, outputs, bands):
+        self.assertEqual(sorted(outputs), sorted(bands))
+        for band in bands:
+            rows, cols = self.pixels[band].shape
+            found = numpy.fromfile(outputs[band], dtype='float32').reshape(rows, cols)
+            self.assertTrue(numpy.allclose(found, expected(self.pixels[band], band), rtol=1e-6, equal_nan=True))
+            self.assertTrue(os.path.isfile(os.path.splitext(outputs[band])[0] + '.hdr'))
+
+    def testBandByBand(self):
+        outputs = landsat8.reflectance(self.items, os.path.join(self.directory, 'toa'), metadataFor(range(1, 10)),
+                                       tileRows=7, workers=3)
+        self.check(outputs, range(1, 10))
+        self.assertEqual(outputs[4], landsat8.outputPath(os.path.join(self.directory, 'toa'), self.paths[4]))
+
+    def testBandParallel(self):
+        outputs = landsat8.reflectance(self.items, os.path.join(self.directory, 'toa'), tileRows=16, workers=4,
+                                       bandParallel=True)
+        self.check(outputs, range(1, 10))
+
+    def testSomeBands(self):
+        outputs = landsat8.reflectance(self.items, self.directory, bands=(4, 8), workers=1)
+        self.check(outputs, (4, 8))
+
+
+if __name__ == '__main__':
+    unittest.main()
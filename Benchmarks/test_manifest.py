@@ -0,0 +1,167 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.manifest
+###
+###     Unchanged files are served from the manifest, changed and deleted files are
+###     noticed, and crawls of two sensors sharing a folder and a manifest
+###     (Benchmarks/corpus.py) never see or delete each other's rows.
+###
+###     python -m pytest Benchmarks/test_manifest.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+
+from prt import crawl
+from prt import manifest
+from prt import walk
+
+
+def describe(path):
+    return ['MS'], 'Product'
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_manifest_')
+        self.dbPath = os.path.join(self.directory, 'manifest.sqlite')
+        self.root = os.path.join(self.directory, 'scenes')
+        os.makedirs(os.path.join(self.root, 'sub'))
+        self.paths = [self.write(name) for name in ('a.dim', 'b.dim', os.path.join('sub', 'c.dim'), 'a.json')]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text='x'):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def recordAll(self, crawlManifest, paths, sensor, filter):
+        for path in paths:
+            crawlManifest.record(path, os.stat(path), sensor, ['MS', 'Pan'], 'Product', filter)
+
+    def testLookup(self):
+        crawlManifest = manifest.CrawlManifest(self.dbPath)
+        crawlManifest.beginCrawl()
+        self.recordAll(crawlManifest, self.paths[:1], 'Kazakhstan', '*.dim')
+        crawlManifest.flush()
+        path = self.paths[0]
+        self.assertEqual(crawlManifest.lookup(path, os.stat(path), 'Kazakhstan'),
+                         {'sensor': 'Kazakhstan', 'tags': ['MS', 'Pan'], 'productType': 'Product'})
+        # Another sensor has not read the file
+        self.assertEqual(crawlManifest.lookup(path, os.stat(path), 'NigeriaSat2'), None)
+        # A changed file is read again
+        self.write('a.dim', 'changed')
+        self.assertEqual(crawlManifest.lookup(path, os.stat(path), 'Kazakhstan'), None)
+        crawlManifest.close()
+
+    def testDeleted(self):
+        crawlManifest = manifest.CrawlManifest(self.dbPath)
+        crawlManifest.beginCrawl()
+        self.recordAll(crawlManifest, self.paths[:3], 'Kazakhstan', '*.dim')
+        self.assertEqual(crawlManifest.finishCrawl([self.root], 'Kazakhstan', '*.dim'), [])
+
+        os.remove(self.paths[1])
+        os.remove(self.paths[2])
+        crawlManifest.beginCrawl()
+        crawlManifest.markSeen(self.paths[0], 'Kazakhstan')
+        # Without recurse the file in sub/ is not part of the crawl
+        self.assertEqual(crawlManifest.finishCrawl([self.root], 'Kazakhstan', '*.dim', False), [self.paths[1]])
+        crawlManifest.beginCrawl()
+        crawlManifest.markSeen(self.paths[0], 'Kazakhstan')
+        self.assertEqual(crawlManifest.finishCrawl([self.root], 'Kazakhstan', '*.dim'), [self.paths[2]])
+        crawlManifest.close()
+
+    def testOtherSensorsAndFilters(self):
+        crawlManifest = manifest.CrawlManifest(self.dbPath)
+        crawlManifest.beginCrawl()
+        self.recordAll(crawlManifest, self.paths[:3], 'Kazakhstan', '*.dim')
+        self.recordAll(crawlManifest, self.paths[3:], 'PlanetLabs', '*.json')
+        crawlManifest.finishCrawl([self.root], 'Kazakhstan', '*.dim')
+
+        # A crawl seeing none of these files deletes only the rows it could have seen
+        crawlManifest.beginCrawl()
+        self.assertEqual(crawlManifest.finishCrawl([self.root], 'NigeriaSat2', '*.dim'), [])
+        crawlManifest.beginCrawl()
+        self.assertEqual(crawlManifest.finishCrawl([self.root], 'Kazakhstan', '*.tif'), [])
+        crawlManifest.beginCrawl()
+        self.assertEqual(crawlManifest.finishCrawl([self.root], 'PlanetLabs', '*.json'), [self.paths[3]])
+        self.assertEqual(crawlManifest.lookup(self.paths[0], os.stat(self.paths[0]), 'Kazakhstan')['productType'], 'Product')
+        crawlManifest.close()
+
+    def testUpgrade(self):
+        # A manifest written with one row per path keeps its rows
+        connection = sqlite3.connect(self.dbPath)
+        connection.executescript("""
+CREATE TABLE files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, inode INTEGER NOT NULL,
+                    sensor TEXT, tags TEXT, productType TEXT, crawlId INTEGER NOT NULL);
+CREATE TABLE crawls (id INTEGER PRIMARY KEY AUTOINCREMENT, started REAL NOT NULL, finished REAL);
+""")
+        st = os.stat(self.paths[0])
+        connection.execute('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                           (self.paths[0], st.st_size, st.st_mtime, st.st_ino, 'Kazakhstan', 'MS', 'Product', 0))
+        connection.commit()
+        connection.close()
+
+        crawlManifest = manifest.CrawlManifest(self.dbPath)
+        self.assertEqual(crawlManifest.lookup(self.paths[0], st, 'Kazakhstan')['tags'], ['MS'])
+        crawlManifest.beginCrawl()
+        self.assertEqual(crawlManifest.finishCrawl([self.root], 'Kazakhstan', '*.dim'), [self.paths[0]])
+        crawlManifest.close()
+
+
+class SharedRootTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_manifest_')
+        self.root = os.path.join(self.directory, 'corpus')
+        corpus.generate(self.root, sensors=['kazakhstan', 'planetlabs'], scenes=6, depth=1, fanout=2, ancillaryPoints=0)
+        self.options = {'manifest': os.path.join(self.directory, 'manifest.sqlite')}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def crawl(self, filter, sensor):
+        crawler = crawl.SceneCrawler([self.root], True, filter, describe, sensor, self.options)
+        paths = set()
+        while True:
+            itemURI = crawler.next()
+            if itemURI is None:
+                break
+            paths.add(itemURI['path'])
+        return sorted(paths), crawler.deletedPaths
+
+    def testTwoSensors(self):
+        planetLabs, deleted = self.crawl('*.json', 'PlanetLabs')
+        self.assertEqual(planetLabs, sorted(walk.findFiles([self.root], True, '*.json')))
+        kazakhstan, deleted = self.crawl('*.dim', 'Kazakhstan')
+        self.assertEqual(kazakhstan, sorted(walk.findFiles([self.root], True, '*.dim')))
+        self.assertTrue(planetLabs and kazakhstan)
+        # The PlanetLabs scenes are still there: the Kazakhstan crawl must not report them
+        self.assertEqual(deleted, [])
+        self.assertEqual(self.crawl('*.json', 'PlanetLabs'), (planetLabs, []))
+
+        os.remove(kazakhstan[0])
+        self.assertEqual(self.crawl('*.json', 'PlanetLabs'), (planetLabs, []))
+        self.assertEqual(self.crawl('*.dim', 'Kazakhstan'), (kazakhstan[1:], [kazakhstan[0]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
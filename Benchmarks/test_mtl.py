@@ -0,0 +1,112 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.mtl
+###
+###     Corpus _MTL.txt files (Benchmarks/corpus.py) must give the fields the old line
+###     split on "=" gave, the GROUP tree group() builds, and one parse per file
+###     through the metadata cache.
+###
+###     python -m pytest Benchmarks/test_mtl.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+
+from prt import cache
+from prt import mtl
+
+SCENE_ID = 'LC80010022016003LGN00'
+
+
+def lineSplit(text):
+    # LS8Builder.readMetFile before prt.mtl
+    fields = dict()
+    for line in text.split('\n'):
+        if '=' in line:
+            parts = line.split('=')
+            fields[parts[0].strip()] = parts[1].strip().replace('"', '')
+    fields.pop('GROUP', None)
+    fields.pop('END_GROUP', None)
+    return fields
+
+
+class MtlTest(unittest.TestCase):
+
+    def setUp(self):
+        self.text = corpus.mtlText(SCENE_ID, random.Random(1))
+        self.directory = tempfile.mkdtemp(prefix='prt_test_mtl_')
+        self.path = os.path.join(self.directory, SCENE_ID + '_MTL.txt')
+        with open(self.path, 'w') as f:
+            f.write(self.text)
+        cache.metadataCache.clear()
+
+    def tearDown(self):
+        cache.metadataCache.clear()
+        shutil.rmtree(self.directory)
+
+    def testFields(self):
+        document = mtl.parseMtl(self.path)
+        self.assertEqual(document.toDict(), lineSplit(self.text))
+        self.assertEqual(document['LANDSAT_SCENE_ID'], SCENE_ID)
+        self.assertEqual(document['FILE_NAME_BAND_1'], SCENE_ID + '_B1.TIF')
+        self.assertEqual(document.get('NO_SUCH_FIELD', 'x'), 'x')
+        self.assertTrue('SUN_ELEVATION' in document)
+
+    def testCrlf(self):
+        self.assertEqual(mtl.parseText(self.text.replace('\n', '\r\n')).toDict(), lineSplit(self.text))
+
+    def testNumbers(self):
+        document = mtl.parseText(self.text)
+        self.assertTrue(isinstance(document.number('UTM_ZONE'), int))
+        self.assertEqual(document.number('SUN_ELEVATION'), float(document['SUN_ELEVATION']))
+        self.assertEqual(document.number('REFLECTANCE_MULT_BAND_1'), 2e-05)
+        self.assertEqual(document.number('NO_SUCH_FIELD', 0), 0)
+        self.assertRaises(ValueError, document.number, 'DATA_TYPE')
+
+    def testGroups(self):
+        document = mtl.parseText(self.text)
+        attributes = document.group('IMAGE_ATTRIBUTES')
+        self.assertEqual(sorted(attributes.keys()), ['CLOUD_COVER', 'EARTH_SUN_DISTANCE', 'SUN_AZIMUTH', 'SUN_ELEVATION'])
+        self.assertTrue(document.group('L1_METADATA_FILE/PROJECTION_PARAMETERS') is not None)
+        self.assertEqual(document.group('L1_METADATA_FILE/PROJECTION_PARAMETERS')['MAP_PROJECTION'], 'UTM')
+        self.assertEqual(document.group('L1_METADATA_FILE/NO_SUCH_GROUP'), None)
+        self.assertEqual(document.group('NO_SUCH_GROUP'), None)
+        self.assertEqual(len(document.group('L1_METADATA_FILE')), 0)
+
+    def testValues(self):
+        document = mtl.parseText('GROUP = A\n  NOTE = "x = y"\n  EMPTY = ""\n  VALUE = 1\nEND_GROUP = A\n')
+        self.assertEqual(document['NOTE'], 'x = y')
+        self.assertEqual(document['EMPTY'], '')
+        self.assertEqual(document.group('A').items(), [('NOTE', 'x = y'), ('EMPTY', ''), ('VALUE', '1')])
+
+    def testUnbalancedGroups(self):
+        # The flat fields are still read; group() reports the broken tree
+        for text in ('GROUP = A\n  X = 1\nEND_GROUP = B\n', 'GROUP = A\n  X = 1\n', 'X = 1\nEND_GROUP = A\n'):
+            document = mtl.parseText(text, 'bad_MTL.txt')
+            self.assertEqual(document['X'], '1')
+            self.assertRaises(ValueError, document.group, 'A')
+            self.assertRaises(ValueError, document.group, 'A')
+
+    def testCache(self):
+        parses = cache.metadataCache.stats()['parses'].get('mtl', 0)
+        first = mtl.readMtl(self.path)
+        self.assertTrue(mtl.readMtl(self.path) is first)
+        self.assertEqual(cache.metadataCache.stats()['parses'].get('mtl', 0), parses + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.prefetch
+###
+###     Entries come out in source order with their own results, at most `depth` are
+###     read ahead of the consumer, errors reach the consumer, and a crawl with
+###     read-ahead yields what it yields without (Benchmarks/corpus.py).
+###
+###     python -m pytest Benchmarks/test_prefetch.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+
+from prt import crawl
+from prt import prefetch
+from prt import sniff
+
+
+class Source():
+
+    # The entries 0..count-1, counting how many were taken
+    def __init__(self, count):
+        self.count = count
+        self.taken = 0
+
+    def __iter__(self):
+        for entry in range(self.count):
+            self.taken += 1
+            yield entry
+
+
+def slowSquare(entry):
+    time.sleep(random.random() * 0.002)
+    return entry * entry
+
+
+def describe(path):
+    found = sniff.sniffHeader(path)
+    return found['tags'] or ['MS'], found['sensor']
+
+
+class PrefetcherTest(unittest.TestCase):
+
+    def testOrder(self):
+        for depth, workers in ((1, None), (4, None), (8, 3), (50, 50)):
+            found = [(entry, prefetched.result()) for entry, prefetched in
+                     prefetch.Prefetcher(range(100), slowSquare, depth, workers)]
+            self.assertEqual(found, [(entry, entry * entry) for entry in range(100)])
+
+    def testBounded(self):
+        source = Source(40)
+        prefetcher = prefetch.Prefetcher(source, slowSquare, 5)
+        handedOut = 0
+        for entry, prefetched in prefetcher:
+            handedOut += 1
+            # The entry handed out and `depth` more behind it
+            self.assertTrue(source.taken <= handedOut + 5)
+            self.assertEqual(prefetcher.pending(), list(range(handedOut, source.taken)))
+        self.assertEqual(source.taken, 40)
+
+    def testSelect(self):
+        calls = list()
+
+        def function(entry):
+            calls.append(entry)
+            return -entry
+
+        prefetcher = prefetch.Prefetcher(range(10), function, 3, select=lambda entry: entry % 2 == 0)
+        found = [(entry, prefetched.result() if prefetched is not None else None) for entry, prefetched in prefetcher]
+        self.assertEqual(found, [(entry, -entry if entry % 2 == 0 else None) for entry in range(10)])
+        self.assertEqual(sorted(calls), [0, 2, 4, 6, 8])
+        self.assertEqual(prefetcher.stats()['skipped'], 5)
+
+    def testError(self):
+        def function(entry):
+            if entry == 3:
+                raise ValueError(entry)
+            return entry
+
+        results = list()
+        for entry, prefetched in prefetch.Prefetcher(range(6), function, 2):
+            try:
+                results.append(prefetched.result())
+            except ValueError:
+                results.append('error')
+        self.assertEqual(results, [0, 1, 2, 'error', 4, 5])
+
+    def testStats(self):
+        release = threading.Event()
+
+        def function(entry):
+            if entry == 1:
+                release.wait()
+            return entry
+
+        prefetcher = prefetch.Prefetcher(range(2), function, 1)
+        entry, prefetched = next(prefetcher)
+        prefetched.ready.wait()
+        self.assertEqual(prefetched.result(), 0)
+        entry, prefetched = next(prefetcher)
+        threading.Timer(0.05, release.set).start()
+        self.assertEqual(prefetched.result(), 1)
+        self.assertEqual(list(prefetcher), [])
+
+        stats = prefetcher.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hitRate']), (1, 1, 0.5))
+        self.assertTrue(stats['stallSeconds'] > 0.0)
+        self.assertEqual(prefetcher.threads, [])
+
+    def testEmpty(self):
+        prefetcher = prefetch.Prefetcher([], slowSquare, 4)
+        self.assertEqual(list(prefetcher), [])
+        self.assertEqual(prefetcher.stats()['hitRate'], None)
+
+
+class PrefetchCrawlTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_prefetch_')
+        corpus.generate(self.directory, sensors=['kazakhstan', 'nigeriasat2'], scenes=20, depth=2, fanout=2,
+                        ancillaryPoints=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def crawl(self, depth):
+        crawler = crawl.SceneCrawler([self.directory], True, '*.dim', describe, 'Test', {'prefetch': depth, 'workers': 1})
+        itemURIs = list()
+        while True:
+            itemURI = crawler.next()
+            if itemURI is None:
+                break
+            itemURIs.append(itemURI)
+        return itemURIs
+
+    def testSameItems(self):
+        expected = self.crawl(0)
+        self.assertTrue(len(expected) >= 40)
+        for depth in (1, 8):
+            self.assertEqual(self.crawl(depth), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
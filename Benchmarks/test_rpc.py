@@ -0,0 +1,108 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.rpc
+###
+###     Corpus _rpc.txt files (Benchmarks/corpus.py) parsed into coefficients, the
+###     geodataXform written from them, bad lines, and the disk cache.
+###
+###     python -m pytest Benchmarks/test_rpc.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+
+from prt import cache
+from prt import rpc
+
+
+class RpcTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDir = rpc.CACHE_DIR
+        self.directory = tempfile.mkdtemp(prefix='prt_test_rpc_')
+        rpc.CACHE_DIR = os.path.join(self.directory, 'cache')
+        self.text = corpus.rpcText(12.5, 45.25, random.Random(1))
+        self.path = self.write('scene_rpc.txt', self.text)
+        cache.metadataCache.clear()
+
+    def tearDown(self):
+        rpc.CACHE_DIR = self.cacheDir
+        cache.metadataCache.clear()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def testParse(self):
+        coefficients = rpc.parseRpc(self.path)
+        lines = [line.split(':') for line in self.text.splitlines()]
+        self.assertEqual(list(coefficients.names), [name for name, value in lines])
+        self.assertEqual(list(coefficients.values), [float(value) for name, value in lines])
+        self.assertEqual(len(coefficients), 12 + 4 * corpus.RPC_TERMS)
+        self.assertEqual(coefficients.get('LAT_OFF'), 45.25)
+        self.assertEqual(coefficients.get('NO_SUCH_NAME', 0.0), 0.0)
+
+    def testSeries(self):
+        coefficients = rpc.parseRpc(self.path)
+        series = coefficients.series('LINE_NUM_COEFF')
+        self.assertEqual(len(series), corpus.RPC_TERMS)
+        self.assertEqual(series[2], -1.0)
+        self.assertEqual(list(series), [coefficients.get('LINE_NUM_COEFF_%d' % (term + 1)) for term in range(corpus.RPC_TERMS)])
+        self.assertEqual(len(coefficients.series('NO_SUCH_PREFIX')), 0)
+
+    def testGeodataXform(self):
+        coefficients = rpc.parseRpc(self.path)
+        xform = json.loads(coefficients.geodataXform())
+        self.assertEqual(xform['GeodataTransforms'][0]['geodataTransform'], 'RPC')
+        self.assertEqual(xform['GeodataTransforms'][0]['geodataTransformArguments']['coeff'], list(coefficients.values))
+
+    def testUnits(self):
+        coefficients = rpc.parseRpc(self.write('units_rpc.txt', 'LINE_OFF: +002414.00 pixels\n\nLAT_OFF: -45.5 degrees\n'))
+        self.assertEqual(list(coefficients.values), [2414.0, -45.5])
+
+    def testBadLines(self):
+        for text in ('LINE_OFF 2414\n', 'LINE_OFF:\n', 'LINE_OFF: pixels\n', 'LINE_OFF: nan\n', 'LINE_OFF: inf\n'):
+            self.assertRaises(ValueError, rpc.parseRpc, self.write('bad_rpc.txt', text))
+
+    def testDiskCache(self):
+        coefficients = rpc.readRpc(self.path)
+        cachePath = rpc._cachePath(self.path)
+        self.assertTrue(os.path.exists(cachePath))
+        cached = rpc._readCached(cachePath)
+        self.assertEqual(cached.names, coefficients.names)
+        self.assertEqual(cached.values, coefficients.values)
+
+        # A damaged cache file is parsed again and rewritten
+        with open(cachePath, 'wb') as f:
+            f.write(rpc.CACHE_MAGIC + b'["LINE_OFF"]\n')
+        self.assertEqual(rpc._readCached(cachePath), None)
+        cache.metadataCache.clear()
+        self.assertEqual(rpc.readRpc(self.path).values, coefficients.values)
+        self.assertEqual(rpc._readCached(cachePath).values, coefficients.values)
+
+    def testDiskCacheOff(self):
+        rpc.CACHE_DIR = ''
+        self.assertEqual(rpc.readRpc(self.path).values, rpc.parseRpc(self.path).values)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'cache')))
+
+
+if __name__ == '__main__':
+    unittest.main()
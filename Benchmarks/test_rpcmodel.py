@@ -0,0 +1,165 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.rpcmodel
+###
+###     forward() against the RPC00B polynomials evaluated term by term, inverse() /
+###     forward() round trips with and without heights, the 78 value form, densified
+###     footprints and validate(), on the RPCs of Benchmarks/corpus.py made more curved.
+###
+###     python -m pytest Benchmarks/test_rpcmodel.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import random
+import unittest
+from array import array
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import numpy
+
+import corpus
+
+from prt import rpc
+from prt import rpcmodel
+
+ROWS = 6000
+COLS = 8000
+
+
+def coefficients(seed=1, curvature=100.0, dropConstants=False):
+    # corpus.rpcText, its non-linear terms multiplied by curvature
+    names = list()
+    values = array('d')
+    for line in corpus.rpcText(12.5, 45.25, random.Random(seed)).splitlines():
+        name, value = line.split(':')
+        value = float(value)
+        if '_COEFF_' in name and abs(value) < 1e-3:
+            value *= curvature
+        if dropConstants and name in ('LINE_DEN_COEFF_1', 'SAMP_DEN_COEFF_1'):
+            continue
+        names.append(name)
+        values.append(value)
+    return rpc.RpcCoefficients(names, values)
+
+
+def polynomial(coefficients, prefix, L, P, H):
+    # One RPC00B polynomial at one normalized point, term by term
+    terms = [1.0, L, P, H, L * P, L * H, P * H, L * L, P * P, H * H,
+             P * L * H, L ** 3, L * P * P, L * H * H, L * L * P, P ** 3, P * H * H, L * L * H, P * P * H, H ** 3]
+    series = list(coefficients.series(prefix))
+    if len(series) == len(terms) - 1:
+        series.insert(0, 1.0)
+    return sum(value * term for value, term in zip(series, terms))
+
+
+def reference(coefficients, longitude, latitude, height):
+    L = (longitude - coefficients.get('LONG_OFF')) / coefficients.get('LONG_SCALE')
+    P = (latitude - coefficients.get('LAT_OFF')) / coefficients.get('LAT_SCALE')
+    H = (height - coefficients.get('HEIGHT_OFF')) / coefficients.get('HEIGHT_SCALE')
+    line = polynomial(coefficients, 'LINE_NUM_COEFF', L, P, H) / polynomial(coefficients, 'LINE_DEN_COEFF', L, P, H)
+    samp = polynomial(coefficients, 'SAMP_NUM_COEFF', L, P, H) / polynomial(coefficients, 'SAMP_DEN_COEFF', L, P, H)
+    return (line * coefficients.get('LINE_SCALE') + coefficients.get('LINE_OFF'),
+            samp * coefficients.get('SAMP_SCALE') + coefficients.get('SAMP_OFF'))
+
+
+class RpcModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.coefficients = coefficients()
+        self.model = rpcmodel.RpcModel(self.coefficients)
+        rng = numpy.random.RandomState(24)
+        self.lines = rng.uniform(0.0, ROWS, size=5000)
+        self.samples = rng.uniform(0.0, COLS, size=5000)
+        self.heights = rng.uniform(-100.0, 1500.0, size=5000)
+
+    def testForward(self):
+        rng = numpy.random.RandomState(3)
+        longitudes = rng.uniform(12.4, 12.6, size=50)
+        latitudes = rng.uniform(45.2, 45.3, size=50)
+        heights = rng.uniform(-100.0, 1500.0, size=50)
+        for height in (None, 800.0, heights):
+            lines, samples = self.model.forward(longitudes, latitudes, height)
+            for index in range(50):
+                if height is None:
+                    pointHeight = self.coefficients.get('HEIGHT_OFF')
+                else:
+                    pointHeight = numpy.broadcast_to(height, (50,))[index]
+                line, samp = reference(self.coefficients, longitudes[index], latitudes[index], pointHeight)
+                self.assertAlmostEqual(lines[index], line, delta=1e-7)
+                self.assertAlmostEqual(samples[index], samp, delta=1e-7)
+
+    def testRoundTrip(self):
+        for heights in (None, 1200.0, self.heights):
+            longitudes, latitudes = self.model.inverse(self.lines, self.samples, heights)
+            self.assertFalse(numpy.isnan(longitudes).any())
+            lines, samples = self.model.forward(longitudes, latitudes, heights)
+            self.assertTrue(numpy.abs(lines - self.lines).max() < rpcmodel.TOLERANCE)
+            self.assertTrue(numpy.abs(samples - self.samples).max() < rpcmodel.TOLERANCE)
+
+    def testShapes(self):
+        lines = self.lines[:12].reshape(3, 4)
+        samples = self.samples[:12].reshape(3, 4)
+        longitudes, latitudes = self.model.inverse(lines, samples)
+        self.assertEqual((longitudes.shape, latitudes.shape), ((3, 4), (3, 4)))
+        flat = self.model.inverse(lines.ravel(), samples.ravel())
+        self.assertTrue(numpy.array_equal(longitudes.ravel(), flat[0]))
+        line, samp = self.model.forward(12.5, 45.25)
+        self.assertEqual(line.shape, ())
+        # Near the centre of the image, the offsets
+        self.assertAlmostEqual(float(line), 3000.0, delta=50.0)
+        self.assertAlmostEqual(float(samp), 4000.0, delta=50.0)
+
+    def testNotConverged(self):
+        longitudes, latitudes = self.model.inverse(self.lines[:10], self.samples[:10], iterations=0)
+        self.assertTrue(numpy.isnan(longitudes).all() and numpy.isnan(latitudes).all())
+
+    def testConstantDenominators(self):
+        model = rpcmodel.RpcModel(coefficients(dropConstants=True))
+        self.assertTrue(numpy.array_equal(model.matrix, self.model.matrix))
+
+    def testErrors(self):
+        names = [name for name in self.coefficients.names if name != 'LINE_OFF']
+        values = array('d', [self.coefficients.get(name) for name in names])
+        self.assertRaises(ValueError, rpcmodel.RpcModel, rpc.RpcCoefficients(names, values))
+        names = [name for name in self.coefficients.names if name != 'SAMP_NUM_COEFF_20']
+        values = array('d', [self.coefficients.get(name) for name in names])
+        self.assertRaises(ValueError, rpcmodel.RpcModel, rpc.RpcCoefficients(names, values))
+        names = list(self.coefficients.names)
+        values = array('d', self.coefficients.values)
+        values[names.index('LAT_SCALE')] = 0.0
+        self.assertRaises(ValueError, rpcmodel.RpcModel, rpc.RpcCoefficients(names, values))
+
+    def testFootprint(self):
+        self.assertEqual(self.model.imageSize(), (ROWS, COLS))
+        footprint = self.model.footprint(pointsPerSide=8)
+        self.assertEqual(len(footprint), 32)
+        self.assertEqual(footprint.spatialReference, 4326)
+        points = footprint.toNumpy()
+        lines, samples = self.model.forward(points[:, 0], points[:, 1])
+        borderLines, borderSamples = self.model.border(pointsPerSide=8)
+        self.assertTrue(numpy.abs(lines - borderLines).max() < 1e-5)
+        self.assertTrue(numpy.abs(samples - borderSamples).max() < 1e-5)
+        # Clockwise from the top left corner
+        self.assertEqual((borderLines[8], borderSamples[8]), (0.0, COLS))
+        self.assertEqual((borderLines[16], borderSamples[16]), (ROWS, COLS))
+
+    def testValidate(self):
+        footprint = self.model.footprint(pointsPerSide=4)
+        self.assertEqual(self.model.validate(footprint=footprint), [])
+        # A footprint twice the size of the image: the vertices past the bottom right
+        larger = self.model.footprint(rows=ROWS * 2, cols=COLS * 2, pointsPerSide=4)
+        problems = self.model.validate(footprint=larger)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue(problems[0].endswith('footprint vertices fall outside the image'))
+
+
+if __name__ == '__main__':
+    unittest.main()
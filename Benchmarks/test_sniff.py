@@ -0,0 +1,103 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.sniff
+###
+###     Corpus metadata files (Benchmarks/corpus.py) are told apart by their header,
+###     with and without mmap, and a tag split across two read chunks is still found.
+###
+###     python -m pytest Benchmarks/test_sniff.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+
+from prt import sniff
+
+SENSOR_NAMES = {'kazakhstan': 'Kazakhstan', 'nigeriasat2': 'NigeriaSat2', 'deimos1': 'DEIMOS-1', 'deimos2': 'DEIMOS-2'}
+
+
+class SniffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chunkSize = sniff.CHUNK_SIZE
+        self.directory = tempfile.mkdtemp(prefix='prt_test_sniff_')
+
+    def tearDown(self):
+        sniff.CHUNK_SIZE = self.chunkSize
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def sniffBoth(self, path, **options):
+        found = sniff.sniffHeader(path, **options)
+        self.assertEqual(sniff.sniffHeader(path, useMmap=True, **options), found)
+        return found
+
+    def testDimapSensors(self):
+        rng = random.Random(1)
+        for sensor in sorted(SENSOR_NAMES):
+            for index in range(4):
+                text = corpus.dimapDocument(sensor, 'S%d' % index, rng, 20)
+                path = self.write('%s_%d.dim' % (sensor, index), text)
+                found = self.sniffBoth(path)
+                self.assertEqual(found['sensor'], SENSOR_NAMES[sensor])
+                self.assertEqual(found['confidence'], 1.0)
+                bands = int(text.split('<NBANDS>')[1].split('<')[0])
+                self.assertEqual(found['tags'], sniff.tagsFromBandCount(bands))
+                self.assertEqual(found['path'], path)
+
+    def testDeimos1NeedsItsIndex(self):
+        text = corpus.dimapDocument('deimos1', 'S1', random.Random(1), 20)
+        path = self.write('deimos.dim', text.replace('<MISSION_INDEX>1<', '<MISSION_INDEX>3<'))
+        self.assertEqual(self.sniffBoth(path)['sensor'], None)
+
+    def testLandsat8(self):
+        path = self.write('LC8_MTL.txt', corpus.mtlText('LC80010022016003LGN00', random.Random(1)))
+        found = self.sniffBoth(path)
+        self.assertEqual((found['sensor'], found['tags']), (sniff.LANDSAT8_SENSOR, ['MS', 'Pan']))
+
+    def testSplitTags(self):
+        # Every chunk boundary through the tags must give the same answer
+        text = corpus.dimapDocument('kazakhstan', 'S1', random.Random(1), 20)
+        path = self.write('scene.dim', text)
+        expected = sniff.sniffHeader(path)
+        for chunkSize in range(sniff.OVERLAP + 1, sniff.OVERLAP + 200, 7):
+            sniff.CHUNK_SIZE = chunkSize
+            self.assertEqual(sniff.sniffHeader(path), expected)
+
+    def testPartialHeaders(self):
+        text = corpus.dimapDocument('nigeriasat2', 'S1', random.Random(1), 20)
+        # The scene source comes after the band count in corpus files
+        found = self.sniffBoth(self.write('scene.dim', text), maxBytes=text.index('<NBANDS>'))
+        self.assertEqual((found['sensor'], found['tags'], found['confidence']), (None, [], 0.0))
+        # A mission without a band count is only half sure
+        sources = text[text.index('<Dataset_Sources>'):text.index('</Dataset_Sources>')]
+        found = self.sniffBoth(self.write('noBands.dim', '<Dimap_Document>' + sources + '</Dataset_Sources></Dimap_Document>'))
+        self.assertEqual((found['sensor'], found['tags'], found['confidence']), ('NigeriaSat2', [], 0.5))
+
+    def testUnknownAndEmpty(self):
+        for text in ('', '<Dimap_Document><Scene_Source><MISSION>SPOT</MISSION></Scene_Source></Dimap_Document>'):
+            found = self.sniffBoth(self.write('other.dim', text))
+            self.assertEqual((found['sensor'], found['tags'], found['confidence']), (None, [], 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.solar
+###
+###     position() against published reference values and an independent algorithm (the
+###     Astronomical Almanac's, Michalsky 1988), acquisition times and footprint centres,
+###     and fill() / request() setting missing angles and replacing wrong ones.
+###
+###     python -m pytest Benchmarks/test_solar.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import math
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import numpy
+
+from prt import geometry
+from prt import item
+from prt import solar
+
+# NREL SPA test case (Reda and Andreas 2004, table A5.1): Golden, Colorado, 2003-10-17
+# 12:30:30 local time (UTC-7). Zenith 50.11162 and azimuth 194.34024 degrees, which
+# include about 0.016 degree of refraction and 0.002 of parallax: position() gives neither
+REFERENCE = [('2003-10-17T19:30:30', 39.742476, -105.1786, 90.0 - 50.11162 - 0.014, 194.34024)]
+
+
+def almanac(text, latitude, longitude):
+    # (elevation, azimuth) from the Astronomical Almanac's low precision formulas,
+    # good to about 0.01 degree from 1950 to 2050
+    day = (numpy.datetime64(text, 's') - numpy.datetime64('2000-01-01T12:00:00', 's')).astype('float64') / 86400.0
+    hour = (day + 0.5) % 1.0 * 24.0
+    meanLongitude = (280.460 + 0.9856474 * day) % 360.0
+    meanAnomaly = math.radians((357.528 + 0.9856003 * day) % 360.0)
+    eclipticLongitude = math.radians(meanLongitude + 1.915 * math.sin(meanAnomaly) + 0.020 * math.sin(2.0 * meanAnomaly))
+    obliquity = math.radians(23.439 - 0.0000004 * day)
+    rightAscension = math.degrees(math.atan2(math.cos(obliquity) * math.sin(eclipticLongitude), math.cos(eclipticLongitude)))
+    declination = math.asin(math.sin(obliquity) * math.sin(eclipticLongitude))
+
+    siderealTime = (6.697375 + 0.0657098242 * day + hour) % 24.0
+    hourAngle = math.radians((siderealTime * 15.0 + longitude - rightAscension) % 360.0)
+    latitude = math.radians(latitude)
+    elevation = math.asin(math.sin(declination) * math.sin(latitude) +
+                          math.cos(declination) * math.cos(latitude) * math.cos(hourAngle))
+    azimuth = math.atan2(-math.cos(declination) * math.sin(hourAngle),
+                         math.sin(declination) * math.cos(latitude) - math.cos(declination) * math.cos(hourAngle) * math.sin(latitude))
+    return math.degrees(elevation), math.degrees(azimuth) % 360.0
+
+
+def builtItem(keyProperties, coordinates=None, srs=4326):
+    builtItem = item.BuiltItem(spatialReference=srs, keyProperties=keyProperties)
+    if coordinates is not None:
+        builtItem['footprint'] = geometry.Footprint(srs, coordinates)
+    return builtItem
+
+
+def square(x, y, size):
+    return [x, y, x + size, y, x + size, y + size, x, y + size]
+
+
+class PositionTest(unittest.TestCase):
+
+    def testReference(self):
+        for text, latitude, longitude, elevation, azimuth in REFERENCE:
+            computed = solar.position([text], [latitude], [longitude])
+            self.assertAlmostEqual(computed[0][0], elevation, delta=0.01)
+            self.assertAlmostEqual(computed[1][0], azimuth, delta=0.01)
+
+    def testAlmanac(self):
+        random = numpy.random.RandomState(23)
+        seconds = random.randint(0, 50 * 365 * 86400, size=300)
+        times = numpy.datetime64('1990-01-01T00:00:00', 's') + seconds.astype('timedelta64[s]')
+        latitudes = random.uniform(-70.0, 70.0, size=300)
+        longitudes = random.uniform(-180.0, 180.0, size=300)
+        elevations, azimuths = solar.position(times, latitudes, longitudes)
+        for index in range(300):
+            elevation, azimuth = almanac(str(times[index]), latitudes[index], longitudes[index])
+            self.assertAlmostEqual(elevations[index], elevation, delta=0.03)
+            # The azimuth of a sun near the zenith moves fast
+            if elevation < 85.0:
+                self.assertAlmostEqual(abs((azimuths[index] - azimuth + 180.0) % 360.0 - 180.0), 0.0, delta=0.05)
+
+    def testSubsolarPoint(self):
+        # March 2016 equinox at 04:30 UTC, local solar noon near 114.4 east
+        elevation, azimuth = solar.position(['2016-03-20T04:30:00'], [0.0], [114.4])
+        self.assertTrue(elevation[0] > 89.5)
+        # Midnight sun at the June solstice, polar night at the December one
+        elevation, azimuth = solar.position(['2016-06-20T12:00:00', '2016-12-21T12:00:00'], [89.0, 89.0], [180.0, 180.0])
+        self.assertTrue(elevation[0] > 20.0 and elevation[1] < -20.0)
+
+    def testMissing(self):
+        elevation, azimuth = solar.position(numpy.array(['NaT', '2016-06-20T12:00:00'], dtype='datetime64[us]'),
+                                            [45.0, numpy.nan], [10.0, 10.0])
+        self.assertTrue(numpy.isnan(elevation).all() and numpy.isnan(azimuth).all())
+
+
+class ItemsTest(unittest.TestCase):
+
+    def testAcquisitionTimes(self):
+        times = solar.acquisitionTimes([{'acquisitionDate': '2016-05-01T10:20:30Z'},
+                                        {'AcquisitionDate': '2016-05-01', 'AcquisitionTime': '10:20:30.5'},
+                                        {'acquisitionDate': '2016-05-01 10:20:30'},
+                                        {'acquisitionDate': '2016-05-01'},
+                                        {'acquisitionDate': 'not a date T'},
+                                        {}])
+        self.assertEqual([str(time) for time in times[:3]],
+                         ['2016-05-01T10:20:30.000000', '2016-05-01T10:20:30.500000', '2016-05-01T10:20:30.000000'])
+        self.assertTrue(numpy.isnat(times[3:]).all())
+
+    def testCentres(self):
+        builtItems = [builtItem({}, square(10.0, 50.0, 1.0)),
+                      builtItem({}, square(500000.0, 4400000.0, 1000.0), 32633),
+                      builtItem({})]
+        latitudes, longitudes = solar.centres(builtItems)
+        self.assertEqual((latitudes[0], longitudes[0]), (50.5, 10.5))
+        self.assertTrue(numpy.isnan(latitudes[1:]).all() and numpy.isnan(longitudes[1:]).all())
+
+    def testFill(self):
+        keyProperties = {'acquisitionDate': '2016-05-01T10:20:30'}
+        builtItems = [builtItem(dict(keyProperties), square(10.0, 50.0, 1.0)),
+                      builtItem(dict(keyProperties, sunElevation=1.0, sunAzimuth=2.0), square(10.0, 50.0, 1.0)),
+                      builtItem(dict(keyProperties, SunAzimuth=2.0), square(10.0, 50.0, 1.0)),
+                      builtItem({'acquisitionDate': '2016-05-01'}, square(10.0, 50.0, 1.0))]
+        elevation, azimuth = solar.position(['2016-05-01T10:20:30'], [50.5], [10.5])
+        elevation, azimuth = round(elevation[0], 4), round(azimuth[0], 4)
+
+        self.assertEqual(solar.fill(builtItems), [])
+        self.assertEqual((builtItems[0]['keyProperties']['sunElevation'], builtItems[0]['keyProperties']['sunAzimuth']),
+                         (elevation, azimuth))
+        # Metadata values are kept without verify; the item's own spelling is used
+        self.assertEqual(builtItems[1]['keyProperties']['sunElevation'], 1.0)
+        self.assertEqual((builtItems[2]['keyProperties']['SunElevation'], builtItems[2]['keyProperties']['SunAzimuth']),
+                         (elevation, 2.0))
+        # No time of day, no angles
+        self.assertFalse('sunElevation' in builtItems[3]['keyProperties'])
+
+        replaced = solar.fill(builtItems, verify=True)
+        self.assertEqual(replaced, [(1, 'sunElevation', 1.0, elevation), (1, 'sunAzimuth', 2.0, azimuth),
+                                    (2, 'SunAzimuth', 2.0, azimuth)])
+        self.assertEqual(builtItems[1]['keyProperties']['sunAzimuth'], azimuth)
+        # Within tolerance values stay
+        builtItems[1]['keyProperties']['sunElevation'] = elevation + 0.5
+        self.assertEqual(solar.fill(builtItems, verify=True), [])
+
+    def testRequest(self):
+        keyProperties = {'acquisitionDate': '2016-05-01T10:20:30'}
+        builtItems = [builtItem(dict(keyProperties), square(500000.0, 4400000.0, 1000.0), 32633),
+                      builtItem(dict(keyProperties, sunElevation=1.0, sunAzimuth=2.0), square(10.0, 50.0, 1.0)),
+                      builtItem(dict(keyProperties, sunElevation=1.0, sunAzimuth=2.0), square(10.0, 50.0, 1.0))]
+        # A projected footprint needs the centre from the metadata
+        self.assertTrue(solar.request(builtItems[0], 39.9, 15.0))
+        self.assertFalse(solar.request(builtItems[1]))
+        self.assertTrue(solar.request(builtItems[2], verify=True))
+        self.assertFalse(item.SOLAR_REQUEST in builtItems[1])
+
+        replaced = solar.fillRequested([builtItems[0], builtItems[2]])
+        self.assertFalse(item.SOLAR_REQUEST in builtItems[0] or item.SOLAR_REQUEST in builtItems[2])
+        elevation, azimuth = solar.position(['2016-05-01T10:20:30'] * 2, [39.9, 50.5], [15.0, 10.5])
+        self.assertEqual(builtItems[0]['keyProperties']['sunElevation'], round(elevation[0], 4))
+        self.assertEqual([(index, key) for index, key, value, computed in replaced], [(1, 'sunElevation'), (1, 'sunAzimuth')])
+        self.assertEqual(builtItems[2]['keyProperties']['sunAzimuth'], round(azimuth[1], 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#############################################################################################
+#############################################################################################
+###
+###     Tests: prt.walk
+###
+###     The parallel walker must find what os.walk + fnmatch finds on a corpus
+###     (Benchmarks/corpus.py), with any number of workers and a tiny buffer, and a
+###     walk resumed from snapshot() must yield exactly the files not yet yielded.
+###
+###     python -m pytest Benchmarks/test_walk.py
+###
+#############################################################################################
+#############################################################################################
+import os
+import sys
+import shutil
+import fnmatch
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+import corpus
+
+from prt import walk
+
+
+def osWalk(root, patterns, recurse=True):
+    found = list()
+    for folder, names, files in os.walk(root):
+        found.extend(os.path.join(folder, name) for name in files
+                     if any(fnmatch.fnmatch(name.lower(), pattern.lower()) for pattern in patterns))
+        if not recurse:
+            break
+    return sorted(found)
+
+
+class WalkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='prt_test_walk_')
+        corpus.generate(self.directory, sensors=['kazakhstan', 'planetlabs', 'landsat8'], scenes=30, depth=2, fanout=3,
+                        ancillaryPoints=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testFilter(self):
+        match = walk.compileFilter('*.dim;*_MTL.txt')
+        self.assertTrue(match('SCENE.DIM'))
+        self.assertTrue(match('LC8_mtl.TXT'))
+        self.assertFalse(match('scene.dim.aux'))
+        self.assertTrue(walk.compileFilter(['*.json', '*.tif'])('a.json'))
+        self.assertTrue(walk.compileFilter('')('anything'))
+
+    def testSameAsOsWalk(self):
+        for filter in ('*.dim', '*.dim;*_metadata.json', '*'):
+            expected = osWalk(self.directory, filter.split(';'))
+            for workers in (1, 4):
+                for maxBuffered in (1, walk.MAX_BUFFERED):
+                    found = list(walk.ParallelWalker([self.directory], filter, workers=workers, maxBuffered=maxBuffered))
+                    self.assertEqual(sorted(found), expected)
+                    self.assertEqual(len(found), len(set(found)))
+
+    def testNoRecurse(self):
+        root = os.path.join(self.directory, 'planetlabs', 'd0_00', 'd1_00')
+        self.assertEqual(sorted(walk.findFiles([root], False, '*.json')), osWalk(root, ['*.json'], recurse=False))
+        self.assertEqual(list(walk.findFiles([os.path.join(self.directory, 'planetlabs')], False, '*.json')), [])
+
+    def testWithStat(self):
+        for path, st in walk.findFiles([self.directory], True, '*.json', withStat=True):
+            self.assertEqual(st.st_size, os.path.getsize(path))
+
+    def testFilesPassThrough(self):
+        path = osWalk(self.directory, ['*.dim'])[0]
+        self.assertEqual(list(walk.findFiles([path], True, '*.json')), [path])
+
+    def testResume(self):
+        expected = osWalk(self.directory, ['*'])
+        for stopAfter in (1, 7, len(expected) // 2, len(expected) - 1):
+            walker = walk.ParallelWalker([self.directory], '*', workers=3, maxBuffered=5)
+            found = list()
+            for path in walker:
+                found.append(path)
+                if len(found) == stopAfter:
+                    snapshot = walker.snapshot()
+                    break
+            walker.stop()
+            resumed = walk.ParallelWalker(snapshot['pendingDirs'], '*', workers=3, listedDirs=snapshot['listedDirs'])
+            found.extend(resumed)
+            self.assertEqual(sorted(found), expected)
+            self.assertEqual(len(found), len(set(found)))
+
+    def testUnreadableDirectory(self):
+        walker = walk.ParallelWalker([os.path.join(self.directory, 'missing')], '*')
+        self.assertEqual(list(walker), [])
+        self.assertEqual(len(walker.errors), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
-﻿import os
-import arcpy
-import glob
-import csv
+﻿import csv
+
+from prt import batch
+from prt import crawl
+from prt import dimap
+from prt import metrics
+from prt import rastertype
+from prt import sniff
 
 try:
   import xml.etree.cElementTree as ET
@@ -19,12 +23,10 @@ class RasterTypeFactory():
   def __init__(self):
     self.debugMode = False
 
+  @rastertype.memoize
   def getRasterTypesInfo(self):
-    self.instrument_auxField = arcpy.Field()
-    self.instrument_auxField.name = 'Instrument'
-    self.instrument_auxField.aliasName = 'Instrument'
-    self.instrument_auxField.type = 'String'
-    self.instrument_auxField.length = 50
+    # Built on the first call only; arcpy is not needed until the info is asked for
+    instrument_auxField = rastertype.field('Instrument', 'Instrument', 'String', 50)
 
     return [
             {
@@ -115,11 +117,39 @@ class RasterTypeFactory():
                                     'datasetTag':'Pan'
                                   }
                                 ],
-              'fields': [self.instrument_auxField]
+              'fields': [instrument_auxField]
             }
            ]
 
 
+# Everything the crawler and builder read from a DEIMOS-2 dim file, collected in one streaming pass
+dimapProfile = dimap.DimapProfile(
+                sensorName = 'DEIMOS-2',
+                rasterPath = 'Data_Access/Data_File/DATA_FILE_PATH@href',
+                # Horizontal CS (can also be a arcpy.SpatialReference object, ESPG code, path to a PRJ file or a WKT string)
+                spatialReference = [
+                                     'Coordinate_Reference_System/PROJECTION',
+                                     'Dataset_Sources/Source_Information/Coordinate_Reference_System/Projection_OGCWKT'
+                                   ],
+                wkt = True,
+                footprint = 'Dataset_Frame/*',
+                bands = 'Image_Interpretation/*',
+                bandNames = {'NIR': 'NearInfrared', 'PAN': 'Panchromatic'},
+                keyProperties = [
+                                  {'key': 'SunElevation', 'path': dimap.SCENE_SOURCE + '/SUN_ELEVATION', 'type': float},
+                                  {'key': 'AcquisitionDate', 'path': dimap.SCENE_SOURCE + '/IMAGING_DATE'},
+                                  # The view angle; this is the angle off Nadir view
+                                  {'key': 'OffNadir', 'paths': [dimap.SCENE_SOURCE + '/SENSOR_VIEWING', dimap.SCENE_SOURCE + '/VIEWING_ANGLE'], 'type': float},
+                                  {'key': 'Instrument', 'path': dimap.SCENE_SOURCE + '/INSTRUMENT'},
+                                  {'key': 'SunAzimuth', 'path': dimap.SCENE_SOURCE + '/SUN_AZIMUTH', 'type': float},
+                                  {'key': 'SunDistance', 'path': dimap.SCENE_SOURCE + '/EARTH_SUN_DISTANCE', 'type': float}
+                                ],
+                passItemURI = True,
+                variables = {'DefaultMaximumInput': 1023, 'DefaultGamma': 1},
+                multipleValues = 'first'
+              )
+
+
 #############################################################################################
 #############################################################################################
 ###
@@ -130,49 +160,30 @@ class RasterTypeFactory():
 class Utilities():
 
   def isDeimos2(self, path):
-    isD2 = False
-    f = open(path)
-    s = f.read()
-    if '<MISSION>Deimos 2' in s:
-      isD2 = True
-    f.close()
-    return isD2
-
-  def __getTagsFromTree(self, tree):
-    tags = list()
-    numBands = 0
-    for nBands in tree.findall('Raster_Dimensions/NBANDS'):
-      if nBands is not None:
-        numBands = int(nBands.text)
-        if numBands == 1:
-          tags.append('Pan')
-        if numBands >= 3:
-          tags.append('MS')
-    return tags
+    # Only the head of the metadata file is read to find the mission
+    header = sniff.sniffHeader(path)
+    return header['sensor'] == 'DEIMOS-2'
 
   def getTags(self, path):
     try:
-      # Get tags by parsing the dim file
-      tree = ET.parse(path)
-      tags = self.__getTagsFromTree(tree)
+      # Get tags from the band count of the dim file
+      values = dimapProfile.read(path)
+      tags = dimapProfile.getTags(values)
       return tags
-    except ParseError as e:
+    except ET.ParseError as e:
       print ("Parse error {0}:".format(e.code))
       return None
       
-  def getProductName(self, tree):
-    productName = tree.find('Production/PRODUCT_TYPE')
-    if productName is not None:
-      return productName.text
-    return None
+  def getProductName(self, values):
+    return dimapProfile.getProductName(values)
 
   def getProductNameFromFile(self, path):
     try:
       # Get product type
-      tree = ET.parse(path)
-      productName = self.getProductName(tree)
+      values = dimapProfile.read(path)
+      productName = self.getProductName(values)
       return productName
-    except ParseError as e:
+    except ET.ParseError as e:
       print ("Exception while parsing {0}\n{1}".format(path, e.code))
     return None
 
@@ -186,7 +197,7 @@ class Utilities():
 class DeimosBuilder():
 
   def __init__(self, **kwargs):
-    self.SensorName = 'DEIMOS-2'
+    self.SensorName = dimapProfile.sensorName
     self.utilities = Utilities()
 
   #######################################
@@ -201,6 +212,15 @@ class DeimosBuilder():
   ### The 'build' function
   #######################################
   def build(self, itemURI):
+    #the arcpy footprint polygon is created here, from the portable item
+    with metrics.stage('build', self.SensorName):
+      return batch.materialize(self.buildPortable(itemURI), itemURI=itemURI)
+
+  def buildMany(self, itemURIs, workers=None):
+    #build many items on a pool of warm worker processes; arcpy geometry is only created in this process
+    return batch.buildMany(__file__, 'DeimosBuilder', itemURIs, workers)
+
+  def buildPortable(self, itemURI):
 
     # Make sure that the itemURI dictionary contains items
     if len(itemURI) <= 0:
@@ -209,147 +229,12 @@ class DeimosBuilder():
     try:
 
       # ItemURI dictionary passed from crawler containing path, tag, display name, group name, product type
-      path = None
-      if 'path' in itemURI:
-        path = itemURI['path']
-      else:
+      if 'path' not in itemURI:
         return None
 
-      # The metadata file is a XML file
-      tree = ET.parse(path)
-
-      # Horizontal CS (can also be a arcpy.SpatialReference object, ESPG code, path to a PRJ file or a WKT string)
-      srsWKT = 0
-      projectionNode = tree.find('Coordinate_Reference_System/PROJECTION')
-      if projectionNode is None:
-        projectionNode = tree.find('Dataset_Sources/Source_Information/Coordinate_Reference_System/Projection_OGCWKT')
-
-      if projectionNode is not None:
-        srsWKT = projectionNode.text
-
-      # Dataset path
-      fileName = None
-      filePathNode = tree.find('Data_Access/Data_File/DATA_FILE_PATH')
-      if filePathNode is not None:
-        fileName = filePathNode.attrib['href']
-
-      if fileName is None:
-        print ("path not found")
-        return None
+      # The metadata file is a XML file; the values are read and assembled as described by dimapProfile
+      return dimapProfile.buildPortable(itemURI)
 
-      fullPath = os.path.join(os.path.dirname(path), fileName)
-
-      # Dataset frame - footprint; this is a list of Vertex coordinates
-      vertex_array = arcpy.Array()
-      all_vertex = tree.find('Dataset_Frame')
-      if all_vertex is not None:
-        for vertex in all_vertex:
-          x_vertex = vertex.find('FRAME_X')
-          y_vertex = vertex.find('FRAME_Y')
-          if x_vertex is not None and y_vertex is not None:
-            frame_x = float(x_vertex.text)
-            frame_y = float(y_vertex.text)
-            vertex_array.add(arcpy.Point(frame_x, frame_y))
-
-      # Get geometry object for the footprint; the SRS of the footprint
-      # can also be passed if it is different to the SRS read from the metadata;
-      # by default, the footprint geometry is assumed to be in the SRS of the metadata 
-      footprint_geometry = arcpy.Polygon(vertex_array)
-
-      # Metadata Information
-      bandProperties = list()
-
-      # Band info(part of metadata) - gain, bias etc
-      img_interpretation = tree.find('Image_Interpretation')
-      if img_interpretation is not None:
-        for band_info in img_interpretation:
-          bandProperty = {}
-          if band_info.find('BAND_DESCRIPTION').text == 'NIR':
-            bandProperty['bandName'] = 'NearInfrared'
-          elif band_info.find('BAND_DESCRIPTION').text == 'PAN':
-            bandProperty['bandName'] = 'Panchromatic'
-          else:
-            bandProperty['bandName'] = band_info.find('BAND_DESCRIPTION').text
-
-          band_num = 0 
-          band_index = band_info.find('BAND_INDEX')
-          if band_index is not None:
-            band_num = int(band_index.text)
-
-          gain = band_info.find('PHYSICAL_GAIN')
-          if gain is not None:
-            bandProperty['RadianceGain'] = float(gain.text)
-
-          bias = band_info.find('PHYSICAL_BIAS')
-          if bias is not None:
-            bandProperty['RadianceBias'] = float(bias.text)
-
-          unit = band_info.find('PHYSICAL_UNIT')
-          if unit is not None:
-            bandProperty['unit'] = unit.text
-
-          bandProperties.append(bandProperty)
-
-      # Other metadata information (Sun elevation, azimuth etc)
-      metadata = {}
-      acquisitionDate = None
-      acquisitionTime = None
-      img_metadata = tree.find('Dataset_Sources/Source_Information/Scene_Source')
-      if img_metadata is not None:
-        # Get the Sun Elevation
-        sunElevation = img_metadata.find('SUN_ELEVATION')
-        if sunElevation is not None:
-          metadata['SunElevation'] = float(sunElevation.text)
-      
-        # Get the acquisition date of the scene
-        acquisitionDate = img_metadata.find('IMAGING_DATE')
-        if acquisitionDate is not None:
-          metadata['AcquisitionDate'] = acquisitionDate.text
-      
-        # retrieve the view angle; this is the angle off Nadir view
-        viewingAngle = img_metadata.find('SENSOR_VIEWING')
-        if viewingAngle is None:
-          viewingAngle = img_metadata.find('VIEWING_ANGLE')
-
-        if viewingAngle is not None:
-          metadata['OffNadir'] = float(viewingAngle.text)
-      
-        instrument = img_metadata.find('INSTRUMENT')
-        if instrument is not None:
-          metadata['Instrument'] = instrument.text
-            
-        # Get the Sun Azimuth
-        sunAzimuth = img_metadata.find('SUN_AZIMUTH')
-        if sunAzimuth is not None:
-          metadata['SunAzimuth'] = float(sunElevation.text)
-
-        # Get the Sun Distance
-        sunDistance = img_metadata.find('EARTH_SUN_DISTANCE')
-        if sunDistance is not None:
-          metadata['SunDistance'] = float(sunDistance.text)
-
-      metadata['SensorName'] = self.SensorName
-      metadata['bandProperties'] = bandProperties
-      metadata['ProductType'] = self.utilities.getProductName(tree)
-
-      #define a dictionary of variables
-      variables = {}
-      variables['DefaultMaximumInput'] = 1023
-      variables['DefaultGamma'] = 1
-
-      # Assemble everything into an outgoing dictionary
-      builtItem = {}
-      builtItem['spatialReference'] = srsWKT
-      builtItem['raster'] = { 'Raster1' : fullPath }
-      builtItem['footprint'] = footprint_geometry
-      builtItem['keyProperties'] = metadata
-      builtItem['variables'] = variables
-      builtItem['itemURI'] = itemURI
-
-      builtItemsList = list()
-      builtItemsList.append(builtItem)
-      return builtItemsList
-    
     except:
       return None
 
@@ -367,65 +252,32 @@ class Deimos2Crawler():
     self.paths = crawlerProperties['paths']
     self.recurse = crawlerProperties['recurse']
     self.filter = crawlerProperties['filter']
-    if self.filter is (None or ""):
+    if not self.filter:
       self.filter = '*.dim'
 
-    try:
-      self.pathGenerator = self.createGenerator()
-      self.curPath = next(self.pathGenerator)
+    # Folders are listed in parallel and the filter is matched case-insensitively. With a 'manifest'
+    # crawler property unchanged files are served from the manifest without opening them, and with
+    # a 'checkpoint' an interrupted crawl resumes where it stopped
+    self.crawler = crawl.SceneCrawler(self.paths, self.recurse, self.filter, self.describe, 'DEIMOS-2', crawlerProperties, self.listPaths)
 
-    except StopIteration:
-      return None
+  def listPaths(self, path):
+    # The entries of paths that are not folders: a csv list of rasters, or the file itself
+    if path.endswith(".csv"):
+        with open(path, 'rb') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                yield row['raster']
 
+    else:
+        yield path
+
+  def describe(self, path):
     # Get the list of tags from the *.dim file using XML parsing
-    self.tags = self.utils.getTags(self.curPath)
-    self.tagsIterator = iter(self.tags)
-
-  def createGenerator(self):
-    for path in self.paths:
-        if os.path.isdir(path):
-            if self.recurse:
-                for root, dirs, files in (os.walk(path)):
-                    for file in (files):
-                        if file.endswith(".dim"):
-                            filename = os.path.join(root, file)
-                            yield filename
-            else:
-                filter_to_scan = path + os.path.sep + self.filter
-                for filename in glob.glob(filter_to_scan):
-                    yield filename
-
-        elif path.endswith(".csv"):
-            with open(path, 'rb') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    yield row['raster']
-
-        else:
-            yield path
+    return self.utils.getTags(path), self.utils.getProductNameFromFile(path)
 
   def __iter__(self):
     return self
 
   def next(self):
-    try:
-      curTag = self.tagsIterator.next()
-    except StopIteration:
-      try:
-        self.curPath = next(self.pathGenerator)
-        self.tags = self.utils.getTags(self.curPath)
-        self.tagsIterator = iter(self.tags)
-        curTag = self.tagsIterator.next()
-      except StopIteration:
-        return None
-
-    uri = {
-            'path': self.curPath,
-            'displayName': os.path.basename(self.curPath),
-            'tag': curTag,
-            'groupName': os.path.split(os.path.dirname(self.curPath))[1],
-            'productName':self.utils.getProductNameFromFile(self.curPath)
-          }
-
     # Return URI dictionary to Builder
-    return uri
+    return self.crawler.next()
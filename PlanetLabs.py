@@ -1,13 +1,16 @@
 ﻿import os
-import arcpy
-import glob
-import fnmatch
-import json
 
-try:
-    import xml.etree.cElementTree as ET
-except ImportError:
-    import xml.etree.ElementTree as ET
+from prt import batch
+from prt import crawl
+from prt import cache
+from prt import geometry
+from prt import item
+from prt import listing
+from prt import metrics
+from prt import rastertype
+from prt import rpc
+from prt import spatial
+
 
 class enumDataSourceType():
     dataSourceTypeUnknown = 0
@@ -16,12 +19,10 @@ class enumDataSourceType():
 
 class rasterTypeFactory():
 
+    @rastertype.memoize
     def getRasterTypesInfo(self):
-        productType_auxField = arcpy.Field()
-        productType_auxField.name = 'ProductType'
-        productType_auxField.aliasName = 'Product Type'
-        productType_auxField.type = 'String'
-        productType_auxField.length = 50
+        #built on the first call only; arcpy is not needed until the info is asked for
+        productType_auxField = rastertype.field('ProductType', 'Product Type', 'String', 50)
 
         return [
                 {
@@ -77,6 +78,22 @@ class rasterTypeFactory():
 
 
 
+#the GeoTIFF products of a scene, in the order they are picked when more than one is present
+productTypes = ['analytic', 'visual', 'unrectified']
+
+def classifySceneFile(name):
+    #<sceneId>_<productType>.tif and <sceneId>_rpc.txt
+    for productType in productTypes:
+        suffix = "_" + productType + ".tif"
+        if name.endswith(suffix):
+            return name[:-len(suffix)], productType
+    if name.endswith("_rpc.txt"):
+        return name[:-len("_rpc.txt")], 'rpc'
+    return None
+
+#one listing per scene directory, shared by the crawler and the builder
+sceneIndex = listing.ListingIndex(classifySceneFile)
+
 class Utilties():
 
     def IsPlanetLabs(self, path):
@@ -88,17 +105,30 @@ class Utilties():
                   }
         return retVal
 
-    def getProductName(self, path):
-        readPath = os.path.dirname(path)
-        for root, dirs, files in (os.walk(readPath)):
-            for file in (files):
-                if file.endswith(".tif"):
-                    if "_unrectified" in str(file):
-                        return "unrectified"
-                    elif "_visual" in str(file):
-                        return "visual"
-                    else:
-                        return "analytic"
+    def getSceneFiles(self, path, sceneId=None):
+        #{productType or 'rpc': path} for the scene described by the *.json file at path
+        if sceneId is None:
+            sceneId = str(cache.loadJson(path)['id'])
+        return sceneIndex.scene(os.path.dirname(path), sceneId)
+
+    def getRpcCoefficients(self, path, sceneId=None):
+        #prt.rpc.RpcCoefficients for the scene's <id>_rpc.txt, for the geodataXform or to evaluate the RPC model
+        if sceneId is None:
+            sceneId = str(cache.loadJson(path)['id'])
+        rpcPath = self.getSceneFiles(path, sceneId).get('rpc', os.path.join(os.path.dirname(path), sceneId + "_rpc.txt"))
+        return rpc.readRpc(rpcPath)
+
+    def getRpcModel(self, path, sceneId=None):
+        #prt.rpcmodel.RpcModel of the scene's RPC, to validate it or trace the footprint from it; numpy is only needed here
+        from prt import rpcmodel
+        return rpcmodel.RpcModel(self.getRpcCoefficients(path, sceneId))
+
+    def getProductName(self, path, sceneId=None):
+        sceneFiles = self.getSceneFiles(path, sceneId)
+        for productType in productTypes:
+            if productType in sceneFiles:
+                return productType
+        return None
 
 #############################################################################################
 #############################################################################################
@@ -112,6 +142,10 @@ class PlanetLabsBuilder():
     def __init__(self, **kwargs):
         self.SensorName = 'PlanetLabs'
         self.utilities = Utilties()
+        #validateRpc: scenes whose RPC fails RpcModel.validate() are not ingested
+        #rpcFootprint: points per image side of a footprint traced with the RPC, 0 keeps the footprint of the json file
+        self.validateRpc = kwargs.get('validateRpc', False)
+        self.rpcFootprint = kwargs.get('rpcFootprint', 0)
 
     def canBuild(self, datasetPath):
         isPlanetLabs = self.utilities.isPlanetLabs(datasetPath)
@@ -119,87 +153,101 @@ class PlanetLabsBuilder():
         return canBuild
 
     def build(self, itemURI):
+        #the arcpy footprint polygon is created here, from the portable item
+        with metrics.stage('build', self.SensorName):
+            return batch.materialize(self.buildPortable(itemURI), itemURI=itemURI)
+
+    def buildMany(self, itemURIs, workers=None):
+        #build many items on a pool of warm worker processes; arcpy geometry is only created in this process
+        return batch.buildMany(__file__, 'PlanetLabsBuilder', itemURIs, workers)
+
+    def buildPortable(self, itemURI):
         path = itemURI['path']
         tags = itemURI['tag']
 
-        with open(path) as json_data:
-            d = json.load(json_data)
-            
-            rpcPath = str(os.path.join(os.path.dirname(path), (str(d['id']) + "_rpc" + ".txt")))
-            readRPC = open(rpcPath, "r")
-
-            #root = ET.Element("GeodataTransform", {"xsi:type": 'typens:RPCXform', "xmlns:xsi": 'http://www.w3.org/2001/XMLSchema-instance', "xmlns:xs": 'http://www.w3.org/2001/XMLSchema', "xmlns:typens": 'http://www.esri.com/schemas/ArcGIS/10.5'})
-            #geo = ET.SubElement(root, "GeodataXform", {"xsi:type":'typens:RPCXform'})
-            #rpc = ET.SubElement(root, "RPC", {"xsi:type":'typens:ArrayOfDouble'})
-            
-            dataXform = '{"GeodataTransforms":[{"geodataTransform" : "RPC","geodataTransformArguments":{"coeff":['
-          
-            for line in readRPC.readlines():
-               data = line.split(":")
-               dataXform = dataXform + data[1] + ","
-               #ET.SubElement(rpc, "double").text = data[1]
-
-
-            dataXformString = dataXform[:-1]
-            dataXformString = dataXformString + "]}}]}"
-            
-            #tree = ET.ElementTree(root)
-            #tree.write(str(os.path.join(os.path.dirname(path), (str(d['id']) + "_geoDataTransform" + ".xml"))))
-            #geoTransformData = str(os.path.join(os.path.dirname(path), (str(d['id']) + "_geoDataTransform" + ".xml")))
-
-            fileName = str(d['id']) + "_" + self.utilities.getProductName(path) + ".tif"
-            fullPath = str(os.path.join(os.path.dirname(path), fileName))
-
-            desc = arcpy.Describe(fullPath)
-            SR = desc.spatialReference
-            srName = str(SR.name)
-            if srName == "Unknown":
-                espgCode = 4326
-            else:
-                espgCode = 3857
-
-            coords_list = list()
-            vertex_array = arcpy.Array()
-            for all_vertex in d['geometry']['coordinates']:
-                for vertex in all_vertex:
-                    vertex_array.add(arcpy.Point(vertex[0], vertex[1]))
-            footprint_geometry = arcpy.Polygon(vertex_array)
-
-            camProperties = list()
-            camProperty = {}
-            camProperty['bit_depth'] = d['properties']['camera']['bit_depth']
-            camProperty['colorMode'] = str(d['properties']['camera']['color_mode'])
-            camProperty['exposure_time'] = d['properties']['camera']['exposure_time']
-            camProperty['gain'] = d['properties']['camera']['gain']
-            camProperty['tdi_pulses'] = d['properties']['camera']['tdi_pulses']
-            camProperties.append(camProperty)
-
-            metadata = {}
-            DateTime = d['properties']['acquired']
-            metadata['acquisitionDate'] = str(DateTime.split("T")[0])
-            metadata['acquisitionTime'] = str(DateTime.split("T")[1])
-            metadata['sunElevation'] = d['properties']['sun']['altitude']
-            metadata['sunAzimuth'] = d['properties']['sun']['azimuth']
-            metadata['SensorName'] = self.SensorName
-            metadata['bandProperties'] = camProperties
-            metadata['ProductType'] = self.utilities.getProductName(path)
-
-            #rpc_file = open("C:\\TEMP\\PlanetLabs\\rpc.xml", 'r')
-            #rpc_file = open(geoTransformData, 'r')
-            #rpc_file = open('C:\\TEMP\\PlanetLabs\\rpcxform.txt', 'r')
-            #rpc_text = rpc_file.read()
-
-            builtItem = {}
-            builtItem['spatialReference'] = espgCode
-            builtItem['raster'] = { 'Raster1' : fullPath }
-            builtItem['footprint'] = footprint_geometry
-            builtItem['keyProperties'] = metadata
-            builtItem['itemURI'] = { 'tag' : 'MS' }
-            builtItem['geodataXform'] = dataXformString
-
-            builtItemsList = list()
-            builtItemsList.append(builtItem)
-            return builtItemsList
+        d = cache.loadJson(path)
+        sceneId = str(d['id'])
+        sceneFiles = self.utilities.getSceneFiles(path, sceneId)
+        productName = self.utilities.getProductName(path, sceneId)
+
+        #the RPC coefficients are parsed into an array once per scene and cached in memory and on disk
+        coefficients = self.utilities.getRpcCoefficients(path, sceneId)
+        dataXformString = coefficients.geodataXform()
+
+        #tree = ET.ElementTree(root)
+        #tree.write(str(os.path.join(os.path.dirname(path), (str(d['id']) + "_geoDataTransform" + ".xml"))))
+        #geoTransformData = str(os.path.join(os.path.dirname(path), (str(d['id']) + "_geoDataTransform" + ".xml")))
+
+        fullPath = str(sceneFiles[productName])
+
+        #described once per raster, not once per item
+        desc = spatial.describe(fullPath)
+        SR = desc.spatialReference
+        srName = str(SR.name)
+        if srName == "Unknown":
+            espgCode = 4326
+        else:
+            espgCode = 3857
+
+        footprint_geometry = geometry.Footprint()
+        coordinates = footprint_geometry.coordinates
+        for all_vertex in d['geometry']['coordinates']:
+            for vertex in all_vertex:
+                coordinates.append(vertex[0])
+                coordinates.append(vertex[1])
+        #GeoJSON coordinates are longitude, latitude
+        geographicExtent = footprint_geometry.extent()
+
+        if self.validateRpc or self.rpcFootprint:
+            model = self.utilities.getRpcModel(path, sceneId)
+            rows = getattr(desc, 'height', None)
+            cols = getattr(desc, 'width', None)
+            if self.validateRpc:
+                problems = model.validate(rows, cols, footprint_geometry)
+                if problems:
+                    print ("{0}: RPC not valid, {1}".format(path, '; '.join(problems)))
+                    return list()
+            if self.rpcFootprint:
+                refined = model.footprint(rows, cols, pointsPerSide=self.rpcFootprint)
+                if refined is not None:
+                    footprint_geometry = refined
+
+        camProperties = list()
+        camProperty = {}
+        camProperty['bit_depth'] = d['properties']['camera']['bit_depth']
+        camProperty['colorMode'] = str(d['properties']['camera']['color_mode'])
+        camProperty['exposure_time'] = d['properties']['camera']['exposure_time']
+        camProperty['gain'] = d['properties']['camera']['gain']
+        camProperty['tdi_pulses'] = d['properties']['camera']['tdi_pulses']
+        camProperties.append(camProperty)
+
+        metadata = {}
+        DateTime = d['properties']['acquired']
+        metadata['acquisitionDate'] = str(DateTime.split("T")[0])
+        metadata['acquisitionTime'] = str(DateTime.split("T")[1])
+        metadata['sunElevation'] = d['properties']['sun']['altitude']
+        metadata['sunAzimuth'] = d['properties']['sun']['azimuth']
+        metadata['SensorName'] = self.SensorName
+        metadata['bandProperties'] = camProperties
+        metadata['ProductType'] = productName
+
+        #rpc_file = open("C:\\TEMP\\PlanetLabs\\rpc.xml", 'r')
+        #rpc_file = open(geoTransformData, 'r')
+        #rpc_file = open('C:\\TEMP\\PlanetLabs\\rpcxform.txt', 'r')
+        #rpc_text = rpc_file.read()
+
+        builtItem = item.BuiltItem()
+        builtItem['spatialReference'] = espgCode
+        builtItem['raster'] = { 'Raster1' : fullPath }
+        builtItem['footprint'] = footprint_geometry
+        builtItem['keyProperties'] = metadata
+        builtItem['itemURI'] = { 'tag' : 'MS' }
+        builtItem['geodataXform'] = dataXformString
+        builtItem[item.GEOGRAPHIC_EXTENT] = geographicExtent
+
+        builtItemsList = list()
+        builtItemsList.append(builtItem)
+        return builtItemsList
 
 #############################################################################################
 #############################################################################################
@@ -213,60 +261,24 @@ class PlanetLabsCrawler():
     def __init__(self, **crawlerProperties):
 
         self.utils = Utilties()
-        global mygenerator
-
-        def createGenerator(pathList, recurse, filter):
-            for i in pathList:
-                if os.path.isdir(i):
-                    if recurse:
-                        for root, dirs, files in (os.walk(i)):
-                            for file in (files):
-                                if file.endswith(".json"):
-                                    filename = os.path.join(root, file)
-                                    yield filename
-                    else:
-                        filter_to_scan = i + os.path.sep + filter
-                        for filename in glob.glob(filter_to_scan):
-                            yield filename
-                else:
-                    yield i
 
         self.paths = crawlerProperties['paths']
         self.recurse = crawlerProperties['recurse']
         self.filter = crawlerProperties['filter']
-        if self.filter is (None or ""):
+        if not self.filter:
             self.filter = '*.json'
-        try:
-            mygenerator = createGenerator(self.paths, self.recurse, self.filter)
-            self.curPath2 = next(mygenerator)
 
-        except StopIteration:
-            return None
+        #get the *.json files as we go; folders are listed in parallel, with a 'manifest' crawler property
+        #unchanged files are served from the manifest without opening them, and with a 'checkpoint'
+        #an interrupted crawl resumes where it stopped
+        self.crawler = crawl.SceneCrawler(self.paths, self.recurse, self.filter, self.describe, 'PlanetLabs', crawlerProperties)
 
-        self.tags = ['MS']
-        self.tagsIterator = iter(self.tags)
+    def describe(self, path):
+        return ['MS'], self.utils.getProductName(path)
 
     def __iter__(self):
         return self
 
     def next(self):
-        try:
-            curTag = self.tagsIterator.next()
-        except StopIteration:
-            try:
-                self.curPath2 = next(mygenerator)
-                self.tags = ['MS']
-                self.tagsIterator = iter(self.tags)
-                curTag = self.tagsIterator.next()
-            except StopIteration:
-                return None
-
-        if self.tags is not None:
-            uri = {
-			        'path': self.curPath2,
-				    'displayName': os.path.basename(self.curPath2),
-					'tag': curTag,
-					'groupName': os.path.split(os.path.dirname(self.curPath2))[1],
-					'productName':self.utils.getProductName(self.curPath2),
-			}
-        return uri
+        #return URI dictionary to Builder
+        return self.crawler.next()
@@ -0,0 +1,2 @@
+# Shared helpers used by the python raster type modules (Kazakhstan, NigeriaSat-2,
+# PlanetLabs, DEIMOS and Landsat). Deploy this folder next to the raster type .py files.
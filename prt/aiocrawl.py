@@ -0,0 +1,223 @@
+import os
+import queue
+import asyncio
+import threading
+from os import scandir
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from prt import archive
+from prt import crawl
+from prt import metrics
+from prt import walk
+
+#############################################################################################
+#############################################################################################
+###
+###     asyncio crawl mode for network shares (Python 3)
+###
+###     On NFS/SMB every listing, stat and open waits milliseconds on the server. Here
+###     directory listings and describe(path) calls (the metadata read behind the tags
+###     and product name) run on an executor, up to `concurrency` at a time, so those
+###     waits overlap instead of adding up. Files are described before more folders are
+###     listed, and at most MAX_BUFFERED items wait for the consumer, so memory stays
+###     bounded on large trees.
+###
+###     AsyncCrawler is an async iterator of itemURIs; SyncAdapter runs it on a
+###     background thread behind the next() contract of the crawlers. Items come out in
+###     completion order, so the mode does not combine with manifests or checkpoints.
+###
+#############################################################################################
+#############################################################################################
+
+DEFAULT_CONCURRENCY = int(os.environ.get('PRT_CRAWL_CONCURRENCY', 32))
+
+# Items waiting for the consumer before the workers pause
+MAX_BUFFERED = 1000
+
+
+class _Failed():
+
+    def __init__(self, error):
+        self.error = error
+
+
+_done = object()
+
+
+class AsyncCrawler():
+
+    # async for itemURI in AsyncCrawler(paths, recurse, '*.dim', describe, 'Kazakhstan'): ...
+    # describe(path) -> (tags, productName) runs on the executor, and so does
+    # listPaths(path) for entries of paths that are not folders
+    def __init__(self, paths, recurse, filter, describe, sensor=None, concurrency=DEFAULT_CONCURRENCY,
+                 listPaths=None, executor=None):
+        self.paths = list(paths)
+        self.recurse = recurse
+        self.match = walk.compileFilter(filter)
+        self.describe = describe
+        self.sensor = sensor
+        self.concurrency = max(1, concurrency)
+        self.listPaths = listPaths or (lambda path: [path])
+        self.executor = executor
+        self.ownExecutor = executor is None
+
+        self.roots = deque(self.paths)
+        self.directories = deque()
+        self.files = deque()
+        self.busy = 0
+        self.errors = list()
+        self.output = None
+        self.condition = None
+        self.started = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.started:
+            self.__start()
+        item = await self.output.get()
+        if item is _done:
+            # Later calls see the end again
+            self.output.put_nowait(_done)
+            raise StopAsyncIteration
+        if isinstance(item, _Failed):
+            raise item.error
+        return item
+
+    def __start(self):
+        self.started = True
+        self.output = asyncio.Queue(MAX_BUFFERED)
+        self.condition = asyncio.Condition()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.concurrency)
+        asyncio.ensure_future(self.__run())
+
+    async def __run(self):
+        workers = [asyncio.ensure_future(self.__work()) for i in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        except Exception as e:
+            for worker in workers:
+                worker.cancel()
+            await self.output.put(_Failed(e))
+        finally:
+            if self.ownExecutor:
+                self.executor.shutdown(wait=False)
+        await self.output.put(_done)
+
+    async def __work(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            async with self.condition:
+                while not (self.files or self.directories or self.roots):
+                    if not self.busy:
+                        self.condition.notify_all()
+                        return
+                    await self.condition.wait()
+                self.busy += 1
+                # Describing before listing keeps the frontier small
+                if self.files:
+                    function, target = self.__describeFile, self.files.popleft()
+                elif self.directories:
+                    function, target = self.__listDirectory, self.directories.popleft()
+                else:
+                    function, target = self.__expandRoot, self.roots.popleft()
+
+            files = subDirs = ()
+            try:
+                files, subDirs, items = await loop.run_in_executor(self.executor, function, target)
+                for item in items:
+                    await self.output.put(item)
+            finally:
+                async with self.condition:
+                    self.busy -= 1
+                    self.files.extend(files)
+                    self.directories.extend(subDirs)
+                    self.condition.notify_all()
+
+    def __expandRoot(self, root):
+        # Runs on the executor, like the two below; returns (files, subDirs, items)
+        if os.path.isdir(root):
+            return self.__listDirectory(root)
+        if archive.isArchive(root):
+            return list(archive.members(root, self.match)), [], []
+        return list(self.listPaths(root)), [], []
+
+    def __listDirectory(self, directory):
+        files = list()
+        subDirs = list()
+        with metrics.stage('walk', self.sensor):
+            try:
+                for entry in scandir(directory):
+                    # Like os.walk, symlinked directories are not followed
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recurse:
+                            subDirs.append(entry.path)
+                    elif self.match(entry.name):
+                        files.append(entry.path)
+            except OSError as e:
+                # Unreadable directories are skipped, as os.walk does
+                self.errors.append((directory, e))
+        files.sort()
+        return files, subDirs, []
+
+    def __describeFile(self, path):
+        with metrics.stage('metadata', self.sensor):
+            tags, productName = self.describe(path)
+        return [], [], [crawl.itemURI(path, tag, productName) for tag in tags or []]
+
+
+class SyncAdapter():
+
+    # Runs an AsyncCrawler on its own event loop in a background thread; next() returns
+    # the next itemURI, or None when the crawl is over
+    def __init__(self, asyncCrawler, maxBuffered=MAX_BUFFERED):
+        self.asyncCrawler = asyncCrawler
+        self.items = queue.Queue(maxBuffered)
+        self.finished = False
+        self.thread = threading.Thread(target=self.__run, name='prt-aiocrawl')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.__pump(loop))
+        finally:
+            loop.close()
+
+    async def __pump(self, loop):
+        try:
+            async for item in self.asyncCrawler:
+                try:
+                    self.items.put_nowait(item)
+                except queue.Full:
+                    # The consumer is behind: wait for it without blocking the event loop
+                    await loop.run_in_executor(None, self.items.put, item)
+        except Exception as e:
+            await loop.run_in_executor(None, self.items.put, _Failed(e))
+        await loop.run_in_executor(None, self.items.put, _done)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self.next()
+        if item is None:
+            raise StopIteration
+        return item
+
+    def next(self):
+        if self.finished:
+            return None
+        item = self.items.get()
+        if item is _done:
+            self.finished = True
+            metrics.flush()
+            return None
+        if isinstance(item, _Failed):
+            self.finished = True
+            raise item.error
+        return item
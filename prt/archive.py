@@ -0,0 +1,307 @@
+import io
+import os
+import re
+import tarfile
+import zipfile
+import threading
+from collections import OrderedDict
+
+try:
+    import builtins
+except ImportError:
+    # Python 2
+    import __builtin__ as builtins
+
+#############################################################################################
+#############################################################################################
+###
+###     Scenes inside .zip / .tar / .tar.gz deliveries, read without extracting them
+###
+###     Archive members are addressed the way GDAL does:
+###         /vsizip/D:/deliveries/batch1.zip/SCENE_1/scene.dim
+###         /vsitar/D:/deliveries/batch2.tar.gz/SCENE_2/scene.dim
+###     Those paths go into the itemURIs, and raster paths built next to a metadata
+###     file (os.path.join(os.path.dirname(path), name)) address members too.
+###
+###     Zip members are read through the central directory. A gzipped tar can only be
+###     read front to back, so members() scans it in one sequential pass, keeping the
+###     bytes of the matching (metadata) members so they are not decompressed again,
+###     and the names and sizes of all members for exists() and stat().
+###
+#############################################################################################
+#############################################################################################
+
+ZIP_PREFIX = '/vsizip/'
+TAR_PREFIX = '/vsitar/'
+
+ZIP_SUFFIXES = ('.zip',)
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz')
+
+MEMBER_PATTERN = re.compile(r'^/vsi(zip|tar)/(.+?\.(?:zip|tar\.gz|tgz|tar))[/\\](.+)$', re.IGNORECASE)
+
+# Bytes of tar members kept from the sequential scans; members dropped past this, and
+# members larger than all of it, are read again by scanning the archive
+MAX_MEMBER_BYTES = int(os.environ.get('PRT_ARCHIVE_CACHE_MB', 256)) * 1024 * 1024
+
+# Open zip files kept for reading members
+MAX_OPEN_ZIPS = 16
+
+_lock = threading.Lock()
+_zips = OrderedDict()
+_tars = OrderedDict()
+_tarBytes = [0]
+
+
+class _ZipHandle():
+
+    def __init__(self, key, archivePath):
+        self.key = key
+        self.zip = zipfile.ZipFile(archivePath)
+        # Member streams still open, on any thread; a handle dropped from _zips is only
+        # closed once the last of them is
+        self.users = 0
+        self.dropped = False
+
+
+class _TarIndex():
+
+    def __init__(self, key):
+        self.key = key
+        # Member name -> size, for all members
+        self.sizes = dict()
+        self.data = OrderedDict()
+        self.bytes = 0
+        self.complete = False
+
+
+def isArchive(path):
+    lower = path.lower()
+    return lower.endswith(ZIP_SUFFIXES) or lower.endswith(TAR_SUFFIXES)
+
+
+def memberPath(archivePath, member):
+    prefix = ZIP_PREFIX if archivePath.lower().endswith(ZIP_SUFFIXES) else TAR_PREFIX
+    return prefix + archivePath + '/' + member
+
+
+def split(path):
+    # '/vsizip/a.zip/x/y.dim' -> ('a.zip', 'x/y.dim'); None for other paths
+    if not path.startswith('/vsi'):
+        return None
+    match = MEMBER_PATTERN.match(path)
+    if match is None:
+        return None
+    return match.group(2), match.group(3).replace('\\', '/')
+
+
+def _archiveKey(archivePath):
+    st = os.stat(archivePath)
+    return (archivePath, st.st_size, st.st_mtime)
+
+
+def _drop(handle):
+    # Called with _lock held
+    handle.dropped = True
+    if handle.users == 0:
+        handle.zip.close()
+
+
+def _release(handle):
+    with _lock:
+        handle.users -= 1
+        if handle.dropped and handle.users == 0:
+            handle.zip.close()
+
+
+def _zipHandle(archivePath, use=False):
+    # The open ZipFile of the current archive; with use=True the caller holds it until
+    # _release(), so that dropping it from _zips does not close it under an open member
+    key = _archiveKey(archivePath)
+    with _lock:
+        handle = _zips.pop(archivePath, None)
+        if handle is not None and handle.key != key:
+            _drop(handle)
+            handle = None
+        if handle is None:
+            handle = _ZipHandle(key, archivePath)
+        _zips[archivePath] = handle
+        if use:
+            handle.users += 1
+        while len(_zips) > MAX_OPEN_ZIPS:
+            _drop(_zips.popitem(last=False)[1])
+        return handle
+
+
+def _zipFile(archivePath):
+    return _zipHandle(archivePath).zip
+
+
+def _openZipMember(archivePath, name):
+    handle = _zipHandle(archivePath, use=True)
+    try:
+        stream = handle.zip.open(name)
+    except KeyError:
+        _release(handle)
+        raise IOError('{0}: no such member'.format(memberPath(archivePath, name)))
+    except BaseException:
+        _release(handle)
+        raise
+    close = stream.close
+    released = []
+
+    def closeMember():
+        close()
+        if not released:
+            released.append(True)
+            _release(handle)
+
+    stream.close = closeMember
+    return stream
+
+
+def _keep(index, name, data):
+    # Called with _lock held; past MAX_MEMBER_BYTES the members of the oldest scans go first
+    if len(data) > MAX_MEMBER_BYTES:
+        return
+    index.data[name] = data
+    index.bytes += len(data)
+    _tarBytes[0] += len(data)
+    while _tarBytes[0] > MAX_MEMBER_BYTES:
+        oldestPath = next(iter(_tars))
+        oldest = _tars[oldestPath]
+        if oldest is index:
+            # Only the archive being scanned is left: drop its earliest members
+            if not index.data:
+                break
+            size = len(index.data.popitem(last=False)[1])
+            index.bytes -= size
+            _tarBytes[0] -= size
+        else:
+            del _tars[oldestPath]
+            _tarBytes[0] -= oldest.bytes
+
+
+def _scanTar(archivePath, match):
+    # One sequential pass; yields the names of the matching members as they are read
+    key = _archiveKey(archivePath)
+    index = _TarIndex(key)
+    with _lock:
+        old = _tars.pop(archivePath, None)
+        if old is not None:
+            _tarBytes[0] -= old.bytes
+        _tars[archivePath] = index
+
+    # 'r|*' streams the archive and detects the compression
+    with tarfile.open(archivePath, 'r|*') as tar:
+        for info in tar:
+            if not info.isfile():
+                continue
+            with _lock:
+                index.sizes[info.name] = info.size
+            if match is not None and match(os.path.basename(info.name)):
+                data = tar.extractfile(info).read()
+                with _lock:
+                    _keep(index, info.name, data)
+                yield info.name
+    index.complete = True
+
+
+def _tarIndex(archivePath):
+    # The index of a complete scan of the current archive, scanning it if needed
+    with _lock:
+        index = _tars.get(archivePath)
+        if index is not None and index.complete and index.key == _archiveKey(archivePath):
+            return index
+    for name in _scanTar(archivePath, None):
+        pass
+    return _tars[archivePath]
+
+
+def members(archivePath, match):
+    # Member paths of the files whose names match(name) is true for, in archive order.
+    # These are the metadata files: the bytes of tar members are kept for open()
+    if archivePath.lower().endswith(ZIP_SUFFIXES):
+        for name in _zipFile(archivePath).namelist():
+            if not name.endswith('/') and match(os.path.basename(name)):
+                yield memberPath(archivePath, name)
+        return
+
+    for name in _scanTar(archivePath, match):
+        yield memberPath(archivePath, name)
+
+
+def open(path, mode='rb'):
+    # open() for plain files and archive members; members are read-only
+    member = split(path)
+    if member is None:
+        return builtins.open(path, mode)
+    if 'w' in mode or 'a' in mode or '+' in mode:
+        raise IOError('{0}: archive members are read-only'.format(path))
+
+    archivePath, name = member
+    if archivePath.lower().endswith(ZIP_SUFFIXES):
+        stream = _openZipMember(archivePath, name)
+    else:
+        key = _archiveKey(archivePath)
+        with _lock:
+            index = _tars.get(archivePath)
+            data = index.data.get(name) if index is not None and index.key == key else None
+        if data is not None:
+            stream = io.BytesIO(data)
+        else:
+            # Not kept from the scan: read the archive up to the member
+            tar = tarfile.open(archivePath, 'r:*')
+            try:
+                extracted = tar.extractfile(name)
+                if extracted is None:
+                    raise IOError('{0}: not a file'.format(path))
+                stream = io.BytesIO(extracted.read())
+            except KeyError:
+                raise IOError('{0}: no such member'.format(path))
+            finally:
+                tar.close()
+
+    if 'b' in mode:
+        return stream
+    return io.TextIOWrapper(stream)
+
+
+def _memberSize(archivePath, name):
+    if archivePath.lower().endswith(ZIP_SUFFIXES):
+        try:
+            return _zipFile(archivePath).getinfo(name).file_size
+        except KeyError:
+            return None
+    with _lock:
+        index = _tars.get(archivePath)
+        return index.sizes.get(name) if index is not None else None
+
+
+def stat(path):
+    # os.stat(); a member has the times and inode of its archive, so it changes when the
+    # archive does, and its own size (the archive's for tar members not scanned yet)
+    member = split(path)
+    if member is None:
+        return os.stat(path)
+    st = os.stat(member[0])
+    size = _memberSize(member[0], member[1])
+    if size is None:
+        return st
+    return os.stat_result(tuple(st)[:6] + (size,) + tuple(st)[7:10],
+                          {'st_atime': st.st_atime, 'st_mtime': st.st_mtime, 'st_ctime': st.st_ctime})
+
+
+def exists(path):
+    member = split(path)
+    if member is None:
+        return os.path.exists(path)
+    archivePath, name = member
+    if not os.path.exists(archivePath):
+        return False
+    if archivePath.lower().endswith(ZIP_SUFFIXES):
+        try:
+            _zipFile(archivePath).getinfo(name)
+        except KeyError:
+            return False
+        return True
+    return name in _tarIndex(archivePath).sizes
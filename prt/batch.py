@@ -0,0 +1,227 @@
+import os
+import re
+import sys
+import atexit
+import threading
+
+from prt import catalog
+from prt import geometry
+from prt import item
+from prt import metrics
+from prt import spatial
+
+#############################################################################################
+#############################################################################################
+###
+###     Multi-core batch build
+###
+###     buildMany fans itemURIs out to a pool of worker processes. Each worker loads the
+###     raster type module once and keeps its builder warm between calls. Workers run
+###     the builder's buildPortable, which returns picklable items; the arcpy geometry
+###     and spatial reference objects are created here, in the parent process.
+###
+###     Inside ArcMap / ArcGIS Pro, sys.executable is the application, not Python, so the
+###     workers are started with the python(w).exe next to the interpreter (or the one in
+###     PRT_PYTHON_EXECUTABLE). When there is none, the builds run in this process.
+###
+#############################################################################################
+#############################################################################################
+
+
+def _cpuCount():
+    # multiprocessing is only imported when a pool is made; it is slow to import
+    try:
+        return os.cpu_count() or 1
+    except AttributeError:
+        # Python 2
+        import multiprocessing
+        return multiprocessing.cpu_count()
+
+
+DEFAULT_WORKERS = int(os.environ.get('PRT_BUILD_WORKERS', _cpuCount()))
+
+# Set PRT_PYTHON_EXECUTABLE to the interpreter the workers should run
+PYTHON_EXECUTABLE = os.environ.get('PRT_PYTHON_EXECUTABLE')
+
+PYTHON_NAMES = ('pythonw.exe', 'python.exe', 'python')
+
+_pools = {}
+_poolsLock = threading.Lock()
+
+# Builders used in this process when no worker interpreter can be found
+_localBuilders = {}
+
+# The builder instance of a worker process
+_workerBuilder = None
+
+
+def loadModule(modulePath):
+    # Raster type files such as NigeriaSat-2.py are not importable by name
+    name = 'prt_rastertype_' + re.sub(r'\W', '_', os.path.splitext(os.path.basename(modulePath))[0])
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(name, modulePath)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    except ImportError:
+        import imp
+        return imp.load_source(name, modulePath)
+
+
+def _initWorker(modulePath, builderName, builderArgs):
+    global _workerBuilder
+    module = loadModule(modulePath)
+    _workerBuilder = getattr(module, builderName)(**builderArgs)
+
+
+def _buildPortable(itemURI):
+    return _workerBuilder.buildPortable(itemURI)
+
+
+def pythonExecutable():
+    # The interpreter to start workers with, None when there is no usable one
+    if PYTHON_EXECUTABLE:
+        return PYTHON_EXECUTABLE if os.path.isfile(PYTHON_EXECUTABLE) else None
+    executable = sys.executable or ''
+    if os.path.basename(executable).lower().startswith('python'):
+        return executable
+    # Embedded (ArcMap.exe, ArcGISPro.exe): look next to the interpreter's library
+    for folder in (sys.exec_prefix, os.path.dirname(executable)):
+        for name in PYTHON_NAMES:
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def getPool(modulePath, builderName, workers=None, builderArgs=None):
+    # None when no interpreter is found to start the workers with
+    if workers is None:
+        workers = DEFAULT_WORKERS
+    builderArgs = builderArgs or {}
+    key = (os.path.abspath(modulePath), builderName, workers, tuple(sorted(builderArgs.items())))
+    with _poolsLock:
+        pool = _pools.get(key)
+        if pool is None:
+            executable = pythonExecutable()
+            if executable is None:
+                return None
+            import multiprocessing
+            if executable != sys.executable:
+                multiprocessing.set_executable(executable)
+            pool = multiprocessing.Pool(workers, _initWorker, (modulePath, builderName, builderArgs))
+            _pools[key] = pool
+        return pool
+
+
+def _localBuilder(modulePath, builderName, builderArgs=None):
+    builderArgs = builderArgs or {}
+    key = (os.path.abspath(modulePath), builderName, tuple(sorted(builderArgs.items())))
+    with _poolsLock:
+        builder = _localBuilders.get(key)
+        if builder is None:
+            builder = _localBuilders[key] = getattr(loadModule(modulePath), builderName)(**builderArgs)
+        return builder
+
+
+def shutdown():
+    with _poolsLock:
+        for pool in _pools.values():
+            pool.terminate()
+            pool.join()
+        _pools.clear()
+
+atexit.register(shutdown)
+
+
+def materialize(builtItemsList, spatialReferenceObjects=False, itemURI=None):
+    # Turn portable items into what ArcGIS expects: BuiltItem -> dict, Footprint -> arcpy.Polygon,
+    # and optionally EPSG codes / WKT strings -> arcpy.SpatialReference. With the scene catalog on,
+    # the items of itemURI are written to it first, while the footprints are still plain vertices
+    pending = list()
+    requested = list()
+    _prepare(builtItemsList, spatialReferenceObjects, pending, requested)
+    _fillSolar(requested)
+    catalog.record(itemURI, builtItemsList)
+    _toPolygons(pending)
+    return _export(builtItemsList)
+
+
+def _export(builtItemsList):
+    if builtItemsList is None:
+        return None
+    for builtItem in builtItemsList:
+        builtItem.pop(item.GEOGRAPHIC_EXTENT, None)
+    return [item.export(builtItem) for builtItem in builtItemsList]
+
+
+def _prepare(builtItemsList, spatialReferenceObjects, pending, requested):
+    # Everything but the sun angles and the polygons; the items whose footprint still has
+    # to become a polygon are added to pending as (builtItem, spatial reference of the
+    # polygon), those marked by prt.solar.request to requested
+    if builtItemsList is None:
+        return
+
+    metrics.increment('build.items', len(builtItemsList))
+    for builtItem in builtItemsList:
+        if builtItem.get(item.SOLAR_REQUEST) is not None:
+            requested.append(builtItem)
+
+        srs = builtItem.get('spatialReference')
+        if spatialReferenceObjects and srs:
+            srs = spatial.spatialReference(srs)
+            builtItem['spatialReference'] = srs
+
+        footprint = builtItem.get('footprint')
+        if isinstance(footprint, geometry.Footprint):
+            # The polygon only carries a spatial reference when the builder asked for one
+            polygonSrs = None
+            if footprint.spatialReference and spatialReferenceObjects:
+                polygonSrs = spatial.spatialReference(footprint.spatialReference)
+            pending.append((builtItem, polygonSrs))
+
+
+def _fillSolar(requested):
+    # The sun angles of all requested items in one NumPy call
+    if not requested:
+        return
+    from prt import solar
+    with metrics.stage('solar'):
+        replaced = solar.fillRequested(requested)
+    metrics.increment('solar.items', len(requested))
+    metrics.increment('solar.replaced', len(replaced))
+
+
+def _toPolygons(pending):
+    # All pending footprints -> arcpy.Polygon in one batch
+    if not pending:
+        return
+    with metrics.stage('geometry'):
+        polygons = geometry.toPolygons([builtItem['footprint'] for builtItem, polygonSrs in pending],
+                                       [polygonSrs for builtItem, polygonSrs in pending])
+    for (builtItem, polygonSrs), polygon in zip(pending, polygons):
+        builtItem['footprint'] = polygon
+
+
+def buildMany(modulePath, builderName, itemURIs, workers=None, chunkSize=8, spatialReferenceObjects=False, builderArgs=None):
+    # Returns one entry per itemURI, in order, exactly as builder.build(itemURI) would
+    pool = getPool(modulePath, builderName, workers, builderArgs)
+    itemURIs = list(itemURIs)
+    if pool is None:
+        builder = _localBuilder(modulePath, builderName, builderArgs)
+        built = (builder.buildPortable(itemURI) for itemURI in itemURIs)
+    else:
+        built = pool.imap(_buildPortable, itemURIs, chunkSize)
+    results = list()
+    # The sun angles and the footprints of all items are done in one batch at the end
+    pending = list()
+    requested = list()
+    for itemURI, builtItemsList in zip(itemURIs, built):
+        _prepare(builtItemsList, spatialReferenceObjects, pending, requested)
+        results.append(builtItemsList)
+    _fillSolar(requested)
+    for itemURI, builtItemsList in zip(itemURIs, results):
+        catalog.record(itemURI, builtItemsList)
+    _toPolygons(pending)
+    return [_export(builtItemsList) for builtItemsList in results]
@@ -0,0 +1,154 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+from prt import archive
+from prt import metrics
+
+#############################################################################################
+#############################################################################################
+###
+###     Process-wide cache of parsed metadata files
+###
+###     Crawlers and builders run in the same process and look at the same metadata
+###     file several times per item (tags, product name, build). Every lookup goes
+###     through this cache so each file is parsed once per ingest.
+###
+#############################################################################################
+#############################################################################################
+
+DEFAULT_MAX_MB = 256
+
+# A parsed ElementTree needs roughly this many times the size of the file on disk
+XML_EXPANSION = 10
+JSON_EXPANSION = 6
+
+
+class MetadataCache():
+
+    def __init__(self, maxBytes=DEFAULT_MAX_MB * 1024 * 1024, maxEntries=None):
+        self.maxBytes = maxBytes
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.keysByPath = {}
+        self.currentBytes = 0
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.parses = {}
+
+    def get(self, path, loader, kind, expansion=1):
+        # Entries are keyed by (path, size, mtime) so a file that changes on disk is parsed again
+        st = archive.stat(path)
+        key = (kind, path, st.st_size, st.st_mtime)
+
+        with self.lock:
+            entry = self.__lookup(key)
+            if entry is not None:
+                self.hits += 1
+                metrics.increment('cache.hits')
+                return entry[0]
+            self.misses += 1
+        metrics.increment('cache.misses')
+
+        # Count and time parses per kind of file ('xml', 'json', 'dimap', ...); the time includes the read
+        category = kind.split(':', 1)[0]
+        with metrics.stage('parse:' + category):
+            parsed = loader(path)
+
+        with self.lock:
+            self.parses[category] = self.parses.get(category, 0) + 1
+            self.__store(key, parsed, max(st.st_size, 1) * expansion)
+        return parsed
+
+    def __lookup(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        # Re-insert to mark the entry as most recently used
+        self.entries[key] = entry
+        return entry
+
+    def __store(self, key, value, cost):
+        if cost > self.maxBytes:
+            return
+
+        # Drop a stale entry left over from an older version of the same file
+        staleKey = self.keysByPath.get(key[:2])
+        if staleKey is not None and staleKey != key:
+            self.__evict(staleKey)
+
+        if key in self.entries:
+            self.__evict(key)
+
+        self.entries[key] = (value, cost)
+        self.keysByPath[key[:2]] = key
+        self.currentBytes += cost
+        self.trim()
+
+    def trim(self):
+        # Evict least recently used entries until the cache fits its limits
+        while self.currentBytes > self.maxBytes or (self.maxEntries is not None and len(self.entries) > self.maxEntries):
+            oldestKey = next(iter(self.entries))
+            self.__evict(oldestKey)
+
+    def __evict(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.currentBytes -= entry[1]
+        if self.keysByPath.get(key[:2]) == key:
+            del self.keysByPath[key[:2]]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keysByPath.clear()
+            self.currentBytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                    'entries': len(self.entries),
+                    'bytes': self.currentBytes,
+                    'maxBytes': self.maxBytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'parses': dict(self.parses)
+                   }
+
+
+def _readJson(path):
+    with archive.open(path, 'r') as jsonFile:
+        return json.load(jsonFile)
+
+
+# The memory cap can be set per process with PRT_METADATA_CACHE_MB or with configure()
+metadataCache = MetadataCache(int(os.environ.get('PRT_METADATA_CACHE_MB', DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def configure(maxBytes=None, maxEntries=None):
+    with metadataCache.lock:
+        if maxBytes is not None:
+            metadataCache.maxBytes = maxBytes
+        metadataCache.maxEntries = maxEntries
+        metadataCache.trim()
+
+
+def _parseXml(path):
+    with archive.open(path) as xmlFile:
+        return ET.parse(xmlFile)
+
+
+def parseXml(path):
+    return metadataCache.get(path, _parseXml, 'xml', XML_EXPANSION)
+
+
+def loadJson(path):
+    return metadataCache.get(path, _readJson, 'json', JSON_EXPANSION)
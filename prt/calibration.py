@@ -0,0 +1,312 @@
+import os
+import math
+import struct
+import datetime
+
+import numpy
+
+#############################################################################################
+#############################################################################################
+###
+###     Radiometric calibration from bandProperties
+###
+###     The DIMAP builders (DEIMOS-1, DEIMOS-2, NigeriaSat-2) copy PHYSICAL_GAIN and
+###     PHYSICAL_BIAS of each band into the item's bandProperties as RadianceGain and
+###     RadianceBias. calibrate() applies them to a raster block:
+###
+###         radiance = DN / PHYSICAL_GAIN + PHYSICAL_BIAS           (DIMAP convention)
+###
+###     and, with toa=True, goes on to top-of-atmosphere reflectance
+###
+###         reflectance = pi * radiance * d^2 / (ESUN * sin(sun elevation))
+###
+###     Each band becomes one multiply and one add per pixel, over tiles of rows spread
+###     across a thread pool (NumPy releases the GIL while it works on a tile). Blocks
+###     are (bands, rows, cols) arrays, or memory-mapped raw files from openRaw(), so
+###     only the tiles being worked on need to be in memory.
+###
+###         block = calibration.openRaw('scene.raw', 4, 8000, 8000, 'uint16')
+###         radiance = calibration.calibrate(block, builtItem['keyProperties']['bandProperties'])
+###
+###     openTiff() maps the pixels of an uncompressed single band GeoTIFF the same way.
+###
+#############################################################################################
+#############################################################################################
+
+
+def _cpuCount():
+    try:
+        return os.cpu_count() or 1
+    except AttributeError:
+        # Python 2
+        import multiprocessing
+        return multiprocessing.cpu_count()
+
+
+# Rows per tile; a 4096 column uint16 band tile is 4 MB in and 8 MB out as float32
+TILE_ROWS = 512
+
+DEFAULT_WORKERS = int(os.environ.get('PRT_CALIBRATION_WORKERS', 0)) or None
+
+# How RadianceGain relates DN to radiance:
+#   DIMAP:   radiance = DN / gain + bias    (PHYSICAL_GAIN is in DN per radiance unit)
+#   LINEAR:  radiance = DN * gain + bias    (ArcGIS RadianceGain, Landsat REFLECTANCE_MULT)
+DIMAP = 'dimap'
+LINEAR = 'linear'
+
+INTERLEAVES = ('bsq', 'bil', 'bip')
+
+# ENVI header data type codes
+ENVI_TYPES = {'uint8': 1, 'int16': 2, 'int32': 3, 'float32': 4, 'float64': 5, 'uint16': 12, 'uint32': 13}
+
+# TIFF tags read by openTiff()
+TIFF_WIDTH = 256
+TIFF_LENGTH = 257
+TIFF_BITS = 258
+TIFF_COMPRESSION = 259
+TIFF_STRIP_OFFSETS = 273
+TIFF_SAMPLES = 277
+TIFF_STRIP_BYTES = 279
+TIFF_TILE_WIDTH = 322
+TIFF_SAMPLE_FORMAT = 339
+
+# TIFF field type -> struct format
+TIFF_FIELDS = {1: 'B', 3: 'H', 4: 'I', 8: 'h', 9: 'i', 16: 'Q'}
+
+# SampleFormat -> dtype kind
+TIFF_KINDS = {1: 'u', 2: 'i', 3: 'f'}
+
+
+def coefficients(bandProperties, convention=DIMAP):
+    # [(scale, offset)] per band, such that radiance = DN * scale + offset
+    pairs = list()
+    for bandProperty in bandProperties:
+        gain = bandProperty.get('RadianceGain', bandProperty.get('reflectanceGain'))
+        bias = bandProperty.get('RadianceBias', bandProperty.get('reflectanceBias', 0.0))
+        if gain is None:
+            raise ValueError("band {0} has no gain".format(bandProperty.get('bandName')))
+        gain = float(gain)
+        bias = float(bias or 0.0)
+        if convention == DIMAP and 'RadianceGain' in bandProperty:
+            if gain == 0.0:
+                raise ValueError("band {0} has a zero gain".format(bandProperty.get('bandName')))
+            pairs.append((1.0 / gain, bias))
+        else:
+            pairs.append((gain, bias))
+    return pairs
+
+
+def _property(keyProperties, *names):
+    for name in names:
+        value = keyProperties.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def sunDistance(date):
+    # Earth-sun distance in AU on a date ('YYYY-MM-DD...' or date / datetime)
+    if not isinstance(date, (datetime.date, datetime.datetime)):
+        date = datetime.datetime.strptime(str(date)[:10], '%Y-%m-%d')
+    dayOfYear = date.timetuple().tm_yday
+    return 1.0 - 0.01672 * math.cos(math.radians(0.9856 * (dayOfYear - 4)))
+
+
+def toaFactors(bandProperties, keyProperties, esun, sunElevation=None, distance=None):
+    # Radiance -> reflectance factor per band. esun is a list (per band) or a dict by bandName
+    # of exo-atmospheric solar irradiance in the radiance unit per micron
+    if sunElevation is None:
+        sunElevation = _property(keyProperties, 'sunElevation', 'SunElevation')
+    if sunElevation is None:
+        raise ValueError("the sun elevation is needed for TOA reflectance")
+    if distance is None:
+        distance = _property(keyProperties, 'SunDistance', 'sunDistance')
+    if distance is None:
+        date = _property(keyProperties, 'acquisitionDate', 'AcquisitionDate')
+        if date is None:
+            raise ValueError("the sun distance or acquisition date is needed for TOA reflectance")
+        distance = sunDistance(date)
+
+    sine = math.sin(math.radians(float(sunElevation)))
+    factors = list()
+    for index, bandProperty in enumerate(bandProperties):
+        if isinstance(esun, dict):
+            irradiance = esun.get(bandProperty.get('bandName'))
+        else:
+            irradiance = esun[index] if index < len(esun) else None
+        if not irradiance:
+            raise ValueError("no solar irradiance for band {0}".format(bandProperty.get('bandName')))
+        factors.append(math.pi * float(distance) ** 2 / (float(irradiance) * sine))
+    return factors
+
+
+def openRaw(path, bands, rows, cols, dtype, interleave='bsq', offset=0, mode='r'):
+    # A raw (headerless) raster file as a memory-mapped (bands, rows, cols) view; nothing
+    # is read until a tile is used. mode 'w+' creates the file, e.g. for the output
+    interleave = interleave.lower()
+    if interleave not in INTERLEAVES:
+        raise ValueError("interleave must be one of {0}".format(', '.join(INTERLEAVES)))
+    shape = {'bsq': (bands, rows, cols), 'bil': (rows, bands, cols), 'bip': (rows, cols, bands)}[interleave]
+    data = numpy.memmap(path, dtype=numpy.dtype(dtype), mode=mode, offset=offset, shape=shape)
+    if interleave == 'bil':
+        return data.transpose(1, 0, 2)
+    if interleave == 'bip':
+        return data.transpose(2, 0, 1)
+    return data
+
+
+def writeEnviHeader(path, bands, rows, cols, dtype, interleave='bsq', bandNames=None):
+    # The .hdr next to a raw file, so ArcGIS and GDAL open it as a raster
+    dtype = numpy.dtype(dtype)
+    if dtype.name not in ENVI_TYPES:
+        raise ValueError("no ENVI data type for {0}".format(dtype.name))
+    lines = ['ENVI',
+             'samples = {0}'.format(cols),
+             'lines = {0}'.format(rows),
+             'bands = {0}'.format(bands),
+             'header offset = 0',
+             'file type = ENVI Standard',
+             'data type = {0}'.format(ENVI_TYPES[dtype.name]),
+             'interleave = {0}'.format(interleave),
+             'byte order = {0}'.format(1 if dtype.byteorder == '>' else 0)]
+    if bandNames:
+        lines.append('band names = {{{0}}}'.format(', '.join(bandNames)))
+    headerPath = os.path.splitext(path)[0] + '.hdr'
+    with open(headerPath, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return headerPath
+
+
+def _tiffValues(f, order, fieldType, count, value):
+    # The values of an IFD entry; value is the 4 byte value / offset field
+    code = TIFF_FIELDS.get(fieldType)
+    if code is None:
+        raise ValueError("unsupported TIFF field type {0}".format(fieldType))
+    size = struct.calcsize(code) * count
+    if size > 4:
+        f.seek(struct.unpack(order + 'I', value)[0])
+        value = f.read(size)
+    return struct.unpack(order + code * count, value[:size])
+
+
+def openTiff(path, mode='r'):
+    # The band of a classic, uncompressed, single band TIFF (the Landsat 8 GeoTIFF layout) as
+    # a memory-mapped (rows, cols) view. Its strips must follow one another in the file;
+    # anything else (compressed, tiled, multi-band) raises ValueError
+    with open(path, 'rb') as f:
+        head = f.read(8)
+        if head[:4] not in (b'II*\x00', b'MM\x00*'):
+            raise ValueError("{0}: not a classic TIFF".format(path))
+        order = '<' if head[:2] == b'II' else '>'
+        f.seek(struct.unpack(order + 'I', head[4:8])[0])
+        tags = dict()
+        entries = struct.unpack(order + 'H', f.read(2))[0]
+        directory = f.read(12 * entries)
+        for index in range(entries):
+            tag, fieldType, count = struct.unpack(order + 'HHI', directory[12 * index:12 * index + 8])
+            tags[tag] = (fieldType, count, directory[12 * index + 8:12 * index + 12])
+        values = dict((tag, _tiffValues(f, order, *tags[tag])) for tag in tags
+                      if tag in (TIFF_WIDTH, TIFF_LENGTH, TIFF_BITS, TIFF_COMPRESSION, TIFF_STRIP_OFFSETS,
+                                 TIFF_SAMPLES, TIFF_STRIP_BYTES, TIFF_SAMPLE_FORMAT))
+
+    if TIFF_TILE_WIDTH in tags:
+        raise ValueError("{0}: tiled TIFFs are not supported".format(path))
+    if values.get(TIFF_COMPRESSION, (1,))[0] != 1:
+        raise ValueError("{0}: compressed TIFFs are not supported".format(path))
+    if values.get(TIFF_SAMPLES, (1,))[0] != 1:
+        raise ValueError("{0}: only single band TIFFs are supported".format(path))
+    cols = values[TIFF_WIDTH][0]
+    rows = values[TIFF_LENGTH][0]
+    bits = values.get(TIFF_BITS, (1,))[0]
+    kind = TIFF_KINDS.get(values.get(TIFF_SAMPLE_FORMAT, (1,))[0])
+    if kind is None or bits % 8:
+        raise ValueError("{0}: unsupported sample format".format(path))
+    dtype = numpy.dtype(order + kind + str(bits // 8))
+
+    offsets = values[TIFF_STRIP_OFFSETS]
+    counts = values[TIFF_STRIP_BYTES]
+    for index in range(1, len(offsets)):
+        if offsets[index] != offsets[index - 1] + counts[index - 1]:
+            raise ValueError("{0}: the strips are not contiguous".format(path))
+    if sum(counts) < rows * cols * dtype.itemsize:
+        raise ValueError("{0}: the strips hold fewer bytes than the image".format(path))
+    return numpy.memmap(path, dtype=dtype, mode=mode, offset=offsets[0], shape=(rows, cols))
+
+
+def _tiles(bands, rows, tileRows):
+    return [(band, start, min(start + tileRows, rows)) for band in range(bands) for start in range(0, rows, tileRows)]
+
+
+def _calibrateTile(block, out, band, start, stop, scale, offset, nodata):
+    source = block[band, start:stop]
+    target = out[band, start:stop]
+    numpy.multiply(source, scale, out=target, dtype=target.dtype, casting='unsafe')
+    if offset:
+        numpy.add(target, offset, out=target, dtype=target.dtype, casting='unsafe')
+    if nodata is not None:
+        target[source == nodata] = numpy.nan
+
+
+def applyLinear(block, pairs, out, nodata=None, tileRows=TILE_ROWS, workers=None):
+    # out[band] = block[band] * scale + offset for (scale, offset) in pairs, over tiles of
+    # tileRows rows; both are (bands, rows, cols). Only workers tiles are in memory at once
+    if nodata is not None and out.dtype.kind != 'f':
+        raise ValueError("nodata needs a floating point output")
+    bands, rows, cols = block.shape
+    tiles = _tiles(bands, rows, max(1, tileRows))
+    workers = workers or DEFAULT_WORKERS or _cpuCount()
+    if workers <= 1 or len(tiles) == 1:
+        for band, start, stop in tiles:
+            _calibrateTile(block, out, band, start, stop, pairs[band][0], pairs[band][1], nodata)
+    else:
+        # multiprocessing.pool.ThreadPool is in the standard library on Python 2 as well
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(workers, len(tiles)))
+        try:
+            pool.map(lambda tile: _calibrateTile(block, out, tile[0], tile[1], tile[2],
+                                                 pairs[tile[0]][0], pairs[tile[0]][1], nodata), tiles)
+        finally:
+            pool.close()
+            pool.join()
+
+    if isinstance(out, numpy.memmap):
+        out.flush()
+    return out
+
+
+def calibrate(block, bandProperties, out=None, toa=False, keyProperties=None, esun=None, sunElevation=None,
+              distance=None, nodata=None, convention=DIMAP, dtype='float32', tileRows=TILE_ROWS, workers=None):
+    # block:  (bands, rows, cols) or (rows, cols) array or memmap, bands in bandProperties order
+    # out:    where to write, same shape (e.g. openRaw(..., mode='w+')); allocated when None
+    # toa:    reflectance instead of radiance; needs esun and the sun elevation / date from
+    #         keyProperties (or sunElevation / distance)
+    # nodata: DN written as NaN
+    # Returns out
+    single = block.ndim == 2
+    if single:
+        block = block[numpy.newaxis]
+    bands, rows, cols = block.shape
+    if bands != len(bandProperties):
+        raise ValueError("the block has {0} bands, bandProperties {1}".format(bands, len(bandProperties)))
+
+    pairs = coefficients(bandProperties, convention)
+    if toa:
+        factors = toaFactors(bandProperties, keyProperties or {}, esun, sunElevation, distance)
+        # Folded into the linear coefficients: still one multiply and one add per pixel
+        pairs = [(scale * factor, offset * factor) for (scale, offset), factor in zip(pairs, factors)]
+
+    if out is None:
+        out = numpy.empty((bands, rows, cols), dtype=dtype)
+    elif single and out.ndim == 2:
+        out = out[numpy.newaxis]
+    if out.shape != (bands, rows, cols):
+        raise ValueError("out has shape {0}, expected {1}".format(out.shape, (bands, rows, cols)))
+
+    applyLinear(block, pairs, out, nodata, tileRows, workers)
+    return out[0] if single else out
+
+
+def calibrateItem(builtItem, block, **options):
+    # calibrate() with the bandProperties and keyProperties of a built item
+    keyProperties = builtItem['keyProperties']
+    return calibrate(block, keyProperties['bandProperties'], keyProperties=keyProperties, **options)
@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+
+from prt import geometry
+from prt import item
+
+#############################################################################################
+#############################################################################################
+###
+###     Persistent scene catalog
+###
+###     Every item handed to ArcGIS (batch.materialize) can also be written to a local
+###     SQLite catalog: its item path and tag, key properties, raster paths, footprint
+###     vertices and their bounding box, in the footprint's coordinates and in longitude,
+###     latitude. The geographic boxes are kept in an R-tree, so "which scenes intersect
+###     this AOI" and acquisition date queries over the whole archive are answered from
+###     the catalog instead of a re-crawl, whatever the coordinate system of each sensor:
+###
+###         scenes = SceneCatalog('D:/catalog.sqlite').query(bbox=(30.0, 40.0, 31.0, 41.0),
+###                                                           start='2016-01-01', end='2016-06-30')
+###
+###     The geographic box comes from the builder (item.GEOGRAPHIC_EXTENT: DIMAP
+###     FRAME_LON / FRAME_LAT, PlanetLabs GeoJSON, Landsat CORNER_*_LAT/LON_PRODUCT) or,
+###     for footprints in geographic coordinates, from the footprint itself.
+###
+###     Off unless PRT_CATALOG is set or enable() is called.
+###
+#############################################################################################
+#############################################################################################
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenes (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    productName TEXT NOT NULL,
+    sensor TEXT,
+    productType TEXT,
+    acquisitionDate TEXT,
+    minX REAL,
+    minY REAL,
+    maxX REAL,
+    maxY REAL,
+    minLon REAL,
+    minLat REAL,
+    maxLon REAL,
+    maxLat REAL,
+    spatialReference TEXT,
+    vertices TEXT,
+    rasters TEXT,
+    keyProperties TEXT,
+    updated REAL NOT NULL,
+    UNIQUE (path, tag, productName)
+);
+CREATE INDEX IF NOT EXISTS scenesAcquisitionDate ON scenes (acquisitionDate);
+CREATE INDEX IF NOT EXISTS scenesSensor ON scenes (sensor, acquisitionDate);
+"""
+
+# The triggers keep the R-tree of geographic boxes in step with the scenes table, so rows
+# are written with one executemany and an item built again simply replaces its row
+RTREE_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS sceneGeographicExtents USING rtree (id, minLon, maxLon, minLat, maxLat);
+CREATE TRIGGER IF NOT EXISTS scenesGeographicInsert AFTER INSERT ON scenes WHEN new.minLon IS NOT NULL BEGIN
+    INSERT INTO sceneGeographicExtents (id, minLon, maxLon, minLat, maxLat)
+        VALUES (new.id, new.minLon, new.maxLon, new.minLat, new.maxLat);
+END;
+CREATE TRIGGER IF NOT EXISTS scenesGeographicDelete AFTER DELETE ON scenes BEGIN
+    DELETE FROM sceneGeographicExtents WHERE id = old.id;
+END;
+"""
+
+# Without the R-tree module in the sqlite3 library, bbox queries use this index instead
+FALLBACK_SCHEMA = 'CREATE INDEX IF NOT EXISTS scenesGeographicExtent ON scenes (minLon, maxLon)'
+
+# Catalogs written before the geographic boxes: the boxes are added, filled in from the
+# footprint boxes that are already geographic, and the R-tree of footprint boxes is
+# replaced (the R-tree of geographic boxes is filled from the scenes when it is created)
+UPGRADE_V1 = """
+ALTER TABLE scenes ADD COLUMN minLon REAL;
+ALTER TABLE scenes ADD COLUMN minLat REAL;
+ALTER TABLE scenes ADD COLUMN maxLon REAL;
+ALTER TABLE scenes ADD COLUMN maxLat REAL;
+UPDATE scenes SET minLon = minX, minLat = minY, maxLon = maxX, maxLat = maxY
+    WHERE minX IS NOT NULL AND (spatialReference = '4326' OR spatialReference LIKE 'GEOGCS[%');
+DROP TRIGGER IF EXISTS scenesInsert;
+DROP TRIGGER IF EXISTS scenesDelete;
+DROP TABLE IF EXISTS sceneExtents;
+DROP INDEX IF EXISTS scenesExtent;
+"""
+
+RTREE_FILL = ('INSERT INTO sceneGeographicExtents (id, minLon, maxLon, minLat, maxLat) '
+              'SELECT id, minLon, maxLon, minLat, maxLat FROM scenes WHERE minLon IS NOT NULL')
+
+# Items are written in batches of this size
+BATCH_SIZE = 1000
+
+# Key property names the builders use for the acquisition date, first match wins
+DATE_PROPERTIES = ('acquisitionDate', 'AcquisitionDate', 'DATE_ACQUIRED', 'acquired')
+
+COLUMNS = ('path', 'tag', 'productName', 'sensor', 'productType', 'acquisitionDate',
+           'minX', 'minY', 'maxX', 'maxY', 'minLon', 'minLat', 'maxLon', 'maxLat',
+           'spatialReference', 'vertices', 'rasters', 'keyProperties')
+
+# The JSON columns, only read by query(details=True)
+DETAIL_COLUMNS = ('vertices', 'rasters', 'keyProperties')
+
+catalogPath = None
+
+_lock = threading.Lock()
+_catalog = None
+
+
+def _spatialReferenceText(srs):
+    # EPSG codes and WKT are stored as they are; arcpy.SpatialReference objects by factory code or WKT
+    if srs is None or isinstance(srs, str):
+        return srs
+    if isinstance(srs, int):
+        return str(srs)
+    code = getattr(srs, 'factoryCode', None)
+    if code:
+        return str(code)
+    if hasattr(srs, 'exportToString'):
+        return srs.exportToString()
+    return str(srs)
+
+
+def _isGeographic(srsText):
+    # EPSG:4326 or a geographic WKT
+    return srsText is not None and (srsText == '4326' or srsText.startswith('GEOGCS['))
+
+
+def _acquisitionDate(keyProperties):
+    # 'YYYY-MM-DD', whatever follows the date in the builder's value is left out
+    for name in DATE_PROPERTIES:
+        value = keyProperties.get(name)
+        if value:
+            return str(value)[:10]
+    return None
+
+
+def _date(value):
+    # Query bounds: 'YYYY-MM-DD' strings, or date / datetime objects
+    if value is None:
+        return None
+    return str(value)[:10]
+
+
+class SceneCatalog():
+
+    def __init__(self, dbPath):
+        self.dbPath = dbPath
+        self.connection = sqlite3.connect(dbPath, check_same_thread=False)
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(scenes)')]
+        if columns and 'minLon' not in columns:
+            self.connection.executescript(UPGRADE_V1)
+        self.connection.executescript(SCHEMA)
+        # Rows replaced by INSERT OR REPLACE fire the delete trigger only with this on
+        self.connection.execute('PRAGMA recursive_triggers = ON')
+        try:
+            created = self.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'sceneGeographicExtents'").fetchone()[0] == 0
+            self.connection.executescript(RTREE_SCHEMA)
+            if created:
+                self.connection.execute(RTREE_FILL)
+            self.rtree = True
+        except sqlite3.OperationalError:
+            self.connection.execute(FALLBACK_SCHEMA)
+            self.rtree = False
+        self.connection.commit()
+        self.lock = threading.Lock()
+        self.pending = list()
+
+    def record(self, itemURI, builtItemsList):
+        # One row per built item; an item built again replaces its row
+        path = itemURI.get('path') or itemURI.get('filePath')
+        if path is None:
+            return
+        updated = time.time()
+        rows = list()
+        for builtItem in builtItemsList:
+            keyProperties = builtItem.get('keyProperties') or {}
+            builtItemURI = builtItem.get('itemURI')
+            tag = (builtItemURI.get('tag') if builtItemURI else None) or itemURI.get('tag') or ''
+            productName = itemURI.get('productName') or keyProperties.get('productName') or ''
+
+            vertices = None
+            extent = (None, None, None, None)
+            srs = builtItem.get('spatialReference')
+            footprint = builtItem.get('footprint')
+            if isinstance(footprint, geometry.Footprint) and len(footprint):
+                vertices = json.dumps(footprint.vertices())
+                extent = footprint.extent()
+                if footprint.spatialReference is not None:
+                    srs = footprint.spatialReference
+            srsText = _spatialReferenceText(srs)
+
+            geographicExtent = builtItem.get(item.GEOGRAPHIC_EXTENT)
+            if geographicExtent is None:
+                geographicExtent = extent if _isGeographic(srsText) else (None, None, None, None)
+
+            rows.append((path, tag, productName,
+                         keyProperties.get('SensorName') or keyProperties.get('sensorName'),
+                         keyProperties.get('ProductType') or keyProperties.get('productName'),
+                         _acquisitionDate(keyProperties)) + tuple(extent) + tuple(geographicExtent) +
+                        (srsText, vertices,
+                         json.dumps(item.export(builtItem.get('raster')) or {}, sort_keys=True),
+                         json.dumps(item.export(keyProperties), sort_keys=True, default=str), updated))
+
+        with self.lock:
+            self.pending.extend(rows)
+            if len(self.pending) >= BATCH_SIZE:
+                self.__flush()
+
+    def __flush(self):
+        if not self.pending:
+            return
+        self.connection.executemany('INSERT OR REPLACE INTO scenes ({0}, updated) VALUES ({1})'.format(
+                                    ', '.join(COLUMNS), ', '.join('?' * (len(COLUMNS) + 1))), self.pending)
+        self.pending = list()
+        self.connection.commit()
+
+    def flush(self):
+        with self.lock:
+            self.__flush()
+
+    def query(self, bbox=None, start=None, end=None, sensor=None, spatialReference=None, limit=None, details=True):
+        # Scenes whose geographic bbox intersects bbox (minLon, minLat, maxLon, maxLat) and
+        # whose acquisition date is within [start, end]; every condition is optional. Scenes
+        # without a geographic bbox are never found by bbox. Without details the vertices,
+        # rasters and key properties are not read, which is much faster for queries that
+        # return thousands of scenes
+        where = list()
+        arguments = list()
+        source = 'scenes s'
+        if bbox is not None:
+            minLon, minLat, maxLon, maxLat = bbox
+            if self.rtree:
+                # The R-tree keeps 32-bit boxes rounded outwards; the columns give the exact test
+                source += ' JOIN sceneGeographicExtents e ON e.id = s.id'
+                where.append('e.minLon <= ? AND e.maxLon >= ? AND e.minLat <= ? AND e.maxLat >= ?')
+                arguments.extend((maxLon, minLon, maxLat, minLat))
+            where.append('s.minLon <= ? AND s.maxLon >= ? AND s.minLat <= ? AND s.maxLat >= ?')
+            arguments.extend((maxLon, minLon, maxLat, minLat))
+        # With a bbox, '+' keeps SQLite from driving the query by the date index instead of the R-tree
+        date = '+s.acquisitionDate' if bbox is not None else 's.acquisitionDate'
+        if start is not None:
+            where.append(date + ' >= ?')
+            arguments.append(_date(start))
+        if end is not None:
+            where.append(date + ' <= ?')
+            arguments.append(_date(end))
+        if sensor is not None:
+            where.append('s.sensor = ?')
+            arguments.append(sensor)
+        if spatialReference is not None:
+            where.append('s.spatialReference = ?')
+            arguments.append(_spatialReferenceText(spatialReference))
+
+        columns = COLUMNS if details else tuple(column for column in COLUMNS if column not in DETAIL_COLUMNS)
+        sql = 'SELECT {0} FROM {1}'.format(', '.join('s.' + column for column in columns), source)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY s.acquisitionDate, s.path'
+        if limit is not None:
+            sql += ' LIMIT %d' % int(limit)
+
+        with self.lock:
+            self.__flush()
+            rows = self.connection.execute(sql, arguments).fetchall()
+
+        scenes = list()
+        for row in rows:
+            scene = dict(zip(columns, row))
+            # The footprint bbox in the footprint's coordinates, and the geographic bbox
+            scene['extent'] = None if scene['minX'] is None else (scene['minX'], scene['minY'], scene['maxX'], scene['maxY'])
+            scene['geographicExtent'] = None if scene['minLon'] is None else \
+                                        (scene['minLon'], scene['minLat'], scene['maxLon'], scene['maxLat'])
+            for column in ('minX', 'minY', 'maxX', 'maxY', 'minLon', 'minLat', 'maxLon', 'maxLat'):
+                del scene[column]
+            if not details:
+                scenes.append(scene)
+                continue
+            scene['vertices'] = [tuple(vertex) for vertex in json.loads(scene['vertices'])] if scene['vertices'] else list()
+            scene['rasters'] = json.loads(scene['rasters'])
+            scene['keyProperties'] = json.loads(scene['keyProperties'])
+            scenes.append(scene)
+        return scenes
+
+    def count(self):
+        with self.lock:
+            self.__flush()
+            return self.connection.execute('SELECT COUNT(*) FROM scenes').fetchone()[0]
+
+    def remove(self, paths):
+        # Drops the scenes of metadata files that no longer exist, e.g. CrawlManifest.finishCrawl()'s
+        with self.lock:
+            self.__flush()
+            self.connection.executemany('DELETE FROM scenes WHERE path = ?', [(path,) for path in paths])
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.__flush()
+            self.connection.close()
+
+
+def enable(dbPath):
+    # Built items are written to the catalog at dbPath from now on
+    global catalogPath
+    disable()
+    catalogPath = dbPath
+
+
+def disable():
+    global catalogPath, _catalog
+    with _lock:
+        if _catalog is not None:
+            _catalog.close()
+            _catalog = None
+        catalogPath = None
+
+
+def _open():
+    # The catalog at catalogPath, opened by the first build that writes to it
+    global _catalog
+    with _lock:
+        if _catalog is None:
+            _catalog = SceneCatalog(catalogPath)
+        return _catalog
+
+
+def record(itemURI, builtItemsList):
+    # Called by batch.materialize for every build; does nothing while the catalog is off
+    if catalogPath is None or itemURI is None or not builtItemsList:
+        return
+    _open().record(itemURI, builtItemsList)
+
+
+def remove(paths):
+    # Forgets the scenes of deleted metadata files; does nothing while the catalog is off
+    if catalogPath is None or not paths:
+        return
+    _open().remove(paths)
+
+
+def flush():
+    with _lock:
+        if _catalog is not None:
+            _catalog.flush()
+
+atexit.register(flush)
+
+
+if os.environ.get('PRT_CATALOG'):
+    enable(os.environ['PRT_CATALOG'])
@@ -0,0 +1,89 @@
+import os
+import json
+import time
+
+from prt import files
+
+#############################################################################################
+#############################################################################################
+###
+###     Crawl checkpoints
+###
+###     A checkpoint is a small JSON document with the crawl's traversal position
+###     (directory frontier, last emitted path and tag index). It is rewritten
+###     atomically, at most every `interval` seconds, and never more often than
+###     keeps the time spent writing it under `maxOverhead` of the crawl time.
+###
+#############################################################################################
+#############################################################################################
+
+CHECKPOINT_VERSION = 1
+
+# Seconds between checkpoints; 0 writes one for every emitted item, whatever it costs
+DEFAULT_INTERVAL = float(os.environ.get('PRT_CHECKPOINT_INTERVAL', 30))
+
+# Largest share of the crawl time spent writing checkpoints
+MAX_OVERHEAD = 0.01
+
+
+class Checkpointer():
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL, maxOverhead=MAX_OVERHEAD):
+        self.path = path
+        self.interval = interval
+        self.maxOverhead = maxOverhead
+        self.started = time.time()
+        self.nextDue = self.started + interval
+
+        self.checkpoints = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def load(self):
+        # The last checkpoint written, or None
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if state.get('version') != CHECKPOINT_VERSION:
+            return None
+        return state
+
+    def due(self):
+        return time.time() >= self.nextDue
+
+    def write(self, state):
+        start = time.time()
+        state = dict(state, version=CHECKPOINT_VERSION, written=start)
+        data = json.dumps(state)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        files.replaceFile(temporary, self.path)
+
+        end = time.time()
+        elapsed = end - start
+        self.checkpoints += 1
+        self.seconds += elapsed
+        self.bytes += len(data)
+        # A slow write pushes the next one out far enough to stay under maxOverhead
+        wait = self.interval
+        if self.interval and self.maxOverhead:
+            wait = max(wait, elapsed / self.maxOverhead)
+        self.nextDue = end + wait
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def stats(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        return {
+                'checkpoints': self.checkpoints,
+                'seconds': self.seconds,
+                'bytes': self.bytes,
+                'overhead': self.seconds / elapsed
+               }
@@ -0,0 +1,324 @@
+import os
+
+from prt import archive
+from prt import catalog
+from prt import checkpoint
+from prt import manifest
+from prt import metrics
+from prt import prefetch
+from prt import walk
+
+#############################################################################################
+#############################################################################################
+###
+###     Shared crawl driver for the file based crawlers
+###
+###     The sensor crawlers (Kazakhstan, NigeriaSat-2, PlanetLabs, DEIMOS-2) hand it
+###     their paths, filter and a describe(path) -> (tags, productName) function and
+###     return its itemURIs from next().
+###
+###     Entries of paths can be folders, .zip/.tar/.tar.gz archives, whose matching
+###     members are crawled without extracting them (prt.archive), or files.
+###
+###     Optional crawler properties:
+###         'workers'            - directory listing threads (prt.walk)
+###         'manifest'           - path of a SQLite crawl manifest (prt.manifest)
+###         'incremental'        - with a manifest, only yield new or changed files
+###         'checkpoint'         - path of a checkpoint file (prt.checkpoint); an
+###                                interrupted crawl with the same paths resumes from it
+###         'checkpointInterval' - seconds between checkpoints, 0 for every item
+###         'prefetch'           - read the metadata of this many files ahead on
+###                                background threads (prt.prefetch)
+###         'concurrency'        - Python 3: list folders and read metadata this many
+###                                at a time with asyncio (prt.aiocrawl), for network
+###                                shares; not with a manifest or checkpoint
+###
+#############################################################################################
+#############################################################################################
+
+
+def itemURI(path, tag, productName):
+    return {
+            'path': path,
+            'displayName': os.path.basename(path),
+            'tag': tag,
+            'groupName': os.path.split(os.path.dirname(path))[1],
+            'productName': productName
+           }
+
+
+class SceneCrawler():
+
+    # listPaths(path) expands an entry of paths that is not a folder, e.g. a csv list
+    # of rasters; by default the entry is the file itself
+    def __init__(self, paths, recurse, filter, describe, sensor, options=None, listPaths=None):
+        options = options or {}
+        self.paths = list(paths)
+        self.recurse = recurse
+        self.filter = filter
+        self.describe = describe
+        self.sensor = sensor
+        self.listPaths = listPaths or (lambda path: [path])
+        self.workers = options.get('workers', walk.DEFAULT_WORKERS)
+        self.prefetchDepth = options.get('prefetch', prefetch.DEFAULT_DEPTH)
+        self.incremental = options.get('incremental', False)
+
+        if options.get('concurrency') and (options.get('manifest') or options.get('checkpoint')):
+            # Items come out in completion order, which a manifest or checkpoint cannot follow
+            raise ValueError("the 'concurrency' crawler property does not work with a manifest or checkpoint")
+
+        self.manifest = None
+        if options.get('manifest'):
+            self.manifest = manifest.CrawlManifest(options['manifest'])
+
+        self.checkpointer = None
+        resumeState = None
+        if options.get('checkpoint'):
+            self.checkpointer = checkpoint.Checkpointer(options['checkpoint'],
+                                                        options.get('checkpointInterval', checkpoint.DEFAULT_INTERVAL))
+            resumeState = self.__resumable(self.checkpointer.load())
+
+        # Traversal position, kept up to date for checkpoints
+        self.rootIndex = 0
+        self.walker = None
+        self.listOffset = 0
+        self.currentPath = None
+        self.currentTagIndex = -1
+        self.emitted = 0
+        self.prefetcher = None
+        self.prefetchers = list()
+
+        # Filled in when the crawl is over
+        self.deletedPaths = None
+
+        if options.get('concurrency'):
+            self.items = self.__concurrentItems(options['concurrency'])
+        else:
+            self.items = self.__generateItems(resumeState)
+
+    def __concurrentItems(self, concurrency):
+        try:
+            from prt import aiocrawl
+        except SyntaxError:
+            raise ValueError("the 'concurrency' crawler property needs Python 3")
+        return aiocrawl.SyncAdapter(aiocrawl.AsyncCrawler(self.paths, self.recurse, self.filter, self.describe,
+                                                          self.sensor, concurrency, self.listPaths))
+
+    def __resumable(self, state):
+        # A checkpoint only applies to the same crawl
+        if state is None:
+            return None
+        if (state.get('sensor') != self.sensor or state.get('paths') != self.paths or
+                state.get('filter') != self.filter or state.get('recurse') != self.recurse):
+            print ("checkpoint {0} is for a different crawl, starting over".format(self.checkpointer.path))
+            return None
+        print ("resuming crawl from {0}, {1} items were already emitted".format(self.checkpointer.path, state['emitted']))
+        return state
+
+    def __files(self, root, resumeState=None):
+        # Sets up the traversal of root right away, so that its position can be
+        # checkpointed, and returns a generator of (path, stat) pairs
+        if os.path.isdir(root):
+            withStat = self.manifest is not None
+            if resumeState is not None:
+                self.walker = walk.ParallelWalker(resumeState['pendingDirs'], self.filter, self.recurse, self.workers,
+                                                  withStat=withStat, listedDirs=resumeState['listedDirs'])
+            else:
+                self.walker = walk.ParallelWalker([root], self.filter, self.recurse, self.workers, withStat=withStat)
+            return self.__walkedFiles(withStat)
+
+        self.listOffset = resumeState['listOffset'] if resumeState is not None else 0
+        if archive.isArchive(root):
+            return self.__listedFiles(archive.members(root, walk.compileFilter(self.filter)), self.listOffset)
+        return self.__listedFiles(self.listPaths(root), self.listOffset)
+
+    def __walkedFiles(self, withStat):
+        # stat is only collected when a manifest needs it
+        for found in self.walker:
+            if withStat:
+                yield found
+            else:
+                yield found, None
+        self.walker = None
+
+    def __listedFiles(self, paths, skip):
+        for index, path in enumerate(paths):
+            if index < skip:
+                continue
+            self.listOffset = index + 1
+            yield path, self.__stat(path)
+
+    def __stat(self, path):
+        if self.manifest is None:
+            return None
+        return archive.stat(path)
+
+    def __prefetched(self, files):
+        # (path, st, prefetched) for each file; prefetched holds describe(path), run ahead
+        if not self.prefetchDepth:
+            for path, st in files:
+                yield path, st, None
+            return
+
+        self.prefetcher = prefetch.Prefetcher(files, self.__prefetchDescribe, self.prefetchDepth, select=self.__needsDescribe)
+        self.prefetchers.append(self.prefetcher)
+        for (path, st), prefetched in self.prefetcher:
+            yield path, st, prefetched
+        self.prefetcher = None
+
+    def __prefetchDescribe(self, entry):
+        return self.describe(entry[0])
+
+    def __needsDescribe(self, entry):
+        # Files the manifest will serve are not read ahead
+        return self.manifest is None or self.manifest.lookup(entry[0], entry[1], self.sensor) is None
+
+    def __describe(self, path, st, resumed=False, prefetched=None):
+        # Returns (tags, productName), or None when the file should not be yielded
+        if self.manifest is None:
+            if prefetched is not None:
+                return prefetched.result()
+            return self.describe(path)
+
+        entry = self.manifest.lookup(path, st, self.sensor)
+        if entry is not None:
+            # Unchanged since the last crawl: served from the manifest, the file is not opened
+            self.manifest.markSeen(path, self.sensor)
+            if self.incremental and not resumed:
+                return None
+            return entry['tags'], entry['productType']
+
+        if prefetched is not None:
+            tags, productName = prefetched.result()
+        else:
+            tags, productName = self.describe(path)
+        self.manifest.record(path, st, self.sensor, tags, productName, self.filter)
+        return tags, productName
+
+    def __items(self, path, st, firstTag=0, resumed=False, prefetched=None):
+        described = self.__describe(path, st, resumed, prefetched)
+        if described is None:
+            return
+
+        tags, productName = described
+        if not tags:
+            return
+
+        self.currentPath = path
+        for tagIndex in range(firstTag, len(tags)):
+            self.currentTagIndex = tagIndex
+            yield itemURI(path, tags[tagIndex], productName)
+
+    def __generateItems(self, resumeState):
+        firstRoot = 0
+        if resumeState is not None:
+            firstRoot = resumeState['rootIndex']
+            self.emitted = resumeState['emitted']
+
+        if self.manifest is not None:
+            if resumeState is not None and resumeState.get('crawlId') is not None:
+                self.manifest.resumeCrawl(resumeState['crawlId'])
+            else:
+                self.manifest.beginCrawl()
+
+        for rootIndex in range(firstRoot, len(self.paths)):
+            self.rootIndex = rootIndex
+            root = self.paths[rootIndex]
+
+            if resumeState is not None and rootIndex == firstRoot:
+                files = self.__files(root, resumeState)
+                # The rest of the tags of the file that was being emitted
+                path = resumeState.get('path')
+                if path and archive.exists(path):
+                    for item in self.__items(path, self.__stat(path), resumeState['tagIndex'] + 1, True):
+                        yield item
+                # Files that were read ahead but not emitted
+                for path in resumeState.get('prefetchedPaths', list()):
+                    if archive.exists(path):
+                        for item in self.__items(path, self.__stat(path)):
+                            yield item
+            else:
+                files = self.__files(root)
+
+            for path, st, prefetched in self.__prefetched(files):
+                for item in self.__items(path, st, prefetched=prefetched):
+                    yield item
+
+        if self.manifest is not None:
+            roots = [path for path in self.paths if os.path.isdir(path)]
+            self.deletedPaths = self.manifest.finishCrawl(roots, self.sensor, self.filter, self.recurse)
+            if self.deletedPaths:
+                print ("{0} files deleted since the last crawl".format(len(self.deletedPaths)))
+                catalog.remove(self.deletedPaths)
+            self.manifest.close()
+
+        if self.checkpointer is not None:
+            # Nothing left to resume
+            self.checkpointer.remove()
+
+        metrics.flush()
+
+    def state(self):
+        # Traversal position after the last emitted item
+        state = {
+                  'sensor': self.sensor,
+                  'paths': self.paths,
+                  'filter': self.filter,
+                  'recurse': self.recurse,
+                  'rootIndex': self.rootIndex,
+                  'listOffset': self.listOffset,
+                  'path': self.currentPath,
+                  'tagIndex': self.currentTagIndex,
+                  'emitted': self.emitted,
+                  'crawlId': self.manifest.crawlId if self.manifest is not None else None,
+                  'pendingDirs': list(),
+                  'listedDirs': list(),
+                  'prefetchedPaths': list()
+                }
+        if self.walker is not None:
+            state.update(self.walker.snapshot())
+        if self.prefetcher is not None:
+            # Taken from the walker already, so not in its snapshot
+            state['prefetchedPaths'] = [path for path, st in self.prefetcher.pending()]
+        return state
+
+    def checkpoint(self):
+        # Writes a checkpoint now; the manifest is flushed first so both agree
+        if self.checkpointer is None:
+            return
+        if self.manifest is not None:
+            self.manifest.flush()
+        self.checkpointer.write(self.state())
+
+    def checkpointStats(self):
+        if self.checkpointer is None:
+            return None
+        return self.checkpointer.stats()
+
+    def prefetchStats(self):
+        # hits, misses (the crawl waited for a file) and stall time, over all roots
+        if not self.prefetchDepth:
+            return None
+        totals = {'depth': self.prefetchDepth, 'hits': 0, 'misses': 0, 'skipped': 0, 'stallSeconds': 0.0}
+        for prefetcher in self.prefetchers:
+            stats = prefetcher.stats()
+            for key in ('hits', 'misses', 'skipped', 'stallSeconds'):
+                totals[key] += stats[key]
+        waited = totals['hits'] + totals['misses']
+        totals['hitRate'] = float(totals['hits']) / waited if waited else None
+        return totals
+
+    def next(self):
+        # Returns the next itemURI, or None when the crawl is over. The checkpoint
+        # includes the returned item, so a resumed crawl starts after it.
+        with metrics.stage('crawl', self.sensor):
+            try:
+                item = next(self.items)
+            except StopIteration:
+                return None
+
+            self.emitted += 1
+            metrics.increment('crawl.items')
+            if self.checkpointer is not None and self.checkpointer.due():
+                self.checkpoint()
+            return item
@@ -0,0 +1,511 @@
+import os
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+from prt import archive
+from prt import cache
+from prt import geometry
+from prt import item
+
+#############################################################################################
+#############################################################################################
+###
+###     Streaming DIMAP metadata extractor
+###
+###     Walks the .dim file with a pull parser, keeps only the requested values, clears
+###     every element once it has been looked at and stops reading as soon as all
+###     requested paths are complete. Subtrees that hold nothing requested (ephemeris,
+###     attitude, ...) are still parsed, but skipped without any lookups.
+###
+#############################################################################################
+#############################################################################################
+
+# Extracted values are small compared to the file they came from
+DIMAP_EXPANSION = 1
+
+# Containers that occur at most once in their parent. A requested path is complete once
+# one of its ancestors made only of these steps has closed; anything that can repeat,
+# such as Dataset_Sources/Source_Information or Data_Access/Data_File, keeps its paths
+# open until the root closes.
+UNIQUE_CONTAINERS = frozenset(('Metadata_Id', 'Dataset_Id', 'Dataset_Frame', 'Dataset_Use', 'Dataset_Sources',
+                               'Production', 'Coordinate_Reference_System', 'Horizontal_CS', 'Geoposition',
+                               'Raster_Dimensions', 'Raster_Encoding', 'Data_Processing', 'Data_Access',
+                               'Image_Display', 'Image_Interpretation'))
+
+
+class _PathInfo():
+
+    def __init__(self, path):
+        self.path = path
+        self.texts = list()
+        self.attributes = list()
+        self.records = list()
+        self.completes = list()
+        self.isRecord = False
+        self.insideRecord = False
+
+
+def _splitPath(path):
+    return tuple(path.strip('/').split('/'))
+
+
+def _matches(pattern, path):
+    if len(pattern) != len(path):
+        return False
+    return _matchesPrefix(pattern, path)
+
+
+def _matchesPrefix(pattern, path):
+    # True when path matches the first len(path) steps of pattern
+    if len(path) > len(pattern):
+        return False
+    for step, tag in zip(pattern, path):
+        if step != '*' and step != tag:
+            return False
+    return True
+
+
+# Bytes read from the file at a time
+CHUNK_SIZE = 1 << 16
+
+
+class DimapExtractor():
+
+    # texts:   'A/B/C' collects the text of every C element, 'A/B/C@href' collects an attribute
+    # records: 'A/B' collects every B element as a {childTag: childText} dictionary;
+    #          a '*' step matches any tag, e.g. 'Image_Interpretation/*'
+    # Paths are relative to the root element, as for ElementTree.findall
+    def __init__(self, texts=(), records=(), stopEarly=True):
+        self.texts = list(texts)
+        self.records = list(records)
+        self.stopEarly = stopEarly
+        self.kind = 'dimap:' + '|'.join(sorted(self.texts) + ['#' + r for r in sorted(self.records)])
+
+        self.textPatterns = list()
+        for key in self.texts:
+            attribute = None
+            path = key
+            if '@' in key:
+                path, attribute = key.rsplit('@', 1)
+            self.textPatterns.append((key, _splitPath(path), attribute))
+
+        self.recordPatterns = [(key, _splitPath(key)) for key in self.records]
+
+        # A path is complete once an ancestor that cannot repeat has closed; this also
+        # covers optional paths whose parent is missing from the file. The root always
+        # counts as such an ancestor, a repeating or wildcard step and below never do.
+        self.completeOn = {}
+        for key, pattern in [(k, p) for k, p, a in self.textPatterns] + self.recordPatterns:
+            for i in range(len(pattern)):
+                ancestor = pattern[:i]
+                if ancestor and ancestor[-1] not in UNIQUE_CONTAINERS:
+                    break
+                self.completeOn.setdefault(ancestor, list()).append(key)
+
+        # Every element path seen so far that holds something we want gets a state; the
+        # transitions table maps (parent state, tag) to the child state, or None for
+        # subtrees that hold nothing we want and are skipped without any lookups.
+        self.states = [self.__newState(())]
+        self.transitions = {}
+
+    def __newState(self, path):
+        info = _PathInfo(path)
+        for key, pattern, attribute in self.textPatterns:
+            if _matches(pattern, path):
+                if attribute is None:
+                    info.texts.append(key)
+                else:
+                    info.attributes.append((key, attribute))
+
+        for key, pattern in self.recordPatterns:
+            if _matches(pattern, path):
+                info.records.append(key)
+                info.isRecord = True
+            if path and _matches(pattern, path[:-1]):
+                info.insideRecord = True
+
+        info.completes = self.completeOn.get(path, list())
+        return info
+
+    def __childState(self, parent, tag):
+        key = (parent, tag)
+        if key in self.transitions:
+            return self.transitions[key]
+
+        parentInfo = self.states[parent]
+        path = parentInfo.path + (tag,)
+        state = None
+        wanted = parentInfo.isRecord
+        if not wanted:
+            for pattern in [p for k, p, a in self.textPatterns] + [p for k, p in self.recordPatterns]:
+                if _matchesPrefix(pattern, path):
+                    wanted = True
+                    break
+
+        if wanted:
+            state = len(self.states)
+            self.states.append(self.__newState(path))
+
+        self.transitions[key] = state
+        return state
+
+    def extract(self, source):
+        # source is a file path or a file object; returns {path: [values]}
+        if hasattr(source, 'read'):
+            return self.__extract(source)
+        # Open the file here so it is closed straight away when the scan stops early
+        with archive.open(source) as f:
+            return self.__extract(f)
+
+    def __events(self, source):
+        if not hasattr(ET, 'XMLPullParser'):
+            # Python 2
+            for event in ET.iterparse(source, events=('start', 'end')):
+                yield event
+            return
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        for data in iter(lambda: source.read(CHUNK_SIZE), b''):
+            parser.feed(data)
+            for event in parser.read_events():
+                yield event
+        parser.close()
+        for event in parser.read_events():
+            yield event
+
+    def __extract(self, source):
+        values = dict((key, list()) for key in self.texts + self.records)
+        remaining = set(values)
+        states = self.states
+        transitions = self.transitions
+
+        stack = [0]
+        # The open elements of a subtree that holds nothing we want
+        skipped = list()
+        root = None
+        for event, elem in self.__events(source):
+            if skipped:
+                if event == 'start':
+                    skipped.append(elem)
+                    continue
+                skipped.pop()
+                if skipped:
+                    # A closed element is the last child of its parent; dropping it keeps
+                    # long runs of skipped siblings (ephemeris points) out of memory
+                    del skipped[-1][-1]
+                else:
+                    elem.clear()
+                    if len(stack) == 1:
+                        root.clear()
+                continue
+
+            if event == 'start':
+                if root is None:
+                    root = elem
+                    continue
+                state = transitions.get((stack[-1], elem.tag), -1)
+                if state == -1:
+                    state = self.__childState(stack[-1], elem.tag)
+                if state is None:
+                    skipped.append(elem)
+                else:
+                    stack.append(state)
+                continue
+
+            info = states[stack.pop()]
+            for key in info.texts:
+                values[key].append(elem.text)
+            for key, attribute in info.attributes:
+                values[key].append(elem.get(attribute))
+            for key in info.records:
+                values[key].append(dict((child.tag, child.text) for child in elem))
+
+            if info.completes:
+                for key in info.completes:
+                    remaining.discard(key)
+                if self.stopEarly and not remaining:
+                    break
+
+            if elem is root:
+                break
+
+            if not info.insideRecord:
+                elem.clear()
+                if len(stack) == 1:
+                    # Drop the cleared top level element from the root as well
+                    root.clear()
+
+        return values
+
+
+def readMetadata(path, extractor):
+    # One extraction per file and extractor per ingest, shared through the metadata cache
+    return cache.metadataCache.get(path, extractor.extract, extractor.kind, DIMAP_EXPANSION)
+
+
+def firstValue(values, key, default=None):
+    found = values.get(key)
+    if found:
+        return found[0]
+    return default
+
+
+def lastValue(values, key, default=None):
+    found = values.get(key)
+    if found:
+        return found[-1]
+    return default
+
+
+#############################################################################################
+#############################################################################################
+###
+###     Declarative DIMAP sensor profiles
+###
+###     A sensor is described by where its values live in the .dim file; the profile
+###     compiles that into one DimapExtractor (a single pass over the file) and a
+###     dispatch table from extracted paths to item fields, and builds the item from it.
+###
+#############################################################################################
+#############################################################################################
+
+SCENE_SOURCE = 'Dataset_Sources/Source_Information/Scene_Source'
+
+BAND_COUNT = 'Raster_Dimensions/NBANDS'
+PRODUCT_TYPE = 'Production/PRODUCT_TYPE'
+
+
+def _epsgCode(text):
+    # 'EPSG:32633' -> 32633
+    return int(text.split(':')[-1])
+
+
+class DimapProfile():
+
+    # sensorName:        the SensorName key property
+    # rasterPath:        path of the raster file name, relative to the .dim file
+    # spatialReference:  paths tried in order for the spatial reference, read as an EPSG
+    #                    code ('HORIZONTAL_CS_CODE') or, with wkt=True, as a WKT string
+    # footprint:         records with FRAME_X / FRAME_Y
+    # bands:             records with BAND_DESCRIPTION / PHYSICAL_GAIN / PHYSICAL_BIAS / PHYSICAL_UNIT
+    # bandNames:         BAND_DESCRIPTION -> bandName, e.g. {'NIR': 'NearInfrared'}
+    # keyProperties:     [{'key': 'sunElevation', 'paths': [...], 'type': float, 'join': 'T'}]
+    #                    the first path found gives the value; with 'join' all found values are joined
+    # parameters:        {'records': path, 'name': child, 'value': child, 'keys': {substring: key}}
+    #                    for name/value tables such as Quality_Assessment
+    # tagsFromBandCount: tags and item tag follow NBANDS (1 -> Pan, 3 or more -> MS); otherwise 'MS'
+    # passItemURI:       the built item carries the crawler's itemURI instead of {'tag': ...}
+    # variables:         raster function variables for the built item
+    # multipleValues:    'first' or 'last', which value is used when a path occurs more than once
+    # productType:       the same for PRODUCT_TYPE, which the crawlers have always read as 'first'
+    # noSpatialReference: the spatialReference of items whose .dim file has none of the paths
+    # solarAngles:       'fill' computes the sun angles missing from the metadata (prt.solar) from the
+    #                    acquisition time and the FRAME_LAT / FRAME_LON centre; 'verify' also replaces
+    #                    metadata angles that disagree with the computed ones. The items are only
+    #                    marked here; batch.materialize / buildMany compute them all in one call
+    def __init__(self, sensorName, rasterPath, spatialReference, footprint, wkt=False, bands=None, bandNames=None,
+                 keyProperties=(), parameters=None, tagsFromBandCount=True, passItemURI=False, variables=None,
+                 footprintSpatialReference=False, multipleValues='last', productType='first', noSpatialReference=0,
+                 solarAngles=None):
+        self.sensorName = sensorName
+        self.rasterPath = rasterPath
+        self.spatialReferencePaths = list(spatialReference)
+        self.wkt = wkt
+        self.footprint = footprint
+        self.bands = bands
+        self.bandNames = bandNames or {}
+        self.parameters = parameters
+        self.tagsFromBandCount = tagsFromBandCount
+        self.passItemURI = passItemURI
+        self.variables = variables
+        self.footprintSpatialReference = footprintSpatialReference
+        self.pick = lastValue if multipleValues == 'last' else firstValue
+        self.pickProductType = lastValue if productType == 'last' else firstValue
+        self.noSpatialReference = noSpatialReference
+        self.solarAngles = solarAngles
+
+        # Dispatch table: (key, paths, convert, join) for every key property
+        self.keyProperties = list()
+        for field in keyProperties:
+            paths = field.get('paths') or [field['path']]
+            self.keyProperties.append((field['key'], paths, field.get('type'), field.get('join')))
+
+        self.extractor = self.__compile()
+
+    def __compile(self):
+        # Everything the profile reads, in one extractor
+        texts = [BAND_COUNT, PRODUCT_TYPE, self.rasterPath] + self.spatialReferencePaths
+        for key, paths, convert, join in self.keyProperties:
+            texts.extend(paths)
+        records = [self.footprint]
+        if self.bands:
+            records.append(self.bands)
+        if self.parameters:
+            records.append(self.parameters['records'])
+
+        unique = list()
+        for path in texts:
+            if path not in unique:
+                unique.append(path)
+        return DimapExtractor(texts=unique, records=records)
+
+    def read(self, path):
+        return readMetadata(path, self.extractor)
+
+    def getBandCount(self, values):
+        return int(self.pick(values, BAND_COUNT, 0))
+
+    def getTags(self, values):
+        # Tags from the band count of the dim file
+        if not self.tagsFromBandCount:
+            return ['MS']
+        tags = list()
+        for nBands in values[BAND_COUNT]:
+            numBands = int(nBands)
+            if numBands == 1:
+                tags.append('Pan')
+            if numBands >= 3:
+                tags.append('MS')
+        return tags
+
+    def getProductName(self, values):
+        return self.pickProductType(values, PRODUCT_TYPE)
+
+    def getSpatialReference(self, values):
+        for path in self.spatialReferencePaths:
+            text = self.pick(values, path)
+            if text is not None:
+                if self.wkt:
+                    return text
+                return _epsgCode(text)
+        return self.noSpatialReference
+
+    def getKeyProperties(self, values):
+        metadata = {}
+        for key, paths, convert, join in self.keyProperties:
+            found = [self.pick(values, path) for path in paths]
+            if join is not None:
+                # The first path is required, the others are appended when present
+                if found[0] is not None:
+                    metadata[key] = join.join([value for value in found if value is not None])
+                continue
+            found = [value for value in found if value is not None]
+            if not found:
+                continue
+            if convert is not None:
+                metadata[key] = convert(found[0])
+            else:
+                metadata[key] = found[0]
+
+        if self.parameters:
+            for parameter in values[self.parameters['records']]:
+                name = parameter.get(self.parameters['name'])
+                if name is None:
+                    continue
+                for substring, key in self.parameters['keys'].items():
+                    if substring in name:
+                        metadata[key] = float(parameter[self.parameters['value']])
+                        break
+        return metadata
+
+    def getBandProperties(self, values):
+        # Band info - gain, bias etc
+        bandProperties = list()
+        for band_info in values[self.bands]:
+            bandProperty = {}
+            description = band_info.get('BAND_DESCRIPTION')
+            bandProperty['bandName'] = self.bandNames.get(description, description)
+
+            gain = band_info.get('PHYSICAL_GAIN')
+            if gain is not None:
+                bandProperty['RadianceGain'] = float(gain)
+
+            bias = band_info.get('PHYSICAL_BIAS')
+            if bias is not None:
+                bandProperty['RadianceBias'] = float(bias)
+
+            unit = band_info.get('PHYSICAL_UNIT')
+            if unit is not None:
+                bandProperty['unit'] = unit
+
+            bandProperties.append(bandProperty)
+        return bandProperties
+
+    def getFrameLonLat(self, values):
+        # The FRAME_LON / FRAME_LAT of the footprint vertices, whatever the footprint's CRS
+        longitudes = [float(vertex['FRAME_LON']) for vertex in values[self.footprint] if vertex.get('FRAME_LON') is not None]
+        latitudes = [float(vertex['FRAME_LAT']) for vertex in values[self.footprint] if vertex.get('FRAME_LAT') is not None]
+        return longitudes, latitudes
+
+    def requestSolarAngles(self, builtItem, values):
+        # numpy is only needed by profiles that use it
+        from prt import solar
+        verify = self.solarAngles == 'verify'
+        if not verify and not solar.missingAngle(builtItem['keyProperties']):
+            return
+        longitudes, latitudes = self.getFrameLonLat(values)
+        if latitudes and len(latitudes) == len(longitudes):
+            centre = (sum(latitudes) / len(latitudes), sum(longitudes) / len(longitudes))
+        else:
+            # Without FRAME_LAT / FRAME_LON, the footprint when it is geographic
+            centre = (None, None)
+        solar.request(builtItem, centre[0], centre[1], verify=verify)
+
+    def buildPortable(self, itemURI):
+        path = itemURI['path']
+        values = self.read(path)
+
+        # Dataset path
+        fileName = self.pick(values, self.rasterPath)
+        if fileName is None:
+            print ("path not found")
+            return None
+        fullPath = os.path.join(os.path.dirname(path), fileName)
+
+        srs = self.getSpatialReference(values)
+
+        # dataset frame - footprint; this is a list of Vertex coordinates, appended to the
+        # footprint's array as they are converted
+        footprint_geometry = geometry.Footprint(srs if self.footprintSpatialReference else None)
+        coordinates = footprint_geometry.coordinates
+        for vertex in values[self.footprint]:
+            frame_x = vertex.get('FRAME_X')
+            frame_y = vertex.get('FRAME_Y')
+            if frame_x is not None and frame_y is not None:
+                coordinates.append(float(frame_x))
+                coordinates.append(float(frame_y))
+
+        metadata = self.getKeyProperties(values)
+        metadata['SensorName'] = self.sensorName
+        if self.bands:
+            metadata['bandProperties'] = self.getBandProperties(values)
+        metadata['ProductType'] = self.getProductName(values)
+
+        if self.passItemURI:
+            builtItemURI = itemURI
+        elif self.tagsFromBandCount and self.getBandCount(values) == 1:
+            builtItemURI = {'tag': 'Pan'}
+        else:
+            builtItemURI = {'tag': 'MS'}
+
+        # Assemble everything into a compact item; it becomes a dictionary when handed to ArcGIS
+        builtItem = item.BuiltItem()
+        builtItem['spatialReference'] = srs
+        builtItem['raster'] = { 'Raster1' : fullPath }
+        builtItem['footprint'] = footprint_geometry
+        builtItem['keyProperties'] = metadata
+        if self.variables is not None:
+            builtItem['variables'] = dict(self.variables)
+        builtItem['itemURI'] = builtItemURI
+        geographicExtent = geometry.geographicExtent(*self.getFrameLonLat(values))
+        if geographicExtent is not None:
+            builtItem[item.GEOGRAPHIC_EXTENT] = geographicExtent
+
+        if self.solarAngles:
+            self.requestSolarAngles(builtItem, values)
+
+        builtItemsList = list()
+        builtItemsList.append(builtItem)
+        return builtItemsList
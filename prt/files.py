@@ -0,0 +1,21 @@
+import os
+
+#############################################################################################
+#############################################################################################
+###
+###     File helpers shared by the modules that write files next to the crawl:
+###     checkpoints (prt.checkpoint), the RPC disk cache (prt.rpc) and the metrics
+###     summaries (prt.metrics)
+###
+#############################################################################################
+#############################################################################################
+
+
+def replaceFile(source, destination):
+    try:
+        os.replace(source, destination)
+    except AttributeError:
+        # Python 2: rename does not overwrite on Windows
+        if os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
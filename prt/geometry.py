@@ -0,0 +1,95 @@
+from array import array
+
+#############################################################################################
+#############################################################################################
+###
+###     Picklable footprint geometry
+###
+###     Builders collect footprint vertices here; the arcpy.Polygon is only created
+###     by toPolygon / toPolygons, in the process that hands the item to ArcGIS.
+###
+###     The vertices are kept as one contiguous array('d') of x0, y0, x1, y1, ...
+###     rather than as a list of per-vertex Python objects. A four-corner footprint
+###     takes about 130 bytes instead of about 500, and pickles to workers as a single
+###     buffer. Builders append each value to the array as they convert it, without a
+###     temporary list; that takes about as long as building the per-vertex lists did.
+###     Every vertex is boxed again when the polygon is made.
+###
+#############################################################################################
+#############################################################################################
+
+
+# __slots__ needs a new-style class on Python 2
+class Footprint(object):
+
+    __slots__ = ('coordinates', 'spatialReference')
+
+    # coordinates: flat x0, y0, x1, y1, ... values, or their float64 bytes
+    def __init__(self, spatialReference=None, coordinates=()):
+        self.coordinates = array('d', coordinates)
+        self.spatialReference = spatialReference
+
+    def add(self, x, y):
+        self.coordinates.append(x)
+        self.coordinates.append(y)
+
+    def __len__(self):
+        return len(self.coordinates) // 2
+
+    def __getstate__(self):
+        return (self.coordinates, self.spatialReference)
+
+    def __setstate__(self, state):
+        self.coordinates, self.spatialReference = state
+
+    def vertices(self):
+        # [(x, y), ...]
+        return list(zip(self.coordinates[0::2], self.coordinates[1::2]))
+
+    def extent(self):
+        # (minX, minY, maxX, maxY); None without vertices
+        if not self.coordinates:
+            return None
+        xs = self.coordinates[0::2]
+        ys = self.coordinates[1::2]
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def toNumpy(self):
+        # An (n, 2) float64 view of the vertices, without copying them
+        import numpy
+        return numpy.frombuffer(self.coordinates, dtype=numpy.float64).reshape(-1, 2)
+
+    def toPolygon(self, spatialReference=None):
+        return toPolygons([self], [spatialReference])[0]
+
+
+def geographicExtent(longitudes, latitudes):
+    # (minLon, minLat, maxLon, maxLat) of a scene's corner coordinates; None when any is missing
+    if not longitudes or len(longitudes) != len(latitudes) or None in longitudes or None in latitudes:
+        return None
+    return (min(longitudes), min(latitudes), max(longitudes), max(latitudes))
+
+
+def toPolygons(footprints, spatialReferences=None):
+    # arcpy.Polygon for each footprint; spatialReferences, when given, has one entry
+    # (or None) per footprint. arcpy is looked up once and one arcpy.Array is filled and
+    # emptied again for every footprint of the batch; Polygon copies the vertices
+    import arcpy
+    Point = arcpy.Point
+    Polygon = arcpy.Polygon
+
+    points = arcpy.Array()
+    add = points.add
+    polygons = list()
+    for index, footprint in enumerate(footprints):
+        # Pairs straight from the buffer, without slicing it
+        values = iter(footprint.coordinates)
+        for x, y in zip(values, values):
+            add(Point(x, y))
+        spatialReference = spatialReferences[index] if spatialReferences is not None else None
+        if spatialReference is None:
+            polygons.append(Polygon(points))
+        else:
+            polygons.append(Polygon(points, spatialReference))
+        points.removeAll()
+    return polygons
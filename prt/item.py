@@ -0,0 +1,236 @@
+import sys
+
+#############################################################################################
+#############################################################################################
+###
+###     Compact built items
+###
+###     buildPortable() returns BuiltItem records instead of freshly assembled nested
+###     dicts. A BuiltItem keeps the keys ArcGIS knows in __slots__, and its nested
+###     dicts (itemURI, raster, keyProperties and the bandProperties in it, variables)
+###     become KeyProperties records that keep only a list of values: the names live in
+###     a tuple shared by every record with the same keys. Strings repeated on every
+###     item (sensor names, instruments, product types, tags, band names, WKT) are interned.
+###
+###     Both read like the dicts they replace (item['keyProperties']['SensorName'],
+###     item.get('footprint')), and export() turns them into those dicts when the item
+###     is handed to ArcGIS (batch.materialize).
+###
+#############################################################################################
+#############################################################################################
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    # Python 2
+    _intern = intern
+
+# Properties whose string values are interned
+INTERNED_PROPERTIES = frozenset(['SensorName', 'sensorName', 'Instrument', 'ProductType', 'productName',
+                                 'tag', 'bandName', 'unit', 'colorMode'])
+
+# Properties holding a list of dicts (one per band), kept as a list of KeyProperties
+NESTED_PROPERTIES = frozenset(['bandProperties'])
+
+# BuiltItem keys whose dict values are kept as KeyProperties
+RECORD_FIELDS = frozenset(['itemURI', 'raster', 'keyProperties', 'variables'])
+
+# Extra key of items whose sun angles batch.materialize / buildMany still have to fill
+# (prt.solar.request); it is removed before the item is handed to ArcGIS
+SOLAR_REQUEST = 'prtSolarRequest'
+
+# Extra key with the (minLon, minLat, maxLon, maxLat) of items whose footprint is not in
+# geographic coordinates, for the scene catalog (prt.catalog); it is removed before the
+# item is handed to ArcGIS
+GEOGRAPHIC_EXTENT = 'prtGeographicExtent'
+
+_layouts = {}
+
+_missing = object()
+
+
+def _layout(names):
+    # The shared layout of a set of property names:
+    # (names, name -> index, indexes of interned properties, indexes of nested properties)
+    layout = _layouts.get(names)
+    if layout is None:
+        names = tuple(_intern(name) if type(name) is str else name for name in names)
+        layout = _layouts.setdefault(names, (names,
+                                             dict((name, index) for index, name in enumerate(names)),
+                                             [index for index, name in enumerate(names) if name in INTERNED_PROPERTIES],
+                                             [index for index, name in enumerate(names) if name in NESTED_PROPERTIES]))
+    return layout
+
+
+def _compact(layout, values):
+    # Interns and nests values in place, as laid out by layout
+    for index in layout[2]:
+        if type(values[index]) is str:
+            values[index] = _intern(values[index])
+    for index in layout[3]:
+        value = values[index]
+        if type(value) is list:
+            values[index] = [KeyProperties(entry) if type(entry) is dict else entry for entry in value]
+    return values
+
+
+# __slots__ needs a new-style class on Python 2
+class KeyProperties(object):
+
+    __slots__ = ('layout', 'values')
+
+    def __init__(self, properties=None):
+        properties = properties or {}
+        self.layout = _layout(tuple(properties))
+        self.values = _compact(self.layout, list(properties.values()))
+
+    def __getstate__(self):
+        return (self.layout[0], self.values)
+
+    def __setstate__(self, state):
+        # Items unpickled from build workers share the layout and strings of this process
+        self.layout = _layout(state[0])
+        self.values = _compact(self.layout, state[1])
+
+    def __getitem__(self, name):
+        return self.values[self.layout[1][name]]
+
+    def get(self, name, default=None):
+        index = self.layout[1].get(name)
+        return default if index is None else self.values[index]
+
+    def __setitem__(self, name, value):
+        index = self.layout[1].get(name)
+        if index is None:
+            self.layout = _layout(self.layout[0] + (name,))
+            self.values.append(value)
+        else:
+            self.values[index] = value
+        _compact(self.layout, self.values)
+
+    def first(self, names):
+        # The first of names whose value is not None, or None
+        indexes = self.layout[1]
+        for name in names:
+            index = indexes.get(name)
+            if index is not None and self.values[index] is not None:
+                return name
+        return None
+
+    def __contains__(self, name):
+        return name in self.layout[1]
+
+    def __iter__(self):
+        return iter(self.layout[0])
+
+    def __len__(self):
+        return len(self.values)
+
+    def keys(self):
+        return list(self.layout[0])
+
+    def items(self):
+        return list(zip(self.layout[0], self.values))
+
+    def toDict(self):
+        names = self.layout[0]
+        record = dict(zip(names, self.values))
+        for index in self.layout[3]:
+            value = self.values[index]
+            if type(value) is list:
+                record[names[index]] = [entry.toDict() if type(entry) is KeyProperties else entry for entry in value]
+        return record
+
+
+class BuiltItem(object):
+
+    # The builtItem keys ArcGIS reads; anything else goes to extra
+    FIELDS = ('itemURI', 'raster', 'footprint', 'spatialReference', 'keyProperties', 'variables', 'geodataXform')
+
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, **fields):
+        self.extra = None
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getstate__(self):
+        return dict(self.items())
+
+    def __setstate__(self, state):
+        self.extra = None
+        for key, value in state.items():
+            self[key] = value
+
+    def __setitem__(self, key, value):
+        if key in RECORD_FIELDS and type(value) is dict:
+            value = KeyProperties(value)
+        elif key == 'spatialReference' and type(value) is str:
+            # WKT, the same on every item of a sensor
+            value = _intern(value)
+        if key in BuiltItem.FIELDS:
+            setattr(self, key, value)
+            return
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def __getitem__(self, key):
+        if key in BuiltItem.FIELDS:
+            value = getattr(self, key, _missing)
+            if value is _missing:
+                raise KeyError(key)
+            return value
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def get(self, key, default=None):
+        if key in BuiltItem.FIELDS:
+            return getattr(self, key, default)
+        if self.extra is None:
+            return default
+        return self.extra.get(key, default)
+
+    def __contains__(self, key):
+        if key in BuiltItem.FIELDS:
+            return hasattr(self, key)
+        return self.extra is not None and key in self.extra
+
+    def pop(self, key, default=None):
+        if key in BuiltItem.FIELDS:
+            value = getattr(self, key, default)
+            if hasattr(self, key):
+                delattr(self, key)
+            return value
+        if self.extra is None:
+            return default
+        return self.extra.pop(key, default)
+
+    def keys(self):
+        keys = [key for key in BuiltItem.FIELDS if hasattr(self, key)]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def toDict(self):
+        # The nested dict ArcGIS expects
+        builtItem = {}
+        for key in BuiltItem.FIELDS:
+            value = getattr(self, key, _missing)
+            if value is not _missing:
+                builtItem[key] = value.toDict() if type(value) is KeyProperties else value
+        if self.extra:
+            builtItem.update(self.extra)
+        return builtItem
+
+
+def export(value):
+    # BuiltItem and KeyProperties records as the dicts they stand for; anything else
+    # (such as items built without this module) is passed through
+    if isinstance(value, (BuiltItem, KeyProperties)):
+        return value.toDict()
+    return value
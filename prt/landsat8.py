@@ -0,0 +1,129 @@
+import os
+import math
+
+import numpy
+
+from prt import calibration
+
+#############################################################################################
+#############################################################################################
+###
+###     Landsat 8 top-of-atmosphere reflectance
+###
+###     Turns the bands of the items LS8Builder builds (the eight MS bands, and the Pan
+###     band) into TOA reflectance with the rescaling of the MTL file:
+###
+###         reflectance = (REFLECTANCE_MULT * DN + REFLECTANCE_ADD) / sin(SUN_ELEVATION)
+###
+###     Each band GeoTIFF is memory-mapped (calibration.openTiff) and written to a
+###     float32 ENVI file in tiles of tileRows rows, so peak memory is a few tiles per
+###     worker however large the scene is. Bands are processed one at a time with the
+###     tiles of a band spread over the workers, or with bandParallel=True one band per
+###     worker, which keeps more files streaming at once.
+###
+###         builder = LS8Builder()
+###         items = builder.buildPortable(itemURI)
+###         outputs = landsat8.reflectance(items, 'D:/toa', metadata=builder.readMetFile(itemURI['filePath']))
+###
+#############################################################################################
+#############################################################################################
+
+# MTL band numbers of the rasters of the MS item (Raster1..Raster8) and of the Pan item
+MS_BANDS = (1, 2, 3, 4, 5, 6, 7, 9)
+PAN_BAND = 8
+
+# Level 1 fill value
+FILL_DN = 0
+
+OUTPUT_SUFFIX = '_TOA.dat'
+
+
+def bandNumbers(builtItem):
+    # The MTL band numbers of an LS8Builder item, in raster order
+    itemURI = builtItem.get('itemURI') or {}
+    if itemURI.get('tag') == 'Pan':
+        return (PAN_BAND,)
+    return MS_BANDS
+
+
+def rasterPaths(builtItem):
+    # Raster1, Raster2, ... of an item
+    raster = builtItem['raster']
+    return [raster['Raster{0}'.format(index)] for index in range(1, len(bandNumbers(builtItem)) + 1)]
+
+
+def coefficients(builtItem, metadata=None):
+    # [(scale, offset)] per band, such that reflectance = DN * scale + offset. The MTL
+    # rescaling is used when metadata (LS8Builder.readMetFile) is given, otherwise the
+    # reflectanceGain / reflectanceBias of the item's bandProperties
+    keyProperties = builtItem['keyProperties']
+    sunElevation = metadata.get('SUN_ELEVATION') if metadata else None
+    if sunElevation is None:
+        sunElevation = keyProperties.get('sunElevation')
+    if sunElevation is None:
+        raise ValueError("the sun elevation is needed for TOA reflectance")
+    sine = math.sin(math.radians(float(sunElevation)))
+    if sine <= 0.0:
+        raise ValueError("the sun is below the horizon ({0})".format(sunElevation))
+
+    pairs = list()
+    for band, bandProperty in zip(bandNumbers(builtItem), keyProperties['bandProperties']):
+        gain = bias = None
+        if metadata:
+            gain = metadata.get('REFLECTANCE_MULT_BAND_{0}'.format(band))
+            bias = metadata.get('REFLECTANCE_ADD_BAND_{0}'.format(band))
+        if gain is None:
+            gain = bandProperty.get('reflectanceGain')
+            bias = bandProperty.get('reflectanceBias')
+        if gain is None:
+            raise ValueError("band {0} has no reflectance gain".format(band))
+        pairs.append((float(gain) / sine, float(bias or 0.0) / sine))
+    return pairs
+
+
+def outputPath(outputDirectory, rasterPath):
+    return os.path.join(outputDirectory, os.path.splitext(os.path.basename(rasterPath))[0] + OUTPUT_SUFFIX)
+
+
+def _processBand(job, nodata, tileRows, workers):
+    source, target, scale, offset = job
+    block = calibration.openTiff(source)
+    rows, cols = block.shape
+    out = calibration.openRaw(target, 1, rows, cols, 'float32', mode='w+')
+    calibration.writeEnviHeader(target, 1, rows, cols, 'float32')
+    calibration.applyLinear(block[numpy.newaxis], [(scale, offset)], out, nodata, tileRows, workers)
+    # Unmapped here, so the pages of finished bands are not held until the scene is done
+    del block, out
+    return target
+
+
+def reflectance(builtItems, outputDirectory, metadata=None, bands=None, nodata=FILL_DN,
+                tileRows=calibration.TILE_ROWS, workers=None, bandParallel=False):
+    # Writes the TOA reflectance of the bands of LS8Builder items (MS, Pan or both) to
+    # outputDirectory, one float32 ENVI file per band with the fill DN as NaN.
+    # bands limits the MTL band numbers processed. Returns {band number: output path}
+    if not os.path.isdir(outputDirectory):
+        os.makedirs(outputDirectory)
+    jobs = list()
+    numbers = list()
+    for builtItem in builtItems:
+        for band, path, (scale, offset) in zip(bandNumbers(builtItem), rasterPaths(builtItem),
+                                               coefficients(builtItem, metadata)):
+            if bands is not None and band not in bands:
+                continue
+            jobs.append((path, outputPath(outputDirectory, path), scale, offset))
+            numbers.append(band)
+
+    workers = workers or calibration.DEFAULT_WORKERS or calibration._cpuCount()
+    if bandParallel and workers > 1 and len(jobs) > 1:
+        # One band per worker, the tiles of each band in sequence
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(workers, len(jobs)))
+        try:
+            outputs = pool.map(lambda job: _processBand(job, nodata, tileRows, 1), jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        outputs = [_processBand(job, nodata, tileRows, workers) for job in jobs]
+    return dict(zip(numbers, outputs))
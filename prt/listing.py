@@ -0,0 +1,73 @@
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from os import scandir
+except ImportError:
+    # Python 2: the scandir backport from PyPI
+    from scandir import scandir
+
+#############################################################################################
+#############################################################################################
+###
+###     Per-directory listing index
+###
+###     Lists a directory once and groups its files by scene, using a classify(name)
+###     function that returns (sceneId, kind) or None. The index is cached by the
+###     directory's mtime, which changes whenever a file is added, removed or renamed,
+###     so crawlers and builders in the same process share one listing per directory.
+###
+#############################################################################################
+#############################################################################################
+
+# Directories kept in memory
+MAX_DIRECTORIES = 4096
+
+
+class ListingIndex():
+
+    def __init__(self, classify, maxDirectories=MAX_DIRECTORIES):
+        self.classify = classify
+        self.maxDirectories = maxDirectories
+        self.directories = OrderedDict()
+        self.lock = threading.Lock()
+        self.listings = 0
+
+    def __list(self, directory):
+        scenes = {}
+        for entry in scandir(directory):
+            classified = self.classify(entry.name)
+            if classified is None:
+                continue
+            sceneId, kind = classified
+            scenes.setdefault(sceneId, {})[kind] = entry.path
+        return scenes
+
+    def get(self, directory):
+        # {sceneId: {kind: path}} for the files directly in directory
+        mtime = os.stat(directory).st_mtime
+        with self.lock:
+            cached = self.directories.get(directory)
+            if cached is not None and cached[0] == mtime:
+                self.directories.pop(directory)
+                self.directories[directory] = cached
+                return cached[1]
+
+        scenes = self.__list(directory)
+
+        with self.lock:
+            self.listings += 1
+            self.directories.pop(directory, None)
+            self.directories[directory] = (mtime, scenes)
+            while len(self.directories) > self.maxDirectories:
+                self.directories.popitem(last=False)
+        return scenes
+
+    def scene(self, directory, sceneId):
+        # {kind: path} for one scene; empty when the directory has none of its files
+        return self.get(directory).get(sceneId, {})
+
+    def clear(self):
+        with self.lock:
+            self.directories.clear()
@@ -0,0 +1,159 @@
+import os
+import time
+import sqlite3
+import threading
+
+from prt import walk
+
+#############################################################################################
+#############################################################################################
+###
+###     Persistent crawl manifest
+###
+###     One row per metadata file and sensor seen by a crawler: path, size, mtime, inode,
+###     the crawl's file filter and what was read from it (tags, product type). A re-crawl
+###     compares the stat of each file with its row, so unchanged files are never opened
+###     again, and rows that were not seen during the crawl are reported as deleted.
+###     Crawls of other sensors may share the manifest and the folders: a crawl only
+###     looks at, and deletes, the rows of its own sensor that its filter matches.
+###
+#############################################################################################
+#############################################################################################
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    sensor TEXT NOT NULL,
+    filter TEXT,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    inode INTEGER NOT NULL,
+    tags TEXT,
+    productType TEXT,
+    crawlId INTEGER NOT NULL,
+    PRIMARY KEY (path, sensor)
+);
+CREATE TABLE IF NOT EXISTS crawls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    finished REAL
+);
+"""
+
+# Manifests written before rows were kept per sensor: one row per path, no filter
+UPGRADE_V1 = """
+ALTER TABLE files RENAME TO files_v1;
+""" + SCHEMA + """
+INSERT OR REPLACE INTO files (path, sensor, filter, size, mtime, inode, tags, productType, crawlId)
+    SELECT path, COALESCE(sensor, ''), NULL, size, mtime, inode, tags, productType, crawlId FROM files_v1;
+DROP TABLE files_v1;
+"""
+
+# Rows are written in batches of this size
+BATCH_SIZE = 1000
+
+TAG_SEPARATOR = ';'
+
+
+class CrawlManifest():
+
+    def __init__(self, dbPath):
+        self.dbPath = dbPath
+        self.connection = sqlite3.connect(dbPath, check_same_thread=False)
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(files)')]
+        if columns and 'filter' not in columns:
+            self.connection.executescript(UPGRADE_V1)
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+        self.lock = threading.Lock()
+        self.crawlId = None
+        self.pendingRecords = list()
+        self.pendingSeen = list()
+
+    def beginCrawl(self):
+        with self.lock:
+            cursor = self.connection.execute('INSERT INTO crawls (started) VALUES (?)', (time.time(),))
+            self.connection.commit()
+            self.crawlId = cursor.lastrowid
+        return self.crawlId
+
+    def resumeCrawl(self, crawlId):
+        # Continues an interrupted crawl, so that the files it already saw are not reported as deleted
+        with self.lock:
+            row = self.connection.execute('SELECT id FROM crawls WHERE id = ?', (crawlId,)).fetchone()
+        if row is None:
+            return self.beginCrawl()
+        self.crawlId = crawlId
+        return self.crawlId
+
+    def lookup(self, path, st, sensor):
+        # Returns {'sensor', 'tags', 'productType'} when the file is unchanged since sensor's
+        # crawler recorded it
+        with self.lock:
+            row = self.connection.execute('SELECT size, mtime, inode, tags, productType FROM files WHERE path = ? AND sensor = ?',
+                                          (path, sensor)).fetchone()
+        if row is None:
+            return None
+
+        size, mtime, inode, tags, productType = row
+        if size != st.st_size or mtime != st.st_mtime or inode != st.st_ino:
+            return None
+
+        return {
+                'sensor': sensor,
+                'tags': tags.split(TAG_SEPARATOR) if tags else list(),
+                'productType': productType
+               }
+
+    def markSeen(self, path, sensor):
+        with self.lock:
+            self.pendingSeen.append((self.crawlId, path, sensor))
+            if len(self.pendingSeen) >= BATCH_SIZE:
+                self.__flush()
+
+    def record(self, path, st, sensor, tags, productType, filter=None):
+        with self.lock:
+            self.pendingRecords.append((path, sensor, filter, st.st_size, st.st_mtime, st.st_ino,
+                                        TAG_SEPARATOR.join(tags or list()), productType, self.crawlId))
+            if len(self.pendingRecords) >= BATCH_SIZE:
+                self.__flush()
+
+    def __flush(self):
+        if self.pendingRecords:
+            self.connection.executemany('INSERT OR REPLACE INTO files (path, sensor, filter, size, mtime, inode, tags, productType, crawlId) '
+                                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', self.pendingRecords)
+            self.pendingRecords = list()
+        if self.pendingSeen:
+            self.connection.executemany('UPDATE files SET crawlId = ? WHERE path = ? AND sensor = ?', self.pendingSeen)
+            self.pendingSeen = list()
+        self.connection.commit()
+
+    def flush(self):
+        with self.lock:
+            self.__flush()
+
+    def finishCrawl(self, roots, sensor, filter, recurse=True):
+        # Removes and returns the rows of sensor under roots that were not seen by this crawl
+        # and that filter matches, i.e. that this crawl would have seen had they still been
+        # there; without recurse only the files directly in each root are considered
+        match = walk.compileFilter(filter)
+        with self.lock:
+            self.__flush()
+            deleted = list()
+            for root in roots:
+                prefix = os.path.join(root, '')
+                rows = self.connection.execute('SELECT path FROM files WHERE crawlId != ? AND sensor = ? AND substr(path, 1, ?) = ?',
+                                               (self.crawlId, sensor, len(prefix), prefix)).fetchall()
+                for row in rows:
+                    if (recurse or os.sep not in row[0][len(prefix):]) and match(os.path.basename(row[0])):
+                        deleted.append(row[0])
+
+            self.connection.executemany('DELETE FROM files WHERE path = ? AND sensor = ?', [(path, sensor) for path in deleted])
+            self.connection.execute('UPDATE crawls SET finished = ? WHERE id = ?', (time.time(), self.crawlId))
+            self.connection.commit()
+        return deleted
+
+    def close(self):
+        with self.lock:
+            self.__flush()
+            self.connection.close()
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+
+from prt import files
+
+#############################################################################################
+#############################################################################################
+###
+###     Opt-in ingest instrumentation
+###
+###     Crawler.next(), Builder.build() and the prt stages inside them (directory
+###     listing, metadata parsing, arcpy Describe, spatial references, geometry) are
+###     timed into per-sensor, per-stage latency histograms and counters. Each stage
+###     also keeps its self time, its time minus the stages nested in it, so the
+###     'build' self time is what the builder spends assembling the item dicts.
+###
+###     Off unless PRT_METRICS_DIR is set or enable() is called; when off, stage()
+###     returns a shared do-nothing object. The summary is written as JSON and as a
+###     Prometheus text file (for the node_exporter textfile collector) at the end of
+###     a crawl, at exit and, with an interval, periodically.
+###
+#############################################################################################
+#############################################################################################
+
+JSON_NAME = 'prt_metrics.json'
+PROMETHEUS_NAME = 'prt_metrics.prom'
+
+# Histogram upper bounds in seconds; one more bucket counts everything above the last
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label for stages timed outside a crawler or builder
+NO_SENSOR = 'none'
+
+clock = getattr(time, 'perf_counter', time.time)
+
+enabled = False
+directory = None
+interval = 0.0
+
+_lock = threading.Lock()
+_local = threading.local()
+_histograms = {}
+_counters = {}
+_started = None
+_nextWrite = None
+
+
+class Histogram():
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.selfSum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds, selfSeconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.selfSum += selfSeconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        # Interpolated within the bucket, as Prometheus' histogram_quantile does
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def summary(self):
+        return {
+                'count': self.count,
+                'seconds': self.sum,
+                'selfSeconds': self.selfSum,
+                'mean': self.sum / self.count if self.count else None,
+                'p50': self.quantile(0.50),
+                'p90': self.quantile(0.90),
+                'p99': self.quantile(0.99),
+                'max': self.max,
+                'buckets': list(self.buckets)
+               }
+
+
+class Stage():
+
+    def __init__(self, name, sensor):
+        self.name = name
+        self.sensor = sensor
+        self.childSeconds = 0.0
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = list()
+        if self.sensor is None:
+            self.sensor = stack[-1].sensor if stack else NO_SENSOR
+        stack.append(self)
+        self.started = clock()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        seconds = clock() - self.started
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].childSeconds += seconds
+        record(self.sensor, self.name, seconds, seconds - self.childSeconds)
+        if not stack and _nextWrite is not None and clock() >= _nextWrite:
+            write()
+        return False
+
+
+class _NullStage():
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+
+_nullStage = _NullStage()
+
+
+def stage(name, sensor=None):
+    # with metrics.stage('build', 'Kazakhstan'): ...  Nested stages inherit the sensor
+    if not enabled:
+        return _nullStage
+    return Stage(name, sensor)
+
+
+def currentSensor():
+    # The sensor of the innermost stage on this thread, for work handed to other threads
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        return stack[-1].sensor
+    return None
+
+
+def record(sensor, name, seconds, selfSeconds=None):
+    if selfSeconds is None:
+        selfSeconds = seconds
+    key = (sensor, name)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.add(seconds, selfSeconds)
+
+
+def increment(name, value=1, sensor=None):
+    if not enabled:
+        return
+    if sensor is None:
+        sensor = currentSensor() or NO_SENSOR
+    key = (sensor, name)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def enable(outputDirectory=None, writeInterval=0.0):
+    # writeInterval > 0 also writes the files every writeInterval seconds
+    global enabled, directory, interval, _started, _nextWrite
+    directory = outputDirectory
+    interval = writeInterval
+    _started = time.time()
+    _nextWrite = clock() + interval if directory and interval > 0 else None
+    enabled = True
+
+
+def disable():
+    global enabled, _nextWrite
+    enabled = False
+    _nextWrite = None
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def summary():
+    with _lock:
+        sensors = {}
+        for (sensor, name), histogram in _histograms.items():
+            sensors.setdefault(sensor, {'stages': {}, 'counters': {}})['stages'][name] = histogram.summary()
+        for (sensor, name), value in _counters.items():
+            sensors.setdefault(sensor, {'stages': {}, 'counters': {}})['counters'][name] = value
+    return {'started': _started, 'written': time.time(), 'pid': os.getpid(), 'buckets': list(BUCKETS), 'sensors': sensors}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus(document=None):
+    # The summary in the Prometheus text exposition format
+    document = document or summary()
+    lines = ['# HELP prt_stage_seconds Time spent in each ingest stage.',
+             '# TYPE prt_stage_seconds histogram']
+    selfLines = ['# HELP prt_stage_self_seconds_total Time spent in each ingest stage, less its nested stages.',
+                 '# TYPE prt_stage_self_seconds_total counter']
+    counterLines = ['# HELP prt_events_total Ingest event counters.',
+                    '# TYPE prt_events_total counter']
+    for sensor in sorted(document['sensors']):
+        stages = document['sensors'][sensor]['stages']
+        for name in sorted(stages):
+            histogram = stages[name]
+            labels = 'sensor="{0}",stage="{1}"'.format(_label(sensor), _label(name))
+            cumulative = 0
+            for bound, count in zip(list(BUCKETS) + ['+Inf'], histogram['buckets']):
+                cumulative += count
+                lines.append('prt_stage_seconds_bucket{{{0},le="{1}"}} {2}'.format(labels, bound, cumulative))
+            lines.append('prt_stage_seconds_sum{{{0}}} {1!r}'.format(labels, histogram['seconds']))
+            lines.append('prt_stage_seconds_count{{{0}}} {1}'.format(labels, histogram['count']))
+            selfLines.append('prt_stage_self_seconds_total{{{0}}} {1!r}'.format(labels, histogram['selfSeconds']))
+        counters = document['sensors'][sensor]['counters']
+        for name in sorted(counters):
+            counterLines.append('prt_events_total{{sensor="{0}",name="{1}"}} {2}'.format(_label(sensor), _label(name), counters[name]))
+    return '\n'.join(lines + selfLines + counterLines) + '\n'
+
+
+def _writeAtomic(path, text):
+    temporary = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(temporary, 'w') as f:
+        f.write(text)
+    files.replaceFile(temporary, path)
+
+
+def write(outputDirectory=None):
+    # Writes prt_metrics.json and prt_metrics.prom; returns the summary
+    global _nextWrite
+    outputDirectory = outputDirectory or directory
+    if interval > 0 and _nextWrite is not None:
+        _nextWrite = clock() + interval
+    document = summary()
+    if outputDirectory:
+        if not os.path.isdir(outputDirectory):
+            os.makedirs(outputDirectory)
+        _writeAtomic(os.path.join(outputDirectory, JSON_NAME), json.dumps(document, indent=2, sort_keys=True))
+        _writeAtomic(os.path.join(outputDirectory, PROMETHEUS_NAME), prometheus(document))
+    return document
+
+
+def flush():
+    # Writes the files when metrics are on and have somewhere to go
+    if enabled and directory:
+        write()
+
+atexit.register(flush)
+
+
+if os.environ.get('PRT_METRICS_DIR'):
+    enable(os.environ['PRT_METRICS_DIR'], float(os.environ.get('PRT_METRICS_INTERVAL', 0)))
@@ -0,0 +1,176 @@
+import re
+
+from prt import archive
+from prt import cache
+
+#############################################################################################
+#############################################################################################
+###
+###     Landsat MTL metadata files
+###
+###     An _MTL.txt file is read once, in binary, and split once per line on "=" into
+###     the flat fields LS8Builder reads. The GROUP / END_GROUP tree is only built from
+###     those lines when group() first asks for it. Values are kept as the text of the
+###     file (quotes removed) and only turned into numbers when number() asks for them. Parsed files
+###     go through prt.cache, keyed by path, size and mtime, so the MS and Pan items of
+###     a scene share one parse.
+###
+###         document = mtl.readMtl(path)
+###         document['FILE_NAME_BAND_1']                        # text, as in the file
+###         document.number('SUN_ELEVATION')                    # 47.06404414
+###         document.group('RADIOMETRIC_RESCALING').items()     # one group
+###
+#############################################################################################
+#############################################################################################
+
+MARKERS = ('GROUP', 'END_GROUP')
+
+INTEGER_PATTERN = re.compile(r'^[-+]?\d+$')
+
+# A parsed MTL file, with its lines kept for group(), takes about this many times its
+# size on disk
+MTL_EXPANSION = 6
+
+
+class MtlGroup():
+
+    def __init__(self, name):
+        self.name = name
+        # Field name -> text, and group name -> MtlGroup, in file order
+        self.fields = dict()
+        self.groups = dict()
+        self.numbers = dict()
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def get(self, name, default=None):
+        return self.fields.get(name, default)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def keys(self):
+        return list(self.fields)
+
+    def items(self):
+        return list(self.fields.items())
+
+    def number(self, name, default=None):
+        # The field as an int or float, converted on first use; default when it is missing,
+        # ValueError when it is not a number
+        value = self.numbers.get(name)
+        if value is None:
+            text = self.fields.get(name)
+            if text is None:
+                return default
+            value = int(text) if INTEGER_PATTERN.match(text) else float(text)
+            self.numbers[name] = value
+        return value
+
+    def group(self, path):
+        # A group by its path below this one ('L1_METADATA_FILE/IMAGE_ATTRIBUTES'), or by
+        # its name alone at any depth; None when there is no such group
+        group = self
+        for name in path.split('/'):
+            child = group.groups.get(name)
+            if child is None and '/' not in path:
+                return self.__find(name)
+            if child is None:
+                return None
+            group = child
+        return group
+
+    def __find(self, name):
+        for child in self.groups.values():
+            if child.name == name:
+                return child
+            found = child.__find(name)
+            if found is not None:
+                return found
+        return None
+
+
+class MtlDocument(MtlGroup):
+
+    # The root of the tree. Its fields are the fields of every group, the last one of a
+    # name winning, which is the flat dict LS8Builder.readMetFile used to return.
+    # The (name, value) lines are kept until group() builds the groups from them
+
+    def __init__(self, path=None, pairs=()):
+        MtlGroup.__init__(self, '')
+        self.path = path
+        self.pairs = pairs
+        self.fields = dict(pairs)
+        for name in MARKERS:
+            self.fields.pop(name, None)
+
+    def group(self, path):
+        if self.pairs:
+            self.__buildGroups()
+        return MtlGroup.group(self, path)
+
+    def toDict(self):
+        return dict(self.fields)
+
+    def __buildGroups(self):
+        # The fields between two GROUP / END_GROUP lines go into their group with one
+        # dict update
+        pairs = self.pairs
+        markers = [index for index, pair in enumerate(pairs) if pair[0] in MARKERS]
+        markers.append(len(pairs))
+        path = self.path
+        stack = [self]
+        start = 0
+        for index in markers:
+            if start < index and len(stack) > 1:
+                stack[-1].fields.update(pairs[start:index])
+            if index == len(pairs):
+                break
+            name, value = pairs[index]
+            if name == 'GROUP':
+                group = MtlGroup(value)
+                stack[-1].groups[group.name] = group
+                stack.append(group)
+            elif len(stack) == 1 or stack[-1].name != value:
+                self.groups = dict()
+                raise ValueError("{0}: END_GROUP = {1} does not close a GROUP".format(path, value))
+            else:
+                stack.pop()
+            start = index + 1
+        if len(stack) > 1:
+            self.groups = dict()
+            raise ValueError("{0}: GROUP = {1} is not closed".format(path, stack[-1].name))
+        self.pairs = None
+
+
+def parseText(text, path=None):
+    # One partition per line, as cheap as the old split on "="; only quoted values
+    # are unquoted
+    pairs = list()
+    append = pairs.append
+    for line in text.split('\n'):
+        name, equals, value = line.partition('=')
+        if equals:
+            value = value.strip()
+            if value[:1] == '"':
+                value = value[1:-1]
+            append((name.strip(), value))
+    return MtlDocument(path, pairs)
+
+
+def parseMtl(path):
+    # One binary read; MTL files are ASCII, latin-1 decodes any byte
+    with archive.open(path, 'rb') as mtlFile:
+        data = mtlFile.read()
+    return parseText(data.decode('latin-1'), path)
+
+
+def readMtl(path):
+    return cache.metadataCache.get(path, parseMtl, 'mtl', MTL_EXPANSION)
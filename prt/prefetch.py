@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+from collections import deque
+
+try:
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+from prt import metrics
+
+#############################################################################################
+#############################################################################################
+###
+###     Read-ahead between the crawler and the builder
+###
+###     While ArcGIS builds the current item, background threads already read and
+###     parse the metadata of the next `depth` files. Entries still come out in crawl
+###     order, one at a time, and at most `depth` of them are read ahead, so memory is
+###     bounded. The source iterator is only advanced by the consumer's thread.
+###
+###     stats() tells whether the consumer ever waited: a hit is a file that was ready
+###     when asked for, a miss (stall) one it had to wait for.
+###
+#############################################################################################
+#############################################################################################
+
+# Files read ahead; 0 turns read-ahead off
+DEFAULT_DEPTH = int(os.environ.get('PRT_PREFETCH_DEPTH', 0))
+
+MAX_WORKERS = 16
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class Prefetched():
+
+    # The result of function(entry), computed on a background thread
+
+    def __init__(self, prefetcher, entry):
+        self.prefetcher = prefetcher
+        self.entry = entry
+        self.ready = threading.Event()
+        self.value = None
+        self.error = None
+
+    def run(self, function):
+        try:
+            self.value = function(self.entry)
+        except Exception as e:
+            self.error = e
+        self.ready.set()
+
+    def result(self):
+        self.prefetcher.wait(self)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class Prefetcher():
+
+    # for entry, prefetched in Prefetcher(entries, function, depth): ... prefetched.result()
+    # select(entry) runs on the consumer's thread; entries it rejects are passed through
+    # with prefetched None and do not use a thread
+    def __init__(self, entries, function, depth, workers=None, select=None):
+        self.entries = iter(entries)
+        self.function = function
+        self.depth = max(1, depth)
+        self.workers = max(1, min(workers or self.depth, MAX_WORKERS))
+        self.select = select
+        self.window = deque()
+        self.exhausted = False
+        self.work = queue.Queue()
+        self.threads = list()
+        # Background threads time their work for the consumer's sensor
+        self.sensor = metrics.currentSensor()
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.stallSeconds = 0.0
+
+    def __worker(self):
+        while True:
+            prefetched = self.work.get()
+            if prefetched is None:
+                return
+            with metrics.stage('prefetch', self.sensor):
+                prefetched.run(self.function)
+
+    def __fill(self):
+        # The entry about to be handed out, and `depth` more behind it
+        while not self.exhausted and len(self.window) <= self.depth:
+            try:
+                entry = next(self.entries)
+            except StopIteration:
+                self.exhausted = True
+                break
+            if self.select is not None and not self.select(entry):
+                self.skipped += 1
+                self.window.append((entry, None))
+                continue
+            if len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.__worker, name='prt-prefetch-%d' % len(self.threads))
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+            prefetched = Prefetched(self, entry)
+            self.work.put(prefetched)
+            self.window.append((entry, prefetched))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.__fill()
+        if not self.window:
+            self.close()
+            raise StopIteration
+        return self.window.popleft()
+
+    next = __next__
+
+    def wait(self, prefetched):
+        if prefetched.ready.is_set():
+            self.hits += 1
+            metrics.increment('prefetch.hits')
+            return
+        self.misses += 1
+        metrics.increment('prefetch.misses')
+        started = clock()
+        with metrics.stage('prefetchStall'):
+            prefetched.ready.wait()
+        self.stallSeconds += clock() - started
+
+    def pending(self):
+        # Entries taken from the source but not handed out yet, in order
+        return [entry for entry, prefetched in self.window]
+
+    def close(self):
+        for thread in self.threads:
+            self.work.put(None)
+        self.threads = list()
+
+    def stats(self):
+        waited = self.hits + self.misses
+        return {
+                'depth': self.depth,
+                'workers': self.workers,
+                'hits': self.hits,
+                'misses': self.misses,
+                'skipped': self.skipped,
+                'hitRate': float(self.hits) / waited if waited else None,
+                'stallSeconds': self.stallSeconds
+               }
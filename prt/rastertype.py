@@ -0,0 +1,58 @@
+import functools
+import threading
+
+#############################################################################################
+#############################################################################################
+###
+###     Raster type info without arcpy at import time
+###
+###     The raster type modules do not import arcpy: it takes seconds to load, and the
+###     metadata side (tags, product type, footprint vertices, key properties) does not
+###     need it. arcpy is imported where arcpy objects are made: geometry.toPolygon,
+###     spatial.spatialReference / describe, and field() below.
+###     getRasterTypesInfo is built once per factory class and then shared.
+###
+#############################################################################################
+#############################################################################################
+
+
+class Field():
+
+    # Stands in for arcpy.Field where arcpy is not installed (metadata-only tools)
+
+    def __init__(self):
+        self.name = None
+        self.aliasName = None
+        self.type = None
+        self.length = None
+
+
+def field(name, aliasName, type, length):
+    # An arcpy.Field describing an auxiliary field of the raster type
+    try:
+        import arcpy
+        auxField = arcpy.Field()
+    except ImportError:
+        auxField = Field()
+    auxField.name = name
+    auxField.aliasName = aliasName
+    auxField.type = type
+    auxField.length = length
+    return auxField
+
+
+def memoize(getRasterTypesInfo):
+    # Decorates rasterTypeFactory.getRasterTypesInfo: the first call builds the info, every
+    # later call, from any factory instance, returns the same list
+    cached = list()
+    lock = threading.Lock()
+
+    @functools.wraps(getRasterTypesInfo)
+    def wrapper(self):
+        if not cached:
+            with lock:
+                if not cached:
+                    cached.append(getRasterTypesInfo(self))
+        return cached[0]
+
+    return wrapper
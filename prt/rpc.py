@@ -0,0 +1,149 @@
+import os
+import json
+import math
+import hashlib
+import tempfile
+from array import array
+
+from prt import cache
+from prt import files
+
+#############################################################################################
+#############################################################################################
+###
+###     RPC coefficient files (<id>_rpc.txt)
+###
+###     "NAME: value" lines are parsed into one array('d'), in file order, with the
+###     names kept alongside. Parsed files are cached in memory (prt.cache) and on
+###     disk, keyed by path, size and mtime, so a scene's RPC is parsed once. The
+###     geodataXform JSON is written from the array in one pass.
+###
+#############################################################################################
+#############################################################################################
+
+# Set PRT_RPC_CACHE_DIR to an empty string to turn the disk cache off
+CACHE_DIR = os.environ.get('PRT_RPC_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'prt_rpc'))
+
+CACHE_MAGIC = b'PRTRPC1\n'
+
+# array('d') is far smaller than the text it comes from
+RPC_EXPANSION = 1
+
+GEODATA_XFORM_PREFIX = '{"GeodataTransforms":[{"geodataTransform" : "RPC","geodataTransformArguments":{"coeff":['
+GEODATA_XFORM_SUFFIX = ']}}]}'
+
+
+class RpcCoefficients():
+
+    def __init__(self, names, values):
+        self.names = tuple(names)
+        self.values = values
+        self.indexes = dict((name, i) for i, name in enumerate(self.names))
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, name, default=None):
+        index = self.indexes.get(name)
+        if index is None:
+            return default
+        return self.values[index]
+
+    def series(self, prefix):
+        # LINE_NUM_COEFF_1 ... LINE_NUM_COEFF_20 -> the 20 values, in index order
+        numbered = list()
+        for name, index in self.indexes.items():
+            if name.startswith(prefix + '_'):
+                suffix = name[len(prefix) + 1:]
+                if suffix.isdigit():
+                    numbered.append((int(suffix), self.values[index]))
+        numbered.sort()
+        return array('d', [value for number, value in numbered])
+
+    def geodataXform(self):
+        return GEODATA_XFORM_PREFIX + ','.join([repr(value) for value in self.values]) + GEODATA_XFORM_SUFFIX
+
+
+def parseRpc(path):
+    names = list()
+    values = array('d')
+    with open(path, 'r') as rpcFile:
+        for lineNumber, line in enumerate(rpcFile, 1):
+            if not line.strip():
+                continue
+            name, separator, text = line.partition(':')
+            if not separator or not text.split():
+                raise ValueError("{0}:{1}: expected 'NAME: value'".format(path, lineNumber))
+            # Some writers follow the value with its unit ("LINE_OFF: +002414.00 pixels")
+            try:
+                value = float(text.split()[0])
+            except ValueError:
+                raise ValueError("{0}:{1}: {2} is not a number".format(path, lineNumber, text.strip()))
+            if math.isinf(value) or math.isnan(value):
+                raise ValueError("{0}:{1}: {2} is not finite".format(path, lineNumber, text.strip()))
+            names.append(name.strip())
+            values.append(value)
+    return RpcCoefficients(names, values)
+
+
+def _cachePath(path):
+    st = os.stat(path)
+    key = '{0}|{1}|{2!r}'.format(os.path.abspath(path), st.st_size, st.st_mtime)
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.rpc')
+
+
+def _readCached(cachePath):
+    try:
+        with open(cachePath, 'rb') as cacheFile:
+            data = cacheFile.read()
+    except (IOError, OSError):
+        return None
+    if not data.startswith(CACHE_MAGIC):
+        return None
+    header, separator, payload = data[len(CACHE_MAGIC):].partition(b'\n')
+    if not separator:
+        return None
+    names = json.loads(header.decode('utf-8'))
+    values = array('d')
+    if hasattr(values, 'frombytes'):
+        values.frombytes(payload)
+    else:
+        # Python 2
+        values.fromstring(payload)
+    if len(values) != len(names):
+        return None
+    return RpcCoefficients(names, values)
+
+
+def _writeCached(cachePath, coefficients):
+    if hasattr(coefficients.values, 'tobytes'):
+        payload = coefficients.values.tobytes()
+    else:
+        # Python 2
+        payload = coefficients.values.tostring()
+    header = json.dumps(list(coefficients.names)).encode('utf-8')
+    try:
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        temporary = '{0}.{1}.{2}.tmp'.format(cachePath, os.getpid(), id(coefficients))
+        with open(temporary, 'wb') as cacheFile:
+            cacheFile.write(CACHE_MAGIC + header + b'\n' + payload)
+        files.replaceFile(temporary, cachePath)
+    except (IOError, OSError):
+        # The disk cache is only an optimization
+        pass
+
+
+def _loadRpc(path):
+    if not CACHE_DIR:
+        return parseRpc(path)
+    cachePath = _cachePath(path)
+    coefficients = _readCached(cachePath)
+    if coefficients is None:
+        coefficients = parseRpc(path)
+        _writeCached(cachePath, coefficients)
+    return coefficients
+
+
+def readRpc(path):
+    return cache.metadataCache.get(path, _loadRpc, 'rpc', RPC_EXPANSION)
@@ -0,0 +1,330 @@
+import numpy
+
+from prt import geometry
+
+#############################################################################################
+#############################################################################################
+###
+###     RPC ground-to-image model
+###
+###     RpcModel evaluates the RPC00B rational polynomials of a prt.rpc.RpcCoefficients
+###     (a scene's _rpc.txt) for whole arrays of points:
+###
+###         line = LINE_NUM(P, L, H) / LINE_DEN(P, L, H)   (normalized, then scaled)
+###         samp = SAMP_NUM(P, L, H) / SAMP_DEN(P, L, H)
+###
+###     The 20 terms of every point are computed once and the four polynomials are one
+###     matrix product. forward() goes from longitude / latitude / height to line / sample,
+###     inverse() back with Newton iterations started from an affine fit of the model; the
+###     derivatives of the polynomials are polynomials in the same terms, so each
+###     iteration is still one matrix product. footprint() traces the image border on the
+###     ground for a densified footprint, and validate() checks a model before ingest.
+###
+###         model = rpcmodel.RpcModel(rpc.readRpc(path))
+###         footprint = model.footprint(rows, cols, pointsPerSide=64)
+###
+#############################################################################################
+#############################################################################################
+
+POLYNOMIALS = ('LINE_NUM_COEFF', 'LINE_DEN_COEFF', 'SAMP_NUM_COEFF', 'SAMP_DEN_COEFF')
+
+# Offsets and scales, in the order of the normalized coordinates (line, samp, lat, long, height)
+NORMALIZATION = ('LINE_OFF', 'SAMP_OFF', 'LAT_OFF', 'LONG_OFF', 'HEIGHT_OFF',
+                 'LINE_SCALE', 'SAMP_SCALE', 'LAT_SCALE', 'LONG_SCALE', 'HEIGHT_SCALE')
+
+TERMS = 20
+
+# (longitude, latitude, height) exponents of the RPC00B terms, in coefficient order
+EXPONENTS = ((0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 1, 0), (1, 0, 1), (0, 1, 1), (2, 0, 0), (0, 2, 0), (0, 0, 2),
+             (1, 1, 1), (3, 0, 0), (1, 2, 0), (1, 0, 2), (2, 1, 0), (0, 3, 0), (0, 1, 2), (2, 0, 1), (0, 2, 1), (0, 0, 3))
+
+# (longitude, latitude) exponents of the terms left when every point has the same height
+PLANAR = ((0, 0), (1, 0), (0, 1), (1, 1), (2, 0), (0, 2), (3, 0), (1, 2), (2, 1), (0, 3))
+PLANAR_TERMS = len(PLANAR)
+
+# inverse(): iterations, and the change in pixels below which a point has converged
+MAX_ITERATIONS = 10
+TOLERANCE = 1e-6
+
+# Points inverted together; the Newton arrays of a block stay in the CPU cache
+INVERSE_BLOCK = 2048
+
+# validate(): pixels of round trip error accepted, and the grid it is measured on
+VALIDATION_TOLERANCE = 0.01
+VALIDATION_GRID = 21
+
+
+def _terms(L, P, H):
+    # (20, N) RPC00B terms of the normalized longitude, latitude and height; one row per
+    # term keeps every product contiguous
+    terms = numpy.empty((TERMS, L.shape[0]))
+    terms[0] = 1.0
+    terms[1] = L
+    terms[2] = P
+    terms[3] = H
+    numpy.multiply(L, P, out=terms[4])
+    numpy.multiply(L, H, out=terms[5])
+    numpy.multiply(P, H, out=terms[6])
+    numpy.multiply(L, L, out=terms[7])
+    numpy.multiply(P, P, out=terms[8])
+    numpy.multiply(H, H, out=terms[9])
+    numpy.multiply(terms[4], H, out=terms[10])
+    numpy.multiply(terms[7], L, out=terms[11])
+    numpy.multiply(terms[8], L, out=terms[12])
+    numpy.multiply(terms[9], L, out=terms[13])
+    numpy.multiply(terms[7], P, out=terms[14])
+    numpy.multiply(terms[8], P, out=terms[15])
+    numpy.multiply(terms[9], P, out=terms[16])
+    numpy.multiply(terms[7], H, out=terms[17])
+    numpy.multiply(terms[8], H, out=terms[18])
+    numpy.multiply(terms[9], H, out=terms[19])
+    return terms
+
+
+def _planarTerms(L, P):
+    # (10, N) terms in PLANAR order, for points that share one height
+    terms = numpy.empty((PLANAR_TERMS, L.shape[0]))
+    terms[0] = 1.0
+    terms[1] = L
+    terms[2] = P
+    numpy.multiply(L, P, out=terms[3])
+    numpy.multiply(L, L, out=terms[4])
+    numpy.multiply(P, P, out=terms[5])
+    numpy.multiply(terms[4], L, out=terms[6])
+    numpy.multiply(terms[5], L, out=terms[7])
+    numpy.multiply(terms[4], P, out=terms[8])
+    numpy.multiply(terms[5], P, out=terms[9])
+    return terms
+
+
+def _fold(matrix, H):
+    # (k, 20) polynomials -> (k, 10) polynomials in longitude and latitude at the
+    # normalized height H
+    folded = numpy.zeros((matrix.shape[0], PLANAR_TERMS))
+    for term, (l, p, h) in enumerate(EXPONENTS):
+        folded[:, PLANAR.index((l, p))] += matrix[:, term] * H ** h
+    return folded
+
+
+def _derivative(matrix, axis):
+    # (k, 20) polynomials -> their derivatives by one coordinate (0 longitude, 1 latitude),
+    # in the same terms
+    derivative = numpy.zeros(matrix.shape)
+    for term, exponents in enumerate(EXPONENTS):
+        if exponents[axis]:
+            lower = list(exponents)
+            lower[axis] -= 1
+            derivative[:, EXPONENTS.index(tuple(lower))] += exponents[axis] * matrix[:, term]
+    return derivative
+
+
+def _points(*arrays):
+    # Flat float64 arrays broadcast to one shape, and that shape
+    arrays = numpy.broadcast_arrays(*[numpy.asarray(array, dtype='float64') for array in arrays])
+    return [array.ravel() for array in arrays], arrays[0].shape
+
+
+class RpcModel():
+
+    def __init__(self, coefficients):
+        # coefficients: prt.rpc.RpcCoefficients, with 20 coefficients per polynomial (90
+        # values) or 19 per denominator whose constant term is 1 (78)
+        normalization = list()
+        for name in NORMALIZATION:
+            value = coefficients.get(name)
+            if value is None:
+                raise ValueError("the RPC has no {0}".format(name))
+            normalization.append(float(value))
+        (self.lineOffset, self.sampOffset, self.latOffset, self.longOffset, self.heightOffset,
+         self.lineScale, self.sampScale, self.latScale, self.longScale, self.heightScale) = normalization
+        if 0.0 in normalization[5:]:
+            raise ValueError("the RPC has a zero scale")
+
+        rows = list()
+        for name in POLYNOMIALS:
+            values = list(coefficients.series(name))
+            if len(values) == TERMS - 1 and '_DEN_' in name:
+                values.insert(0, 1.0)
+            if len(values) != TERMS:
+                raise ValueError("the RPC has {0} {1} values, expected {2}".format(len(values), name, TERMS))
+            rows.append(values)
+        # (4, 20): line numerator, line denominator, sample numerator, sample denominator
+        self.matrix = numpy.array(rows)
+        # (12, 20): the four polynomials, then their derivatives by longitude and by latitude
+        self.newtonMatrix = numpy.vstack((self.matrix, _derivative(self.matrix, 0), _derivative(self.matrix, 1)))
+        # (rows, normalized height) -> the matrix folded at that height
+        self.folded = {}
+        self.affine = None
+
+    def _evaluate(self, matrix, L, P, H):
+        # matrix (self.matrix or self.newtonMatrix) at normalized points; with one height
+        # for all points (a scalar H) only the 10 planar terms are computed
+        if numpy.ndim(H) == 0:
+            key = (matrix.shape[0], float(H))
+            folded = self.folded.get(key)
+            if folded is None:
+                if len(self.folded) > 64:
+                    self.folded.clear()
+                folded = self.folded[key] = _fold(matrix, float(H))
+            return folded.dot(_planarTerms(L, P))
+        return matrix.dot(_terms(L, P, H))
+
+    def _heights(self, heights, shape):
+        # Normalized heights: a scalar when all points share one, else flat like the points
+        if heights is None:
+            return 0.0
+        heights = numpy.asarray(heights, dtype='float64')
+        if heights.ndim == 0:
+            return (float(heights) - self.heightOffset) / self.heightScale
+        return ((numpy.broadcast_to(heights, shape) - self.heightOffset) / self.heightScale).ravel()
+
+    def normalized(self, longitudes, latitudes, H):
+        # Normalized line and sample, and the (4, N) polynomial values, of flat ground
+        # arrays at normalized heights H
+        L = (longitudes - self.longOffset) / self.longScale
+        P = (latitudes - self.latOffset) / self.latScale
+        polynomials = self._evaluate(self.matrix, L, P, H)
+        return polynomials[0] / polynomials[1], polynomials[2] / polynomials[3], polynomials
+
+    def forward(self, longitudes, latitudes, heights=None):
+        # (lines, samples) of ground points in degrees and metres above the ellipsoid;
+        # HEIGHT_OFF when heights is None
+        (longitudes, latitudes), shape = _points(longitudes, latitudes)
+        line, samp, polynomials = self.normalized(longitudes, latitudes, self._heights(heights, shape))
+        return ((line * self.lineScale + self.lineOffset).reshape(shape),
+                (samp * self.sampScale + self.sampOffset).reshape(shape))
+
+    def _fitAffine(self):
+        # Normalized (line, samp, 1) -> normalized (L, P), fitted on a grid over the
+        # model's ground domain at the height offset
+        L, P = numpy.meshgrid(numpy.linspace(-1.0, 1.0, 11), numpy.linspace(-1.0, 1.0, 11))
+        L = L.ravel()
+        P = P.ravel()
+        line, samp, polynomials = self.normalized(L * self.longScale + self.longOffset,
+                                                  P * self.latScale + self.latOffset, 0.0)
+        design = numpy.column_stack((line, samp, numpy.ones(L.shape)))
+        self.affine = numpy.linalg.lstsq(design, numpy.column_stack((L, P)), rcond=None)[0]
+
+    def inverse(self, lines, samples, heights=None, iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+        # (longitudes, latitudes) of image points at heights (HEIGHT_OFF when None); NaN
+        # for points that have not converged to tolerance pixels within iterations
+        (lines, samples), shape = _points(lines, samples)
+        H = self._heights(heights, shape)
+        if self.affine is None:
+            self._fitAffine()
+        if lines.shape[0] > INVERSE_BLOCK:
+            longitudes = numpy.empty(lines.shape)
+            latitudes = numpy.empty(lines.shape)
+            for start in range(0, lines.shape[0], INVERSE_BLOCK):
+                block = slice(start, start + INVERSE_BLOCK)
+                longitudes[block], latitudes[block] = self._inverse(lines[block], samples[block],
+                                                                    H if numpy.ndim(H) == 0 else H[block],
+                                                                    iterations, tolerance)
+        else:
+            longitudes, latitudes = self._inverse(lines, samples, H, iterations, tolerance)
+        return longitudes.reshape(shape), latitudes.reshape(shape)
+
+    def _inverse(self, lines, samples, H, iterations, tolerance):
+        # inverse() of flat arrays at normalized heights H
+        line = (lines - self.lineOffset) / self.lineScale
+        samp = (samples - self.sampOffset) / self.sampScale
+        L = line * self.affine[0, 0] + samp * self.affine[1, 0] + self.affine[2, 0]
+        P = line * self.affine[0, 1] + samp * self.affine[1, 1] + self.affine[2, 1]
+
+        # Points the model cannot invert diverge to inf / NaN; they are reported as NaN
+        with numpy.errstate(all='ignore'):
+            for iteration in range(iterations):
+                values = self._evaluate(self.newtonMatrix, L, P, H)
+                lineDen = values[1]
+                sampDen = values[3]
+                modelLine = values[0] / lineDen
+                modelSamp = values[2] / sampDen
+                # Quotient rule for d(line)/dL, d(line)/dP, d(samp)/dL, d(samp)/dP
+                a = (values[4] - modelLine * values[5]) / lineDen
+                b = (values[8] - modelLine * values[9]) / lineDen
+                c = (values[6] - modelSamp * values[7]) / sampDen
+                d = (values[10] - modelSamp * values[11]) / sampDen
+                lineError = line - modelLine
+                sampError = samp - modelSamp
+                # The 2x2 systems of all points by Cramer's rule
+                determinant = a * d - b * c
+                L = L + (lineError * d - b * sampError) / determinant
+                P = P + (a * sampError - c * lineError) / determinant
+                converged = ((numpy.abs(lineError) * abs(self.lineScale) < tolerance) &
+                             (numpy.abs(sampError) * abs(self.sampScale) < tolerance))
+                if converged.all():
+                    break
+            else:
+                # The last step was taken after the test; check where it got to
+                polynomials = self._evaluate(self.matrix, L, P, H)
+                converged = ((numpy.abs(line - polynomials[0] / polynomials[1]) * abs(self.lineScale) < tolerance) &
+                             (numpy.abs(samp - polynomials[2] / polynomials[3]) * abs(self.sampScale) < tolerance))
+
+        longitudes = L * self.longScale + self.longOffset
+        latitudes = P * self.latScale + self.latOffset
+        longitudes[~converged] = numpy.nan
+        latitudes[~converged] = numpy.nan
+        return longitudes, latitudes
+
+    def imageSize(self):
+        # (rows, cols) the normalization spans, for when the raster's size is not at hand
+        return (int(round(self.lineOffset + abs(self.lineScale))),
+                int(round(self.sampOffset + abs(self.sampScale))))
+
+    def border(self, rows=None, cols=None, pointsPerSide=16):
+        # (lines, samples) around the image edge, clockwise from the top left pixel corner
+        if rows is None or cols is None:
+            rows, cols = self.imageSize()
+        steps = numpy.linspace(0.0, 1.0, pointsPerSide + 1)[:-1]
+        lines = numpy.concatenate((numpy.zeros(pointsPerSide), steps * rows,
+                                   numpy.full(pointsPerSide, float(rows)), (1.0 - steps) * rows))
+        samples = numpy.concatenate((steps * cols, numpy.full(pointsPerSide, float(cols)),
+                                     (1.0 - steps) * cols, numpy.zeros(pointsPerSide)))
+        return lines, samples
+
+    def footprint(self, rows=None, cols=None, height=None, pointsPerSide=16):
+        # The image border projected to the ground at height, as a densified geographic
+        # geometry.Footprint; None when part of the border does not converge
+        lines, samples = self.border(rows, cols, pointsPerSide)
+        longitudes, latitudes = self.inverse(lines, samples, height)
+        if numpy.isnan(longitudes).any():
+            return None
+        # The float64 buffer is copied into the footprint's array as it is
+        coordinates = numpy.column_stack((longitudes, latitudes)).astype(numpy.float64).ravel()
+        return geometry.Footprint(4326, coordinates.tobytes())
+
+    def validate(self, rows=None, cols=None, footprint=None, tolerance=VALIDATION_TOLERANCE, margin=0.05):
+        # Problems found with the model, an empty list for one that can be ingested:
+        #   - denominators that reach zero over the image
+        #   - inverse / forward round trips further than tolerance pixels
+        #   - footprint vertices (longitude / latitude) projecting outside the image by more
+        #     than margin of its size
+        if rows is None or cols is None:
+            rows, cols = self.imageSize()
+        problems = list()
+        lines, samples = numpy.meshgrid(numpy.linspace(0.0, rows, VALIDATION_GRID),
+                                        numpy.linspace(0.0, cols, VALIDATION_GRID), indexing='ij')
+        longitudes, latitudes = self.inverse(lines, samples)
+        failed = numpy.isnan(longitudes)
+        if failed.any():
+            problems.append("the inverse does not converge for {0} of {1} grid points".format(int(failed.sum()), failed.size))
+
+        if not failed.all():
+            found = ~failed
+            line, samp, polynomials = self.normalized(longitudes[found], latitudes[found], 0.0)
+            denominators = numpy.concatenate((polynomials[1], polynomials[3]))
+            if (denominators == 0.0).any() or (numpy.sign(denominators) != numpy.sign(denominators[0])).any():
+                problems.append("a denominator changes sign over the image")
+            error = numpy.hypot(line * self.lineScale + self.lineOffset - lines[found],
+                                samp * self.sampScale + self.sampOffset - samples[found])
+            if error.max() > tolerance:
+                problems.append("round trip error of {0:.4f} pixels".format(float(error.max())))
+
+        if footprint is not None and len(footprint):
+            points = footprint.toNumpy()
+            vertexLines, vertexSamples = self.forward(points[:, 0], points[:, 1])
+            outside = ((vertexLines < -margin * rows) | (vertexLines > (1.0 + margin) * rows) |
+                       (vertexSamples < -margin * cols) | (vertexSamples > (1.0 + margin) * cols))
+            if outside.any():
+                problems.append("{0} footprint vertices fall outside the image".format(int(outside.sum())))
+        return problems
@@ -0,0 +1,141 @@
+import re
+import mmap
+
+from prt import archive
+
+#############################################################################################
+#############################################################################################
+###
+###     Header sniffing used by canBuild / Is<Sensor> checks
+###
+###     Only the head of the metadata file is read, in chunks, and the scan stops as
+###     soon as the mission, mission index and band count are known. No ElementTree
+###     is built.
+###
+#############################################################################################
+#############################################################################################
+
+CHUNK_SIZE = 16 * 1024
+MAX_SNIFF_BYTES = 1024 * 1024
+
+# Longest tag we look for; this much of the previous chunk is kept so a split tag is still found
+OVERLAP = 256
+
+# (SensorName, MISSION prefix, MISSION_INDEX or None); checked in order
+DIMAP_SENSORS = [
+                  ('Kazakhstan', b'DZZ-HR', None),
+                  ('NigeriaSat2', b'NIGERIASAT', None),
+                  ('DEIMOS-2', b'Deimos 2', None),
+                  ('DEIMOS-1', b'DEIMOS', b'1'),
+                ]
+
+LANDSAT8_SENSOR = 'Landsat 8'
+
+# field name -> (value pattern, closing tag after which the field can no longer appear)
+FIELDS = {
+          'mission': (re.compile(br'<MISSION>\s*([^<]*)<'), b'</Scene_Source>'),
+          'missionIndex': (re.compile(br'<MISSION_INDEX>\s*([^<]*)<'), b'</Scene_Source>'),
+          'nbands': (re.compile(br'<NBANDS>\s*(\d+)'), b'</Raster_Dimensions>'),
+         }
+
+LANDSAT8_PATTERN = re.compile(br'LANDSAT_8')
+
+
+def tagsFromBandCount(numBands):
+    tags = list()
+    if numBands == 1:
+        tags.append('Pan')
+    if numBands >= 3:
+        tags.append('MS')
+    return tags
+
+
+def _scan(buf, found, closed, end):
+    for name, (pattern, closingTag) in FIELDS.items():
+        if name in found:
+            continue
+        match = pattern.search(buf, 0, end)
+        if match is not None:
+            found[name] = match.group(1).strip()
+        elif buf.find(closingTag, 0, end) >= 0:
+            closed.add(name)
+
+    if LANDSAT8_PATTERN.search(buf, 0, end) is not None:
+        found['landsat8'] = True
+
+
+def _done(found, closed):
+    if 'landsat8' in found:
+        return True
+    return all(name in found or name in closed for name in FIELDS)
+
+
+def _classify(path, found):
+    retVal = {
+              'sensor': None,
+              'tags': list(),
+              'confidence': 0.0,
+              'path': path
+             }
+
+    mission = found.get('mission')
+    if mission is None:
+        if 'landsat8' in found:
+            retVal['sensor'] = LANDSAT8_SENSOR
+            retVal['tags'] = ['MS', 'Pan']
+            retVal['confidence'] = 1.0
+        return retVal
+
+    missionIndex = found.get('missionIndex')
+    for sensorName, missionPrefix, requiredIndex in DIMAP_SENSORS:
+        if not mission.startswith(missionPrefix):
+            continue
+        if requiredIndex is not None and missionIndex != requiredIndex:
+            continue
+
+        retVal['sensor'] = sensorName
+        if 'nbands' in found:
+            retVal['tags'] = tagsFromBandCount(int(found['nbands']))
+            retVal['confidence'] = 1.0
+        else:
+            # Mission matched but the band count was not within the sniffed bytes
+            retVal['confidence'] = 0.5
+        break
+
+    return retVal
+
+
+def sniffHeader(path, maxBytes=MAX_SNIFF_BYTES, useMmap=False):
+    # Returns {'sensor', 'tags', 'confidence', 'path'}; sensor is None when nothing matched
+    found = {}
+    closed = set()
+
+    with archive.open(path) as f:
+        # Archive members cannot be mapped
+        if useMmap and archive.split(path) is None:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error):
+                # Empty files cannot be mapped
+                return _classify(path, found)
+            try:
+                # Search the mapping in place; only the pages the patterns touch are read
+                _scan(mapped, found, closed, min(maxBytes, len(mapped)))
+            finally:
+                mapped.close()
+            return _classify(path, found)
+
+        tail = b''
+        bytesRead = 0
+        while bytesRead < maxBytes:
+            chunk = f.read(min(CHUNK_SIZE, maxBytes - bytesRead))
+            if not chunk:
+                break
+            bytesRead += len(chunk)
+            buf = tail + chunk
+            _scan(buf, found, closed, len(buf))
+            if _done(found, closed):
+                break
+            tail = chunk[-OVERLAP:]
+
+    return _classify(path, found)
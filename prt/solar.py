@@ -0,0 +1,266 @@
+import os
+
+import numpy
+
+from prt import geometry
+from prt import item
+
+#############################################################################################
+#############################################################################################
+###
+###     Solar position for batches of scenes
+###
+###     position() gives the sun elevation and azimuth (degrees, azimuth clockwise from
+###     north) for arrays of UTC times and latitudes / longitudes in one NumPy pass, with
+###     the NOAA solar calculator equations (about 0.01 degree, no refraction, which is
+###     how the DIMAP SUN_ELEVATION is given).
+###
+###     fill() applies it to built items: angles missing from the key properties are
+###     computed from the acquisition date and time and the footprint centre, and with
+###     verify=True metadata values further than tolerance from the computed ones are
+###     replaced. Only the items that need it are computed, all in one call; for items
+###     already built, pass them all at once:
+###
+###         corrected = solar.fill(builtItems, verify=True)
+###
+###     Builders call request() instead (DimapProfile(solarAngles='fill' or 'verify')):
+###     it only marks the items that need angles, and batch.materialize / buildMany run
+###     fillRequested() once over every item they hand to ArcGIS.
+###
+#############################################################################################
+#############################################################################################
+
+# Key property names, first match wins; angles are written under the name the item
+# already uses for either angle, the first name otherwise
+ELEVATION_KEYS = ('sunElevation', 'SunElevation')
+AZIMUTH_KEYS = ('sunAzimuth', 'SunAzimuth')
+DATE_KEYS = ('acquisitionDate', 'AcquisitionDate')
+TIME_KEYS = ('acquisitionTime', 'AcquisitionTime')
+
+# Degrees a metadata angle may differ from the computed one before verify replaces it
+TOLERANCE = float(os.environ.get('PRT_SOLAR_TOLERANCE', 1.0))
+
+# EPSG codes of geographic footprints, whose vertices are longitude / latitude
+GEOGRAPHIC_CODES = (4326, 4258, 4269)
+
+_epoch = numpy.datetime64('1970-01-01T00:00:00', 'us')
+
+
+def _key(keyProperties, names):
+    if type(keyProperties) is item.KeyProperties:
+        return keyProperties.first(names)
+    for name in names:
+        if keyProperties.get(name) is not None:
+            return name
+    return None
+
+
+def missingAngle(keyProperties):
+    return _key(keyProperties, ELEVATION_KEYS) is None or _key(keyProperties, AZIMUTH_KEYS) is None
+
+
+def _timeText(date, time=None):
+    # 'YYYY-MM-DD' and 'HH:MM:SS[.fff]', or 'YYYY-MM-DDTHH:MM:SS[.fff][Z]' in date alone, as
+    # ISO text. A date without a time cannot place the sun: 'NaT'
+    if date is None:
+        return 'NaT'
+    text = str(date).strip().rstrip('Z')
+    if time is not None:
+        text = text[:10] + 'T' + str(time).strip().rstrip('Z')
+    if 'T' not in text and ' ' not in text:
+        return 'NaT'
+    return text.replace(' ', 'T')
+
+
+def _parseTime(text):
+    try:
+        return numpy.datetime64(text, 'us')
+    except ValueError:
+        return numpy.datetime64('NaT', 'us')
+
+
+def acquisitionTimes(keyPropertiesList):
+    # datetime64[us] array of the acquisition times of the items, NaT where unknown
+    texts = list()
+    for keyProperties in keyPropertiesList:
+        dateKey = _key(keyProperties, DATE_KEYS)
+        timeKey = _key(keyProperties, TIME_KEYS)
+        texts.append(_timeText(keyProperties.get(dateKey) if dateKey else None,
+                               keyProperties.get(timeKey) if timeKey else None))
+    try:
+        # One conversion for the whole batch; one at a time only when a value is malformed
+        return numpy.array(texts, dtype='datetime64[us]')
+    except ValueError:
+        return numpy.array([_parseTime(text) for text in texts], dtype='datetime64[us]')
+
+
+def _isGeographic(spatialReference):
+    if spatialReference is None:
+        return False
+    if isinstance(spatialReference, int):
+        return spatialReference in GEOGRAPHIC_CODES
+    if isinstance(spatialReference, str):
+        text = spatialReference.strip().upper()
+        return text.startswith('GEOGCS') or text.startswith('GEOGCRS')
+    return getattr(spatialReference, 'type', None) == 'Geographic'
+
+
+def centres(builtItems):
+    # (latitudes, longitudes) of the footprint vertex means; NaN for footprints that are
+    # not in geographic coordinates
+    latitudes = numpy.full(len(builtItems), numpy.nan)
+    longitudes = numpy.full(len(builtItems), numpy.nan)
+    for index, builtItem in enumerate(builtItems):
+        footprint = builtItem.get('footprint')
+        if not isinstance(footprint, geometry.Footprint) or not len(footprint):
+            continue
+        srs = footprint.spatialReference
+        if srs is None:
+            srs = builtItem.get('spatialReference')
+        if not _isGeographic(srs):
+            continue
+        # A handful of vertices: summing the array('d') beats a NumPy call per footprint
+        coordinates = footprint.coordinates
+        count = len(coordinates) // 2
+        longitudes[index] = sum(coordinates[0::2]) / count
+        latitudes[index] = sum(coordinates[1::2]) / count
+    return latitudes, longitudes
+
+
+def position(times, latitudes, longitudes):
+    # (elevation, azimuth) in degrees for UTC times (datetime64 or ISO strings) and
+    # latitudes / longitudes in degrees; NaN wherever an input is NaT / NaN
+    times = numpy.asarray(times, dtype='datetime64[us]')
+    latitude = numpy.radians(numpy.asarray(latitudes, dtype='float64'))
+    longitude = numpy.asarray(longitudes, dtype='float64')
+
+    missing = numpy.isnat(times)
+    seconds = (times - _epoch).astype('float64') / 1e6
+    seconds[missing] = numpy.nan
+    julianDay = seconds / 86400.0 + 2440587.5
+    century = (julianDay - 2451545.0) / 36525.0
+
+    meanLongitude = numpy.radians((280.46646 + century * (36000.76983 + century * 0.0003032)) % 360.0)
+    meanAnomaly = numpy.radians(357.52911 + century * (35999.05029 - 0.0001537 * century))
+    eccentricity = 0.016708634 - century * (0.000042037 + 0.0000001267 * century)
+    centre = (numpy.sin(meanAnomaly) * (1.914602 - century * (0.004817 + 0.000014 * century)) +
+              numpy.sin(2.0 * meanAnomaly) * (0.019993 - 0.000101 * century) +
+              numpy.sin(3.0 * meanAnomaly) * 0.000289)
+    omega = numpy.radians(125.04 - 1934.136 * century)
+    apparentLongitude = meanLongitude + numpy.radians(centre - 0.00569 - 0.00478 * numpy.sin(omega))
+    obliquity = numpy.radians(23.0 + (26.0 + (21.448 - century * (46.815 + century * (0.00059 - century * 0.001813))) / 60.0) / 60.0 +
+                              0.00256 * numpy.cos(omega))
+    declination = numpy.arcsin(numpy.sin(obliquity) * numpy.sin(apparentLongitude))
+
+    y = numpy.tan(obliquity / 2.0) ** 2
+    equationOfTime = 4.0 * numpy.degrees(y * numpy.sin(2.0 * meanLongitude) -
+                                         2.0 * eccentricity * numpy.sin(meanAnomaly) +
+                                         4.0 * eccentricity * y * numpy.sin(meanAnomaly) * numpy.cos(2.0 * meanLongitude) -
+                                         0.5 * y * y * numpy.sin(4.0 * meanLongitude) -
+                                         1.25 * eccentricity * eccentricity * numpy.sin(2.0 * meanAnomaly))
+
+    minutes = (seconds % 86400.0) / 60.0
+    trueSolarTime = (minutes + equationOfTime + 4.0 * longitude) % 1440.0
+    hourAngle = numpy.radians(trueSolarTime / 4.0 - 180.0)
+
+    cosZenith = (numpy.sin(latitude) * numpy.sin(declination) +
+                 numpy.cos(latitude) * numpy.cos(declination) * numpy.cos(hourAngle))
+    elevation = 90.0 - numpy.degrees(numpy.arccos(numpy.clip(cosZenith, -1.0, 1.0)))
+    azimuth = (numpy.degrees(numpy.arctan2(numpy.sin(hourAngle),
+                                           numpy.cos(hourAngle) * numpy.sin(latitude) -
+                                           numpy.tan(declination) * numpy.cos(latitude))) + 180.0) % 360.0
+    return elevation, azimuth
+
+
+def angles(builtItems, latitudes=None, longitudes=None):
+    # Computed (elevation, azimuth) per item; the footprint centres unless latitudes and
+    # longitudes are given
+    if latitudes is None or longitudes is None:
+        latitudes, longitudes = centres(builtItems)
+    times = acquisitionTimes([builtItem['keyProperties'] for builtItem in builtItems])
+    return position(times, latitudes, longitudes)
+
+
+def _difference(a, b):
+    return abs((a - b + 180.0) % 360.0 - 180.0)
+
+
+def fill(builtItems, latitudes=None, longitudes=None, verify=False, tolerance=TOLERANCE):
+    # Sets the sun angles missing from the items' key properties, and with verify those
+    # further than tolerance from the computed ones. Items whose time or centre is unknown
+    # are left alone. Returns [(index, key, metadata value, computed value)] of the
+    # replaced values
+    keyPropertiesList = [builtItem['keyProperties'] for builtItem in builtItems]
+    keys = [(_key(keyProperties, ELEVATION_KEYS), _key(keyProperties, AZIMUTH_KEYS)) for keyProperties in keyPropertiesList]
+    selected = range(len(builtItems))
+    if not verify:
+        # Only the items missing an angle are computed
+        selected = [index for index, (elevationKey, azimuthKey) in enumerate(keys) if elevationKey is None or azimuthKey is None]
+        if not selected:
+            return []
+        if len(selected) < len(builtItems):
+            if latitudes is not None and longitudes is not None:
+                latitudes = numpy.asarray(latitudes, dtype='float64')[selected]
+                longitudes = numpy.asarray(longitudes, dtype='float64')[selected]
+            builtItems = [builtItems[index] for index in selected]
+
+    elevation, azimuth = angles(builtItems, latitudes, longitudes)
+    known = (~numpy.isnan(elevation)).tolist()
+    elevation = numpy.round(elevation, 4).tolist()
+    azimuth = numpy.round(azimuth, 4).tolist()
+    replaced = list()
+    for position, index in enumerate(selected):
+        if not known[position]:
+            continue
+        keyProperties = keyPropertiesList[index]
+        elevationKey, azimuthKey = keys[index]
+        capitalized = (elevationKey or azimuthKey) in ('SunElevation', 'SunAzimuth')
+        for names, key, computed in ((ELEVATION_KEYS, elevationKey, elevation[position]),
+                                     (AZIMUTH_KEYS, azimuthKey, azimuth[position])):
+            if key is None:
+                keyProperties[names[1] if capitalized else names[0]] = computed
+                continue
+            if not verify:
+                continue
+            try:
+                value = float(keyProperties[key])
+            except (TypeError, ValueError):
+                value = None
+            if value is None or _difference(value, computed) > tolerance:
+                replaced.append((index, key, keyProperties[key], computed))
+                keyProperties[key] = computed
+    return replaced
+
+
+def request(builtItem, latitude=None, longitude=None, verify=False):
+    # Marks the item for fillRequested(), with the scene centre when the metadata gives it
+    # (the footprint centre is used otherwise). Without verify, items that have both
+    # angles are not marked. True when the item was marked
+    if not verify and not missingAngle(builtItem['keyProperties']):
+        return False
+    builtItem[item.SOLAR_REQUEST] = (latitude, longitude, verify)
+    return True
+
+
+def fillRequested(builtItems):
+    # fill() for the items marked by request(), one call per mode; the marks are removed.
+    # Returns the replaced values as fill() does, indexed into builtItems
+    groups = {False: list(), True: list()}
+    for index, builtItem in enumerate(builtItems):
+        latitude, longitude, verify = builtItem.pop(item.SOLAR_REQUEST)
+        groups[verify].append((index, latitude, longitude))
+    replaced = list()
+    for verify, group in groups.items():
+        if not group:
+            continue
+        selected = [builtItems[index] for index, latitude, longitude in group]
+        latitudes = numpy.array([numpy.nan if latitude is None else latitude for index, latitude, longitude in group])
+        longitudes = numpy.array([numpy.nan if longitude is None else longitude for index, latitude, longitude in group])
+        unknown = numpy.isnan(latitudes) | numpy.isnan(longitudes)
+        if unknown.any():
+            centreLatitudes, centreLongitudes = centres(selected)
+            latitudes[unknown] = centreLatitudes[unknown]
+            longitudes[unknown] = centreLongitudes[unknown]
+        for index, key, value, computed in fill(selected, latitudes, longitudes, verify):
+            replaced.append((group[index][0], key, value, computed))
+    return replaced
@@ -0,0 +1,110 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from prt import metrics
+
+#############################################################################################
+#############################################################################################
+###
+###     Caches for arcpy spatial references and Describe results
+###
+###     Creating an arcpy.SpatialReference or describing a raster costs far more than
+###     the rest of a build, and the same few codes and rasters come up again and
+###     again. SpatialReference objects are kept by EPSG code or by a hash of their
+###     WKT, Describe results by raster path and mtime. arcpy is imported on first use.
+###
+#############################################################################################
+#############################################################################################
+
+MAX_SPATIAL_REFERENCES = 256
+MAX_DESCRIBED = 1024
+
+
+class LruCache():
+
+    def __init__(self, maxEntries):
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, create):
+        with self.lock:
+            value = self.entries.pop(key, None)
+            if value is not None:
+                self.entries[key] = value
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = create()
+
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+spatialReferences = LruCache(MAX_SPATIAL_REFERENCES)
+described = LruCache(MAX_DESCRIBED)
+
+
+def spatialReferenceKey(srs):
+    # ('epsg', code) for EPSG codes, ('wkt', sha1) for WKT strings
+    try:
+        return ('epsg', int(srs))
+    except (TypeError, ValueError):
+        return ('wkt', hashlib.sha1(srs.encode('utf-8')).hexdigest())
+
+
+def spatialReference(srs):
+    # EPSG code or WKT string -> shared arcpy.SpatialReference; objects are returned as they are
+    import arcpy
+    if isinstance(srs, arcpy.SpatialReference):
+        return srs
+
+    key = spatialReferenceKey(srs)
+
+    def create():
+        with metrics.stage('spatialReference'):
+            if key[0] == 'epsg':
+                return arcpy.SpatialReference(key[1])
+            # SpatialReference(text=...) is ArcGIS Pro only; ArcMap 10.x loads WKT this way
+            sr = arcpy.SpatialReference()
+            sr.loadFromString(srs)
+            return sr
+
+    return spatialReferences.get(key, create)
+
+
+def describe(path):
+    # arcpy.Describe(path), described again only when the raster changes on disk
+    import arcpy
+    try:
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime)
+    except OSError:
+        # Not a plain file (geodatabase raster, service, ...): keyed by path alone
+        key = (path, None, None)
+
+    def create():
+        with metrics.stage('describe'):
+            return arcpy.Describe(path)
+
+    return described.get(key, create)
+
+
+def stats():
+    return {'spatialReferences': spatialReferences.stats(), 'described': described.stats()}
@@ -0,0 +1,194 @@
+import os
+import re
+import fnmatch
+import threading
+from collections import deque
+
+from prt import metrics
+
+try:
+    from os import scandir
+except ImportError:
+    # Python 2: the scandir backport from PyPI
+    from scandir import scandir
+
+#############################################################################################
+#############################################################################################
+###
+###     Parallel directory traversal used by the crawlers' createGenerator
+###
+###     A pool of threads lists directories with scandir; only the file type that
+###     DirEntry already carries is used, so no extra stat call is made per file.
+###
+#############################################################################################
+#############################################################################################
+
+DEFAULT_WORKERS = int(os.environ.get('PRT_CRAWL_WORKERS', 16))
+
+# Listed but not yet consumed paths; workers pause when this many are waiting
+MAX_BUFFERED = 10000
+
+
+def compileFilter(filter):
+    # '*.dim' or '*.dim;*.xml' -> one compiled, case-insensitive match function
+    if not filter:
+        filter = '*'
+    if isinstance(filter, (list, tuple)):
+        patterns = filter
+    else:
+        patterns = filter.split(';')
+    regex = '|'.join('(?:%s)' % fnmatch.translate(p.strip()) for p in patterns if p.strip())
+    return re.compile(regex, re.IGNORECASE).match
+
+
+class ParallelWalker():
+
+    # With withStat the walker yields (path, stat) pairs, using DirEntry.stat(); that is
+    # free on Windows and one stat call per matching file elsewhere.
+    # listedDirs are (directory, firstName) pairs from snapshot(): only the files of those
+    # directories from firstName on are yielded, their subdirectories are not walked again
+    def __init__(self, roots, filter='*', recurse=True, workers=DEFAULT_WORKERS, maxBuffered=MAX_BUFFERED, withStat=False, listedDirs=None):
+        self.match = compileFilter(filter)
+        self.recurse = recurse
+        self.withStat = withStat
+        self.workers = max(1, workers)
+        self.maxBuffered = maxBuffered
+        # Listings are timed for the crawler that created the walker
+        self.sensor = metrics.currentSensor()
+
+        # (directory, firstName) work items; firstName is None for a full listing
+        self.pendingDirs = deque([(root, None) for root in roots])
+        self.pendingDirs.extend((directory, firstName) for directory, firstName in listedDirs or list())
+        self.activeDirs = set()
+        # Listed (directory, files) groups not yet taken by the consumer, and how many files they hold
+        self.groups = deque()
+        self.buffered = 0
+        # The groups the consumer is working through, and its position in the first one
+        self.batch = deque()
+        self.position = 0
+        self.errors = list()
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.threads = list()
+
+    def __listDirectory(self, directory, firstName):
+        files = list()
+        subDirs = list()
+        try:
+            for entry in scandir(directory):
+                # Like os.walk, symlinked directories are not followed
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recurse and firstName is None:
+                        subDirs.append((entry.path, None))
+                elif self.match(entry.name) and (firstName is None or entry.name >= firstName):
+                    if self.withStat:
+                        files.append((entry.path, entry.stat()))
+                    else:
+                        files.append(entry.path)
+        except OSError as e:
+            # Unreadable directories are skipped, as os.walk does
+            self.errors.append((directory, e))
+        files.sort()
+        return files, subDirs
+
+    def __work(self):
+        condition = self.condition
+        while True:
+            with condition:
+                while not self.stopped and (not self.pendingDirs or self.buffered >= self.maxBuffered):
+                    if not self.pendingDirs and not self.activeDirs:
+                        return
+                    condition.wait()
+                if self.stopped:
+                    return
+                work = self.pendingDirs.popleft()
+                self.activeDirs.add(work)
+
+            with metrics.stage('walk', self.sensor):
+                files, subDirs = self.__listDirectory(*work)
+            metrics.increment('walk.directories', 1, self.sensor)
+            metrics.increment('walk.files', len(files), self.sensor)
+
+            with condition:
+                # A directory's files and subdirectories are published together
+                if files:
+                    self.groups.append((work[0], files))
+                    self.buffered += len(files)
+                self.pendingDirs.extend(subDirs)
+                self.activeDirs.discard(work)
+                condition.notify_all()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.__work, name='prt-walk-%d' % i)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def snapshot(self):
+        # The walk's remaining work, for ParallelWalker(pendingDirs, ..., listedDirs=listedDirs).
+        # It holds directories rather than files, so its size does not grow with the buffer:
+        # directories being listed are listed again, since their files are only published
+        # once the listing is complete. Call it from the consuming thread.
+        pendingDirs = list()
+        listedDirs = list()
+        with self.condition:
+            for directory, firstName in list(self.activeDirs) + list(self.pendingDirs):
+                if firstName is None:
+                    pendingDirs.append(directory)
+                else:
+                    listedDirs.append((directory, firstName))
+            groups = list(self.batch) + list(self.groups)
+
+        position = self.position
+        for directory, files in groups:
+            if position < len(files):
+                path = files[position]
+                if self.withStat:
+                    path = path[0]
+                listedDirs.append((directory, os.path.basename(path)))
+            position = 0
+        return {'pendingDirs': pendingDirs, 'listedDirs': listedDirs}
+
+    def __iter__(self):
+        if not self.threads:
+            self.start()
+        condition = self.condition
+        try:
+            while True:
+                with condition:
+                    while not self.groups and (self.pendingDirs or self.activeDirs):
+                        condition.wait()
+                    if not self.groups:
+                        return
+                    self.batch.extend(self.groups)
+                    self.groups.clear()
+                    self.buffered = 0
+                    condition.notify_all()
+                while self.batch:
+                    files = self.batch[0][1]
+                    while self.position < len(files):
+                        self.position += 1
+                        yield files[self.position - 1]
+                    self.batch.popleft()
+                    self.position = 0
+        finally:
+            self.stop()
+
+
+def findFiles(paths, recurse, filter, workers=DEFAULT_WORKERS, withStat=False):
+    # Drop-in for the crawlers' createGenerator: folders are scanned for files matching
+    # filter (case-insensitive), anything else in paths is yielded as it is
+    for path in paths:
+        if os.path.isdir(path):
+            for found in ParallelWalker([path], filter, recurse, workers, withStat=withStat):
+                yield found
+        elif withStat:
+            yield path, os.stat(path)
+        else:
+            yield path